@@ -0,0 +1,117 @@
+"""
+Benchmark: Monte Carlo battle balance over the card catalog with the vectorized battle engine.
+
+Run from the repo root:  python -m benchmarks.bench_battles [--matches N] [--synthetic N] [--csv PATH]
+Plays random 5-card decks with random tactics against each other and reports per-tactic and
+per-card win rates. Uses the cards in cards_game.db unless --synthetic is given. Needs numpy.
+"""
+import argparse
+import csv
+import random
+import time
+from collections import namedtuple
+
+import numpy as np
+
+from utils.battle_engine import ROUNDS, TACTICS, match_over, resolve_round, seat_tactics
+from utils.battle_sim import card_stats, simulate
+
+FakeCard = namedtuple('FakeCard', 'card_id name overall attack defense speed')
+
+
+def build_cards(n):
+    cards = []
+    for card_id in range(n):
+        overall = random.randint(60, 99)
+        cards.append(FakeCard(card_id, f"Card {card_id}", overall,
+                              *(max(1, min(99, overall + random.randint(-25, 10))) for _ in range(3))))
+    return cards
+
+
+def load_cards():
+    from utils.catalog import load_catalog
+    return list(load_catalog().all())
+
+
+def scalar_matches(cards, matches):
+    """The same random matches through the per-round rules the bot uses, one at a time."""
+    for _ in range(matches):
+        decks = random.sample(cards, ROUNDS * 2)
+        p1_wins = p2_wins = 0
+        for round_number in range(1, ROUNDS + 1):
+            p1_action, p2_action = seat_tactics(round_number % 2 == 1, random.choice(TACTICS))
+            winner, _, _ = resolve_round(decks[round_number - 1], decks[ROUNDS + round_number - 1], p1_action, p2_action)
+            p1_wins += winner == 1
+            p2_wins += winner == 2
+            if match_over(p1_wins, p2_wins, round_number):
+                break
+
+
+def print_cards(title, cards, order, report, round_rate, match_rate):
+    print(f"\n{title}")
+    print(f"{'card':<28} {'ovr':>4} {'atk':>4} {'def':>4} {'spd':>4} {'rounds':>9} {'round win':>10} {'match win':>10}")
+    for i in order:
+        card = cards[i]
+        print(f"{card.name[:28]:<28} {card.overall:>4} {card.attack:>4} {card.defense:>4} {card.speed:>4} "
+              f"{report.card_rounds[i]:>9} {round_rate[i]:>9.1%} {match_rate[i]:>10.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--matches', type=int, default=1_000_000)
+    parser.add_argument('--batch', type=int, default=100_000)
+    parser.add_argument('--synthetic', type=int, metavar='CARDS', help="use N synthetic cards instead of the database")
+    parser.add_argument('--top', type=int, default=10)
+    parser.add_argument('--min-rounds', type=int, default=100, help="leave out cards with fewer simulated rounds")
+    parser.add_argument('--csv', help="write every card's tallies to this file")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    cards = build_cards(args.synthetic) if args.synthetic else load_cards()
+    if len(cards) < ROUNDS * 2:
+        raise SystemExit(f"Need at least {ROUNDS * 2} cards, found {len(cards)}")
+    stats = card_stats(cards)
+    print(f"{len(cards)} cards, {args.matches} matches")
+
+    start = time.perf_counter()
+    report = simulate(stats, args.matches, batch=args.batch, seed=args.seed)
+    vectorized = time.perf_counter() - start
+    print(f"{'vectorized engine':<24} {vectorized * 1000:10.1f} ms   {args.matches / vectorized:12,.0f} matches/s")
+
+    sample = min(args.matches, 20_000)
+    start = time.perf_counter()
+    scalar_matches(cards, sample)
+    scalar = time.perf_counter() - start
+    print(f"{'per-round rules':<24} {scalar * 1000:10.1f} ms   {sample / scalar:12,.0f} matches/s ({sample} matches)")
+    print(f"speedup: {(scalar / sample) / (vectorized / args.matches):.1f}x")
+
+    losses, draws, wins = report.p1_results / report.matches
+    print(f"\nPlayer 1 (first pick): {wins:.1%} won, {draws:.1%} drawn, {losses:.1%} lost")
+
+    print(f"\n{'tactic (turn player)':<24} {'rounds':>10} {'win':>7} {'draw':>7} {'loss':>7}")
+    for i, tactic in enumerate(TACTICS):
+        rounds = report.tactic_rounds[i]
+        win, draw = report.tactic_wins[i] / rounds, report.tactic_draws[i] / rounds
+        print(f"{tactic:<24} {rounds:>10} {win:>7.1%} {draw:>7.1%} {1 - win - draw:>7.1%}")
+
+    round_rate, match_rate = report.card_rates()
+    eligible = np.flatnonzero(report.card_rounds >= args.min_rounds)
+    ranked = eligible[np.argsort(round_rate[eligible])[::-1]]
+    print_cards(f"Strongest {args.top} cards (by round win rate)", cards, ranked[:args.top], report, round_rate, match_rate)
+    print_cards(f"Weakest {args.top} cards", cards, ranked[::-1][:args.top], report, round_rate, match_rate)
+
+    if args.csv:
+        with open(args.csv, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(['card_id', 'name', 'overall', 'attack', 'defense', 'speed',
+                             'rounds', 'round_wins', 'matches', 'match_wins'])
+            for i, card in enumerate(cards):
+                writer.writerow([card.card_id, card.name, card.overall, card.attack, card.defense, card.speed,
+                                 report.card_rounds[i], report.card_round_wins[i],
+                                 report.card_matches[i], report.card_match_wins[i]])
+        print(f"\nWrote {len(cards)} cards to {args.csv}")
+
+
+if __name__ == '__main__':
+    main()
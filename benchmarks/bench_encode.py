@@ -0,0 +1,69 @@
+"""
+Benchmark: encode time and payload size of a rendered image per output format.
+
+Run from the repo root:  python -m benchmarks.bench_encode [--image PATH] [--repeat N] [--max-mb N]
+Encodes the deck lineup render (pitch.png at 1080x1350, or a synthetic gradient if it's missing)
+through utils.rendering.encode_image. Needs Pillow.
+"""
+import argparse
+import time
+
+from utils.rendering import Image, encode_image
+
+# (label, format, quality, optimize)
+CONFIGS = [
+    ('PNG', 'PNG', None, False),
+    ('PNG optimize', 'PNG', None, True),
+    ('WEBP q90', 'WEBP', 90, True),
+    ('WEBP q85', 'WEBP', 85, True),
+    ('WEBP q75', 'WEBP', 75, True),
+    ('WEBP q85 fast', 'WEBP', 85, False),
+    ('JPEG q90', 'JPEG', 90, True),
+    ('JPEG q85', 'JPEG', 85, True),
+    ('JPEG q85 fast', 'JPEG', 85, False),
+]
+
+
+def load_image(path):
+    try:
+        return Image.open(path).convert('RGBA').resize((1080, 1350), Image.Resampling.LANCZOS)
+    except FileNotFoundError:
+        print(f"{path} not found, using a synthetic image")
+    img = Image.new('RGBA', (1080, 1350))
+    img.putdata([(x % 256, y % 256, (x * y) % 256, 255) for y in range(1350) for x in range(1080)])
+    return img
+
+
+def bench(label, img, fmt, quality, optimize, max_bytes, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        buffer = encode_image(img, fmt=fmt, quality=quality, optimize=optimize, max_bytes=max_bytes)
+    elapsed = (time.perf_counter() - start) / repeat
+    size = buffer.getbuffer().nbytes
+    print(f"{label:<16} {elapsed * 1000:10.1f} ms   {size / 1024:9.1f} KiB")
+    return size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--image', default='pitch.png')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--max-mb', type=float, default=0, help="size target (0 = none)")
+    args = parser.parse_args()
+
+    if Image is None:
+        print("Pillow is not installed")
+        return
+
+    img = load_image(args.image)
+    max_bytes = int(args.max_mb * 1024 * 1024)
+    print(f"{img.width}x{img.height}, {args.repeat} runs each" + (f", target {args.max_mb} MB" if max_bytes else ""))
+
+    sizes = {label: bench(label, img, fmt, quality, optimize, max_bytes, args.repeat)
+             for label, fmt, quality, optimize in CONFIGS}
+    for label in ('WEBP q85', 'JPEG q85'):
+        print(f"{label} is {sizes['PNG'] / sizes[label]:.1f}x smaller than PNG")
+
+
+if __name__ == '__main__':
+    main()
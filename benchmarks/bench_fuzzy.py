@@ -0,0 +1,82 @@
+"""
+Benchmark: fuzzy card-name lookup with fuzzywuzzy, plain rapidfuzz and the cached CardNameMatcher.
+
+Run from the repo root:  python -m benchmarks.bench_fuzzy [--cards N] [--queries N]
+Uses synthetic player names, so it needs no database. fuzzywuzzy is optional (it is no longer a
+dependency); its row is skipped when it isn't installed.
+"""
+import argparse
+import random
+import time
+from collections import namedtuple
+
+from rapidfuzz import process as rapidfuzz_process
+
+from utils.fuzzy import CardNameMatcher
+
+FakeCard = namedtuple('FakeCard', 'card_id name')
+
+FIRST = ['Kylian', 'Erling', 'Luka', 'Martin', 'Søren', 'João', 'Vinícius', 'Ángel', 'Thibaut', 'Bukayo', 'Declan']
+LAST = ['Mbappé', 'Haaland', 'Modrić', 'Ødegaard', 'Félix', 'Júnior', 'Di María', 'Courtois', 'Saka', 'Rice', 'Müller']
+
+
+def build_cards(n):
+    return [FakeCard(card_id, f"{random.choice(FIRST)} {random.choice(LAST)}") for card_id in range(n)]
+
+
+def typo(name):
+    """Drop or swap a character, the way names get typed into !lookup."""
+    chars = list(name.lower())
+    i = random.randrange(len(chars) - 1)
+    if random.random() < 0.5:
+        del chars[i]
+    else:
+        chars[i], chars[i + 1] = chars[i + 1], chars[i]
+    return ''.join(chars)
+
+
+def bench(label, func, queries):
+    start = time.perf_counter()
+    for query in queries:
+        func(query)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<32} {elapsed * 1000:10.1f} ms   {elapsed / len(queries) * 1e6:8.1f} us/query")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--cards', type=int, default=5000)
+    parser.add_argument('--queries', type=int, default=200)
+    args = parser.parse_args()
+
+    random.seed(0)
+    cards = build_cards(args.cards)
+    queries = [typo(card.name) for card in random.choices(cards, k=args.queries)]
+    print(f"{args.cards} cards, {args.queries} queries")
+
+    start = time.perf_counter()
+    matcher = CardNameMatcher(cards)
+    print(f"{'matcher build':<32} {(time.perf_counter() - start) * 1000:10.1f} ms")
+
+    def rapidfuzz_uncached(query):
+        # The previous per-call path: lower-case the whole list, then extractOne
+        names = [card.name.lower() for card in cards]
+        return rapidfuzz_process.extractOne(query, names)
+
+    try:
+        from fuzzywuzzy import process as fuzzywuzzy_process
+    except ImportError:
+        print(f"{'fuzzywuzzy extractOne':<32} (not installed)")
+    else:
+        names = [card.name.lower() for card in cards]
+        # Pure-Python scorer: a few queries are enough for the per-query figure
+        bench('fuzzywuzzy extractOne', lambda q: fuzzywuzzy_process.extractOne(q, names), queries[:20])
+
+    uncached = bench('rapidfuzz, list rebuilt per call', rapidfuzz_uncached, queries)
+    cached = bench('CardNameMatcher.best', matcher.best, queries)
+    print(f"speedup: {uncached / cached:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""
+Benchmark: joining and sweeping the strength-bucketed MatchmakingQueue.
+
+Run from the repo root:  python -m benchmarks.bench_matchmaking [--players N] [--guilds N] [--sweeps N]
+Uses synthetic players and decks, so it needs no database or Discord connection. Players are spread
+over many guilds and only pair within their own, so a large part of them stays queued.
+"""
+import argparse
+import random
+import time
+from collections import namedtuple
+
+from utils.matchmaking import MatchmakingQueue, QueueEntry
+
+FakeUser = namedtuple('FakeUser', 'id')
+FakeCard = namedtuple('FakeCard', 'overall')
+
+
+def build_entries(n, guilds):
+    entries = []
+    for user_id in range(n):
+        level = random.randint(65, 95)
+        deck = [FakeCard(max(50, min(99, level + random.randint(-5, 5)))) for _ in range(5)]
+        guild_id = random.randrange(guilds)
+        entries.append(QueueEntry(FakeUser(user_id), 'deck', deck, channel_id=guild_id, pool=guild_id))
+    return entries
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--players', type=int, default=20000)
+    parser.add_argument('--guilds', type=int, default=2000)
+    parser.add_argument('--sweeps', type=int, default=10)
+    args = parser.parse_args()
+
+    random.seed(0)
+    entries = build_entries(args.players, args.guilds)
+    queue = MatchmakingQueue()
+    print(f"{args.players} players in {args.guilds} guilds")
+
+    start = time.perf_counter()
+    paired_on_join = sum(queue.join(entry) is not None for entry in entries)
+    elapsed = time.perf_counter() - start
+    print(f"{'join':<24} {elapsed * 1000:10.1f} ms   {elapsed / args.players * 1e6:8.2f} us/join   "
+          f"{paired_on_join} pairs, {len(queue)} waiting")
+
+    now = time.monotonic()
+    for sweep in range(1, args.sweeps + 1):
+        waiting = len(queue)
+        start = time.perf_counter()
+        # Each sweep pretends another 10 seconds have passed
+        paired = queue.sweep(now + sweep * 10)
+        elapsed = time.perf_counter() - start
+        print(f"{f'sweep {sweep} (+{sweep * 10}s)':<24} {elapsed * 1000:10.1f} ms   "
+              f"{elapsed / max(waiting, 1) * 1e6:8.2f} us/entry  {paired} pairs, {len(queue)} waiting")
+        if not queue:
+            break
+
+    start = time.perf_counter()
+    expired = len(queue)
+    queue.sweep(now + 24 * 3600)
+    print(f"{'expire':<24} {(time.perf_counter() - start) * 1000:10.1f} ms   {expired - len(queue)} entries timed out")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""
+Benchmark: linear weighted_choice vs the alias-method WeightedSampler.
+
+Run from the repo root:  python -m benchmarks.bench_sampler [--cards N] [--draws N]
+Uses a synthetic card pool with the same weight tiers as utils.models, so it needs no database.
+"""
+import argparse
+import random
+import time
+from collections import Counter, namedtuple
+
+from utils.sampler import WeightedSampler
+
+FakeCard = namedtuple('FakeCard', 'card_id overall')
+
+# Same tiers as utils.models (70-79, 80-85, 86-90, 90+, hero/icon, TOTT)
+TIER_WEIGHTS = [70, 20, 7, 3, 2, 1]
+TIER_SHARE = [0.55, 0.25, 0.1, 0.04, 0.05, 0.01]
+
+
+def weighted_choice(cards_with_weights):
+    """The previous implementation from utils.models: re-sum and walk the list on every draw."""
+    total = sum(weight for card, weight in cards_with_weights)
+    r = random.uniform(0, total)
+    upto = 0
+    for card, weight in cards_with_weights:
+        if upto + weight >= r:
+            return card
+        upto += weight
+    return cards_with_weights[0][0] if cards_with_weights else None
+
+
+def build_pool(n):
+    pool = []
+    for card_id in range(n):
+        weight = random.choices(TIER_WEIGHTS, TIER_SHARE)[0]
+        pool.append((FakeCard(card_id, 60 + weight), weight))
+    return pool
+
+
+def bench(label, func, draws):
+    start = time.perf_counter()
+    func(draws)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<28} {elapsed * 1000:10.1f} ms   {elapsed / draws * 1e6:8.2f} us/draw")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--cards', type=int, default=5000)
+    parser.add_argument('--draws', type=int, default=20000)
+    args = parser.parse_args()
+
+    random.seed(0)
+    pool = build_pool(args.cards)
+    print(f"{args.cards} cards, {args.draws} draws")
+
+    start = time.perf_counter()
+    sampler = WeightedSampler(pool)
+    print(f"{'alias table build':<28} {(time.perf_counter() - start) * 1000:10.1f} ms")
+
+    linear = bench('linear weighted_choice', lambda k: [weighted_choice(pool) for _ in range(k)], args.draws)
+    alias = bench('WeightedSampler.sample', sampler.sample, args.draws)
+    owned = {card.card_id for card, _ in pool[: args.cards // 2]}
+    bench('choice_excluding (50% owned)', lambda k: [sampler.choice_excluding(owned) for _ in range(k)], args.draws)
+    print(f"speedup: {linear / alias:.0f}x")
+
+    # Sanity check: both draw tiers in proportion to their total weight
+    tier_weight = Counter()
+    for card, weight in pool:
+        tier_weight[weight] += weight
+    total = sum(tier_weight.values())
+    drawn = Counter(card.overall - 60 for card in sampler.sample(100000))
+    print("tier   expected   alias")
+    for weight in TIER_WEIGHTS:
+        print(f"{weight:>4} {tier_weight[weight] / total:10.3f} {drawn[weight] / 100000:7.3f}")
+
+
+if __name__ == '__main__':
+    main()
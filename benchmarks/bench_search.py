@@ -0,0 +1,72 @@
+"""
+Benchmark: linear autocomplete scan vs the trigram CardSearchIndex.
+
+Run from the repo root:  python -m benchmarks.bench_search [--cards N] [--queries N]
+Uses synthetic accented player names, so it needs no database.
+"""
+import argparse
+import random
+import time
+from collections import namedtuple
+
+from utils.search import CardSearchIndex, fold
+
+FakeCard = namedtuple('FakeCard', 'card_id name overall wishlist_count copies')
+
+FIRST = ['Kylian', 'Erling', 'Luka', 'Martin', 'Søren', 'João', 'Vinícius', 'Ángel', 'Thibaut', 'İlkay', 'Heung-min']
+LAST = ['Mbappé', 'Haaland', 'Modrić', 'Ødegaard', 'Félix', 'Júnior', 'Di María', 'Courtois', 'Gündoğan', 'Son', 'Müller']
+
+
+def build_cards(n):
+    return [
+        FakeCard(card_id, f"{random.choice(FIRST)} {random.choice(LAST)} {card_id}",
+                 random.randint(60, 99), random.randint(0, 50), random.randint(0, 200))
+        for card_id in range(n)
+    ]
+
+
+def linear_search(cards, current):
+    """The previous autocomplete: lower-case every name on every keystroke, first 25 in table order."""
+    matches = []
+    for card in cards:
+        if current.lower() in card.name.lower():
+            matches.append(card)
+            if len(matches) == 25:
+                break
+    return matches
+
+
+def bench(label, func, queries):
+    start = time.perf_counter()
+    for query in queries:
+        func(query)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<24} {elapsed * 1000:10.1f} ms   {elapsed / len(queries) * 1e6:8.1f} us/query")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--cards', type=int, default=5000)
+    parser.add_argument('--queries', type=int, default=2000)
+    args = parser.parse_args()
+
+    random.seed(0)
+    cards = build_cards(args.cards)
+    # Keystroke-by-keystroke prefixes of real names, plus misses
+    words = [fold(word) for word in FIRST + LAST] + ['zzz', 'xq']
+    queries = [word[:random.randint(1, len(word))] for word in random.choices(words, k=args.queries)]
+    print(f"{args.cards} cards, {args.queries} queries")
+
+    start = time.perf_counter()
+    index = CardSearchIndex(cards)
+    print(f"{'index build':<24} {(time.perf_counter() - start) * 1000:10.1f} ms   {len(index.postings)} trigrams")
+
+    linear = bench('linear scan', lambda q: linear_search(cards, q), queries)
+    indexed = bench('CardSearchIndex.search', index.search, queries)
+    print(f"speedup: {linear / indexed:.1f}x")
+    print(f"'mbappe' -> {[card.name for card in index.search('mbappe', 3)]}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,14 +1,10 @@
 import discord
 from discord.ext import commands, tasks
-from rapidfuzz import process
-import sqlite3
 import random
+import sys
 import asyncio
 import logging
 import json
-from fuzzywuzzy import process
-from PIL import Image, ImageDraw, ImageFont, ImageOps
-import io
 import time
 from datetime import datetime, timedelta
 import os
@@ -16,6 +12,29 @@ from dotenv import load_dotenv
 from typing import Literal
 from discord import app_commands
 from typing import List
+from utils.database import (
+    run_db, run_write, fetchone, fetchall, execute, close_pool,
+    ensure_player_exists, add_card_to_inventory, remove_card_from_inventory,
+    check_card_ownership, increment_cards_dropped
+)
+from utils.catalog import fetch_card_rows, load_catalog
+from utils.sampler import WeightedSampler
+from utils.pack_definitions import NON_DROPPABLE_TYPES
+from utils.packs import PACKS, MAX_PACKS_PER_OPEN, open_pack_batch
+from utils.assets import asset_file
+from utils.uploads import edit_image_url, remember_upload, send_card_image
+from utils.render_pool import RenderBusy, render_pool, render_card_grid, render_lineup, render_minted_card
+from utils.rendering import render_filename
+from utils.atlas import build_lineup_atlas, fetch_atlas_cards
+from utils.avatars import fetch_avatar
+from utils.search import card_search_index
+from utils.fuzzy import card_name_matcher
+from utils.battle_stats import BattleLedger, recover_interrupted_battles, WIN_COINS, LOSS_COINS, DRAW_COINS
+from utils.battle_engine import match_over, resolve_round, seat_tactics
+from utils.battle_ai import BattleAI, practice_deck
+from utils.matchmaking import QueueEntry, QUEUE_TIMEOUT_MINUTES, match_channel, matchmaking
+from utils.battle_store import save_battle, forget_battle, restore_battles, in_live_battle
+from utils.leaderboard import get_leaderboard
 try:
     from aiohttp import web as aiohttp_web
     _AIOHTTP_AVAILABLE = True
@@ -48,145 +67,12 @@ SUGGESTION_CHANNEL_ID = int(os.getenv('SUGGESTION_CHANNEL_ID'))
 API_PORT = int(os.getenv('API_PORT', '25535'))
 DASHBOARD_SECRET = os.getenv('DASHBOARD_SECRET', '')
 
-# Connect to SQLite database (or create it if it doesn't exist)
-conn = sqlite3.connect('cards_game.db')
-cursor = conn.cursor()
-
-
-
-
-
+# Tables and migrations are created by utils.database on import; every query below goes through
+# its reader pool (run_db) or its single writer (run_write)
 
 
-#---------------------------------------------------------TABLES-------------------------------------------------------------------------------------
-# Create tables (if not already created)
-cursor.execute('''
-CREATE TABLE IF NOT EXISTS cards (
-    card_id INTEGER PRIMARY KEY,
-    player_id TEXT,
-    name TEXT,
-    attack INTEGER,
-    defense INTEGER,
-    speed INTEGER,
-    height TEXT,
-    club TEXT,
-    position TEXT,
-    overall INTEGER,
-    image_path TEXT,
-    card_rarity TEXT,
-    card_type TEXT,
-    league TEXT,
-    nation TEXT
-)
-''')
-
-cursor.execute('''
-CREATE TABLE IF NOT EXISTS decks (
-    user_id INTEGER,
-    deck_name TEXT,
-    cards TEXT,
-    FOREIGN KEY(user_id) REFERENCES players(user_id)
-)
-''')
-
-
-cursor.execute('''
-CREATE TABLE IF NOT EXISTS players (
-    user_id INTEGER PRIMARY KEY,
-    name TEXT,
-    battles_played INTEGER DEFAULT 0,
-    battles_won INTEGER DEFAULT 0,
-    battles_lost INTEGER DEFAULT 0,
-    has_claimed_starter_pack BOOLEAN DEFAULT 0,
-    rounds_played INTEGER DEFAULT 0,
-    rounds_won INTEGER DEFAULT 0,
-    rounds_lost INTEGER DEFAULT 0
-)
-''')
-
-cursor.execute('''
-CREATE TABLE IF NOT EXISTS inventories (
-    user_id INTEGER,
-    card_id INTEGER,
-    edition INTEGER,
-    FOREIGN KEY(user_id) REFERENCES players(user_id),
-    FOREIGN KEY(card_id) REFERENCES cards(card_id)
-)
-''')
-
-cursor.execute('''
-CREATE TABLE IF NOT EXISTS achievements (
-   	achievement_id	INTEGER,
-	title	TEXT NOT NULL,
-	description	TEXT NOT NULL,
-	PRIMARY KEY(achievement_id)
-)
-''')
-
-cursor.execute('''
-CREATE TABLE IF NOT EXISTS user_achievements (
-    	user_id	INTEGER,
-	achievement_id	INTEGER,
-	date_earned 	DATETIME DEFAULT CURRENT_TIMESTAMP,
-	PRIMARY KEY(user_id,achievement_id),
-	FOREIGN KEY(user_id) REFERENCES players(user_id),
-	FOREIGN KEY(achievement_id) REFERENCES achievements(achievement_id)
-)
-''')
-
-def migrate_db():
-    try:
-        conn = sqlite3.connect('cards_game.db')
-        cursor = conn.cursor()
-        
-        # ... (Keep previous Player/Wishlist checks) ...
-
-        # --- NEW: Card Stats (Individual Copies in Inventory) ---
-        cursor.execute("PRAGMA table_info(inventories)")
-        inv_columns = [info[1] for info in cursor.fetchall()]
-        
-        stats_cols = ['battles_played', 'battles_won', 'rounds_played', 'rounds_won']
-        for col in stats_cols:
-            if col not in inv_columns:
-                print(f"Migrating DB: Adding {col} to inventories...")
-                cursor.execute(f"ALTER TABLE inventories ADD COLUMN {col} INTEGER DEFAULT 0")
-
-        # --- NEW: Card Stats (Global Totals in Cards table) ---
-        cursor.execute("PRAGMA table_info(cards)")
-        card_columns = [info[1] for info in cursor.fetchall()]
-        
-        global_cols = ['total_battles_played', 'total_battles_won', 'total_rounds_played', 'total_rounds_won']
-        for col in global_cols:
-            if col not in card_columns:
-                print(f"Migrating DB: Adding {col} to cards...")
-                cursor.execute(f"ALTER TABLE cards ADD COLUMN {col} INTEGER DEFAULT 0")
-
-        # --- NEW: Daily Streak System ---
-        cursor.execute("PRAGMA table_info(players)")
-        player_columns = [info[1] for info in cursor.fetchall()]
-        
-        streak_cols = ['daily_streak', 'last_daily_claim']
-        for col in streak_cols:
-            if col not in player_columns:
-                print(f"Migrating DB: Adding {col} to players...")
-                if col == 'daily_streak':
-                    cursor.execute(f"ALTER TABLE players ADD COLUMN {col} INTEGER DEFAULT 0")
-                else:
-                    cursor.execute(f"ALTER TABLE players ADD COLUMN {col} TEXT DEFAULT NULL")
-
-        conn.commit()
-        conn.close()
-        print("Database migration complete.")
-    except Exception as e:
-        print(f"Migration Error: {e}")
-
-# IMPORTANT: Call this function once when the bot starts
-migrate_db()
-
 #---------------------------------------------------------SETUP-------------------------------------------------------------------------------------
 
-conn.commit()
-
 intents = discord.Intents.default()
 intents.message_content = True
 intents.members = True  # <--- ADD THIS LINE
@@ -274,7 +160,7 @@ class HelpSelect(discord.ui.Select):
         
         elif value == "battle":
             embed = discord.Embed(title="⚔️ Battle Arena", color=discord.Color.red())
-            embed.add_field(name="Matchmaking", value="`/battle @user` - Challenge a player to a 5-round match.", inline=False)
+            embed.add_field(name="Matchmaking", value="`/battle challenge @user` - Challenge a player to a 5-round match.\n`/battle bot` - Practice against the bot (no coins or stats).\n`/battle queue [deck]` - Get matched with a player of similar deck strength.", inline=False)
             embed.add_field(name="Deck Management", value="`/build_deck [name]` - **NEW!** Visual interactive deck builder.\n`/create_deck` - Manual creation (Requires IDs).\n`/edit_deck` - Modify an existing deck.\n`/decks` - View your list of decks.\n`/view_deck` - Visualize your lineup.", inline=False)
             embed.add_field(name="Info", value="`/battle_logic` - Learn the rules of combat.", inline=False)
 
@@ -282,7 +168,7 @@ class HelpSelect(discord.ui.Select):
             embed = discord.Embed(title="🎒 Collection & Items", color=discord.Color.blue())
             embed.add_field(name="Viewing", value="`/inventory` - View your cards (Sort/Filter available).\n`/catalog` - Browse ALL cards in the game database.\n`/view [name]` - See card stats and global popularity.", inline=False)
             embed.add_field(name="Inspection", value="`/lookup [id]` - Generate a custom 'Minted' slab for a card you own.", inline=False)
-            embed.add_field(name="Packs", value="`/packs` - See your unopened card packs.\n`/open [id]` - Open a pack.\n`/weight` - Check drop chances.", inline=False)
+            embed.add_field(name="Packs", value="`/packs` - See your unopened card packs.\n`/open [id] [count]` - Open one or more packs.\n`/open_all` - Open all of your packs.\n`/weight` - Check drop chances.", inline=False)
             embed.add_field(name="Wishlist", value="`/wishlist [id]` - Add/Remove a card from your wishlist.\n`/wishlists [@user]` - View your (or a friend's) wishlist.", inline=False)
 
         elif value == "economy":
@@ -447,18 +333,16 @@ async def suggest(ctx, *, suggestion: str):
 @bot.hybrid_command(name='titles', description="View achievements")
 async def display_achievements(ctx, member: discord.Member = None):
     if member is None:
-        cursor.execute('SELECT title, description FROM achievements')
-        achievements = cursor.fetchall()
+        achievements = await fetchall('SELECT title, description FROM achievements')
         embed = discord.Embed(title="All Achievements", description="List of all possible achievements.")
         for title, description in achievements:
             embed.add_field(name=title, value=description, inline=False)
     else:
-        cursor.execute('''
+        user_achievements = await fetchall('''
         SELECT a.title, a.description FROM achievements a
         JOIN user_achievements ua ON a.achievement_id = ua.achievement_id
         WHERE ua.user_id = ?
         ''', (member.id,))
-        user_achievements = cursor.fetchall()
 
         if not user_achievements:
             embed = discord.Embed(title=f"{member.name}'s Achievements", description="This user doesn't have any achievements.")
@@ -485,19 +369,6 @@ def determine_card_rarity(overall):
 from discord.ext import commands
 from discord.ui import View
 
-def increment_cards_dropped(user_id):
-    try:
-        conn = sqlite3.connect('cards_game.db')
-        cursor = conn.cursor()
-        cursor.execute("UPDATE players SET cards_dropped = cards_dropped + 1 WHERE user_id = ?", (user_id,))
-        conn.commit()
-    except Exception as e:
-        logger.error(f"Error incrementing cards_dropped: {e}")
-    finally:
-        conn.close()
-
-
-
 #---------------------------------------------------------SECRET COMMANDS-------------------------------------------------------------------------------------
 
 def secret_command():
@@ -510,14 +381,7 @@ def secret_command():
 
 
 def get_card_by_id(card_id):
-    conn = sqlite3.connect('cards_game.db')
-    cursor = conn.cursor()
-    cursor.execute('SELECT * FROM cards WHERE card_id = ?', (card_id,))
-    row = cursor.fetchone()
-    conn.close()
-    if row:
-        return Card(*row)
-    return None
+    return card_catalog.get(card_id)
 
 
 #-----------------ENGLAND
@@ -527,63 +391,62 @@ itscominghome_card_ids = [10392, 10397, 10406, 10407, 10408, 10411, 10412, 10418
 @bot.command(name='itscominghome')
 @secret_command()
 async def itscominghome(ctx):
-    ensure_player_exists(ctx.author.id, ctx.author.name)
-    
-    conn = sqlite3.connect('cards_game.db')
-    cursor = conn.cursor()
-    cursor.execute('SELECT itscominghome FROM players WHERE user_id = ?', (ctx.author.id,))
-    used_command = cursor.fetchone()[0]
+    await ensure_player_exists(ctx.author.id, ctx.author.name)
+
+    def claim_card(cursor):
+        # Claim the command first: a second invocation finds it already set and grants nothing
+        cursor.execute('UPDATE players SET itscominghome = 1 WHERE user_id = ? AND itscominghome = 0', (ctx.author.id,))
+        if cursor.rowcount == 0:
+            raise ValueError("You have already used this command.")
+
+        card_id = None
+        attempts = 0
+        max_attempts = len(itscominghome_card_ids) * 2  # To prevent potential infinite loops
+
+        while attempts < max_attempts:
+            attempts += 1
+            card_id = random.choice(itscominghome_card_ids)
+            cursor.execute('SELECT 1 FROM inventories WHERE user_id = ? AND card_id = ?', (ctx.author.id, card_id))
+            if cursor.fetchone() is None:
+                break
+        else:
+            card_id = None
 
-    if used_command:
-        await ctx.author.send("You have already used this command.")
-        return
-    
-    card_id = None
-    attempts = 0
-    max_attempts = len(itscominghome_card_ids) * 2  # To prevent potential infinite loops
-    
-    while attempts < max_attempts:
-        attempts += 1
-        card_id = random.choice(itscominghome_card_ids)
-        cursor.execute('SELECT 1 FROM inventories WHERE user_id = ? AND card_id = ?', (ctx.author.id, card_id))
-        if cursor.fetchone() is None:
-            break
+        if card_id is None:
+            raise ValueError("No available cards to add to your inventory.")
+        card = get_card_by_id(card_id)
+        if card is None:
+            raise ValueError("An error occurred while processing your request.")
 
-    if card_id is None:
-        await ctx.author.send("No available cards to add to your inventory.")
-        conn.close()
+        # Raising above rolls the claim back; from here the claim and the card commit together
+        cursor.execute('UPDATE cards SET copies = copies + 1 WHERE card_id = ?', (card_id,))
+        cursor.execute('SELECT copies FROM cards WHERE card_id = ?', (card_id,))
+        copies = cursor.fetchone()[0]
+        cursor.execute('INSERT INTO inventories (user_id, card_id, edition) VALUES (?, ?, ?)', (ctx.author.id, card_id, copies))
+        return card, copies
+
+    try:
+        card, copies = await run_write(claim_card)
+    except ValueError as e:
+        await ctx.author.send(str(e))
         return
 
-    card = get_card_by_id(card_id)
-    if card:
-        card.copies += 1
-        add_card(card)
-        add_card_to_inventory(ctx.author.id, card.card_id)
-
-        cursor.execute('UPDATE players SET itscominghome = 1 WHERE user_id = ?', (ctx.author.id,))
-        conn.commit()
-        
-        embed = discord.Embed(title="Special Drop", description="You have received a special card drop! Shh, don't tell anyone about this command.")
-        embed.add_field(name="Name", value=card.name, inline=True)
-        embed.add_field(name="ID", value=card.card_id, inline=True)
-        embed.add_field(name="Rarity", value=card.card_rarity, inline=True)
-        embed.add_field(name="Type", value=card.card_type, inline=True)
-        embed.add_field(name="Attack", value=card.attack, inline=True)
-        embed.add_field(name="Defense", value=card.defense, inline=True)
-        embed.add_field(name="Speed", value=card.speed, inline=True)
-        embed.add_field(name="Overall", value=card.overall, inline=True)
-        embed.add_field(name="League", value=card.league, inline=True)
-        embed.add_field(name="Nation", value=card.nation, inline=True)
-        embed.add_field(name="Copies", value=card.copies, inline=True)
-        embed.set_image(url=f"attachment://{card.image_path.split('/')[-1]}")
-        embed.set_footer(text=f"Requested by {ctx.author.name}", icon_url=ctx.author.display_avatar.url)
-
-        await ctx.author.send(embed=embed, file=discord.File(card.image_path))
-        logger.info(f'{ctx.author.name} received a special card {card.name} (ID: {card.card_id}) using !itscominghome')
-    else:
-        await ctx.author.send("An error occurred while processing your request.")
-    
-    conn.close()
+    embed = discord.Embed(title="Special Drop", description="You have received a special card drop! Shh, don't tell anyone about this command.")
+    embed.add_field(name="Name", value=card.name, inline=True)
+    embed.add_field(name="ID", value=card.card_id, inline=True)
+    embed.add_field(name="Rarity", value=card.card_rarity, inline=True)
+    embed.add_field(name="Type", value=card.card_type, inline=True)
+    embed.add_field(name="Attack", value=card.attack, inline=True)
+    embed.add_field(name="Defense", value=card.defense, inline=True)
+    embed.add_field(name="Speed", value=card.speed, inline=True)
+    embed.add_field(name="Overall", value=card.overall, inline=True)
+    embed.add_field(name="League", value=card.league, inline=True)
+    embed.add_field(name="Nation", value=card.nation, inline=True)
+    embed.add_field(name="Copies", value=copies, inline=True)
+    embed.set_footer(text=f"Requested by {ctx.author.name}", icon_url=ctx.author.display_avatar.url)
+
+    await send_card_image(ctx.author.send, card.image_path, embed)
+    logger.info(f'{ctx.author.name} received a special card {card.name} (ID: {card.card_id}) using !itscominghome')
 
 
 #----------------------BRAZIL
@@ -593,63 +456,62 @@ jogabonito_card_ids = [10394, 10395, 10399, 10405, 10446, 10462, 10465, 10469]
 @bot.command(name='jogabonito')
 @secret_command()
 async def jogabonito(ctx):
-    ensure_player_exists(ctx.author.id, ctx.author.name)
-    
-    conn = sqlite3.connect('cards_game.db')
-    cursor = conn.cursor()
-    cursor.execute('SELECT jogabonito FROM players WHERE user_id = ?', (ctx.author.id,))
-    used_command = cursor.fetchone()[0]
+    await ensure_player_exists(ctx.author.id, ctx.author.name)
+
+    def claim_card(cursor):
+        # Claim the command first: a second invocation finds it already set and grants nothing
+        cursor.execute('UPDATE players SET jogabonito = 1 WHERE user_id = ? AND jogabonito = 0', (ctx.author.id,))
+        if cursor.rowcount == 0:
+            raise ValueError("You have already used this command.")
+
+        card_id = None
+        attempts = 0
+        max_attempts = len(jogabonito_card_ids) * 2  # To prevent potential infinite loops
+
+        while attempts < max_attempts:
+            attempts += 1
+            card_id = random.choice(jogabonito_card_ids)
+            cursor.execute('SELECT 1 FROM inventories WHERE user_id = ? AND card_id = ?', (ctx.author.id, card_id))
+            if cursor.fetchone() is None:
+                break
+        else:
+            card_id = None
 
-    if used_command:
-        await ctx.author.send("You have already used this command.")
-        return
-    
-    card_id = None
-    attempts = 0
-    max_attempts = len(jogabonito_card_ids) * 2  # To prevent potential infinite loops
-    
-    while attempts < max_attempts:
-        attempts += 1
-        card_id = random.choice(jogabonito_card_ids)
-        cursor.execute('SELECT 1 FROM inventories WHERE user_id = ? AND card_id = ?', (ctx.author.id, card_id))
-        if cursor.fetchone() is None:
-            break
+        if card_id is None:
+            raise ValueError("No available cards to add to your inventory.")
+        card = get_card_by_id(card_id)
+        if card is None:
+            raise ValueError("An error occurred while processing your request.")
+
+        # Raising above rolls the claim back; from here the claim and the card commit together
+        cursor.execute('UPDATE cards SET copies = copies + 1 WHERE card_id = ?', (card_id,))
+        cursor.execute('SELECT copies FROM cards WHERE card_id = ?', (card_id,))
+        copies = cursor.fetchone()[0]
+        cursor.execute('INSERT INTO inventories (user_id, card_id, edition) VALUES (?, ?, ?)', (ctx.author.id, card_id, copies))
+        return card, copies
 
-    if card_id is None:
-        await ctx.author.send("No available cards to add to your inventory.")
-        conn.close()
+    try:
+        card, copies = await run_write(claim_card)
+    except ValueError as e:
+        await ctx.author.send(str(e))
         return
 
-    card = get_card_by_id(card_id)
-    if card:
-        card.copies += 1
-        add_card(card)
-        add_card_to_inventory(ctx.author.id, card.card_id)
-
-        cursor.execute('UPDATE players SET jogabonito = 1 WHERE user_id = ?', (ctx.author.id,))
-        conn.commit()
-        
-        embed = discord.Embed(title="Special Drop", description="You have received a special card drop! Shh, don't tell anyone about this command.")
-        embed.add_field(name="Name", value=card.name, inline=True)
-        embed.add_field(name="ID", value=card.card_id, inline=True)
-        embed.add_field(name="Rarity", value=card.card_rarity, inline=True)
-        embed.add_field(name="Type", value=card.card_type, inline=True)
-        embed.add_field(name="Attack", value=card.attack, inline=True)
-        embed.add_field(name="Defense", value=card.defense, inline=True)
-        embed.add_field(name="Speed", value=card.speed, inline=True)
-        embed.add_field(name="Overall", value=card.overall, inline=True)
-        embed.add_field(name="League", value=card.league, inline=True)
-        embed.add_field(name="Nation", value=card.nation, inline=True)
-        embed.add_field(name="Copies", value=card.copies, inline=True)
-        embed.set_image(url=f"attachment://{card.image_path.split('/')[-1]}")
-        embed.set_footer(text=f"Requested by {ctx.author.name}", icon_url=ctx.author.display_avatar.url)
-
-        await ctx.author.send(embed=embed, file=discord.File(card.image_path))
-        logger.info(f'{ctx.author.name} received a special card {card.name} (ID: {card.card_id}) using !jogabonito')
-    else:
-        await ctx.author.send("An error occurred while processing your request.")
-    
-    conn.close()
+    embed = discord.Embed(title="Special Drop", description="You have received a special card drop! Shh, don't tell anyone about this command.")
+    embed.add_field(name="Name", value=card.name, inline=True)
+    embed.add_field(name="ID", value=card.card_id, inline=True)
+    embed.add_field(name="Rarity", value=card.card_rarity, inline=True)
+    embed.add_field(name="Type", value=card.card_type, inline=True)
+    embed.add_field(name="Attack", value=card.attack, inline=True)
+    embed.add_field(name="Defense", value=card.defense, inline=True)
+    embed.add_field(name="Speed", value=card.speed, inline=True)
+    embed.add_field(name="Overall", value=card.overall, inline=True)
+    embed.add_field(name="League", value=card.league, inline=True)
+    embed.add_field(name="Nation", value=card.nation, inline=True)
+    embed.add_field(name="Copies", value=copies, inline=True)
+    embed.set_footer(text=f"Requested by {ctx.author.name}", icon_url=ctx.author.display_avatar.url)
+
+    await send_card_image(ctx.author.send, card.image_path, embed)
+    logger.info(f'{ctx.author.name} received a special card {card.name} (ID: {card.card_id}) using !jogabonito')
 
 
 #--------------------ITALY
@@ -659,63 +521,62 @@ pineappleonpizza_card_ids = [10391, 10393, 10414, 10415, 10430, 10455, 10459, 10
 @bot.command(name='pineappleonpizza')
 @secret_command()
 async def pineappleonpizza(ctx):
-    ensure_player_exists(ctx.author.id, ctx.author.name)
-    
-    conn = sqlite3.connect('cards_game.db')
-    cursor = conn.cursor()
-    cursor.execute('SELECT pineappleonpizza FROM players WHERE user_id = ?', (ctx.author.id,))
-    used_command = cursor.fetchone()[0]
+    await ensure_player_exists(ctx.author.id, ctx.author.name)
+
+    def claim_card(cursor):
+        # Claim the command first: a second invocation finds it already set and grants nothing
+        cursor.execute('UPDATE players SET pineappleonpizza = 1 WHERE user_id = ? AND pineappleonpizza = 0', (ctx.author.id,))
+        if cursor.rowcount == 0:
+            raise ValueError("You have already used this command.")
+
+        card_id = None
+        attempts = 0
+        max_attempts = len(pineappleonpizza_card_ids) * 2  # To prevent potential infinite loops
+
+        while attempts < max_attempts:
+            attempts += 1
+            card_id = random.choice(pineappleonpizza_card_ids)
+            cursor.execute('SELECT 1 FROM inventories WHERE user_id = ? AND card_id = ?', (ctx.author.id, card_id))
+            if cursor.fetchone() is None:
+                break
+        else:
+            card_id = None
 
-    if used_command:
-        await ctx.author.send("You have already used this command.")
-        return
-    
-    card_id = None
-    attempts = 0
-    max_attempts = len(pineappleonpizza_card_ids) * 2  # To prevent potential infinite loops
-    
-    while attempts < max_attempts:
-        attempts += 1
-        card_id = random.choice(pineappleonpizza_card_ids)
-        cursor.execute('SELECT 1 FROM inventories WHERE user_id = ? AND card_id = ?', (ctx.author.id, card_id))
-        if cursor.fetchone() is None:
-            break
+        if card_id is None:
+            raise ValueError("No available cards to add to your inventory.")
+        card = get_card_by_id(card_id)
+        if card is None:
+            raise ValueError("An error occurred while processing your request.")
 
-    if card_id is None:
-        await ctx.author.send("No available cards to add to your inventory.")
-        conn.close()
+        # Raising above rolls the claim back; from here the claim and the card commit together
+        cursor.execute('UPDATE cards SET copies = copies + 1 WHERE card_id = ?', (card_id,))
+        cursor.execute('SELECT copies FROM cards WHERE card_id = ?', (card_id,))
+        copies = cursor.fetchone()[0]
+        cursor.execute('INSERT INTO inventories (user_id, card_id, edition) VALUES (?, ?, ?)', (ctx.author.id, card_id, copies))
+        return card, copies
+
+    try:
+        card, copies = await run_write(claim_card)
+    except ValueError as e:
+        await ctx.author.send(str(e))
         return
 
-    card = get_card_by_id(card_id)
-    if card:
-        card.copies += 1
-        add_card(card)
-        add_card_to_inventory(ctx.author.id, card.card_id)
-
-        cursor.execute('UPDATE players SET pineappleonpizza = 1 WHERE user_id = ?', (ctx.author.id,))
-        conn.commit()
-        
-        embed = discord.Embed(title="Special Drop", description="You have received a special card drop! Shh, don't tell anyone about this command.")
-        embed.add_field(name="Name", value=card.name, inline=True)
-        embed.add_field(name="ID", value=card.card_id, inline=True)
-        embed.add_field(name="Rarity", value=card.card_rarity, inline=True)
-        embed.add_field(name="Type", value=card.card_type, inline=True)
-        embed.add_field(name="Attack", value=card.attack, inline=True)
-        embed.add_field(name="Defense", value=card.defense, inline=True)
-        embed.add_field(name="Speed", value=card.speed, inline=True)
-        embed.add_field(name="Overall", value=card.overall, inline=True)
-        embed.add_field(name="League", value=card.league, inline=True)
-        embed.add_field(name="Nation", value=card.nation, inline=True)
-        embed.add_field(name="Copies", value=card.copies, inline=True)
-        embed.set_image(url=f"attachment://{card.image_path.split('/')[-1]}")
-        embed.set_footer(text=f"Requested by {ctx.author.name}", icon_url=ctx.author.display_avatar.url)
-
-        await ctx.author.send(embed=embed, file=discord.File(card.image_path))
-        logger.info(f'{ctx.author.name} received a special card {card.name} (ID: {card.card_id}) using !pineappleonpizza')
-    else:
-        await ctx.author.send("An error occurred while processing your request.")
-    
-    conn.close()
+    embed = discord.Embed(title="Special Drop", description="You have received a special card drop! Shh, don't tell anyone about this command.")
+    embed.add_field(name="Name", value=card.name, inline=True)
+    embed.add_field(name="ID", value=card.card_id, inline=True)
+    embed.add_field(name="Rarity", value=card.card_rarity, inline=True)
+    embed.add_field(name="Type", value=card.card_type, inline=True)
+    embed.add_field(name="Attack", value=card.attack, inline=True)
+    embed.add_field(name="Defense", value=card.defense, inline=True)
+    embed.add_field(name="Speed", value=card.speed, inline=True)
+    embed.add_field(name="Overall", value=card.overall, inline=True)
+    embed.add_field(name="League", value=card.league, inline=True)
+    embed.add_field(name="Nation", value=card.nation, inline=True)
+    embed.add_field(name="Copies", value=copies, inline=True)
+    embed.set_footer(text=f"Requested by {ctx.author.name}", icon_url=ctx.author.display_avatar.url)
+
+    await send_card_image(ctx.author.send, card.image_path, embed)
+    logger.info(f'{ctx.author.name} received a special card {card.name} (ID: {card.card_id}) using !pineappleonpizza')
 
 
 
@@ -726,63 +587,62 @@ mannschaft_card_ids = [10417, 10447, 10449, 10452, 10463]
 @bot.command(name='fubball')
 @secret_command()
 async def mannschaft(ctx):
-    ensure_player_exists(ctx.author.id, ctx.author.name)
-    
-    conn = sqlite3.connect('cards_game.db')
-    cursor = conn.cursor()
-    cursor.execute('SELECT mannschaft FROM players WHERE user_id = ?', (ctx.author.id,))
-    used_command = cursor.fetchone()[0]
+    await ensure_player_exists(ctx.author.id, ctx.author.name)
+
+    def claim_card(cursor):
+        # Claim the command first: a second invocation finds it already set and grants nothing
+        cursor.execute('UPDATE players SET mannschaft = 1 WHERE user_id = ? AND mannschaft = 0', (ctx.author.id,))
+        if cursor.rowcount == 0:
+            raise ValueError("You have already used this command.")
+
+        card_id = None
+        attempts = 0
+        max_attempts = len(mannschaft_card_ids) * 2  # To prevent potential infinite loops
+
+        while attempts < max_attempts:
+            attempts += 1
+            card_id = random.choice(mannschaft_card_ids)
+            cursor.execute('SELECT 1 FROM inventories WHERE user_id = ? AND card_id = ?', (ctx.author.id, card_id))
+            if cursor.fetchone() is None:
+                break
+        else:
+            card_id = None
 
-    if used_command:
-        await ctx.author.send("You have already used this command.")
-        return
-    
-    card_id = None
-    attempts = 0
-    max_attempts = len(mannschaft_card_ids) * 2  # To prevent potential infinite loops
-    
-    while attempts < max_attempts:
-        attempts += 1
-        card_id = random.choice(mannschaft_card_ids)
-        cursor.execute('SELECT 1 FROM inventories WHERE user_id = ? AND card_id = ?', (ctx.author.id, card_id))
-        if cursor.fetchone() is None:
-            break
+        if card_id is None:
+            raise ValueError("No available cards to add to your inventory.")
+        card = get_card_by_id(card_id)
+        if card is None:
+            raise ValueError("An error occurred while processing your request.")
+
+        # Raising above rolls the claim back; from here the claim and the card commit together
+        cursor.execute('UPDATE cards SET copies = copies + 1 WHERE card_id = ?', (card_id,))
+        cursor.execute('SELECT copies FROM cards WHERE card_id = ?', (card_id,))
+        copies = cursor.fetchone()[0]
+        cursor.execute('INSERT INTO inventories (user_id, card_id, edition) VALUES (?, ?, ?)', (ctx.author.id, card_id, copies))
+        return card, copies
 
-    if card_id is None:
-        await ctx.author.send("No available cards to add to your inventory.")
-        conn.close()
+    try:
+        card, copies = await run_write(claim_card)
+    except ValueError as e:
+        await ctx.author.send(str(e))
         return
 
-    card = get_card_by_id(card_id)
-    if card:
-        card.copies += 1
-        add_card(card)
-        add_card_to_inventory(ctx.author.id, card.card_id)
-
-        cursor.execute('UPDATE players SET mannschaft = 1 WHERE user_id = ?', (ctx.author.id,))
-        conn.commit()
-        
-        embed = discord.Embed(title="Special Drop", description="You have received a special card drop! Shh, don't tell anyone about this command.")
-        embed.add_field(name="Name", value=card.name, inline=True)
-        embed.add_field(name="ID", value=card.card_id, inline=True)
-        embed.add_field(name="Rarity", value=card.card_rarity, inline=True)
-        embed.add_field(name="Type", value=card.card_type, inline=True)
-        embed.add_field(name="Attack", value=card.attack, inline=True)
-        embed.add_field(name="Defense", value=card.defense, inline=True)
-        embed.add_field(name="Speed", value=card.speed, inline=True)
-        embed.add_field(name="Overall", value=card.overall, inline=True)
-        embed.add_field(name="League", value=card.league, inline=True)
-        embed.add_field(name="Nation", value=card.nation, inline=True)
-        embed.add_field(name="Copies", value=card.copies, inline=True)
-        embed.set_image(url=f"attachment://{card.image_path.split('/')[-1]}")
-        embed.set_footer(text=f"Requested by {ctx.author.name}", icon_url=ctx.author.display_avatar.url)
-
-        await ctx.author.send(embed=embed, file=discord.File(card.image_path))
-        logger.info(f'{ctx.author.name} received a special card {card.name} (ID: {card.card_id}) using !mannschaft')
-    else:
-        await ctx.author.send("An error occurred while processing your request.")
-    
-    conn.close()
+    embed = discord.Embed(title="Special Drop", description="You have received a special card drop! Shh, don't tell anyone about this command.")
+    embed.add_field(name="Name", value=card.name, inline=True)
+    embed.add_field(name="ID", value=card.card_id, inline=True)
+    embed.add_field(name="Rarity", value=card.card_rarity, inline=True)
+    embed.add_field(name="Type", value=card.card_type, inline=True)
+    embed.add_field(name="Attack", value=card.attack, inline=True)
+    embed.add_field(name="Defense", value=card.defense, inline=True)
+    embed.add_field(name="Speed", value=card.speed, inline=True)
+    embed.add_field(name="Overall", value=card.overall, inline=True)
+    embed.add_field(name="League", value=card.league, inline=True)
+    embed.add_field(name="Nation", value=card.nation, inline=True)
+    embed.add_field(name="Copies", value=copies, inline=True)
+    embed.set_footer(text=f"Requested by {ctx.author.name}", icon_url=ctx.author.display_avatar.url)
+
+    await send_card_image(ctx.author.send, card.image_path, embed)
+    logger.info(f'{ctx.author.name} received a special card {card.name} (ID: {card.card_id}) using !mannschaft')
 
 
 #--------------------NETHERLANDS
@@ -792,63 +652,62 @@ theflyingdutchmen_card_ids = [10420, 10422, 10424, 10432, 10433, 10448, 10456]
 @bot.command(name='theflyingdutchmen')
 @secret_command()
 async def theflyingdutchmen(ctx):
-    ensure_player_exists(ctx.author.id, ctx.author.name)
-    
-    conn = sqlite3.connect('cards_game.db')
-    cursor = conn.cursor()
-    cursor.execute('SELECT theflyingdutchmen FROM players WHERE user_id = ?', (ctx.author.id,))
-    used_command = cursor.fetchone()[0]
+    await ensure_player_exists(ctx.author.id, ctx.author.name)
+
+    def claim_card(cursor):
+        # Claim the command first: a second invocation finds it already set and grants nothing
+        cursor.execute('UPDATE players SET theflyingdutchmen = 1 WHERE user_id = ? AND theflyingdutchmen = 0', (ctx.author.id,))
+        if cursor.rowcount == 0:
+            raise ValueError("You have already used this command.")
+
+        card_id = None
+        attempts = 0
+        max_attempts = len(theflyingdutchmen_card_ids) * 2  # To prevent potential infinite loops
+
+        while attempts < max_attempts:
+            attempts += 1
+            card_id = random.choice(theflyingdutchmen_card_ids)
+            cursor.execute('SELECT 1 FROM inventories WHERE user_id = ? AND card_id = ?', (ctx.author.id, card_id))
+            if cursor.fetchone() is None:
+                break
+        else:
+            card_id = None
 
-    if used_command:
-        await ctx.author.send("You have already used this command.")
-        return
-    
-    card_id = None
-    attempts = 0
-    max_attempts = len(theflyingdutchmen_card_ids) * 2  # To prevent potential infinite loops
-    
-    while attempts < max_attempts:
-        attempts += 1
-        card_id = random.choice(theflyingdutchmen_card_ids)
-        cursor.execute('SELECT 1 FROM inventories WHERE user_id = ? AND card_id = ?', (ctx.author.id, card_id))
-        if cursor.fetchone() is None:
-            break
+        if card_id is None:
+            raise ValueError("No available cards to add to your inventory.")
+        card = get_card_by_id(card_id)
+        if card is None:
+            raise ValueError("An error occurred while processing your request.")
+
+        # Raising above rolls the claim back; from here the claim and the card commit together
+        cursor.execute('UPDATE cards SET copies = copies + 1 WHERE card_id = ?', (card_id,))
+        cursor.execute('SELECT copies FROM cards WHERE card_id = ?', (card_id,))
+        copies = cursor.fetchone()[0]
+        cursor.execute('INSERT INTO inventories (user_id, card_id, edition) VALUES (?, ?, ?)', (ctx.author.id, card_id, copies))
+        return card, copies
 
-    if card_id is None:
-        await ctx.author.send("No available cards to add to your inventory.")
-        conn.close()
+    try:
+        card, copies = await run_write(claim_card)
+    except ValueError as e:
+        await ctx.author.send(str(e))
         return
 
-    card = get_card_by_id(card_id)
-    if card:
-        card.copies += 1
-        add_card(card)
-        add_card_to_inventory(ctx.author.id, card.card_id)
-
-        cursor.execute('UPDATE players SET theflyingdutchmen = 1 WHERE user_id = ?', (ctx.author.id,))
-        conn.commit()
-        
-        embed = discord.Embed(title="Special Drop", description="You have received a special card drop! Shh, don't tell anyone about this command.")
-        embed.add_field(name="Name", value=card.name, inline=True)
-        embed.add_field(name="ID", value=card.card_id, inline=True)
-        embed.add_field(name="Rarity", value=card.card_rarity, inline=True)
-        embed.add_field(name="Type", value=card.card_type, inline=True)
-        embed.add_field(name="Attack", value=card.attack, inline=True)
-        embed.add_field(name="Defense", value=card.defense, inline=True)
-        embed.add_field(name="Speed", value=card.speed, inline=True)
-        embed.add_field(name="Overall", value=card.overall, inline=True)
-        embed.add_field(name="League", value=card.league, inline=True)
-        embed.add_field(name="Nation", value=card.nation, inline=True)
-        embed.add_field(name="Copies", value=card.copies, inline=True)
-        embed.set_image(url=f"attachment://{card.image_path.split('/')[-1]}")
-        embed.set_footer(text=f"Requested by {ctx.author.name}", icon_url=ctx.author.display_avatar.url)
-
-        await ctx.author.send(embed=embed, file=discord.File(card.image_path))
-        logger.info(f'{ctx.author.name} received a special card {card.name} (ID: {card.card_id}) using !theflyingdutchmen')
-    else:
-        await ctx.author.send("An error occurred while processing your request.")
-    
-    conn.close()
+    embed = discord.Embed(title="Special Drop", description="You have received a special card drop! Shh, don't tell anyone about this command.")
+    embed.add_field(name="Name", value=card.name, inline=True)
+    embed.add_field(name="ID", value=card.card_id, inline=True)
+    embed.add_field(name="Rarity", value=card.card_rarity, inline=True)
+    embed.add_field(name="Type", value=card.card_type, inline=True)
+    embed.add_field(name="Attack", value=card.attack, inline=True)
+    embed.add_field(name="Defense", value=card.defense, inline=True)
+    embed.add_field(name="Speed", value=card.speed, inline=True)
+    embed.add_field(name="Overall", value=card.overall, inline=True)
+    embed.add_field(name="League", value=card.league, inline=True)
+    embed.add_field(name="Nation", value=card.nation, inline=True)
+    embed.add_field(name="Copies", value=copies, inline=True)
+    embed.set_footer(text=f"Requested by {ctx.author.name}", icon_url=ctx.author.display_avatar.url)
+
+    await send_card_image(ctx.author.send, card.image_path, embed)
+    logger.info(f'{ctx.author.name} received a special card {card.name} (ID: {card.card_id}) using !theflyingdutchmen')
 
 #--------------------FRANCE
 
@@ -858,63 +717,62 @@ blues_card_ids = [10398, 10410, 10419, 10421, 10426, 10439, 10467]
 @bot.command(name='mayonnaise')
 @secret_command()
 async def blues(ctx):
-    ensure_player_exists(ctx.author.id, ctx.author.name)
-    
-    conn = sqlite3.connect('cards_game.db')
-    cursor = conn.cursor()
-    cursor.execute('SELECT blues FROM players WHERE user_id = ?', (ctx.author.id,))
-    used_command = cursor.fetchone()[0]
+    await ensure_player_exists(ctx.author.id, ctx.author.name)
+
+    def claim_card(cursor):
+        # Claim the command first: a second invocation finds it already set and grants nothing
+        cursor.execute('UPDATE players SET blues = 1 WHERE user_id = ? AND blues = 0', (ctx.author.id,))
+        if cursor.rowcount == 0:
+            raise ValueError("You have already used this command.")
+
+        card_id = None
+        attempts = 0
+        max_attempts = len(blues_card_ids) * 2  # To prevent potential infinite loops
+
+        while attempts < max_attempts:
+            attempts += 1
+            card_id = random.choice(blues_card_ids)
+            cursor.execute('SELECT 1 FROM inventories WHERE user_id = ? AND card_id = ?', (ctx.author.id, card_id))
+            if cursor.fetchone() is None:
+                break
+        else:
+            card_id = None
 
-    if used_command:
-        await ctx.author.send("You have already used this command.")
-        return
-    
-    card_id = None
-    attempts = 0
-    max_attempts = len(blues_card_ids) * 2  # To prevent potential infinite loops
-    
-    while attempts < max_attempts:
-        attempts += 1
-        card_id = random.choice(blues_card_ids)
-        cursor.execute('SELECT 1 FROM inventories WHERE user_id = ? AND card_id = ?', (ctx.author.id, card_id))
-        if cursor.fetchone() is None:
-            break
+        if card_id is None:
+            raise ValueError("No available cards to add to your inventory.")
+        card = get_card_by_id(card_id)
+        if card is None:
+            raise ValueError("An error occurred while processing your request.")
 
-    if card_id is None:
-        await ctx.author.send("No available cards to add to your inventory.")
-        conn.close()
+        # Raising above rolls the claim back; from here the claim and the card commit together
+        cursor.execute('UPDATE cards SET copies = copies + 1 WHERE card_id = ?', (card_id,))
+        cursor.execute('SELECT copies FROM cards WHERE card_id = ?', (card_id,))
+        copies = cursor.fetchone()[0]
+        cursor.execute('INSERT INTO inventories (user_id, card_id, edition) VALUES (?, ?, ?)', (ctx.author.id, card_id, copies))
+        return card, copies
+
+    try:
+        card, copies = await run_write(claim_card)
+    except ValueError as e:
+        await ctx.author.send(str(e))
         return
 
-    card = get_card_by_id(card_id)
-    if card:
-        card.copies += 1
-        add_card(card)
-        add_card_to_inventory(ctx.author.id, card.card_id)
-
-        cursor.execute('UPDATE players SET blues = 1 WHERE user_id = ?', (ctx.author.id,))
-        conn.commit()
-        
-        embed = discord.Embed(title="Special Drop", description="You have received a special card drop! Shh, don't tell anyone about this command.")
-        embed.add_field(name="Name", value=card.name, inline=True)
-        embed.add_field(name="ID", value=card.card_id, inline=True)
-        embed.add_field(name="Rarity", value=card.card_rarity, inline=True)
-        embed.add_field(name="Type", value=card.card_type, inline=True)
-        embed.add_field(name="Attack", value=card.attack, inline=True)
-        embed.add_field(name="Defense", value=card.defense, inline=True)
-        embed.add_field(name="Speed", value=card.speed, inline=True)
-        embed.add_field(name="Overall", value=card.overall, inline=True)
-        embed.add_field(name="League", value=card.league, inline=True)
-        embed.add_field(name="Nation", value=card.nation, inline=True)
-        embed.add_field(name="Copies", value=card.copies, inline=True)
-        embed.set_image(url=f"attachment://{card.image_path.split('/')[-1]}")
-        embed.set_footer(text=f"Requested by {ctx.author.name}", icon_url=ctx.author.display_avatar.url)
-
-        await ctx.author.send(embed=embed, file=discord.File(card.image_path))
-        logger.info(f'{ctx.author.name} received a special card {card.name} (ID: {card.card_id}) using !blues')
-    else:
-        await ctx.author.send("An error occurred while processing your request.")
-    
-    conn.close()
+    embed = discord.Embed(title="Special Drop", description="You have received a special card drop! Shh, don't tell anyone about this command.")
+    embed.add_field(name="Name", value=card.name, inline=True)
+    embed.add_field(name="ID", value=card.card_id, inline=True)
+    embed.add_field(name="Rarity", value=card.card_rarity, inline=True)
+    embed.add_field(name="Type", value=card.card_type, inline=True)
+    embed.add_field(name="Attack", value=card.attack, inline=True)
+    embed.add_field(name="Defense", value=card.defense, inline=True)
+    embed.add_field(name="Speed", value=card.speed, inline=True)
+    embed.add_field(name="Overall", value=card.overall, inline=True)
+    embed.add_field(name="League", value=card.league, inline=True)
+    embed.add_field(name="Nation", value=card.nation, inline=True)
+    embed.add_field(name="Copies", value=copies, inline=True)
+    embed.set_footer(text=f"Requested by {ctx.author.name}", icon_url=ctx.author.display_avatar.url)
+
+    await send_card_image(ctx.author.send, card.image_path, embed)
+    logger.info(f'{ctx.author.name} received a special card {card.name} (ID: {card.card_id}) using !blues')
 
 #---------------------------------------------------------FACTS-------------------------------------------------------------------------------------
 
@@ -937,7 +795,17 @@ async def facts(ctx):
 #---------------------------------------------------------CARDS AND PLAYERS CLASS-------------------------------------------------------------------------------------
 
 
+# Intern repeated category strings (club, league, nation, type) so cards share one copy
+def _intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+
 class Card:
+    __slots__ = (
+        'card_id', 'player_id', 'name', 'attack', 'defense', 'speed', 'height', 'club', 'position',
+        'overall', 'image_path', 'card_rarity', 'card_type', 'league', 'nation', 'copies', 'wishlist_count'
+    )
+
     # Added 'wishlist_count' and '*args' to the end of the argument list
     def __init__(self, card_id, player_id, name, attack, defense, speed, height, club, position, overall, image_path, card_rarity=None, card_type='standard', league=None, nation=None, copies=0, wishlist_count=0, *args):
         self.card_id = card_id
@@ -947,14 +815,14 @@ class Card:
         self.defense = defense
         self.speed = speed
         self.height = height
-        self.club = club
-        self.position = position
+        self.club = _intern(club)
+        self.position = _intern(position)
         self.overall = overall if overall is not None else 0
         self.image_path = image_path
-        self.card_rarity = card_rarity if card_rarity else determine_card_rarity(overall)
-        self.card_type = card_type
-        self.league = league
-        self.nation = nation
+        self.card_rarity = _intern(card_rarity if card_rarity else determine_card_rarity(overall))
+        self.card_type = _intern(card_type)
+        self.league = _intern(league)
+        self.nation = _intern(nation)
         self.copies = copies
         self.wishlist_count = wishlist_count
 
@@ -970,76 +838,37 @@ class Player:
         self.selected_deck = None
         self.decks = {}
 
-def ensure_player_exists(user_id, user_name):
-    cursor.execute('SELECT * FROM players WHERE user_id = ?', (user_id,))
-    if cursor.fetchone() is None:
-        cursor.execute('INSERT INTO players (user_id, name) VALUES (?, ?)', (user_id, user_name))
-        conn.commit()
-
-def add_card(card):
+async def add_card(card):
     card_rarity = determine_card_rarity(card.overall)
-    cursor.execute('''
+    await execute('''
     INSERT INTO cards (card_id, player_id, name, attack, defense, speed, height, club, position, overall, image_path, card_rarity, card_type, league, nation, copies)
     VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
     ON CONFLICT(card_id) DO UPDATE SET copies = copies + 1
     ''', (card.card_id, card.player_id, card.name, card.attack, card.defense, card.speed, card.height, card.club, card.position, card.overall, card.image_path, card_rarity, card.card_type, card.league, card.nation, card.copies))
-    conn.commit()
 
 
 def get_card_by_name(card_name):
-    cursor.execute('SELECT * FROM cards')
-    rows = cursor.fetchall()
-    cards = [Card(*row) for row in rows]
-    card_names = [card.name.lower() for card in cards]
-    best_match = process.extractOne(card_name.lower(), card_names)
-    if best_match:
-        best_match_index = card_names.index(best_match[0])
-        return cards[best_match_index]
-    return None
-
-
-def add_card_to_inventory(user_id, card_id):
-    # Check if the card is already in the user's inventory
-    cursor.execute('SELECT * FROM inventories WHERE user_id = ? AND card_id = ?', (user_id, card_id))
-    if cursor.fetchone() is not None:
-        raise ValueError("Card already in inventory")
-
-    # Get the current copies number from the cards table
-    cursor.execute('SELECT copies FROM cards WHERE card_id = ?', (card_id,))
-    current_copies = cursor.fetchone()[0]
-
-    # Set the edition to the current copies number + 1
-    edition = current_copies 
-
-    cursor.execute('''
-    INSERT INTO inventories (user_id, card_id, edition) VALUES (?, ?, ?)
-    ''', (user_id, card_id, edition))
-    conn.commit()
-
-
+    # Matcher with the processed name list prebuilt; rebuilt when the catalog changes
+    return card_name_matcher(card_catalog).best(card_name)
 
 
-def get_player_inventory(user_id):
-    cursor.execute('''
+async def get_player_inventory(user_id):
+    rows = await fetchall('''
     SELECT cards.*, inventories.edition FROM cards
     JOIN inventories ON cards.card_id = inventories.card_id
     WHERE inventories.user_id = ?
     ORDER BY cards.overall DESC
     ''', (user_id,))
-    rows = cursor.fetchall()
     return [Card(*row[:-1]) for row in rows], [row[-1] for row in rows]
 
 def fetch_all_cards():
-    cursor.execute('SELECT * FROM cards')
-    rows = cursor.fetchall()
-    return [Card(*row) for row in rows]
+    return card_catalog.all()
 
 
+# Shared in-memory card catalog; the dashboard API refreshes it when cards change
+card_catalog = load_catalog(Card)
 all_cards = fetch_all_cards()
 
-# Card types excluded from all pack drops and random card drops
-NON_DROPPABLE_TYPES = ('Unique',)
-_ndt_sql = ','.join('?' * len(NON_DROPPABLE_TYPES))  # placeholder string for SQL NOT IN
 
 # Define weights for each overall rating range
 weight_70_79 = 70
@@ -1052,26 +881,35 @@ weight_icon_90 = 1
 weight_euro_tott = 1
 weight_copa_tott = 1
 
-cards_with_weights = [(card, weight_70_79) for card in all_cards if 70 <= card.overall <= 79 and card.card_type == 'Standard'] + \
-                     [(card, weight_80_85) for card in all_cards if 80 <= card.overall <= 85 and card.card_type == 'Standard'] + \
-                     [(card, weight_86_90) for card in all_cards if 86 <= card.overall <= 90 and card.card_type == 'Standard'] + \
-                     [(card, weight_90_plus) for card in all_cards if card.overall > 90 and card.card_type == 'Standard'] + \
-                     [(card, weight_hero) for card in all_cards if card.card_type == 'Hero'] + \
-                     [(card, weight_icon_80) for card in all_cards if 80 <= card.overall <= 89 and card.card_type == 'Icon'] + \
-                     [(card, weight_icon_90) for card in all_cards if card.overall >= 90 and card.card_type == 'Icon']  + \
-                     [(card, weight_euro_tott) for card in all_cards if card.card_type == 'Euro TOTT']  + \
-                     [(card, weight_euro_tott) for card in all_cards if card.card_type == 'Copa America TOTT']
-
-def get_card_weight_by_name(card_name):
+def build_cards_with_weights(all_cards):
+    return [(card, weight_70_79) for card in all_cards if 70 <= card.overall <= 79 and card.card_type == 'Standard'] + \
+           [(card, weight_80_85) for card in all_cards if 80 <= card.overall <= 85 and card.card_type == 'Standard'] + \
+           [(card, weight_86_90) for card in all_cards if 86 <= card.overall <= 90 and card.card_type == 'Standard'] + \
+           [(card, weight_90_plus) for card in all_cards if card.overall > 90 and card.card_type == 'Standard'] + \
+           [(card, weight_hero) for card in all_cards if card.card_type == 'Hero'] + \
+           [(card, weight_icon_80) for card in all_cards if 80 <= card.overall <= 89 and card.card_type == 'Icon'] + \
+           [(card, weight_icon_90) for card in all_cards if card.overall >= 90 and card.card_type == 'Icon']  + \
+           [(card, weight_euro_tott) for card in all_cards if card.card_type == 'Euro TOTT']  + \
+           [(card, weight_euro_tott) for card in all_cards if card.card_type == 'Copa America TOTT']
+
+
+def _on_catalog_change(catalog):
+    global all_cards, cards_with_weights, drop_sampler
+    all_cards = catalog.all()
+    cards_with_weights = build_cards_with_weights(all_cards)
+    drop_sampler = WeightedSampler(cards_with_weights)
+
+cards_with_weights = build_cards_with_weights(all_cards)
+drop_sampler = WeightedSampler(cards_with_weights)
+card_catalog.subscribe(_on_catalog_change)
+
+async def get_card_weight_by_name(card_name):
     card = get_card_by_name(card_name)
     if not card:
         return None, None
 
-    cursor = conn.cursor()
-
     if card.card_type == 'Standard':
-        cursor.execute('SELECT COUNT(*) FROM cards WHERE card_type = "Standard"')
-        total_standard_cards = cursor.fetchone()[0]
+        total_standard_cards = (await fetchone('SELECT COUNT(*) FROM cards WHERE card_type = "Standard"'))[0]
 
         if 70 <= card.overall <= 79:
             return weight_70_79 / total_standard_cards, card.name
@@ -1083,15 +921,14 @@ def get_card_weight_by_name(card_name):
             return weight_90_plus / total_standard_cards, card.name
         
     else:
-        cursor.execute('SELECT COUNT(*) FROM cards WHERE card_type != "Standard"')
-        total_non_standard_cards = cursor.fetchone()[0]
+        total_non_standard_cards = (await fetchone('SELECT COUNT(*) FROM cards WHERE card_type != "Standard"'))[0]
         return 3 / total_non_standard_cards, card.name
 
 
 
 @bot.hybrid_command(name='weight', description="Check the pack weight of a card")
 async def weight(ctx, *, card_name: str):
-    weight, actual_card_name = get_card_weight_by_name(card_name)
+    weight, actual_card_name = await get_card_weight_by_name(card_name)
     if weight:
         embed = discord.Embed(title=f"Card Weight: {actual_card_name}", color=0x00ff00)
         embed.add_field(name="Pack Weight", value=f"{weight:.6f}", inline=False)
@@ -1109,9 +946,9 @@ class CollectButton(discord.ui.Button):
 
     async def callback(self, interaction: discord.Interaction):
         # 1. Add to database
-        ensure_player_exists(interaction.user.id, interaction.user.name)
+        await ensure_player_exists(interaction.user.id, interaction.user.name)
         try:
-            add_card_to_inventory(interaction.user.id, self.card.card_id)
+            await add_card_to_inventory(interaction.user.id, self.card.card_id)
         except ValueError:
             return await interaction.response.send_message("You already have this card!", ephemeral=True)
 
@@ -1121,7 +958,7 @@ class CollectButton(discord.ui.Button):
             description=f"**{self.card.name}** has been collected by {interaction.user.mention}!",
             color=discord.Color.gold()
         )
-        embed.set_image(url=f"attachment://{self.card.image_path.split('/')[-1]}")
+        embed.set_image(url=edit_image_url(interaction.message, self.card.image_path))
         
         # ROW 1: Stats (Overall added to start, Speed icon changed to Lightning)
         embed.add_field(
@@ -1150,16 +987,17 @@ class CollectButton(discord.ui.Button):
 async def on_ready():
     logger.info(f'Logged in as {bot.user}')
     card_drop.start()
+    # Pick up card edits the dashboard writes straight to the database
+    card_catalog.start()
     bot.loop.create_task(_start_dashboard_api())
-
-def weighted_choice(cards_with_weights):
-    total = sum(weight for card, weight in cards_with_weights)
-    r = random.uniform(0, total)
-    upto = 0
-    for card, weight in cards_with_weights:
-        if upto + weight >= r:
-            return card
-        upto += weight
+    # Start the render workers (they preload the pitch background) before the first lineup render
+    bot.loop.create_task(render_pool.warm())
+    # Finish crediting battles left in the old battle_journal, then
+    # re-attach battles that were in progress before the restart (both run once per process)
+    await recover_interrupted_battles()
+    await restore_battles(bot, lambda player1, player2: Battle(None, player1, player2), get_card_by_id)
+    # Pair queued players in the background
+    matchmaking.start(start_matched_battle, matchmaking_timed_out, lambda a, b: match_channel(bot, a, b) is not None)
 
 
 #---------------------------------------------------------AUTO DROP-------------------------------------------------------------------------------------
@@ -1171,14 +1009,13 @@ async def handle_single_drop(channel, card):
             description="Be the first to click **Collect** to claim this card!",
             color=discord.Color.blue()
         )
-        embed.set_image(url=f"attachment://{card.image_path.split('/')[-1]}")
         embed.set_footer(text="Hurry! This drop expires in 2 minutes.")
 
         # Use our custom view that tracks the collected state
         view = DropView(timeout=120)
         view.add_item(TimedCollectButton(card, None)) # Passing None as owner_id since auto-drops have no owner priority
 
-        msg = await channel.send(embed=embed, view=view, file=discord.File(card.image_path))
+        msg = await send_card_image(channel.send, card.image_path, embed, view=view)
         
         # Wait until button clicked OR timeout
         await view.wait()
@@ -1191,7 +1028,7 @@ async def handle_single_drop(channel, card):
                 description=f"No one collected **{card.name}** in time.", 
                 color=discord.Color.red()
             )
-            expired_embed.set_image(url=f"attachment://{card.image_path.split('/')[-1]}")
+            expired_embed.set_image(url=edit_image_url(msg, card.image_path))
             
             # Remove the button by setting view=None
             await msg.edit(embed=expired_embed, view=None)
@@ -1204,8 +1041,8 @@ async def card_drop():
     await bot.wait_until_ready()
     
     # 1. Choose ONE card for this cycle
-    card = weighted_choice(cards_with_weights)
-    add_card(card)
+    card = drop_sampler.choice()
+    await add_card(card)
 
     # 2. Drop it in EVERY configured channel
     for channel_id in DROP_CHANNEL_IDS:
@@ -1222,12 +1059,7 @@ async def card_drop():
 
 @bot.hybrid_command(name='get_starter_pack', description="Claim your free starter cards")
 async def get_starter_pack(ctx):
-    ensure_player_exists(ctx.author.id, ctx.author.name)
-    cursor.execute('SELECT has_claimed_starter_pack FROM players WHERE user_id = ?', (ctx.author.id,))
-    has_claimed_starter_pack = cursor.fetchone()[0]
-    if has_claimed_starter_pack:
-        await ctx.send("You have already claimed your starter pack!")
-        return
+    await ensure_player_exists(ctx.author.id, ctx.author.name)
 
     common_pack = random.sample([card for card in all_cards if 70 <= card.overall <= 79 and card.card_type not in NON_DROPPABLE_TYPES], 6)
     uncommon_pack = random.sample([card for card in all_cards if 80 <= card.overall <= 85 and card.card_type not in NON_DROPPABLE_TYPES], 3)
@@ -1235,45 +1067,66 @@ async def get_starter_pack(ctx):
 
     all_cards_received = common_pack + uncommon_pack + rare_pack
 
-    for card in all_cards_received:
-        increment_card_copies(card.card_id)
-        add_card_to_inventory(ctx.author.id, card.card_id)
-        
+    def claim_starter_pack(cursor):
+        # Check and claim in one transaction so double invocations can't both get a pack
+        cursor.execute('SELECT has_claimed_starter_pack FROM players WHERE user_id = ?', (ctx.author.id,))
+        if cursor.fetchone()[0]:
+            return False
+
+        for card in all_cards_received:
+            cursor.execute('UPDATE cards SET copies = copies + 1 WHERE card_id = ?', (card.card_id,))
+            cursor.execute('SELECT 1 FROM inventories WHERE user_id = ? AND card_id = ?', (ctx.author.id, card.card_id))
+            if cursor.fetchone() is None:
+                cursor.execute('SELECT copies FROM cards WHERE card_id = ?', (card.card_id,))
+                edition = cursor.fetchone()[0]
+                cursor.execute('INSERT INTO inventories (user_id, card_id, edition) VALUES (?, ?, ?)', (ctx.author.id, card.card_id, edition))
 
-    cursor.execute('UPDATE players SET has_claimed_starter_pack = 1 WHERE user_id = ?', (ctx.author.id,))
-    conn.commit()
+        cursor.execute('UPDATE players SET has_claimed_starter_pack = 1 WHERE user_id = ?', (ctx.author.id,))
+        return True
+
+    if not await run_write(claim_starter_pack):
+        await ctx.send("You have already claimed your starter pack!")
+        return
 
     card_names = "\n".join([f"{card.name} (ID: {card.card_id})" for card in all_cards_received])
     await ctx.send(f"**{ctx.author.name} has claimed their starter pack!**\nYou received:\n{card_names}")
     logger.info(f'{ctx.author.name} claimed a starter pack')
 
-def increment_card_copies(card_id):
-    cursor.execute('UPDATE cards SET copies = copies + 1 WHERE card_id = ?', (card_id,))
-    conn.commit()
-
 #---------------------------------------------------------VIEW-------------------------------------------------------------------------------------
 
-def get_card_by_name_or_id(identifier):
-    conn = sqlite3.connect('cards_game.db')
-    cursor = conn.cursor()
-    
-    if identifier.isdigit():
-        cursor.execute('SELECT * FROM cards WHERE card_id = ?', (int(identifier),))
-        rows = cursor.fetchall()
-    else:
+async def get_card_by_name_or_id(identifier):
+    def find_rows(cursor):
+        if identifier.isdigit():
+            cursor.execute('SELECT * FROM cards WHERE card_id = ?', (int(identifier),))
+            return cursor.fetchall()
+
         cursor.execute('SELECT DISTINCT player_id FROM cards WHERE LOWER(name) LIKE ?', ('%' + identifier.lower() + '%',))
-        player_ids = cursor.fetchall()
-        
-        if player_ids:
-            player_ids = [pid[0] for pid in player_ids]
-            query = 'SELECT * FROM cards WHERE player_id IN ({})'.format(','.join('?' for _ in player_ids))
-            cursor.execute(query, player_ids)
-            rows = cursor.fetchall()
-        else:
-            rows = []
+        player_ids = [pid[0] for pid in cursor.fetchall()]
+        if not player_ids:
+            return []
+        query = 'SELECT * FROM cards WHERE player_id IN ({})'.format(','.join('?' for _ in player_ids))
+        cursor.execute(query, player_ids)
+        return cursor.fetchall()
+
+    return [Card(*row) for row in await run_db(find_rows)]
+
 
-    conn.close()
-    return [Card(*row) for row in rows]
+def get_card_details(cursor, user_id, card_id):
+    # (inventory entry, global stats row, is wishlisted) for a card as seen by a user
+    cursor.execute('SELECT trade_count FROM inventories WHERE user_id = ? AND card_id = ?', (user_id, card_id))
+    inventory_entry = cursor.fetchone()
+
+    cursor.execute('''
+        SELECT wishlist_count, 
+               total_battles_played, total_battles_won, 
+               total_rounds_played, total_rounds_won 
+        FROM cards WHERE card_id = ?
+    ''', (card_id,))
+    row = cursor.fetchone()
+
+    cursor.execute('SELECT 1 FROM wishlists WHERE user_id = ? AND card_id = ?', (user_id, card_id))
+    is_wishlisted = cursor.fetchone() is not None
+    return inventory_entry, row, is_wishlisted
 
 
 
@@ -1295,22 +1148,8 @@ class ViewCardSelect(discord.ui.Select):
         selected_card_id = int(selected_card_id)
         card = next(c for c in self.cards if c.card_id == selected_card_id)
 
-        # 2. Fetch Advanced Stats from DB
-        conn = sqlite3.connect('cards_game.db')
-        cursor = conn.cursor()
-        
-        # Ownership
-        cursor.execute('SELECT trade_count FROM inventories WHERE user_id = ? AND card_id = ?', (self.user.id, card.card_id))
-        inventory_entry = cursor.fetchone()
-        
-        # Global Stats
-        cursor.execute('''
-            SELECT wishlist_count, 
-                   total_battles_played, total_battles_won, 
-                   total_rounds_played, total_rounds_won 
-            FROM cards WHERE card_id = ?
-        ''', (card.card_id,))
-        row = cursor.fetchone()
+        # 2. Fetch Advanced Stats from DB (ownership, global stats, wishlist state for the button)
+        inventory_entry, row, is_wishlisted = await run_db(get_card_details, self.user.id, card.card_id)
         
         wl_count = row[0] if row else 0
         g_b_played = row[1] if row else 0
@@ -1318,12 +1157,6 @@ class ViewCardSelect(discord.ui.Select):
         g_r_played = row[3] if row else 0
         g_r_won = row[4] if row else 0
 
-        # Wishlist State (for button)
-        cursor.execute('SELECT 1 FROM wishlists WHERE user_id = ? AND card_id = ?', (self.user.id, card.card_id))
-        is_wishlisted = cursor.fetchone() is not None
-        
-        conn.close()
-
         owned_by_user = "Yes" if inventory_entry else "No"
         win_rate = f"{(g_b_won / g_b_played * 100):.1f}%" if g_b_played > 0 else "0%"
 
@@ -1354,7 +1187,7 @@ class ViewCardSelect(discord.ui.Select):
         # 5. Send/Edit Message
         # Since we are replying to the dropdown interaction, we use response.send_message
         # We attach the file and the view.
-        await interaction.response.send_message(embed=embed, file=discord.File(card.image_path), view=view)
+        await send_card_image(interaction.response.send_message, card.image_path, embed, view=view)
         logger.info(f'{self.user.name} viewed card {card.name} (ID: {card.card_id}) via selection')
 
 class ViewCardSelectView(discord.ui.View):
@@ -1375,18 +1208,31 @@ class ToggleWishlistButton(discord.ui.Button):
         self.is_wishlisted = is_wishlisted
 
     async def callback(self, interaction: discord.Interaction):
-        conn = sqlite3.connect('cards_game.db')
-        cursor = conn.cursor()
-
-        try:
-            # 1. Toggle Wishlist Logic
+        def toggle_wishlist(cursor):
             cursor.execute('SELECT 1 FROM wishlists WHERE user_id = ? AND card_id = ?', (interaction.user.id, self.card_id))
             exists = cursor.fetchone()
 
             if exists:
                 cursor.execute('DELETE FROM wishlists WHERE user_id = ? AND card_id = ?', (interaction.user.id, self.card_id))
                 cursor.execute('UPDATE cards SET wishlist_count = MAX(0, wishlist_count - 1) WHERE card_id = ?', (self.card_id,))
-                
+            else:
+                cursor.execute('INSERT INTO wishlists (user_id, card_id) VALUES (?, ?)', (interaction.user.id, self.card_id))
+                cursor.execute('UPDATE cards SET wishlist_count = wishlist_count + 1 WHERE card_id = ?', (self.card_id,))
+
+            # Fresh stats to rebuild the embed
+            cursor.execute('''
+                SELECT wishlist_count, 
+                       total_battles_played, total_battles_won, 
+                       total_rounds_played, total_rounds_won 
+                FROM cards WHERE card_id = ?
+            ''', (self.card_id,))
+            return exists is None, cursor.fetchone()
+
+        try:
+            # 1. Toggle Wishlist Logic
+            added, row = await run_write(toggle_wishlist)
+
+            if not added:
                 # Update Button Visuals
                 self.style = discord.ButtonStyle.secondary
                 self.label = "Add to Wishlist"
@@ -1394,9 +1240,6 @@ class ToggleWishlistButton(discord.ui.Button):
                 self.is_wishlisted = False
                 action_msg = "Removed from your wishlist."
             else:
-                cursor.execute('INSERT INTO wishlists (user_id, card_id) VALUES (?, ?)', (interaction.user.id, self.card_id))
-                cursor.execute('UPDATE cards SET wishlist_count = wishlist_count + 1 WHERE card_id = ?', (self.card_id,))
-                
                 # Update Button Visuals
                 self.style = discord.ButtonStyle.red
                 self.label = "Remove from Wishlist"
@@ -1404,25 +1247,12 @@ class ToggleWishlistButton(discord.ui.Button):
                 self.is_wishlisted = True
                 action_msg = "Added to your wishlist."
 
-            conn.commit()
-
-            # 2. Fetch Fresh Stats to Rebuild Embed
-            cursor.execute('''
-                SELECT wishlist_count, 
-                       total_battles_played, total_battles_won, 
-                       total_rounds_played, total_rounds_won 
-                FROM cards WHERE card_id = ?
-            ''', (self.card_id,))
-            
-            row = cursor.fetchone()
-            # Safety defaults
+            # 2. Rebuild the Embed from the fresh stats (safety defaults)
             wl_count = row[0] if row else 0
             g_b_played = row[1] if row else 0
             g_b_won = row[2] if row else 0
             g_r_played = row[3] if row else 0
             g_r_won = row[4] if row else 0
-            
-            conn.close()
 
             # 3. Reconstruct the Field Text
             win_rate = f"{(g_b_won / g_b_played * 100):.1f}%" if g_b_played > 0 else "0%"
@@ -1449,7 +1279,6 @@ class ToggleWishlistButton(discord.ui.Button):
             await interaction.followup.send(f"✅ {action_msg}", ephemeral=True)
 
         except Exception as e:
-            if conn: conn.close()
             print(f"Wishlist Button Error: {e}")
             await interaction.response.send_message("Error updating wishlist.", ephemeral=True)
 
@@ -1475,16 +1304,8 @@ async def card_search_autocomplete(interaction: discord.Interaction, current: st
     if not current:
         return []
 
-    matches = []
-    count = 0
-    
-    for card in all_cards:
-        # Check if search term is in name (case insensitive)
-        if current.lower() in card.name.lower():
-            matches.append(card)
-            count += 1
-            if count == 25: # Discord limit
-                break
+    # Accent-folded trigram index over the catalog, best cards first (top 25 is Discord's limit)
+    matches = card_search_index(card_catalog).search(current)
 
     return [
         discord.app_commands.Choice(
@@ -1500,7 +1321,7 @@ async def card_search_autocomplete(interaction: discord.Interaction, current: st
 @app_commands.describe(player_name="Search for a player...")
 @app_commands.autocomplete(player_name=card_search_autocomplete)
 async def view(ctx, *, player_name: str):
-    ensure_player_exists(ctx.author.id, ctx.author.name)
+    await ensure_player_exists(ctx.author.id, ctx.author.name)
     
     # 1. Check if input is a Card ID (from Autocomplete or manual ID)
     if player_name.isdigit():
@@ -1508,37 +1329,19 @@ async def view(ctx, *, player_name: str):
         cards = [card] if card else []
     else:
         # 2. Fallback: Search by name text
-        cards = get_card_by_name_or_id(player_name)
+        cards = await get_card_by_name_or_id(player_name)
     
     if cards:
         if len(cards) == 1:
             card = cards[0]
             
-            conn = sqlite3.connect('cards_game.db')
-            cursor = conn.cursor()
-            
-            cursor.execute('SELECT trade_count FROM inventories WHERE user_id = ? AND card_id = ?', (ctx.author.id, card.card_id))
-            inventory_entry = cursor.fetchone()
-            
-            cursor.execute('''
-                SELECT wishlist_count, 
-                       total_battles_played, total_battles_won, 
-                       total_rounds_played, total_rounds_won 
-                FROM cards WHERE card_id = ?
-            ''', (card.card_id,))
-            
-            row = cursor.fetchone()
+            inventory_entry, row, is_wishlisted = await run_db(get_card_details, ctx.author.id, card.card_id)
             wl_count = row[0] if row else 0
             g_b_played = row[1] if row else 0
             g_b_won = row[2] if row else 0
             g_r_played = row[3] if row else 0
             g_r_won = row[4] if row else 0
             
-            cursor.execute('SELECT 1 FROM wishlists WHERE user_id = ? AND card_id = ?', (ctx.author.id, card.card_id))
-            is_wishlisted = cursor.fetchone() is not None
-            
-            conn.close()
-            
             owned_by_user = "Yes" if inventory_entry else "No"
             win_rate = f"{(g_b_won / g_b_played * 100):.1f}%" if g_b_played > 0 else "0%"
 
@@ -1561,7 +1364,7 @@ async def view(ctx, *, player_name: str):
             embed.set_footer(text=f"Requested by {ctx.author.name}", icon_url=ctx.author.display_avatar.url)
 
             view = CardDetailsView(ctx, card.card_id, is_wishlisted)
-            await ctx.send(embed=embed, file=discord.File(card.image_path), view=view)
+            await send_card_image(ctx.send, card.image_path, embed, view=view)
             
             logger.info(f'{ctx.author.name} viewed card {card.name}')
 
@@ -1575,135 +1378,6 @@ async def view(ctx, *, player_name: str):
 
 #---------------------------------------------------------LOOKUP-------------------------------------------------------------------------------------
 
-def generate_minted_card(card_path, avatar_bytes, owner_name, edition_text):
-    try:
-        # 1. Load Base Card
-        card_img = Image.open(card_path).convert("RGBA")
-        card_w, card_h = card_img.size
-        draw = ImageDraw.Draw(card_img)
-
-        # --- DYNAMIC SCALING MATH ---
-        # We base everything on the card's width to ensure readability
-        # Example: On a 1000px card, font will be 45px. On a 2000px card, it becomes 90px.
-        scale_factor = card_w / 1000 
-        
-        font_size_main = int(45 * scale_factor) # Base size 45
-        pfp_size = int(90 * scale_factor)       # Base size 90
-        padding = int(20 * scale_factor)        # Padding 20
-        edge_margin = int(30 * scale_factor)    # Margin from edge 30
-        border_width = int(3 * scale_factor)    # Border thickness
-        corner_radius = int(25 * scale_factor)  # Pill roundness
-
-        # Ensure minimum visible sizes for very small cards
-        font_size_main = max(20, font_size_main)
-        pfp_size = max(40, pfp_size)
-
-        # --- Setup Fonts ---
-        try:
-            font_owner = ImageFont.truetype("arialbd.ttf", font_size_main)
-            font_edition = ImageFont.truetype("arialbd.ttf", font_size_main)
-        except:
-            font_owner = ImageFont.load_default()
-            font_edition = ImageFont.load_default()
-
-        # ==============================================================================
-        # LEFT BOTTOM: OWNER TAG (PFP + Name)
-        # ==============================================================================
-        
-        # Calculate text dimensions
-        owner_bbox = draw.textbbox((0, 0), owner_name, font=font_owner)
-        owner_text_w = owner_bbox[2] - owner_bbox[0]
-        owner_text_h = owner_bbox[3] - owner_bbox[1]
-        
-        # Pill Dimensions
-        owner_pill_w = pfp_size + owner_text_w + (padding * 3)
-        owner_pill_h = pfp_size + padding
-
-        # Create Pill
-        owner_pill = Image.new("RGBA", (owner_pill_w, owner_pill_h), (0, 0, 0, 0))
-        pill_draw = ImageDraw.Draw(owner_pill)
-
-        # Draw Background
-        pill_draw.rounded_rectangle(
-            [(0, 0), (owner_pill_w, owner_pill_h)],
-            radius=corner_radius,
-            fill=(20, 20, 20, 245), # Very dark background for contrast
-            outline=(255, 255, 255, 150), 
-            width=max(1, int(border_width/2))
-        )
-
-        # Paste Avatar
-        if avatar_bytes:
-            avatar_img = Image.open(io.BytesIO(avatar_bytes)).convert("RGBA")
-            avatar_img = avatar_img.resize((pfp_size, pfp_size), Image.Resampling.LANCZOS)
-            
-            mask = Image.new("L", (pfp_size, pfp_size), 0)
-            ImageDraw.Draw(mask).ellipse((0, 0, pfp_size, pfp_size), fill=255)
-            circular_avatar = ImageOps.fit(avatar_img, mask.size, centering=(0.5, 0.5))
-            circular_avatar.putalpha(mask)
-            
-            # Vertically center PFP in pill
-            pfp_y = (owner_pill_h - pfp_size) // 2
-            owner_pill.paste(circular_avatar, (padding, pfp_y), circular_avatar)
-
-        # Draw Name
-        text_x = padding * 2 + pfp_size
-        # Vertically center text
-        text_y = (owner_pill_h - owner_text_h) // 2 - int(5 * scale_factor)
-        pill_draw.text((text_x, text_y), owner_name, font=font_owner, fill="white")
-
-        # Paste onto Card (Bottom Left)
-        card_img.paste(owner_pill, (edge_margin, card_h - owner_pill_h - edge_margin), owner_pill)
-
-
-        # ==============================================================================
-        # RIGHT BOTTOM: EDITION PLATE
-        # ==============================================================================
-        ed_bbox = draw.textbbox((0, 0), edition_text, font=font_edition)
-        ed_w = ed_bbox[2] - ed_bbox[0]
-        ed_h = ed_bbox[3] - ed_bbox[1]
-
-        plate_w = ed_w + (padding * 4)
-        plate_h = owner_pill_h # Match height of owner pill for symmetry
-
-        # Create Plate
-        plate_img = Image.new("RGBA", (plate_w, plate_h), (0, 0, 0, 0))
-        plate_draw = ImageDraw.Draw(plate_img)
-
-        gold_border = (218, 165, 32, 255)
-        gold_text = (255, 223, 0, 255)
-        dark_fill = (30, 30, 30, 245)
-
-        # Draw Background
-        plate_draw.rounded_rectangle(
-            [(0, 0), (plate_w, plate_h)],
-            radius=corner_radius,
-            fill=dark_fill,
-            outline=gold_border,
-            width=border_width
-        )
-
-        # Draw Text
-        text_pos_x = (plate_w - ed_w) // 2
-        text_pos_y = (plate_h - ed_h) // 2 - int(5 * scale_factor)
-        plate_draw.text((text_pos_x, text_pos_y), edition_text, font=font_edition, fill=gold_text)
-
-        # Paste onto Card (Bottom Right)
-        card_img.paste(plate_img, (card_w - plate_w - edge_margin, card_h - plate_h - edge_margin), plate_img)
-
-        # --- Finalize ---
-        buffer = io.BytesIO()
-        card_img.save(buffer, format="PNG")
-        buffer.seek(0)
-        return buffer
-
-    except Exception as e:
-        print(f"Error generating minted card: {e}")
-        import traceback
-        traceback.print_exc()
-        return None
-
-
 @bot.hybrid_command(name='lookup', aliases=['lu'], description="Inspect a specific card owned by a user (Visual Slab)")
 @app_commands.describe(card="Search for the card to inspect...")
 @app_commands.autocomplete(card=card_search_autocomplete)
@@ -1712,7 +1386,7 @@ async def lookup(ctx, card: str, user: discord.User = None):
     await ctx.defer()
 
     target_user = user or ctx.author
-    ensure_player_exists(target_user.id, target_user.name)
+    await ensure_player_exists(target_user.id, target_user.name)
 
     # 1. Resolve Card ID
     if card.isdigit():
@@ -1725,10 +1399,7 @@ async def lookup(ctx, card: str, user: discord.User = None):
         card_id_int = found_card.card_id
 
     # 2. Database Check
-    conn = sqlite3.connect('cards_game.db')
-    cursor = conn.cursor()
-    
-    cursor.execute('''
+    result = await fetchone('''
         SELECT c.name, c.overall, c.attack, c.defense, c.speed, 
                c.card_rarity, c.card_type, c.image_path, c.copies, i.edition,
                i.battles_played, i.battles_won, i.rounds_played, i.rounds_won
@@ -1736,9 +1407,6 @@ async def lookup(ctx, card: str, user: discord.User = None):
         JOIN cards c ON i.card_id = c.card_id
         WHERE i.user_id = ? AND i.card_id = ?
     ''', (target_user.id, card_id_int))
-    
-    result = cursor.fetchone()
-    conn.close()
 
     # 3. Handle "User doesn't own it"
     if not result:
@@ -1750,24 +1418,19 @@ async def lookup(ctx, card: str, user: discord.User = None):
     edition_str = f"#{edition}/{total_copies}"
     win_rate = f"{(b_won / b_played * 100):.1f}%" if b_played > 0 else "0%"
 
+    # Small avatar variant, fetched once per avatar hash
+    avatar_bytes = await fetch_avatar(target_user)
+
+    # Rendered in the render worker pool; repeat lookups of the same copy/owner/avatar come from the render cache
     try:
-        avatar_bytes = await target_user.display_avatar.read()
-    except:
-        avatar_bytes = None
-
-    image_buffer = await bot.loop.run_in_executor(
-        None, 
-        generate_minted_card, 
-        image_path, 
-        avatar_bytes, 
-        target_user.name, 
-        edition_str
-    )
+        image_buffer = await render_minted_card(image_path, avatar_bytes, target_user.name, edition_str)
+    except RenderBusy as e:
+        return await ctx.send(f"⏳ {e}")
 
     if not image_buffer:
         return await ctx.send("❌ Error generating card image.")
 
-    file = discord.File(fp=image_buffer, filename=f"minted_{card_id_int}.png")
+    file = discord.File(fp=image_buffer, filename=render_filename(f"minted_{card_id_int}"))
     
     embed = discord.Embed(title=f"🔍 Card Inspection: {name}", color=discord.Color.gold())
     embed.set_author(name=f"Property of {target_user.name}", icon_url=target_user.display_avatar.url)
@@ -1787,6 +1450,17 @@ async def lookup(ctx, card: str, user: discord.User = None):
 #---------------------------------------------------------DROPS-------------------------------------------------------------------------------------
 
 
+def daily_bonus(streak):
+    # (coins, tier name) daily reward for a streak length
+    if streak >= 14:
+        return 300, "🔥 Legendary"
+    elif streak >= 7:
+        return 200, "💎 Diamond"
+    elif streak >= 4:
+        return 150, "🥈 Silver"
+    return 100, "🥉 Bronze"
+
+
 class DailyView(discord.ui.View):
     def __init__(self, timeout=120):
         super().__init__(timeout=timeout)
@@ -1797,115 +1471,99 @@ class DailyView(discord.ui.View):
 @bot.hybrid_command(name='daily', description="Claim your daily reward card")
 async def daily(ctx):
     logger.info(f"User {ctx.author.name} (ID: {ctx.author.id}) invoked the daily command.")
-    ensure_player_exists(ctx.author.id, ctx.author.name)
+    await ensure_player_exists(ctx.author.id, ctx.author.name)
     
     # --- CALENDAR DAY STREAK SYSTEM ---
-    conn = sqlite3.connect('cards_game.db')
-    cursor = conn.cursor()
-    
-    # Get current streak info
-    cursor.execute('SELECT daily_streak, last_daily_claim FROM players WHERE user_id = ?', (ctx.author.id,))
-    result = cursor.fetchone()
-    current_streak = result[0] if result[0] else 0
-    last_claim = result[1]
-    
-    today = datetime.now().date()
-    
-    # Check if already claimed today
-    if last_claim:
-        last_claim_date = datetime.fromisoformat(last_claim).date()
-        
-        if last_claim_date == today:
-            # Already claimed today - show cooldown message
-            tomorrow = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
-            time_until = tomorrow - datetime.now()
-            hours = int(time_until.total_seconds() // 3600)
-            minutes = int((time_until.total_seconds() % 3600) // 60)
+    def claim_daily(cursor):
+        # Read and update the streak in one transaction so double invocations can't both claim
+        cursor.execute('SELECT daily_streak, last_daily_claim FROM players WHERE user_id = ?', (ctx.author.id,))
+        result = cursor.fetchone()
+        current_streak = result[0] if result[0] else 0
+        last_claim = result[1]
+        
+        today = datetime.now().date()
+        
+        if last_claim:
+            last_claim_date = datetime.fromisoformat(last_claim).date()
             
-            embed = discord.Embed(
-                title="⏳ Daily Cooldown",
-                description=f"You've already claimed today!\n\n**Come back in:** {hours}h {minutes}m",
-                color=discord.Color.orange()
-            )
-            embed.add_field(name="🔥 Current Streak", value=f"**{current_streak}** days", inline=True)
+            if last_claim_date == today:
+                return False, current_streak
             
-            if current_streak < 7:
-                embed.add_field(name="📍 Next Milestone", value=f"{7 - current_streak} days → Free Pack!", inline=True)
-            elif current_streak < 14:
-                embed.add_field(name="📍 Next Milestone", value=f"{14 - current_streak} days → Rare Pack!", inline=True)
-            else:
-                embed.add_field(name="🏆 Status", value="Max tier reached!", inline=True)
+            # Calculate days since last claim
+            days_since_claim = (today - last_claim_date).days
             
-            await ctx.send(embed=embed)
-            conn.close()
-            return
-        
-        # Calculate days since last claim
-        days_since_claim = (today - last_claim_date).days
-        
-        if days_since_claim == 1:
-            # Claimed yesterday - streak continues!
-            current_streak += 1
-        elif days_since_claim > 1:
-            # Missed a day - streak resets
+            if days_since_claim == 1:
+                # Claimed yesterday - streak continues!
+                current_streak += 1
+            elif days_since_claim > 1:
+                # Missed a day - streak resets
+                current_streak = 1
+        else:
+            # First ever claim
             current_streak = 1
-    else:
-        # First ever claim
-        current_streak = 1
+        
+        # Update streak in database
+        cursor.execute('''
+            UPDATE players 
+            SET daily_streak = ?, last_daily_claim = ? 
+            WHERE user_id = ?
+        ''', (current_streak, datetime.now().isoformat(), ctx.author.id))
+        
+        # Add coins to player
+        cursor.execute('UPDATE players SET coins = coins + ? WHERE user_id = ?', (daily_bonus(current_streak)[0], ctx.author.id))
+        
+        # Free Rare Player Pack at the 7 and 14 day milestones
+        if current_streak in (7, 14):
+            cursor.execute('SELECT * FROM packs WHERE user_id = ?', (ctx.author.id,))
+            if cursor.fetchone():
+                cursor.execute('UPDATE packs SET rare_player_pack = rare_player_pack + 1 WHERE user_id = ?', (ctx.author.id,))
+            else:
+                cursor.execute('INSERT INTO packs (user_id, rare_player_pack, icon_pack, hero_pack, tester_pack) VALUES (?, 1, 0, 0, 0)', (ctx.author.id,))
+        return True, current_streak
+
+    claimed, current_streak = await run_write(claim_daily)
     
-    # Update streak in database
-    cursor.execute('''
-        UPDATE players 
-        SET daily_streak = ?, last_daily_claim = ? 
-        WHERE user_id = ?
-    ''', (current_streak, datetime.now().isoformat(), ctx.author.id))
+    # Check if already claimed today
+    if not claimed:
+        # Already claimed today - show cooldown message
+        tomorrow = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
+        time_until = tomorrow - datetime.now()
+        hours = int(time_until.total_seconds() // 3600)
+        minutes = int((time_until.total_seconds() % 3600) // 60)
+        
+        embed = discord.Embed(
+            title="⏳ Daily Cooldown",
+            description=f"You've already claimed today!\n\n**Come back in:** {hours}h {minutes}m",
+            color=discord.Color.orange()
+        )
+        embed.add_field(name="🔥 Current Streak", value=f"**{current_streak}** days", inline=True)
+        
+        if current_streak < 7:
+            embed.add_field(name="📍 Next Milestone", value=f"{7 - current_streak} days → Free Pack!", inline=True)
+        elif current_streak < 14:
+            embed.add_field(name="📍 Next Milestone", value=f"{14 - current_streak} days → Rare Pack!", inline=True)
+        else:
+            embed.add_field(name="🏆 Status", value="Max tier reached!", inline=True)
+        
+        await ctx.send(embed=embed)
+        return
     
     # --- CALCULATE REWARDS ---
-    # Base coins based on streak tier
-    if current_streak >= 14:
-        bonus_coins = 300
-        tier_name = "🔥 Legendary"
-    elif current_streak >= 7:
-        bonus_coins = 200
-        tier_name = "💎 Diamond"
-    elif current_streak >= 4:
-        bonus_coins = 150
-        tier_name = "🥈 Silver"
-    else:
-        bonus_coins = 100
-        tier_name = "🥉 Bronze"
-    
-    # Add coins to player
-    cursor.execute('UPDATE players SET coins = coins + ? WHERE user_id = ?', (bonus_coins, ctx.author.id))
+    bonus_coins, tier_name = daily_bonus(current_streak)
     
     # Check for milestone bonuses
     milestone_text = ""
     if current_streak == 7:
-        # Award a free Rare Player Pack at 7-day milestone
-        cursor.execute('SELECT * FROM packs WHERE user_id = ?', (ctx.author.id,))
-        if cursor.fetchone():
-            cursor.execute('UPDATE packs SET rare_player_pack = rare_player_pack + 1 WHERE user_id = ?', (ctx.author.id,))
-        else:
-            cursor.execute('INSERT INTO packs (user_id, rare_player_pack, icon_pack, hero_pack, tester_pack) VALUES (?, 1, 0, 0, 0)', (ctx.author.id,))
         milestone_text = "\n\n🎁 **MILESTONE BONUS!** You got a FREE **Rare Player Pack**!"
     elif current_streak == 14:
-        # Award a Rare Player Pack at 14-day milestone (every 7 days = rare pack)
-        cursor.execute('SELECT * FROM packs WHERE user_id = ?', (ctx.author.id,))
-        if cursor.fetchone():
-            cursor.execute('UPDATE packs SET rare_player_pack = rare_player_pack + 1 WHERE user_id = ?', (ctx.author.id,))
-        else:
-            cursor.execute('INSERT INTO packs (user_id, rare_player_pack, icon_pack, hero_pack, tester_pack) VALUES (?, 1, 0, 0, 0)', (ctx.author.id,))
         milestone_text = "\n\n🎁 **2-WEEK MILESTONE!** You got a FREE **Rare Player Pack**!"
     
-    conn.commit()
-    conn.close()
-    
     # --- GENERATE CARDS ---
-    cards = [weighted_choice(cards_with_weights) for _ in range(2)]
+    cards = drop_sampler.sample(2)
     for card in cards:
         card.copies += 1
 
-    if increment_cards_dropped(ctx.author.id):
+    if await increment_cards_dropped(ctx.author.id):
         logger.info(f"User {ctx.author.name}'s cards_dropped incremented successfully.")
     else:
         logger.error(f"Failed to increment cards_dropped for user {ctx.author.name}.")
@@ -1945,10 +1603,11 @@ async def daily(ctx):
     else:
         embed.set_footer(text=f"🏆 You've reached max streak tier! Keep it going!")
     
-    files = [discord.File(card.image_path) for card in cards]
+    files = [asset_file(card.image_path) for card in cards]
     
     try:
         msg = await ctx.send(content=content, embed=embed, view=view, files=files)
+        remember_upload(msg, *(card.image_path for card in cards))
         
         await view.wait()
         
@@ -1980,13 +1639,13 @@ async def daily(ctx):
 @commands.cooldown(1, 1800, commands.BucketType.user)
 async def drop_card(ctx):
     logger.info(f"User {ctx.author.name} (ID: {ctx.author.id}) invoked the drop command.")
-    ensure_player_exists(ctx.author.id, ctx.author.name)
+    await ensure_player_exists(ctx.author.id, ctx.author.name)
     
     # 1. Logic
-    card = weighted_choice(cards_with_weights)
+    card = drop_sampler.choice()
     card.copies += 1
-    add_card(card)
-    increment_cards_dropped(ctx.author.id)
+    await add_card(card)
+    await increment_cards_dropped(ctx.author.id)
 
     # 2. Calculate Timestamps
     current_time = int(time.time())
@@ -2007,14 +1666,13 @@ async def drop_card(ctx):
     embed.add_field(name="ID", value=card.card_id, inline=True)
     embed.add_field(name="Total Copies", value=card.copies, inline=True)
 
-    embed.set_image(url=f"attachment://{card.image_path.split('/')[-1]}")
 
     # Use DropView (which has the .collected flag we added earlier)
     view = DropView(timeout=120)
     view.add_item(TimedCollectButton(card, ctx.author.id))
 
     try:
-        msg = await ctx.send(content=content, embed=embed, view=view, file=discord.File(card.image_path))
+        msg = await send_card_image(ctx.send, card.image_path, embed, content=content, view=view)
         
         # --- PHASE 1: Priority Timer (10 Seconds) ---
         await asyncio.sleep(10)
@@ -2077,9 +1735,9 @@ class TimedCollectButton(discord.ui.Button):
             return
 
         # 2. Add to Inventory
-        ensure_player_exists(interaction.user.id, interaction.user.name)
+        await ensure_player_exists(interaction.user.id, interaction.user.name)
         try:
-            add_card_to_inventory(interaction.user.id, self.card.card_id)
+            await add_card_to_inventory(interaction.user.id, self.card.card_id)
         except ValueError:
             return await interaction.response.send_message("You already have this card!", ephemeral=True)
 
@@ -2089,7 +1747,7 @@ class TimedCollectButton(discord.ui.Button):
             description=f"**{self.card.name}** has been collected by {interaction.user.mention}!",
             color=discord.Color.gold()
         )
-        embed.set_image(url=f"attachment://{self.card.image_path.split('/')[-1]}")
+        embed.set_image(url=edit_image_url(interaction.message, self.card.image_path))
         
         embed.add_field(name="Stats", value=f"⭐ {self.card.overall} | ⚔️ {self.card.attack} | 🛡️ {self.card.defense} | ⚡ {self.card.speed}", inline=False)
         embed.add_field(name="Card Details", value=f"ID: {self.card.card_id} | Rarity: {self.card.card_rarity} | Total Copies: {self.card.copies + 1}", inline=False)
@@ -2104,19 +1762,6 @@ class TimedCollectButton(discord.ui.Button):
         self.view.stop()
 
 
-def increment_cards_dropped(user_id):
-    try:
-        connection = sqlite3.connect('cards_game.db')
-        cursor = connection.cursor()
-        cursor.execute('UPDATE players SET cards_dropped = cards_dropped + 1 WHERE user_id = ?', (user_id,))
-        connection.commit()
-        cursor.close()
-        connection.close()
-        return True
-    except sqlite3.Error as e:
-        logger.error(f'SQLite error: {e}')
-        return False
-
 #---------------------------------------------------------STATS-------------------------------------------------------------------------------------
 
 @bot.hybrid_command(name='stats', description="View player stats")
@@ -2124,9 +1769,8 @@ async def stats(ctx, member: discord.Member = None):
     if member is None:
         member = ctx.author
 
-    ensure_player_exists(member.id, member.name)
-    cursor.execute('SELECT * FROM players WHERE user_id = ?', (member.id,))
-    player = cursor.fetchone()
+    await ensure_player_exists(member.id, member.name)
+    player = await fetchone('SELECT * FROM players WHERE user_id = ?', (member.id,))
     if player:
         embed = discord.Embed(title=f"**{player[1]}'s Stats**")
 
@@ -2141,7 +1785,7 @@ async def stats(ctx, member: discord.Member = None):
         embed.add_field(name="**Rounds Won**", value=player[7])
         embed.add_field(name="**Rounds Lost**", value=player[8])
 
-        cards, editions = get_player_inventory(player[0])
+        cards, editions = await get_player_inventory(player[0])
         total_cards = len(cards)
         common_cards = sum(1 for card in cards if card.card_rarity == 'Common')
         uncommon_cards = sum(1 for card in cards if card.card_rarity == 'Uncommon')
@@ -2167,11 +1811,14 @@ class TitleDropdown(discord.ui.Select):
 
     async def callback(self, interaction: discord.Interaction):
         achievement_id = int(self.values[0])
-        cursor.execute('SELECT title FROM achievements WHERE achievement_id = ?', (achievement_id,))
-        title = cursor.fetchone()[0]
-        
-        cursor.execute('UPDATE players SET display_title = ? WHERE user_id = ?', (title, self.user_id))
-        conn.commit()
+
+        def equip_title(cursor):
+            cursor.execute('SELECT title FROM achievements WHERE achievement_id = ?', (achievement_id,))
+            title = cursor.fetchone()[0]
+            cursor.execute('UPDATE players SET display_title = ? WHERE user_id = ?', (title, self.user_id))
+            return title
+
+        title = await run_write(equip_title)
 
         await interaction.response.send_message(f"Your title has been set to: {title}", ephemeral=True)
         logger.info(f'{interaction.user.name} set their title to {title}')
@@ -2184,15 +1831,14 @@ class TitleDropdownView(discord.ui.View):
 
 @bot.hybrid_command(name='set_title', description="Equip a title you have unlocked")
 async def set_title(ctx):
-    ensure_player_exists(ctx.author.id, ctx.author.name)
+    await ensure_player_exists(ctx.author.id, ctx.author.name)
     
-    cursor.execute('''
+    titles = await fetchall('''
     SELECT achievements.title, achievements.achievement_id
     FROM achievements
     JOIN user_achievements ON achievements.achievement_id = user_achievements.achievement_id
     WHERE user_achievements.user_id = ?
     ''', (ctx.author.id,))
-    titles = cursor.fetchall()
 
     if titles:
         view = TitleDropdownView(titles, ctx.author.id)
@@ -2219,7 +1865,7 @@ class CollectCardButton(discord.ui.Button):
             return
 
         try:
-            add_card_to_inventory(self.user_id, self.card.card_id)
+            await add_card_to_inventory(self.user_id, self.card.card_id)
             await interaction.response.send_message(f'{interaction.user.name} collected {self.card.name}!', ephemeral=True)
 
             # Update embed to success state
@@ -2227,7 +1873,7 @@ class CollectCardButton(discord.ui.Button):
             embed.title = "✅ Daily Reward Collected!"
             embed.description = f"{interaction.user.mention} has collected **{self.card.name}**!"
             embed.color = discord.Color.green()
-            embed.set_image(url=f"attachment://{self.card.image_path.split('/')[-1]}")
+            embed.set_image(url=edit_image_url(interaction.message, self.card.image_path))
             
             embed.clear_fields()
             # Added "Total Copies" here as well
@@ -2248,13 +1894,13 @@ class CollectCardButton(discord.ui.Button):
             await interaction.response.send_message(str(e), ephemeral=True)
 
 
-def get_user_rank_and_details(user_id, criteria):
-    cursor.execute(f'SELECT user_id, name, {criteria}, ROW_NUMBER() OVER (ORDER BY {criteria} DESC) as rank FROM players')
-    rows = cursor.fetchall()
-    for row in rows:
-        if row[0] == user_id:
-            return row
-    return None
+async def get_user_rank_and_details(user_id, criteria):
+    leaderboard = await get_leaderboard()
+    ranked = leaderboard.rank(criteria, user_id)
+    if ranked is None:
+        return None
+    rank, name, value = ranked
+    return (user_id, name, value, rank)
 
 
 #---------------------------------------------------------LEADERBOARDS-------------------------------------------------------------------------------------
@@ -2262,58 +1908,17 @@ def get_user_rank_and_details(user_id, criteria):
 async def build_leaderboard_embed(guild, author_id, stat_column, stat_name, scope):
     """Helper to generate the leaderboard Embed."""
     scope = scope.title() # "Server" or "Global"
-    
-    conn = sqlite3.connect('cards_game.db')
-    cursor = conn.cursor()
-
-    # 1. Fetch ALL players sorted by the stat
-    cursor.execute(f'SELECT user_id, name, {stat_column} FROM players ORDER BY {stat_column} DESC')
-    all_rows = cursor.fetchall()
-    conn.close()
-
-    leaderboard_data = []
-    user_rank_info = None
-    rank_counter = 1
 
-    # 2. Filter Logic
-    if scope == 'Server':
-        if not guild:
-            return discord.Embed(title="Error", description="Server leaderboard cannot be used in DMs.", color=discord.Color.red())
+    if scope == 'Server' and not guild:
+        return discord.Embed(title="Error", description="Server leaderboard cannot be used in DMs.", color=discord.Color.red())
 
-        # Optimization: Get set of member IDs for O(1) lookup
-        guild_member_ids = {member.id for member in guild.members}
-        
-        for row in all_rows:
-            u_id, u_name, u_stat = row
-            
-            if u_id in guild_member_ids:
-                if len(leaderboard_data) < 10:
-                    leaderboard_data.append((rank_counter, u_name, u_stat))
-                
-                if u_id == author_id:
-                    user_rank_info = (rank_counter, u_name, u_stat)
-                
-                rank_counter += 1
-                
-            if len(leaderboard_data) == 10 and user_rank_info:
-                break
-                
-    else: # Global
-        for row in all_rows:
-            u_id, u_name, u_stat = row
-            
-            if len(leaderboard_data) < 10:
-                leaderboard_data.append((rank_counter, u_name, u_stat))
-            
-            if u_id == author_id:
-                user_rank_info = (rank_counter, u_name, u_stat)
-            
-            rank_counter += 1
-            
-            if len(leaderboard_data) == 10 and user_rank_info:
-                break
+    # Top 10 and the author's rank come straight from the in-memory leaderboards (O(log n), no players scan)
+    leaderboard = await get_leaderboard()
+    leaderboard_data, user_rank_info = leaderboard.standings(
+        stat_column, author_id, guild if scope == 'Server' else None
+    )
 
-    # 3. Build Embed
+    # Build Embed
     icon = "🌍" if scope == "Global" else "🏰"
     embed = discord.Embed(title=f"{icon} {scope} Leaderboard - {stat_name}", color=discord.Color.gold())
     
@@ -2422,6 +2027,20 @@ class LeaderboardView(discord.ui.View):
         self.add_item(ScopeButton(scope))
 
 
+# Keep the per-guild leaderboards in step with membership
+@bot.listen()
+async def on_member_join(member):
+    (await get_leaderboard()).add_member(member.guild.id, member.id)
+
+@bot.listen()
+async def on_member_remove(member):
+    (await get_leaderboard()).remove_member(member.guild.id, member.id)
+
+@bot.listen()
+async def on_guild_remove(guild):
+    (await get_leaderboard()).forget_guild(guild.id)
+
+
 # --- COMMANDS ---
 
 @bot.hybrid_command(name='leaderboard', aliases=['lb'], description="View game rankings")
@@ -2452,9 +2071,9 @@ logger = logging.getLogger(__name__)
 @bot.hybrid_command(name='inventory', description="View your card collection")
 async def view_inventory(ctx, user: discord.User = None, search: str = None):
     target_user = user or ctx.author
-    ensure_player_exists(target_user.id, target_user.name)
+    await ensure_player_exists(target_user.id, target_user.name)
     
-    inventory, editions = get_player_inventory(target_user.id)
+    inventory, editions = await get_player_inventory(target_user.id)
     
     if not inventory:
         return await ctx.send(f"{target_user.name} has no cards in their inventory.")
@@ -2738,26 +2357,16 @@ class TradeView(discord.ui.View):
         if interaction.user.id != self.other_user.id:
             return await interaction.response.send_message("This trade offer is not for you!", ephemeral=True)
 
-        conn = sqlite3.connect('cards_game.db')
-        cursor = conn.cursor()
-        
-        # Verify ownership one last time
-        cursor.execute('SELECT 1 FROM inventories WHERE user_id = ? AND card_id = ?', (self.ctx.author.id, self.your_card.card_id))
-        sender_has = cursor.fetchone()
-        cursor.execute('SELECT 1 FROM inventories WHERE user_id = ? AND card_id = ?', (self.other_user.id, self.their_card.card_id))
-        receiver_has = cursor.fetchone()
+        def swap_cards(cursor):
+            # Verify ownership one last time, in the same transaction as the swap
+            cursor.execute('SELECT 1 FROM inventories WHERE user_id = ? AND card_id = ?', (self.ctx.author.id, self.your_card.card_id))
+            sender_has = cursor.fetchone()
+            cursor.execute('SELECT 1 FROM inventories WHERE user_id = ? AND card_id = ?', (self.other_user.id, self.their_card.card_id))
+            receiver_has = cursor.fetchone()
 
-        if not sender_has or not receiver_has:
-            conn.close()
-            embed = interaction.message.embeds[0]
-            embed.color = discord.Color.red()
-            embed.title = "❌ Trade Failed"
-            embed.description = "One of the players no longer owns the required card."
-            return await interaction.response.edit_message(embed=embed, view=None)
+            if not sender_has or not receiver_has:
+                return False
 
-        try:
-            # --- FIX: Update user_id AND increment trade_count ---
-            
             # 1. Move Author's card to Other User (Increment trade_count)
             cursor.execute('''
                 UPDATE inventories 
@@ -2771,14 +2380,20 @@ class TradeView(discord.ui.View):
                 SET user_id = ?, trade_count = trade_count + 1 
                 WHERE user_id = ? AND card_id = ?
             ''', (self.ctx.author.id, self.other_user.id, self.their_card.card_id))
-            
-            conn.commit()
+            return True
+
+        try:
+            swapped = await run_write(swap_cards)
         except Exception as e:
-            conn.close()
             logger.error(f"Trade Error: {e}")
             return await interaction.response.send_message("Database error occurred.", ephemeral=True)
-        
-        conn.close()
+
+        if not swapped:
+            embed = interaction.message.embeds[0]
+            embed.color = discord.Color.red()
+            embed.title = "❌ Trade Failed"
+            embed.description = "One of the players no longer owns the required card."
+            return await interaction.response.edit_message(embed=embed, view=None)
 
         embed = interaction.message.embeds[0]
         embed.title = "✅ Trade Successful"
@@ -2825,8 +2440,8 @@ async def trade(ctx, your_card_id: int, other_user: discord.User, their_card_id:
     if ctx.author.id == other_user.id:
         return await ctx.send("You cannot trade with yourself.")
 
-    ensure_player_exists(ctx.author.id, ctx.author.name)
-    ensure_player_exists(other_user.id, other_user.name)
+    await ensure_player_exists(ctx.author.id, ctx.author.name)
+    await ensure_player_exists(other_user.id, other_user.name)
 
     # 2. Fetch Card Objects
     your_card = get_card_by_id(your_card_id)
@@ -2838,17 +2453,17 @@ async def trade(ctx, your_card_id: int, other_user: discord.User, their_card_id:
         return await ctx.send(f"Card ID **{their_card_id}** not found.")
 
     # 3. Ownership Checks
-    if not check_card_ownership(ctx.author.id, your_card_id):
+    if not await check_card_ownership(ctx.author.id, your_card_id):
         return await ctx.send(f"You do not own the card **{your_card.name}** (ID: {your_card_id}).")
     
-    if not check_card_ownership(other_user.id, their_card_id):
+    if not await check_card_ownership(other_user.id, their_card_id):
         return await ctx.send(f"{other_user.name} does not own the card **{their_card.name}** (ID: {their_card_id}).")
 
     # 4. Duplicate Checks
-    if check_card_ownership(ctx.author.id, their_card_id):
+    if await check_card_ownership(ctx.author.id, their_card_id):
         return await ctx.send(f"You already own **{their_card.name}**. Cannot trade for duplicates.")
     
-    if check_card_ownership(other_user.id, your_card_id):
+    if await check_card_ownership(other_user.id, your_card_id):
         return await ctx.send(f"{other_user.name} already owns **{your_card.name}**. Cannot trade duplicates.")
 
     # 5. Build UI
@@ -2868,40 +2483,34 @@ async def trade(ctx, your_card_id: int, other_user: discord.User, their_card_id:
         content=f"Hey {other_user.mention}, you have a trade offer!", 
         embed=embed, 
         view=view, 
-        files=[discord.File(your_card.image_path), discord.File(their_card.image_path)]
+        files=[asset_file(your_card.image_path), asset_file(their_card.image_path)]
     )
     view.message = msg
 
 
-def add_deck(user_id, deck_name, card_ids):
-    # Check if deck already exists
-    cursor.execute('SELECT * FROM decks WHERE user_id = ? AND deck_name = ?', (user_id, deck_name))
-    if cursor.fetchone() is not None:
-        raise ValueError("Deck with this name already exists")
-
-    # Check for duplicate player IDs in the deck
-    player_ids = set()
-    for card_id in card_ids:
-        cursor.execute('SELECT player_id FROM cards WHERE card_id = ?', (card_id,))
-        player_id = cursor.fetchone()[0]
-        if player_id in player_ids:
-            raise ValueError("Deck cannot contain more than one card with the same player ID")
-        player_ids.add(player_id)
+async def add_deck(user_id, deck_name, card_ids):
+    def insert_deck(cursor):
+        # Check if deck already exists
+        cursor.execute('SELECT * FROM decks WHERE user_id = ? AND deck_name = ?', (user_id, deck_name))
+        if cursor.fetchone() is not None:
+            raise ValueError("Deck with this name already exists")
 
-    # Convert card IDs to comma-separated string
-    cards_str = ','.join(map(str, card_ids))
+        # Check for duplicate player IDs in the deck
+        player_ids = set()
+        for card_id in card_ids:
+            cursor.execute('SELECT player_id FROM cards WHERE card_id = ?', (card_id,))
+            player_id = cursor.fetchone()[0]
+            if player_id in player_ids:
+                raise ValueError("Deck cannot contain more than one card with the same player ID")
+            player_ids.add(player_id)
 
-    # Insert the deck into the database
-    cursor.execute('INSERT INTO decks (user_id, deck_name, cards) VALUES (?, ?, ?)', (user_id, deck_name, cards_str))
-    conn.commit()
+        # Convert card IDs to comma-separated string
+        cards_str = ','.join(map(str, card_ids))
 
+        # Insert the deck into the database
+        cursor.execute('INSERT INTO decks (user_id, deck_name, cards) VALUES (?, ?, ?)', (user_id, deck_name, cards_str))
 
-def get_deck(user_id, deck_name):
-    cursor.execute('SELECT cards FROM decks WHERE user_id = ? AND deck_name = ?', (user_id, deck_name))
-    result = cursor.fetchone()
-    if result is None:
-        return None
-    return list(map(int, result[0].split(',')))
+    await run_write(insert_deck)
 
 
 
@@ -2946,11 +2555,7 @@ class ExchangeAddCoinsModal(discord.ui.Modal, title="Add Coins to Exchange"):
         user_id = interaction.user.id
         
         # Verify Balance
-        conn = sqlite3.connect('cards_game.db')
-        cursor = conn.cursor()
-        cursor.execute('SELECT coins FROM players WHERE user_id = ?', (user_id,))
-        balance = cursor.fetchone()[0]
-        conn.close()
+        balance = (await fetchone('SELECT coins FROM players WHERE user_id = ?', (user_id,)))[0]
 
         if balance < amount:
             return await interaction.response.send_message(f"You only have {balance} coins.", ephemeral=True)
@@ -2985,7 +2590,7 @@ class ExchangeAddCardModal(discord.ui.Modal, title="Add Card to Exchange"):
         card_id = int(identifier)
         
         # 1. Check if YOU own it
-        if not check_card_ownership(interaction.user.id, card_id):
+        if not await check_card_ownership(interaction.user.id, card_id):
             return await interaction.response.send_message("You do not own this card.", ephemeral=True)
 
         # 2. Check if OPPONENT owns it (The Fix)
@@ -2995,7 +2600,7 @@ class ExchangeAddCardModal(discord.ui.Modal, title="Add Card to Exchange"):
         else:
             receiver = self.exchange_view.session.p1
             
-        if check_card_ownership(receiver.id, card_id):
+        if await check_card_ownership(receiver.id, card_id):
             return await interaction.response.send_message(f"⛔ **{receiver.name}** already owns this card! No duplicates allowed.", ephemeral=True)
 
         card = get_card_by_id(card_id)
@@ -3040,12 +2645,12 @@ class ExchangeCardSearchSelect(discord.ui.Select):
         
         # ... (Keep your ownership/duplicate checks here) ...
         # 1. Ownership Check
-        if not check_card_ownership(user.id, card_id):
+        if not await check_card_ownership(user.id, card_id):
             return await interaction.response.send_message("❌ You no longer own this card.", ephemeral=True)
 
         # 2. Duplicate Check
         opponent = self.exchange_view.session.p2 if self.side == 'p1' else self.exchange_view.session.p1
-        if check_card_ownership(opponent.id, card_id):
+        if await check_card_ownership(opponent.id, card_id):
              return await interaction.response.send_message(f"⛔ **{opponent.name}** already owns this card!", ephemeral=True)
 
         # 3. Add to Offer
@@ -3086,7 +2691,7 @@ class ExchangeSearchModal(discord.ui.Modal, title="Search your Inventory"):
         user_id = interaction.user.id
         
         # Fetch user inventory
-        inventory, _ = get_player_inventory(user_id)
+        inventory, _ = await get_player_inventory(user_id)
         
         # Filter matches
         matches = [c for c in inventory if search_term in c.name.lower()]
@@ -3163,10 +2768,7 @@ class ExchangeView(discord.ui.View):
             await interaction.response.edit_message(embed=embed, view=self)
 
     async def execute_exchange(self, interaction):
-        conn = sqlite3.connect('cards_game.db')
-        cursor = conn.cursor()
-        
-        try:
+        def exchange(cursor):
             # 1. FINAL ASSET VERIFICATION
             cursor.execute('SELECT coins FROM players WHERE user_id = ?', (self.session.p1.id,))
             if cursor.fetchone()[0] < self.session.p1_offer['coins']: raise ValueError(f"{self.session.p1.name} missing coins.")
@@ -3200,44 +2802,41 @@ class ExchangeView(discord.ui.View):
                 cursor.execute('UPDATE players SET coins = coins + ? WHERE user_id = ?', (self.session.p2_offer['coins'], self.session.p1.id))
 
             # 3. EXECUTE SWAPS (Cards)
-            for card in self.session.p1_offer['cards']:
-                cursor.execute('UPDATE inventories SET user_id = ?, trade_count = trade_count + 1 WHERE card_id = ?', (self.session.p2.id, card.card_id))
-            
-            for card in self.session.p2_offer['cards']:
-                cursor.execute('UPDATE inventories SET user_id = ?, trade_count = trade_count + 1 WHERE card_id = ?', (self.session.p1.id, card.card_id))
-
-            conn.commit()
-            
-            # --- NEW SUMMARY EMBED ---
-            embed = discord.Embed(title="✅ Exchange Complete!", color=discord.Color.green())
-            
-            # Format P1 Summary
-            p1_items = []
-            if self.session.p1_offer['coins'] > 0:
-                p1_items.append(f"💰 {self.session.p1_offer['coins']:,} Coins")
-            for c in self.session.p1_offer['cards']:
-                p1_items.append(f"🃏 {c.name}")
-            p1_val = "\n".join(p1_items) if p1_items else "*Nothing*"
-
-            # Format P2 Summary
-            p2_items = []
-            if self.session.p2_offer['coins'] > 0:
-                p2_items.append(f"💰 {self.session.p2_offer['coins']:,} Coins")
-            for c in self.session.p2_offer['cards']:
-                p2_items.append(f"🃏 {c.name}")
-            p2_val = "\n".join(p2_items) if p2_items else "*Nothing*"
-
-            embed.add_field(name=f"{self.session.p1.name} sent:", value=p1_val, inline=True)
-            embed.add_field(name=f"{self.session.p2.name} sent:", value=p2_val, inline=True)
+            for card in self.session.p1_offer['cards']:
+                cursor.execute('UPDATE inventories SET user_id = ?, trade_count = trade_count + 1 WHERE card_id = ?', (self.session.p2.id, card.card_id))
             
-            await interaction.response.edit_message(embed=embed, view=None)
-            self.stop()
+            for card in self.session.p2_offer['cards']:
+                cursor.execute('UPDATE inventories SET user_id = ?, trade_count = trade_count + 1 WHERE card_id = ?', (self.session.p1.id, card.card_id))
 
+        try:
+            await run_write(exchange)
         except Exception as e:
-            conn.rollback()
-            await interaction.response.send_message(f"❌ Failed: {str(e)}", ephemeral=True)
-        finally:
-            conn.close()
+            return await interaction.response.send_message(f"❌ Failed: {str(e)}", ephemeral=True)
+
+        # --- NEW SUMMARY EMBED ---
+        embed = discord.Embed(title="✅ Exchange Complete!", color=discord.Color.green())
+        
+        # Format P1 Summary
+        p1_items = []
+        if self.session.p1_offer['coins'] > 0:
+            p1_items.append(f"💰 {self.session.p1_offer['coins']:,} Coins")
+        for c in self.session.p1_offer['cards']:
+            p1_items.append(f"🃏 {c.name}")
+        p1_val = "\n".join(p1_items) if p1_items else "*Nothing*"
+
+        # Format P2 Summary
+        p2_items = []
+        if self.session.p2_offer['coins'] > 0:
+            p2_items.append(f"💰 {self.session.p2_offer['coins']:,} Coins")
+        for c in self.session.p2_offer['cards']:
+            p2_items.append(f"🃏 {c.name}")
+        p2_val = "\n".join(p2_items) if p2_items else "*Nothing*"
+
+        embed.add_field(name=f"{self.session.p1.name} sent:", value=p1_val, inline=True)
+        embed.add_field(name=f"{self.session.p2.name} sent:", value=p2_val, inline=True)
+        
+        await interaction.response.edit_message(embed=embed, view=None)
+        self.stop()
 
 # --- EXCHANGE BUTTONS ---
 
@@ -3309,8 +2908,8 @@ async def exchange(ctx, user: discord.User):
     if user.id == ctx.author.id: return await ctx.send("You cannot exchange with yourself.")
     if user.bot: return await ctx.send("Bots cannot trade.")
 
-    ensure_player_exists(ctx.author.id, ctx.author.name)
-    ensure_player_exists(user.id, user.name)
+    await ensure_player_exists(ctx.author.id, ctx.author.name)
+    await ensure_player_exists(user.id, user.name)
 
     view = ExchangeView(ctx, ctx.author, user)
     embed = discord.Embed(title="⚖️ Exchange Request", description=f"{ctx.author.mention} wants to negotiate an exchange with {user.mention}!", color=discord.Color.blue())
@@ -3326,7 +2925,7 @@ async def exchange(ctx, user: discord.User):
 # ---------------------------------------------------------BATTLES REFACTORED-------------------------------------------------------------------------------------
 
 class Battle:
-    def __init__(self, ctx, player1, player2):
+    def __init__(self, ctx, player1, player2, practice=False):
         self.ctx = ctx
         self.message = None 
         self.player1 = player1
@@ -3355,15 +2954,60 @@ class Battle:
         self.p2_card = None
         
         self.draw_offers = set()
+        self.ready_players = set()
         self.phase = "SETUP"
+        # Deck names offered in the setup menus (player1, player2)
+        self.deck_choices = [[], []]
+
+        # Stat changes are buffered here (and saved with each phase), then written once at the end
+        self.ledger = BattleLedger()
+        # View of the current phase; the session is saved (utils.battle_store) each time it changes
+        self.view = None
+
+        # Practice: the bot plays player2 and nothing is written to the DB
+        self.practice = practice
+        self.ai = None
 
     async def start(self):
+        # Decks picked beforehand (matchmaking): straight to round 1
+        if self.player1_deck and self.player2_deck:
+            self.message = await self.ctx.send(f"⚔️ {self.player1.mention} vs {self.player2.mention}")
+            self.phase = "ACTION"
+            await self.update_game_state()
+            return
+
         embed = discord.Embed(title="⚔️ Battle Arena ⚔️", description="Both players must select their decks to begin.")
         embed.add_field(name=self.player1.name, value="❌ Deck Not Selected", inline=True)
         embed.add_field(name=self.player2.name, value="❌ Deck Not Selected", inline=True)
         
-        view = SetupView(self)
-        self.message = await self.ctx.send(embed=embed, view=view)
+        self.deck_choices = [await get_deck_names(self.player1.id), [] if self.practice else await get_deck_names(self.player2.id)]
+        self.view = self.build_view()
+        self.message = await self.ctx.send(embed=embed, view=self.view)
+        await save_battle(self)
+
+    # --- SESSION ---
+    def build_view(self):
+        # View of the current phase (also re-attached to the message of a resumed battle)
+        if self.phase == "SETUP":
+            return SetupView(self, *self.deck_choices)
+        if self.phase == "ACTION":
+            return ActionView(self, self.turn_player)
+        if self.phase == "CARD_SELECT":
+            return CardSelectView(self)
+        if self.phase == "RESULT":
+            return NextRoundView(self)
+        return None
+
+    async def show(self, embed, interaction=None):
+        # Stop the old view first: the new one reuses its custom_ids on the same message
+        if self.view is not None:
+            self.view.stop()
+        self.view = self.build_view()
+        if interaction and not interaction.response.is_done():
+            await interaction.response.edit_message(embed=embed, view=self.view)
+        else:
+            await self.message.edit(embed=embed, view=self.view)
+        await save_battle(self)
 
 
     
@@ -3379,24 +3023,22 @@ class Battle:
     async def confirm_surrender(self, interaction, loser):
         winner = self.player1 if loser == self.player2 else self.player2
         
-        conn = sqlite3.connect('cards_game.db')
-        cursor = conn.cursor()
-        
-        try:
-            cursor.execute('UPDATE players SET battles_played = battles_played + 1, battles_won = battles_won + 1 WHERE user_id = ?', (winner.id,))
-            cursor.execute('UPDATE players SET battles_played = battles_played + 1, battles_lost = battles_lost + 1 WHERE user_id = ?', (loser.id,))
-            cursor.execute('UPDATE players SET coins = coins + 200 WHERE user_id = ?', (winner.id,))
-            cursor.execute('UPDATE players SET coins = coins + 100 WHERE user_id = ?', (loser.id,))
-            conn.commit()
-        except Exception as e:
-            logger.error(f"Surrender DB Error: {e}")
-        finally:
-            conn.close()
+        # Flushes the rounds played so far together with the result
+        if not self.practice:
+            self.ledger.record_surrender(winner.id, loser.id)
+            try:
+                await self.ledger.flush()
+            except Exception as e:
+                logger.error(f"Surrender DB Error: {e}")
+        await forget_battle(self)
         
         # 1. Update the Battle Message (Background)
         embed = discord.Embed(title="🏳️ Battle Surrendered", color=discord.Color.red())
         embed.add_field(name="Result", value=f"**{winner.name}** wins! {loser.name} has surrendered.", inline=False)
-        embed.add_field(name="Rewards", value=f"{winner.name}: +200 Coins\n{loser.name}: +100 Coins", inline=False)
+        if self.practice:
+            embed.add_field(name="Rewards", value="Practice match: no coins or stats.", inline=False)
+        else:
+            embed.add_field(name="Rewards", value=f"{winner.name}: +{WIN_COINS} Coins\n{loser.name}: +{LOSS_COINS} Coins", inline=False)
         await self.message.edit(embed=embed, view=None)
         
         # 2. Acknowledge the Interaction (Ephemeral "You surrendered")
@@ -3407,30 +3049,20 @@ class Battle:
             pass
 
         # 3. NOW check achievements (Safe because interaction is done)
-        await self.check_achievements(winner.id, 'battles_won', interaction)
+        if not self.practice:
+            await self.check_achievements(winner.id, 'battles_won', interaction)
 
     # 2. DRAW LOGIC (Fixed DB Locking)
     async def confirm_draw(self, interaction):
-        conn = sqlite3.connect('cards_game.db')
-        cursor = conn.cursor()
-        
+        self.ledger.record_agreed_draw(self.player1.id, self.player2.id)
         try:
-            # Update Stats
-            cursor.execute('UPDATE players SET battles_played = battles_played + 1, battles_drawn = battles_drawn + 1 WHERE user_id = ?', (self.player1.id,))
-            cursor.execute('UPDATE players SET battles_played = battles_played + 1, battles_drawn = battles_drawn + 1 WHERE user_id = ?', (self.player2.id,))
-            
-            # Update Coins
-            cursor.execute('UPDATE players SET coins = coins + 100 WHERE user_id = ?', (self.player1.id,))
-            cursor.execute('UPDATE players SET coins = coins + 100 WHERE user_id = ?', (self.player2.id,))
-            
-            conn.commit()
+            await self.ledger.flush()
         except Exception as e:
             logger.error(f"Draw DB Error: {e}")
-        finally:
-            conn.close()
+        await forget_battle(self)
 
         embed = discord.Embed(title="🤝 Battle Drawn", description="Both players agreed to a mutual draw.", color=discord.Color.greyple())
-        embed.add_field(name="Rewards", value="Both players received +100 Coins", inline=False)
+        embed.add_field(name="Rewards", value=f"Both players received +{DRAW_COINS} Coins", inline=False)
         
         await self.message.edit(embed=embed, view=None)
         try:
@@ -3439,39 +3071,14 @@ class Battle:
         except:
             pass
 
-    # 3. ROUND UPDATE LOGIC (Fixed DB Locking)
-    def update_round_db_stats(self, winner):
-        conn = sqlite3.connect('cards_game.db')
-        cursor = conn.cursor()
-
-        try:
-            # Update Player Stats
-            cursor.execute('UPDATE players SET rounds_played = rounds_played + 1 WHERE user_id = ?', (self.player1.id,))
-            cursor.execute('UPDATE players SET rounds_played = rounds_played + 1 WHERE user_id = ?', (self.player2.id,))
-            
-            if winner:
-                loser = self.player2 if winner == self.player1 else self.player1
-                cursor.execute('UPDATE players SET rounds_won = rounds_won + 1 WHERE user_id = ?', (winner.id,))
-                cursor.execute('UPDATE players SET rounds_lost = rounds_lost + 1 WHERE user_id = ?', (loser.id,))
-            else:
-                cursor.execute('UPDATE players SET rounds_drawn = rounds_drawn + 1 WHERE user_id = ?', (self.player1.id,))
-                cursor.execute('UPDATE players SET rounds_drawn = rounds_drawn + 1 WHERE user_id = ?', (self.player2.id,))
-
-            # Update Card Stats (Rounds)
-            for card, user in [(self.p1_card, self.player1), (self.p2_card, self.player2)]:
-                cursor.execute('UPDATE inventories SET rounds_played = rounds_played + 1 WHERE card_id = ? AND user_id = ?', (card.card_id, user.id))
-                cursor.execute('UPDATE cards SET total_rounds_played = total_rounds_played + 1 WHERE card_id = ?', (card.card_id,))
-
-            if winner:
-                winning_card = self.p1_card if winner == self.player1 else self.p2_card
-                cursor.execute('UPDATE inventories SET rounds_won = rounds_won + 1 WHERE card_id = ? AND user_id = ?', (winning_card.card_id, winner.id))
-                cursor.execute('UPDATE cards SET total_rounds_won = total_rounds_won + 1 WHERE card_id = ?', (winning_card.card_id,))
-
-            conn.commit()
-        except Exception as e:
-            logger.error(f"Round Update DB Error: {e}")
-        finally:
-            conn.close()
+    # 3. ROUND UPDATE LOGIC (buffered; persisted with the battle's next saved phase)
+    async def update_round_db_stats(self, winner):
+        if self.practice:
+            return
+        self.ledger.record_round(
+            self.player1.id, self.p1_card.card_id, self.player2.id, self.p2_card.card_id,
+            winner.id if winner else None
+        )
 
     # 4. END GAME LOGIC (Fixed DB Locking + Card Stats)
     async def end_game(self, interaction, last_round_embed):
@@ -3490,54 +3097,35 @@ class Battle:
         else:
             is_draw = True
 
-        conn = sqlite3.connect('cards_game.db')
-        cursor = conn.cursor()
-
-        try:
-            cursor.execute('UPDATE players SET battles_played = battles_played + 1 WHERE user_id = ?', (self.player1.id,))
-            cursor.execute('UPDATE players SET battles_played = battles_played + 1 WHERE user_id = ?', (self.player2.id,))
-
-            def update_deck_stats(deck, user, won_battle):
-                for card in deck:
-                    cursor.execute('UPDATE inventories SET battles_played = battles_played + 1 WHERE card_id = ? AND user_id = ?', (card.card_id, user.id))
-                    cursor.execute('UPDATE cards SET total_battles_played = total_battles_played + 1 WHERE card_id = ?', (card.card_id,))
-                    if won_battle:
-                        cursor.execute('UPDATE inventories SET battles_won = battles_won + 1 WHERE card_id = ? AND user_id = ?', (card.card_id, user.id))
-                        cursor.execute('UPDATE cards SET total_battles_won = total_battles_won + 1 WHERE card_id = ?', (card.card_id,))
-
-            if is_draw:
-                cursor.execute('UPDATE players SET battles_drawn = battles_drawn + 1 WHERE user_id = ?', (self.player1.id,))
-                cursor.execute('UPDATE players SET battles_drawn = battles_drawn + 1 WHERE user_id = ?', (self.player2.id,))
-                cursor.execute('UPDATE players SET coins = coins + 100 WHERE user_id = ?', (self.player1.id,))
-                cursor.execute('UPDATE players SET coins = coins + 100 WHERE user_id = ?', (self.player2.id,))
-                
-                update_deck_stats(self.player1_deck, self.player1, False)
-                update_deck_stats(self.player2_deck, self.player2, False)
-
-                embed = discord.Embed(title="🤝 Battle Drawn 🤝", color=discord.Color.greyple())
-                embed.add_field(name="Result", value="The battle ended in a draw!", inline=False)
-                embed.add_field(name="Rewards", value="Both players received +100 Coins", inline=False)
-            else:
-                cursor.execute('UPDATE players SET battles_won = battles_won + 1 WHERE user_id = ?', (winner.id,))
-                cursor.execute('UPDATE players SET battles_lost = battles_lost + 1 WHERE user_id = ?', (loser.id,))
-                cursor.execute('UPDATE players SET coins = coins + 200 WHERE user_id = ?', (winner.id,))
-                cursor.execute('UPDATE players SET coins = coins + 100 WHERE user_id = ?', (loser.id,))
-                
-                update_deck_stats(self.player1_deck, self.player1, (winner == self.player1))
-                update_deck_stats(self.player2_deck, self.player2, (winner == self.player2))
+        # Rounds, result, coins, every deck card's stats and the stored session's removal in one transaction
+        if not self.practice:
+            self.ledger.record_result(
+                self.player1.id, [card.card_id for card in self.player1_deck],
+                self.player2.id, [card.card_id for card in self.player2_deck],
+                winner.id if winner else None
+            )
+            try:
+                await self.ledger.flush()
+            except Exception as e:
+                logger.error(f"End Game DB Error: {e}")
+        await forget_battle(self)
+
+        if is_draw:
+            embed = discord.Embed(title="🤝 Battle Drawn 🤝", color=discord.Color.greyple())
+            embed.add_field(name="Result", value="The battle ended in a draw!", inline=False)
+        else:
+            embed = discord.Embed(title="🏆 Battle Finished 🏆", color=discord.Color.gold())
+            embed.add_field(name="Winner", value=f"**{winner.name}**", inline=False)
 
-                embed = discord.Embed(title="🏆 Battle Finished 🏆", color=discord.Color.gold())
-                embed.add_field(name="Winner", value=f"**{winner.name}**", inline=False)
-                embed.add_field(name="Rewards", value=f"{winner.name}: +200 Coins\n{loser.name}: +100 Coins", inline=False)
-            
-            conn.commit()
-        except Exception as e:
-            logger.error(f"End Game DB Error: {e}")
-        finally:
-            conn.close()
+        if self.practice:
+            embed.add_field(name="Rewards", value="Practice match: no coins or stats.", inline=False)
+        elif is_draw:
+            embed.add_field(name="Rewards", value=f"Both players received +{DRAW_COINS} Coins", inline=False)
+        else:
+            embed.add_field(name="Rewards", value=f"{winner.name}: +{WIN_COINS} Coins\n{loser.name}: +{LOSS_COINS} Coins", inline=False)
 
         # Achievements (Safe now because we deferred earlier)
-        if not is_draw:
+        if not is_draw and not self.practice:
             await self.check_achievements(winner.id, 'battles_won', interaction)
 
         embed.add_field(name="Final Score", value=f"{self.player1.name}: {self.player1_wins} | {self.player2.name}: {self.player2_wins} | Draws: {self.draws}", inline=False)
@@ -3591,6 +3179,12 @@ class Battle:
         # 3. Filter the deck: Keep cards ONLY if their ID is not in the used list
         return [card for card in full_deck if card.card_id not in used_ids]
 
+    # --- PRACTICE OPPONENT ---
+    def choose_bot_deck(self):
+        # A deck about as strong as the player's, straight from the catalog
+        self.player2_deck = practice_deck(card_catalog, self.player1_deck, NON_DROPPABLE_TYPES)
+        self.ai = BattleAI(self.player1_deck, self.player2_deck)
+
     async def update_game_state(self, interaction=None):
         # 1. SETUP
         if self.phase == "SETUP":
@@ -3599,18 +3193,20 @@ class Battle:
                 await self.update_game_state(interaction)
             return
 
+        # The bot picks its tactic on its turn and its card before seeing the player's
+        if self.practice and self.phase == "ACTION" and self.turn_player.id == self.player2.id:
+            self.p1_action, self.p2_action = seat_tactics(False, self.ai.choose_tactic(self))
+            self.phase = "CARD_SELECT"
+        if self.practice and self.phase == "CARD_SELECT" and self.p2_card is None:
+            self.p2_card = self.ai.choose_card(self)
+
         # 2. ACTION
         if self.phase == "ACTION":
             embed = discord.Embed(title=f"⚔️ Round {self.round} | Action Phase", color=discord.Color.blue())
             embed.add_field(name="Score", value=f"{self.player1.name}: {self.player1_wins} | {self.player2.name}: {self.player2_wins} | Draws: {self.draws}", inline=False)
             embed.add_field(name="Current Turn", value=f"It is **{self.turn_player.name}'s** turn to choose the tactic.", inline=False)
             
-            view = ActionView(self, self.turn_player)
-            
-            if interaction and not interaction.response.is_done():
-                await interaction.response.edit_message(embed=embed, view=view)
-            else:
-                await self.message.edit(embed=embed, view=view)
+            await self.show(embed, interaction)
 
         # 3. CARD SELECT
         elif self.phase == "CARD_SELECT":
@@ -3621,18 +3217,12 @@ class Battle:
             embed.add_field(name="Tactics", value=f"{self.player1.name}: **{self.p1_action.upper()}**\n{self.player2.name}: **{self.p2_action.upper()}**", inline=False)
             embed.add_field(name="Card Selection", value=f"**{self.player1.name}:** {p1_status}\n**{self.player2.name}:** {p2_status}", inline=False)
             
-            view = CardSelectView(self)
-            
-            if interaction and not interaction.response.is_done():
-                await interaction.response.edit_message(embed=embed, view=view)
-            else:
-                await self.message.edit(embed=embed, view=view)
+            await self.show(embed, interaction)
 
         # 4. RESULT
         elif self.phase == "RESULT":
             if not self.round_resolved:
                 result_text, winner = self.calculate_winner()
-                self.update_round_db_stats(winner)
                 
                 # --- FIX: Restore these lines to track used cards ---
                 self.player1_used_cards.append(self.p1_card)
@@ -3643,6 +3233,7 @@ class Battle:
                 self.last_result_text = result_text
                 self.last_winner = winner
                 self.round_resolved = True
+                await self.update_round_db_stats(winner)
             else:
                 result_text = self.last_result_text
                 winner = self.last_winner
@@ -3651,69 +3242,56 @@ class Battle:
             embed.add_field(name=f"{self.player1.name} ({self.p1_action})", value=f"**{self.p1_card.name}**\n⭐ {self.p1_card.overall}\n⚔️ {self.p1_card.attack} | 🛡️ {self.p1_card.defense} | ⚡ {self.p1_card.speed}", inline=True)
             embed.add_field(name=f"{self.player2.name} ({self.p2_action})", value=f"**{self.p2_card.name}**\n⭐ {self.p2_card.overall}\n⚔️ {self.p2_card.attack} | 🛡️ {self.p2_card.defense} | ⚡ {self.p2_card.speed}", inline=True)
             
-            if self.player1_wins >= 3 or self.player2_wins >= 3 or self.round == 5:
+            if match_over(self.player1_wins, self.player2_wins, self.round):
                 self.phase = "GAME_OVER"
                 await self.end_game(interaction, embed) 
             else:
-                view = NextRoundView(self)
-                if interaction and not interaction.response.is_done():
-                    await interaction.response.edit_message(embed=embed, view=view)
-                else:
-                    await self.message.edit(embed=embed, view=view)
+                await self.show(embed, interaction)
                 
                 # Check Achievements
                 if winner and not self.round_resolved: 
                      await self.check_achievements(winner.id, 'rounds_won', interaction)
 
     def calculate_winner(self):
-        p1_val, p2_val, stat_name = 0, 0, "Stat"
-        if self.p1_action == 'attack' and self.p2_action == 'defense':
-             p1_val, p2_val, stat_name = self.p1_card.attack, self.p2_card.defense, "Attack vs Defense"
-        elif self.p1_action == 'defense' and self.p2_action == 'attack':
-             p1_val, p2_val, stat_name = self.p1_card.defense, self.p2_card.attack, "Defense vs Attack"
-        else: 
-             p1_val, p2_val, stat_name = self.p1_card.speed, self.p2_card.speed, "Speed vs Speed"
+        winner, stat_name, on_overall = resolve_round(self.p1_card, self.p2_card, self.p1_action, self.p2_action)
 
-        if p1_val > p2_val:
+        if winner == 1:
             self.player1_wins += 1
+            if on_overall:
+                return f"⚠️ Stats Draw! **{self.player1.name}** wins on Overall ({self.p1_card.overall} vs {self.p2_card.overall})!", self.player1
             return f"🏆 **{self.player1.name}** Wins with {stat_name}!", self.player1
-        elif p2_val > p1_val:
+        elif winner == 2:
             self.player2_wins += 1
+            if on_overall:
+                return f"⚠️ Stats Draw! **{self.player2.name}** wins on Overall ({self.p2_card.overall} vs {self.p1_card.overall})!", self.player2
             return f"🏆 **{self.player2.name}** Wins with {stat_name}!", self.player2
         else:
-            if self.p1_card.overall > self.p2_card.overall:
-                self.player1_wins += 1
-                return f"⚠️ Stats Draw! **{self.player1.name}** wins on Overall ({self.p1_card.overall} vs {self.p2_card.overall})!", self.player1
-            elif self.p2_card.overall > self.p1_card.overall:
-                self.player2_wins += 1
-                return f"⚠️ Stats Draw! **{self.player2.name}** wins on Overall ({self.p2_card.overall} vs {self.p1_card.overall})!", self.player2
-            else:
-                self.draws += 1
-                return f"🤝 **It's a Draw!** Both stats and overall are equal!", None
+            self.draws += 1
+            return f"🤝 **It's a Draw!** Both stats and overall are equal!", None
 
     
 
     
     async def check_achievements(self, user_id, stat_type, interaction):
         try:
-            conn = sqlite3.connect('cards_game.db')
-            cursor = conn.cursor()
-            cursor.execute(f'SELECT {stat_type} FROM players WHERE user_id = ?', (user_id,))
-            stat_value = cursor.fetchone()[0]
             if stat_type == 'rounds_won':
                 thresholds = {10: 1, 50: 2, 100: 8}
             elif stat_type == 'battles_won':
                 thresholds = {1: 3, 10: 4, 25: 5, 50: 6, 100: 8}
-            for threshold, achievement_id in thresholds.items():
-                if stat_value == threshold:
-                    cursor.execute('INSERT OR IGNORE INTO user_achievements (user_id, achievement_id) VALUES (?, ?)', (user_id, achievement_id))
-                    conn.commit()
-                    cursor.execute('SELECT title, description FROM achievements WHERE achievement_id = ?', (achievement_id,))
-                    achievement = cursor.fetchone()
-                    if achievement and interaction:
-                        user = await interaction.client.fetch_user(user_id)
-                        await interaction.followup.send(f"🎉 **Achievement Unlocked!** {user.mention} unlocked **{achievement[0]}**: {achievement[1]}", ephemeral=True)
-            conn.close()
+
+            def unlock(cursor):
+                cursor.execute(f'SELECT {stat_type} FROM players WHERE user_id = ?', (user_id,))
+                achievement_id = thresholds.get(cursor.fetchone()[0])
+                if achievement_id is None:
+                    return None
+                cursor.execute('INSERT OR IGNORE INTO user_achievements (user_id, achievement_id) VALUES (?, ?)', (user_id, achievement_id))
+                cursor.execute('SELECT title, description FROM achievements WHERE achievement_id = ?', (achievement_id,))
+                return cursor.fetchone()
+
+            achievement = await run_write(unlock)
+            if achievement and interaction:
+                user = await interaction.client.fetch_user(user_id)
+                await interaction.followup.send(f"🎉 **Achievement Unlocked!** {user.mention} unlocked **{achievement[0]}**: {achievement[1]}", ephemeral=True)
         except Exception as e:
             logger.error(f"Error checking achievements: {e}")
 
@@ -3725,7 +3303,9 @@ def configure_battle_buttons(view, battle):
     # Surrender Button (Always Red)
     view.add_item(SurrenderButton(battle))
     
-    # Draw Button (Dynamic)
+    # Draw Button (Dynamic); the practice bot never takes a draw
+    if battle.practice:
+        return
     label = "Offer Draw"
     style = discord.ButtonStyle.secondary
     
@@ -3740,7 +3320,7 @@ def configure_battle_buttons(view, battle):
 
 class SurrenderButton(discord.ui.Button):
     def __init__(self, battle):
-        super().__init__(style=discord.ButtonStyle.danger, label="Surrender", emoji="🏳️", row=2)
+        super().__init__(style=discord.ButtonStyle.danger, label="Surrender", emoji="🏳️", row=2, custom_id="battle:surrender")
         self.battle = battle
 
     async def callback(self, interaction: discord.Interaction):
@@ -3748,7 +3328,7 @@ class SurrenderButton(discord.ui.Button):
 
 class DrawButton(discord.ui.Button):
     def __init__(self, battle, label="Offer Draw", style=discord.ButtonStyle.secondary):
-        super().__init__(style=style, label=label, emoji="🤝", row=2)
+        super().__init__(style=style, label=label, emoji="🤝", row=2, custom_id="battle:draw")
         self.battle = battle
 
     async def callback(self, interaction: discord.Interaction):
@@ -3771,28 +3351,31 @@ class SurrenderConfirmView(discord.ui.View):
         await interaction.response.edit_message(content="Surrender cancelled.", view=None)
 
 # --- PHASE VIEWS ---
+# No timeout and fixed custom_ids, so a resumed battle can re-attach them to its message;
+# abandoned battles are expired by utils.battle_store instead.
 
 class SetupView(discord.ui.View):
-    def __init__(self, battle):
-        super().__init__(timeout=120)
+    def __init__(self, battle, player1_decks, player2_decks):
+        super().__init__(timeout=None)
         self.battle = battle
-        self.add_item(DeckSelectMenu(battle, battle.player1))
-        self.add_item(DeckSelectMenu(battle, battle.player2))
+        self.add_item(DeckSelectMenu(battle, battle.player1, player1_decks))
+        if not battle.practice:
+            self.add_item(DeckSelectMenu(battle, battle.player2, player2_decks))
 
-    @discord.ui.button(label="Cancel Setup", style=discord.ButtonStyle.red, row=2)
+    @discord.ui.button(label="Cancel Setup", style=discord.ButtonStyle.red, row=2, custom_id="battle:setup:cancel")
     async def cancel(self, interaction: discord.Interaction, button: discord.ui.Button):
         if interaction.user.id not in [self.battle.player1.id, self.battle.player2.id]:
             return await interaction.response.send_message("Not your battle.", ephemeral=True)
         await interaction.response.edit_message(content="Battle setup cancelled.", embed=None, view=None)
+        await forget_battle(self.battle)
 
 class DeckSelectMenu(discord.ui.Select):
-    def __init__(self, battle, player):
+    def __init__(self, battle, player, decks):
         self.battle = battle
         self.player = player
-        cursor.execute('SELECT deck_name FROM decks WHERE user_id = ?', (player.id,))
-        decks = cursor.fetchall()
-        options = [discord.SelectOption(label=d[0]) for d in decks] if decks else [discord.SelectOption(label="No Decks", value="none")]
-        super().__init__(placeholder=f"{player.name}, choose...", options=options, min_values=1, max_values=1)
+        options = [discord.SelectOption(label=d) for d in decks] if decks else [discord.SelectOption(label="No Decks", value="none")]
+        seat = "p1" if player.id == battle.player1.id else "p2"
+        super().__init__(placeholder=f"{player.name}, choose...", options=options, min_values=1, max_values=1, custom_id=f"battle:setup:{seat}")
 
     async def callback(self, interaction: discord.Interaction):
         if interaction.user.id != self.player.id:
@@ -3801,9 +3384,10 @@ class DeckSelectMenu(discord.ui.Select):
         deck_name = self.values[0]
         if deck_name == "none": return await interaction.response.send_message("Create a deck first!", ephemeral=True)
 
-        deck_cards = get_deck(self.player.id, deck_name)
+        deck_cards = await get_deck(self.player.id, deck_name)
         if self.player.id == self.battle.player1.id: self.battle.player1_deck = deck_cards
         else: self.battle.player2_deck = deck_cards
+        if self.battle.practice and deck_cards: self.battle.choose_bot_deck()
 
         if self.battle.player1_deck and self.battle.player2_deck:
              await self.battle.update_game_state(interaction)
@@ -3812,49 +3396,42 @@ class DeckSelectMenu(discord.ui.Select):
             index = 0 if self.player.id == self.battle.player1.id else 1
             embed.set_field_at(index, name=self.player.name, value=f"✅ Ready ({deck_name})", inline=True)
             await interaction.response.edit_message(embed=embed, view=self.view)
+            await save_battle(self.battle)
 
 class ActionView(discord.ui.View):
     def __init__(self, battle, turn_player):
-        super().__init__(timeout=60)
+        super().__init__(timeout=None)
         self.battle = battle
         self.turn_player = turn_player
         
         # Add Surrender/Draw buttons dynamically
         configure_battle_buttons(self, battle)
 
-    @discord.ui.button(label="Attack", style=discord.ButtonStyle.danger)
+    @discord.ui.button(label="Attack", style=discord.ButtonStyle.danger, custom_id="battle:attack")
     async def attack(self, interaction: discord.Interaction, button: discord.ui.Button): await self.process_action(interaction, "attack")
 
-    @discord.ui.button(label="Defense", style=discord.ButtonStyle.primary)
+    @discord.ui.button(label="Defense", style=discord.ButtonStyle.primary, custom_id="battle:defense")
     async def defense(self, interaction: discord.Interaction, button: discord.ui.Button): await self.process_action(interaction, "defense")
         
-    @discord.ui.button(label="Speed", style=discord.ButtonStyle.success)
+    @discord.ui.button(label="Speed", style=discord.ButtonStyle.success, custom_id="battle:speed")
     async def speed(self, interaction: discord.Interaction, button: discord.ui.Button): await self.process_action(interaction, "speed")
 
     async def process_action(self, interaction, action):
         if interaction.user.id != self.turn_player.id:
             return await interaction.response.send_message("Not your turn!", ephemeral=True)
         
-        if self.turn_player.id == self.battle.player1.id:
-            self.battle.p1_action = action
-            if action == "attack": self.battle.p2_action = "defense"
-            elif action == "defense": self.battle.p2_action = "attack"
-            else: self.battle.p2_action = "speed"
-        else:
-            self.battle.p2_action = action
-            if action == "attack": self.battle.p1_action = "defense"
-            elif action == "defense": self.battle.p1_action = "attack"
-            else: self.battle.p1_action = "speed"
+        self.battle.p1_action, self.battle.p2_action = seat_tactics(self.turn_player.id == self.battle.player1.id, action)
             
         self.battle.phase = "CARD_SELECT"
         await self.battle.update_game_state(interaction)
 
 class CardSelectView(discord.ui.View):
     def __init__(self, battle):
-        super().__init__(timeout=60)
+        super().__init__(timeout=None)
         self.battle = battle
         self.add_item(CardDropdown(battle, battle.player1))
-        self.add_item(CardDropdown(battle, battle.player2))
+        if not battle.practice:
+            self.add_item(CardDropdown(battle, battle.player2))
         
         # Add Surrender/Draw buttons dynamically
         configure_battle_buttons(self, battle)
@@ -3865,7 +3442,8 @@ class CardDropdown(discord.ui.Select):
         self.player = player
         cards = battle.get_valid_deck(player)
         options = [discord.SelectOption(label=c.name, description=f"OVR: {c.overall}", value=str(c.card_id)) for c in cards]
-        super().__init__(placeholder=f"{player.name}'s Card", options=options, min_values=1, max_values=1)
+        seat = "p1" if player.id == battle.player1.id else "p2"
+        super().__init__(placeholder=f"{player.name}'s Card", options=options, min_values=1, max_values=1, custom_id=f"battle:card:{seat}")
     
     async def callback(self, interaction: discord.Interaction):
         if interaction.user.id != self.player.id: return await interaction.response.send_message("Not for you!", ephemeral=True)
@@ -3885,25 +3463,27 @@ class CardDropdown(discord.ui.Select):
 
 class NextRoundView(discord.ui.View):
     def __init__(self, battle):
-        super().__init__(timeout=60)
+        super().__init__(timeout=None)
         self.battle = battle
-        self.ready_players = set()
         
         # Add Surrender/Draw buttons dynamically
         configure_battle_buttons(self, battle)
 
-    @discord.ui.button(label="Ready for Next Round", style=discord.ButtonStyle.primary, row=0)
+    @discord.ui.button(label="Ready for Next Round", style=discord.ButtonStyle.primary, row=0, custom_id="battle:next")
     async def next_round(self, interaction: discord.Interaction, button: discord.ui.Button):
         if interaction.user.id not in [self.battle.player1.id, self.battle.player2.id]: 
             return await interaction.response.send_message("Not your battle.", ephemeral=True)
         
-        if interaction.user.id in self.ready_players: 
+        if interaction.user.id in self.battle.ready_players: 
             return await interaction.response.send_message("Waiting for opponent...", ephemeral=True)
 
-        self.ready_players.add(interaction.user.id)
+        self.battle.ready_players.add(interaction.user.id)
+        if self.battle.practice:
+            self.battle.ready_players.add(self.battle.player2.id)
         
-        if len(self.ready_players) == 2:
+        if len(self.battle.ready_players) == 2:
             # RESET ROUND DATA
+            self.battle.ready_players.clear()
             self.battle.p1_action = None
             self.battle.p2_action = None
             self.battle.p1_card = None
@@ -3923,6 +3503,7 @@ class NextRoundView(discord.ui.View):
             await self.battle.update_game_state(interaction)
         else:
             await interaction.response.send_message(f"{interaction.user.name} is ready! Waiting for opponent...", ephemeral=False)
+            await save_battle(self.battle)
 
 
 # ---------------- COMMANDS ----------------
@@ -3950,63 +3531,119 @@ class BattleInviteView(discord.ui.View):
         await interaction.response.edit_message(content="Battle Declined.", embed=None, view=None)
 
 
-@bot.hybrid_command(name='battle', description="Challenge a player to a battle")
+@bot.hybrid_group(name='battle', description="Challenge a player to a battle", fallback='challenge', invoke_without_command=True)
 async def battle(ctx, user: discord.User):
     if user.id == ctx.author.id:
         return await ctx.send("You cannot battle yourself.")
         
-    ensure_player_exists(ctx.author.id, ctx.author.name)
-    ensure_player_exists(user.id, user.name)
+    await ensure_player_exists(ctx.author.id, ctx.author.name)
+    await ensure_player_exists(user.id, user.name)
     
     embed = discord.Embed(title="Battle Request", description=f"{ctx.author.name} has challenged {user.name} to a battle!")
     view = BattleInviteView(ctx, ctx.author, user)
     await ctx.send(embed=embed, view=view)
 
 
-def get_deck(user_id, deck_name):
-    cursor.execute('SELECT cards FROM decks WHERE user_id = ? AND deck_name = ?', (user_id, deck_name))
-    result = cursor.fetchone()
-    if result is None:
-        return None
-    
-    card_ids = list(map(int, result[0].split(',')))
-    cards = []
-    for card_id in card_ids:
-        cursor.execute('SELECT * FROM cards WHERE card_id = ?', (card_id,))
-        card_data = cursor.fetchone()
-        if card_data:
-            cards.append(Card(*card_data))
-    return cards
+@battle.command(name='bot', description="Practice battle against the bot (no coins or stats)")
+async def battle_bot(ctx):
+    battle_instance = Battle(ctx, ctx.author, bot.user, practice=True)
+    await battle_instance.start()
 
-#---------------------------------------------------------COINS AND SALES-------------------------------------------------------------------------------------
 
-def increment_cards_sold(user_id):
-    cursor.execute('UPDATE players SET cards_sold = cards_sold + 1 WHERE user_id = ?', (user_id,))
-    conn.commit()
-    
+# ---------------- MATCHMAKING ----------------
+
+@battle.command(name='queue', description="Find an opponent of similar deck strength")
+async def battle_queue(ctx, deck_name: str):
+    if ctx.guild is None:
+        return await ctx.send("Matchmaking is only available in servers.", ephemeral=True)
+    if in_live_battle(ctx.author.id):
+        return await ctx.send("Finish your current battle before joining the queue.", ephemeral=True)
+    deck = await get_deck(ctx.author.id, deck_name)
+    if not deck:
+        return await ctx.send(f"You don't have a deck named '{deck_name}'.", ephemeral=True)
+    await ensure_player_exists(ctx.author.id, ctx.author.name)
+
+    entry = QueueEntry(ctx.author, deck_name, deck, ctx.channel.id, pool=ctx.guild.id)
+    opponent = matchmaking.join(entry)
+    if opponent is None:
+        await ctx.send(f"🔎 {ctx.author.name} joined the matchmaking queue with **{deck_name}** (strength {entry.strength}). Use `/battle leave` to stop searching.")
+    else:
+        await ctx.send(f"✅ Opponent found: **{opponent.user.name}**! Loading arena...")
+
+@battle.command(name='leave', description="Leave the matchmaking queue")
+async def battle_leave(ctx):
+    if matchmaking.leave(ctx.author.id) is None:
+        return await ctx.send("You are not in the matchmaking queue.", ephemeral=True)
+    await ctx.send("You left the matchmaking queue.", ephemeral=True)
+
+async def start_matched_battle(first, second):
+    # The player who waited longest is player 1; the battle opens in their queue channel when possible
+    channel = match_channel(bot, first, second)
+    if channel is None:
+        logger.error(f"No channel for matched battle {first.user.id} vs {second.user.id}")
+        return
+    # Decks are reloaded: cards may have been sold or traded while the players were queued
+    dropped = []
+    for entry in (first, second):
+        deck = await get_deck(entry.user.id, entry.deck_name)
+        if not deck:
+            dropped.append((entry, f"your deck **{entry.deck_name}** no longer exists"))
+        elif await run_db(find_unowned_card, entry.user.id, [card.card_id for card in deck]) is not None:
+            dropped.append((entry, f"your deck **{entry.deck_name}** has cards you no longer own"))
+        elif in_live_battle(entry.user.id):
+            dropped.append((entry, "you are already in a battle"))
+        else:
+            entry.set_deck(deck)
+    if dropped:
+        for entry, reason in dropped:
+            queue_channel = bot.get_channel(entry.channel_id)
+            if queue_channel:
+                await queue_channel.send(f"⚠️ {entry.user.mention}, {reason}, so you have left the matchmaking queue.")
+        for entry in (first, second):
+            if entry not in [dropped_entry for dropped_entry, _ in dropped]:
+                matchmaking.requeue(entry)
+        return
+
+    battle_instance = Battle(channel, first.user, second.user)
+    battle_instance.player1_deck, battle_instance.player2_deck = first.deck, second.deck
+    await battle_instance.start()
+
+async def matchmaking_timed_out(entry):
+    channel = bot.get_channel(entry.channel_id)
+    if channel:
+        await channel.send(f"⌛ {entry.user.mention}, no opponent was found within {QUEUE_TIMEOUT_MINUTES} minutes. You have left the matchmaking queue.")
+
+
+async def get_deck(user_id, deck_name):
+    def load_deck(cursor):
+        cursor.execute('SELECT cards FROM decks WHERE user_id = ? AND deck_name = ?', (user_id, deck_name))
+        result = cursor.fetchone()
+        if result is None:
+            return None
+        
+        card_ids = list(map(int, result[0].split(',')))
+        cards = []
+        for card_id in card_ids:
+            cursor.execute('SELECT * FROM cards WHERE card_id = ?', (card_id,))
+            card_data = cursor.fetchone()
+            if card_data:
+                cards.append(Card(*card_data))
+        return cards
+    return await run_db(load_deck)
+
+def find_unowned_card(cursor, user_id, card_ids):
+    # First card id the user doesn't own, or None (runs inside a DB job)
+    for card_id in card_ids:
+        cursor.execute('SELECT 1 FROM inventories WHERE user_id = ? AND card_id = ?', (user_id, card_id))
+        if cursor.fetchone() is None:
+            return card_id
+    return None
+
+async def get_deck_names(user_id):
+    rows = await fetchall('SELECT deck_name FROM decks WHERE user_id = ?', (user_id,))
+    return [row[0] for row in rows]
 
-def check_card_ownership(user_id, card_id):
-    conn = sqlite3.connect('cards_game.db')
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM inventories WHERE user_id = ? AND card_id = ?", (user_id, card_id))
-    ownership = cursor.fetchone()
-    conn.close()
-    return ownership is not None
-
-
-def add_coins(user_id, coins):
-    conn = sqlite3.connect('cards_game.db')
-    cursor = conn.cursor()
-    cursor.execute("UPDATE players SET coins = coins + ? WHERE user_id = ?", (coins, user_id))
-    conn.commit()
-    conn.close()
-
-def remove_card_from_inventory(user_id, card_id):
-    conn = sqlite3.connect('cards_game.db')
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM inventories WHERE user_id = ? AND card_id = ?", (user_id, card_id))
-    conn.commit()
-    conn.close()
+#---------------------------------------------------------COINS AND SALES-------------------------------------------------------------------------------------
 
 class ConfirmButton(Button):
     def __init__(self, card, user_id, sale_value):
@@ -4016,13 +3653,20 @@ class ConfirmButton(Button):
         self.sale_value = sale_value
 
     async def callback(self, interaction):
-        add_coins(self.user_id, self.sale_value)
-        remove_card_from_inventory(self.user_id, self.card.card_id)
-        increment_cards_sold(self.user_id)
+        def sell_card(cursor):
+            cursor.execute('DELETE FROM inventories WHERE user_id = ? AND card_id = ?', (self.user_id, self.card.card_id))
+            if cursor.rowcount == 0:
+                return False
+            cursor.execute('UPDATE players SET coins = coins + ?, cards_sold = cards_sold + 1 WHERE user_id = ?', (self.sale_value, self.user_id))
+            return True
+
+        if not await run_write(sell_card):
+            await interaction.response.edit_message(content="You no longer own this card.", view=None)
+            return
         
         embed = interaction.message.embeds[0]
         embed.add_field(name="Status", value="Sold", inline=True)
-        embed.set_image(url=f"attachment://{self.card.image_path.split('/')[-1]}")  # Ensure the image is correctly set
+        embed.set_image(url=edit_image_url(interaction.message, self.card.image_path))  # Ensure the image is correctly set
         await interaction.response.edit_message(embed=embed, content="The card has been sold.", view=None)
         logger.info(f'Card {self.card.card_id} sold by user {self.user_id}')
 
@@ -4070,10 +3714,10 @@ def calculate_card_value(card):
     card5=card_search_autocomplete
 )
 async def sell(ctx, card1: str = None, card2: str = None, card3: str = None, card4: str = None, card5: str = None):
-    ensure_player_exists(ctx.author.id, ctx.author.name)
+    await ensure_player_exists(ctx.author.id, ctx.author.name)
     
     # 1. Fetch Inventory
-    inventory, editions = get_player_inventory(ctx.author.id)
+    inventory, editions = await get_player_inventory(ctx.author.id)
     if not inventory:
         return await ctx.send("You have no cards to sell!")
 
@@ -4265,13 +3909,9 @@ class MultiSellConfirmButton(discord.ui.Button):
         view = self.view
         user_id = interaction.user.id
         
-        total_coins = 0
-        count = 0
-        
-        conn = sqlite3.connect('cards_game.db')
-        cursor = conn.cursor()
-        
-        try:
+        def sell_cards(cursor):
+            total_coins = 0
+            count = 0
             for cid in view.selected_ids:
                 # 1. Verify Ownership
                 cursor.execute('SELECT 1 FROM inventories WHERE user_id = ? AND card_id = ?', (user_id, cid))
@@ -4291,7 +3931,10 @@ class MultiSellConfirmButton(discord.ui.Button):
             
             # 4. Give Coins
             cursor.execute('UPDATE players SET coins = coins + ? WHERE user_id = ?', (total_coins, user_id))
-            conn.commit()
+            return total_coins, count
+        
+        try:
+            total_coins, count = await run_write(sell_cards)
             
             embed = discord.Embed(title="✅ Sale Complete!", color=discord.Color.green())
             embed.description = f"You sold **{count}** cards for **{total_coins:,}** coins."
@@ -4303,42 +3946,9 @@ class MultiSellConfirmButton(discord.ui.Button):
         except Exception as e:
             logger.error(f"Sell Error: {e}")
             await interaction.response.send_message("❌ Database error.", ephemeral=True)
-        finally:
-            conn.close()
 
 #---------------------------------------------------------PACKS-------------------------------------------------------------------------------------
 
-PACKS = {
-    1: {
-        "name": "rare_player_pack",
-        "display_name": "Rare Player Pack",
-        "buyable": True,
-        "cost": 1000
-    },
-    2: {
-        "name": "icon_pack",
-        "display_name": "Icon Pack",
-        "buyable": True,
-        "cost": 2500
-    },
-
-    3: {
-        "name": "hero_pack",
-        "display_name": "Hero Pack",
-        "buyable": True,
-        "cost": 1750  
-    },
-
-    4: {
-        "name": "tester_pack",
-        "display_name": "Tester Pack",
-        "buyable": False,
-        "cost": 0  # Not buyable, so cost is 0
-    }
-}
-
-
-
 @bot.hybrid_command(name='shop', description="View the pack shop")
 async def shop(ctx):
     embed = discord.Embed(title="Shop", description="Available packs for purchase:\nUse `buy pack_no` to buy the pack.")
@@ -4367,19 +3977,28 @@ async def buy(ctx, pack_id: int):
     pack_name = pack["name"]
     cost = pack["cost"]
 
-    if not has_sufficient_coins(user_id, cost):
+    def buy_pack(cursor):
+        # Charge and grant in one transaction; the coins >= cost guard makes concurrent buys safe
+        cursor.execute('UPDATE players SET coins = coins - ? WHERE user_id = ? AND coins >= ?', (cost, user_id, cost))
+        if cursor.rowcount == 0:
+            return False
+        cursor.execute('SELECT 1 FROM packs WHERE user_id = ?', (user_id,))
+        if not cursor.fetchone():
+            cursor.execute('INSERT INTO packs (user_id, rare_player_pack, icon_pack, hero_pack, tester_pack) VALUES (?, 0, 0, 0, 0)', (user_id,))
+        cursor.execute(f'UPDATE packs SET {pack_name} = {pack_name} + 1 WHERE user_id = ?', (user_id,))
+        return True
+
+    if not await run_write(buy_pack):
         await ctx.send(f"You need **{cost}** coins to buy this pack.")
         return
     
-    deduct_coins(user_id, cost)
-    add_pack_to_user(user_id, pack['name'])
     await ctx.send(f"✅ You have bought a **{pack['display_name']}** for {cost} coins.")
     logger.info(f"User {ctx.author.name} bought a {pack['display_name']} pack.")
 
 @bot.hybrid_command(name='packs', description="View your unopened packs")
 async def packs(ctx):
     user_id = ctx.author.id
-    user_packs = get_user_packs(user_id)
+    user_packs = await get_user_packs(user_id)
     
     if not user_packs:
         await ctx.send("You don't have any packs.")
@@ -4401,298 +4020,126 @@ async def packs(ctx):
 
 
 # Helper functions
-def get_user_packs(user_id):
-    conn = sqlite3.connect('cards_game.db')
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM packs WHERE user_id = ?", (user_id,))
-    row = cursor.fetchone()
-    if row:
-        columns = [desc[0] for desc in cursor.description]
-        return dict(zip(columns, row))
-    return {}
+async def get_user_packs(user_id):
+    def load_packs(cursor):
+        cursor.execute("SELECT * FROM packs WHERE user_id = ?", (user_id,))
+        row = cursor.fetchone()
+        if row:
+            columns = [desc[0] for desc in cursor.description]
+            return dict(zip(columns, row))
+        return {}
+    return await run_db(load_packs)
 
 
-def add_pack_to_user(user_id, pack_name):
-    conn = sqlite3.connect('cards_game.db')
-    cursor = conn.cursor()
-    
-    # Check if the user exists in the packs table
-    cursor.execute('SELECT * FROM packs WHERE user_id = ?', (user_id,))
-    user_packs = cursor.fetchone()
-    
-    if user_packs:
-        # User exists, update the pack quantity
-        cursor.execute(f'UPDATE packs SET {pack_name} = {pack_name} + 1 WHERE user_id = ?', (user_id,))
-    else:
-        # User does not exist, insert a new record with initial quantities
-        cursor.execute('INSERT INTO packs (user_id, rare_player_pack, icon_pack, hero_pack, tester_pack) VALUES (?, 0, 0, 0, 0)', (user_id,))
-        cursor.execute(f'UPDATE packs SET {pack_name} = {pack_name} + 1 WHERE user_id = ?', (user_id,))
-    
-    conn.commit()
-    conn.close()
-
-
-
-
-def remove_pack_from_user(user_id, pack_name):
-    conn = sqlite3.connect('cards_game.db')
-    cursor = conn.cursor()
-    cursor.execute(f"UPDATE packs SET {pack_name} = {pack_name} - 1 WHERE user_id = ? AND {pack_name} > 0", (user_id,))
-    conn.commit()
-    conn.close()
-
-def has_sufficient_coins(user_id, cost):
-    conn = sqlite3.connect('cards_game.db')
-    cursor = conn.cursor()
-    cursor.execute("SELECT coins FROM players WHERE user_id = ?", (user_id,))
-    coins = cursor.fetchone()[0]
-    conn.close()
-    return coins >= cost
-
-def deduct_coins(user_id, amount):
-    conn = sqlite3.connect('cards_game.db')
-    cursor = conn.cursor()
-    cursor.execute("UPDATE players SET coins = coins - ? WHERE user_id = ?", (amount, user_id))
-    conn.commit()
-    conn.close()
-
-def get_player_id(username):
-    conn = sqlite3.connect('cards_game.db')
-    cursor = conn.cursor()
-    cursor.execute('SELECT user_id FROM players WHERE name = ?', (username,))
-    result = cursor.fetchone()
-    conn.close()
+async def get_player_id(username):
+    result = await fetchone('SELECT user_id FROM players WHERE name = ?', (username,))
     if result:
         return result[0]
     return None
 
-def is_duplicate_card(user_id, card_id):
-    conn = sqlite3.connect('cards_game.db')
-    cursor = conn.cursor()
-    cursor.execute('SELECT COUNT(*) FROM inventories WHERE user_id = ? AND card_id = ?', (user_id, card_id))
-    result = cursor.fetchone()[0]
-    conn.close()
-    return result > 0
-
-
-@bot.hybrid_command(name='open', description="Open a pack")
-async def open(ctx, pack_id: int):
+@bot.hybrid_command(name='open', description="Open one or more packs")
+async def open(ctx, pack_id: int, count: int = 1):
     user_id = ctx.author.id
 
     if pack_id not in PACKS:
         await ctx.send("Invalid pack ID.")
         return
+    if count < 1:
+        await ctx.send("You must open at least one pack.")
+        return
 
     pack_name = PACKS[pack_id]["name"]
 
-    user_packs = get_user_packs(user_id)
-    if not user_packs or user_packs.get(pack_name, 0) <= 0:
+    user_packs = await get_user_packs(user_id)
+    owned = user_packs.get(pack_name, 0) if user_packs else 0
+    if owned <= 0:
         await ctx.send("You don't own this pack.")
         return
 
-    # Open the pack based on its type
-    if pack_id == 1:
-        card_obtained = await open_rare_player_pack(ctx, user_id)
-    elif pack_id == 2:
-        card_obtained = await open_icon_pack(ctx, user_id)
-    elif pack_id == 3:
-        card_obtained = await open_hero_pack(ctx, user_id)
-    elif pack_id == 4:
-        card_obtained = await open_tester_pack(ctx, user_id)
-
-    remove_pack_from_user(user_id, pack_name)
-    await ctx.send(f"You have opened a {PACKS[pack_id]['display_name']} and obtained {card_obtained}.")
-
-
+    await open_and_report(ctx, {pack_id: min(count, owned, MAX_PACKS_PER_OPEN)})
 
-async def open_rare_player_pack(ctx, user_id):
-    conn = sqlite3.connect('cards_game.db')
-    cursor = conn.cursor()
 
-    card = None
-    while True:
-        # Define the card types and their respective probabilities
-        card_types = ['Standard', 'Other']
-        probabilities = [0.8, 0.2]
-
-        # Choose a card type based on the defined probabilities
-        chosen_type = random.choices(card_types, probabilities)[0]
-
-        if chosen_type == 'Standard':
-            cursor.execute("SELECT card_id, name, card_rarity, card_type, attack, defense, speed, overall, league, nation, image_path FROM cards WHERE card_type = 'Standard' AND overall > 85 ORDER BY RANDOM() LIMIT 1")
-        else:
-            cursor.execute(f"SELECT card_id, name, card_rarity, card_type, attack, defense, speed, overall, league, nation, image_path FROM cards WHERE card_type != 'Standard' AND card_type NOT IN ({_ndt_sql}) AND overall > 85 ORDER BY RANDOM() LIMIT 1", NON_DROPPABLE_TYPES)
+@bot.hybrid_command(name='open_all', description="Open all of your packs at once")
+async def open_all(ctx):
+    user_packs = await get_user_packs(ctx.author.id)
+    counts = {}
+    for pack_id, pack in PACKS.items():
+        quantity = min(user_packs.get(pack['name'], 0), MAX_PACKS_PER_OPEN) if user_packs else 0
+        if quantity > 0:
+            counts[pack_id] = quantity
 
-        card = cursor.fetchone()
+    if not counts:
+        await ctx.send("You don't have any packs.")
+        return
+    await open_and_report(ctx, counts)
 
-        if card and not is_duplicate_card(user_id, card[0]):
-            break
 
-    card_id, name, rarity, card_type, attack, defense, speed, overall, league, nation, image_path = card
+async def open_and_report(ctx, counts):
+    # The packs are consumed in the same transaction that grants their cards
+    try:
+        opened = await open_pack_batch(ctx.author.id, counts, catalog=card_catalog)
+    except ValueError as e:
+        await ctx.send(str(e))
+        return
 
-    # Increment the copies attribute of the chosen card
-    cursor.execute('UPDATE cards SET copies = copies + 1 WHERE card_id = ?', (card_id,))
-    conn.commit()
+    if list(counts.values()) == [1]:
+        pack_id, packs = next(iter(opened.items()))
+        first_card, *other_cards = packs[0]
+        await send_pack_card(ctx, first_card)
+        if other_cards:
+            card_names = [f"{card.card_id}: {card.name}" for card in other_cards]
+            await ctx.send(f"Other cards obtained: {', '.join(card_names)}")
 
-    # Add the card to the user's inventory
-    add_card_to_inventory(user_id, card_id)
-    conn.close()
+        card_obtained = first_card.name if not other_cards else f"{len(packs[0])} Cards"
+        await ctx.send(f"You have opened a {PACKS[pack_id]['display_name']} and obtained {card_obtained}.")
+        return
 
-    embed = discord.Embed(title="You have received a card!", description=f"**{name}**")
-    embed.set_image(url=f"attachment://{image_path.split('/')[-1]}")
-    embed.add_field(name="Rarity", value=rarity, inline=True)
-    embed.add_field(name="Type", value=card_type, inline=True)
-    embed.add_field(name="Attack", value=attack, inline=True)
-    embed.add_field(name="Defense", value=defense, inline=True)
-    embed.add_field(name="Speed", value=speed, inline=True)
-    embed.add_field(name="Overall", value=overall, inline=True)
-    embed.add_field(name="League", value=league, inline=True)
-    embed.add_field(name="Nation", value=nation, inline=True)
-    embed.add_field(name="Copies", value=1, inline=True)
+    # Several packs: one summary embed with every card composited into a single image
+    cards = sorted(
+        (card for packs in opened.values() for pack in packs for card in pack),
+        key=lambda card: card.overall, reverse=True
+    )
+    total_packs = sum(len(packs) for packs in opened.values())
+
+    embed = discord.Embed(title=f"You have opened {total_packs} packs!", description=f"You obtained **{len(cards)}** cards.")
+    for pack_id, count in counts.items():
+        opened_count = len(opened.get(pack_id, ()))
+        value = f"Opened: **{opened_count}**"
+        if opened_count < count:
+            value += f" ({count - opened_count} kept, you own every card they can contain)"
+        embed.add_field(name=PACKS[pack_id]['display_name'], value=value, inline=False)
+
+    card_names = [f"{card.card_id}: {card.name} ({card.overall})" for card in cards[:15]]
+    if len(cards) > 15:
+        card_names.append(f"...and {len(cards) - 15} more")
+    embed.add_field(name="Best Pulls", value="\n".join(card_names), inline=False)
     embed.set_footer(text=f"Requested by {ctx.author.name}", icon_url=ctx.author.display_avatar.url)
-    file = discord.File(image_path, filename=image_path.split('/')[-1])
-    await ctx.send(embed=embed, file=file)
-    return name
-
-
-
-async def open_icon_pack(ctx, user_id):
-    conn = sqlite3.connect('cards_game.db')
-    cursor = conn.cursor()
-
-    card = None
-    while True:
-        cursor.execute("SELECT card_id, name, card_rarity, card_type, attack, defense, speed, overall, league, nation, image_path FROM cards WHERE card_type = 'Icon' ORDER BY RANDOM() LIMIT 1")
-        card = cursor.fetchone()
 
-        if card and not is_duplicate_card(user_id, card[0]):
-            break
-
-    card_id, name, rarity, card_type, attack, defense, speed, overall, league, nation, image_path = card
-
-    # Increment the copies attribute of the chosen card
-    cursor.execute('UPDATE cards SET copies = copies + 1 WHERE card_id = ?', (card_id,))
-    conn.commit()
+    try:
+        image_buffer = await render_card_grid(cards)
+    except RenderBusy:
+        image_buffer = None
+    if image_buffer is None:
+        await ctx.send(embed=embed)
+        return
+    filename = render_filename("packs")
+    embed.set_image(url=f"attachment://{filename}")
+    await ctx.send(embed=embed, file=discord.File(image_buffer, filename=filename))
 
-    # Add the card to the user's inventory
-    add_card_to_inventory(user_id, card_id)
-    conn.close()
 
-    embed = discord.Embed(title="You have received a card!", description=f"**{name}**")
-    embed.set_image(url=f"attachment://{image_path.split('/')[-1]}")
-    embed.add_field(name="Rarity", value=rarity, inline=True)
-    embed.add_field(name="Type", value=card_type, inline=True)
-    embed.add_field(name="Attack", value=attack, inline=True)
-    embed.add_field(name="Defense", value=defense, inline=True)
-    embed.add_field(name="Speed", value=speed, inline=True)
-    embed.add_field(name="Overall", value=overall, inline=True)
-    embed.add_field(name="League", value=league, inline=True)
-    embed.add_field(name="Nation", value=nation, inline=True)
-    embed.add_field(name="Copies", value=1, inline=True)
-    embed.set_footer(text=f"Requested by {ctx.author.name}", icon_url=ctx.author.display_avatar.url)
-    file = discord.File(image_path, filename=image_path.split('/')[-1])
-    await ctx.send(embed=embed, file=file)
-    return name
-
-async def open_hero_pack(ctx, user_id):
-    conn = sqlite3.connect('cards_game.db')
-    cursor = conn.cursor()
-
-    card = None
-    while True:
-        cursor.execute("SELECT card_id, name, card_rarity, card_type, attack, defense, speed, overall, league, nation, image_path FROM cards WHERE card_type = 'Hero' ORDER BY RANDOM() LIMIT 1")
-        card = cursor.fetchone()
-
-        if card and not is_duplicate_card(user_id, card[0]):
-            break
-
-    card_id, name, rarity, card_type, attack, defense, speed, overall, league, nation, image_path = card
-
-    # Increment the copies attribute of the chosen card
-    cursor.execute('UPDATE cards SET copies = copies + 1 WHERE card_id = ?', (card_id,))
-    conn.commit()
-
-    # Add the card to the user's inventory
-    add_card_to_inventory(user_id, card_id)
-    conn.close()
-
-    embed = discord.Embed(title="You have received a card!", description=f"**{name}**")
-    embed.set_image(url=f"attachment://{image_path.split('/')[-1]}")
-    embed.add_field(name="Rarity", value=rarity, inline=True)
-    embed.add_field(name="Type", value=card_type, inline=True)
-    embed.add_field(name="Attack", value=attack, inline=True)
-    embed.add_field(name="Defense", value=defense, inline=True)
-    embed.add_field(name="Speed", value=speed, inline=True)
-    embed.add_field(name="Overall", value=overall, inline=True)
-    embed.add_field(name="League", value=league, inline=True)
-    embed.add_field(name="Nation", value=nation, inline=True)
+async def send_pack_card(ctx, card):
+    embed = discord.Embed(title="You have received a card!", description=f"**{card.name}**")
+    embed.add_field(name="Rarity", value=card.card_rarity, inline=True)
+    embed.add_field(name="Type", value=card.card_type, inline=True)
+    embed.add_field(name="Attack", value=card.attack, inline=True)
+    embed.add_field(name="Defense", value=card.defense, inline=True)
+    embed.add_field(name="Speed", value=card.speed, inline=True)
+    embed.add_field(name="Overall", value=card.overall, inline=True)
+    embed.add_field(name="League", value=card.league, inline=True)
+    embed.add_field(name="Nation", value=card.nation, inline=True)
     embed.add_field(name="Copies", value=1, inline=True)
     embed.set_footer(text=f"Requested by {ctx.author.name}", icon_url=ctx.author.display_avatar.url)
-    file = discord.File(image_path, filename=image_path.split('/')[-1])
-    await ctx.send(embed=embed, file=file)
-    return name
-
-
-async def open_tester_pack(ctx, user_id):
-    conn = sqlite3.connect('cards_game.db')
-    cursor = conn.cursor()
-
-    icon_card = None
-    while True:
-        cursor.execute("SELECT card_id, name, card_rarity, card_type, attack, defense, speed, overall, league, nation, image_path FROM cards WHERE card_type = 'Icon' ORDER BY RANDOM() LIMIT 1")
-        icon_card = cursor.fetchone()
-
-        if icon_card and not is_duplicate_card(user_id, icon_card[0]):
-            break
-
-    high_overall_cards = []
-    while len(high_overall_cards) < 4:
-        card_types = ['Standard', 'Other']
-        probabilities = [0.9, 0.1]
-
-        chosen_type = random.choices(card_types, probabilities)[0]
-
-        if chosen_type == 'Standard':
-            cursor.execute("SELECT card_id, name, card_rarity, card_type, attack, defense, speed, overall, league, nation, image_path FROM cards WHERE card_type = 'Standard' AND overall > 85 ORDER BY RANDOM() LIMIT 1")
-        else:
-            cursor.execute(f"SELECT card_id, name, card_rarity, card_type, attack, defense, speed, overall, league, nation, image_path FROM cards WHERE card_type != 'Standard' AND card_type NOT IN ({_ndt_sql}) AND overall > 85 ORDER BY RANDOM() LIMIT 1", NON_DROPPABLE_TYPES)
-
-        card = cursor.fetchone()
-
-        if card and not is_duplicate_card(user_id, card[0]):
-            high_overall_cards.append(card)
-
-    icon_card_id, icon_name, icon_rarity, icon_card_type, icon_attack, icon_defense, icon_speed, icon_overall, icon_league, icon_nation, icon_image_path = icon_card
-
-    cursor.execute('UPDATE cards SET copies = copies + 1 WHERE card_id = ?', (icon_card_id,))
-    conn.commit()
-    add_card_to_inventory(user_id, icon_card_id)
-
-    for card in high_overall_cards:
-        card_id, name, rarity, card_type, attack, defense, speed, overall, league, nation, image_path = card
-        cursor.execute('UPDATE cards SET copies = copies + 1 WHERE card_id = ?', (card_id,))
-        conn.commit()
-        add_card_to_inventory(user_id, card_id)
-
-    conn.close()
-
-    embed = discord.Embed(title="You have received a Tester Pack!", description=f"**Icon Card: {icon_name}**")
-    embed.set_image(url=f"attachment://{icon_image_path.split('/')[-1]}")
-    embed.add_field(name="Rarity", value=icon_rarity, inline=True)
-    embed.add_field(name="Type", value=icon_card_type, inline=True)
-    embed.add_field(name="Attack", value=icon_attack, inline=True)
-    embed.add_field(name="Defense", value=icon_defense, inline=True)
-    embed.add_field(name="Speed", value=icon_speed, inline=True)
-    embed.add_field(name="Overall", value=icon_overall, inline=True)
-    embed.add_field(name="League", value=icon_league, inline=True)
-    embed.add_field(name="Nation", value=icon_nation, inline=True)
-    embed.add_field(name="Copies", value=1, inline=True)
-
-    card_names = [f"{card[0]}: {card[1]}" for card in high_overall_cards]
-    await ctx.send(embed=embed, file=discord.File(icon_image_path, filename=icon_image_path.split('/')[-1]))
-    await ctx.send(f"Other cards obtained: {', '.join(card_names)}")
-
-    return "5 Cards"
+    await send_card_image(ctx.send, card.image_path, embed)
 
 
 #---------------------------------DECKS-----
@@ -4702,23 +4149,29 @@ async def view_decks(ctx, user: discord.User = None):
     if user is None:
         user = ctx.author
 
-    ensure_player_exists(user.id, user.name)
-    cursor.execute('SELECT deck_name, cards FROM decks WHERE user_id = ?', (user.id,))
-    decks = cursor.fetchall()
+    await ensure_player_exists(user.id, user.name)
+
+    def load_decks(cursor):
+        cursor.execute('SELECT deck_name, cards FROM decks WHERE user_id = ?', (user.id,))
+        decks = []
+        for deck_name, cards in cursor.fetchall():
+            card_details = []
+            for card_id in cards.split(','):
+                cursor.execute('SELECT name FROM cards WHERE card_id = ?', (card_id,))
+                card_data = cursor.fetchone()
+                if card_data:
+                    card_details.append(card_data[0])
+            decks.append((deck_name, card_details))
+        return decks
+
+    decks = await run_db(load_decks)
 
     if not decks:
         await ctx.send(f"{user.name} has no decks.")
         return
 
     embed = discord.Embed(title=f"{user.name}'s Decks")
-    for deck_name, cards in decks:
-        card_ids = cards.split(',')
-        card_details = []
-        for card_id in card_ids:
-            cursor.execute('SELECT name FROM cards WHERE card_id = ?', (card_id,))
-            card_data = cursor.fetchone()
-            if card_data:
-                card_details.append(card_data[0])
+    for deck_name, card_details in decks:
         embed.add_field(name=deck_name, value=', '.join(card_details), inline=False)
 
     await ctx.send(embed=embed)
@@ -4732,19 +4185,18 @@ async def create_deck(ctx, deck_name: str, card1: int, card2: int, card3: int, c
         await ctx.send("A deck must contain exactly 5 cards.")
         return
 
-    ensure_player_exists(ctx.author.id, ctx.author.name)
+    await ensure_player_exists(ctx.author.id, ctx.author.name)
 
     # --- SECURITY CHECK: OWNERSHIP ---
     # We loop through every card ID to make sure the user actually owns it
     for card_id in card_ids:
-        cursor.execute('SELECT 1 FROM inventories WHERE user_id = ? AND card_id = ?', (ctx.author.id, card_id))
-        if cursor.fetchone() is None:
+        if not await check_card_ownership(ctx.author.id, card_id):
             await ctx.send(f"⛔ You cannot create this deck because you do not own the card with ID **{card_id}**.")
             return
 
     try:
         # If they own all cards, we proceed to create the deck
-        add_deck(ctx.author.id, deck_name, card_ids)
+        await add_deck(ctx.author.id, deck_name, card_ids)
         await ctx.send(f"✅ Deck '**{deck_name}**' created successfully!")
     except ValueError as e:
         await ctx.send(f"❌ Error: {str(e)}")
@@ -4758,39 +4210,42 @@ async def edit_deck(ctx, deck_name: str, card1: int, card2: int, card3: int, car
         await ctx.send("A deck must contain exactly 5 cards.")
         return
 
-    ensure_player_exists(ctx.author.id, ctx.author.name)
+    await ensure_player_exists(ctx.author.id, ctx.author.name)
 
-    # 1. Check if deck exists
-    cursor.execute('SELECT deck_name FROM decks WHERE user_id = ? AND deck_name = ?', (ctx.author.id, deck_name))
-    if cursor.fetchone() is None:
-        await ctx.send(f"❌ No deck found with the name '**{deck_name}**'.")
-        return
+    def validate_deck(cursor):
+        # 1. Check if deck exists
+        cursor.execute('SELECT deck_name FROM decks WHERE user_id = ? AND deck_name = ?', (ctx.author.id, deck_name))
+        if cursor.fetchone() is None:
+            return f"❌ No deck found with the name '**{deck_name}**'."
 
-    # 2. Check Ownership & 3. Check for Duplicate Players
-    player_ids_in_deck = set()
+        # 2. Check Ownership & 3. Check for Duplicate Players
+        player_ids_in_deck = set()
 
-    for card_id in card_ids:
-        # Check Ownership
-        cursor.execute('SELECT 1 FROM inventories WHERE user_id = ? AND card_id = ?', (ctx.author.id, card_id))
-        if cursor.fetchone() is None:
-            await ctx.send(f"⛔ You cannot use ID **{card_id}** because you do not own it.")
-            return
+        for card_id in card_ids:
+            # Check Ownership
+            cursor.execute('SELECT 1 FROM inventories WHERE user_id = ? AND card_id = ?', (ctx.author.id, card_id))
+            if cursor.fetchone() is None:
+                return f"⛔ You cannot use ID **{card_id}** because you do not own it."
+
+            # Check for Duplicate Player IDs (e.g. 2 different cards of the same player)
+            cursor.execute('SELECT player_id, name FROM cards WHERE card_id = ?', (card_id,))
+            card_data = cursor.fetchone()
+            if card_data:
+                player_id, player_name = card_data
+                if player_id in player_ids_in_deck:
+                    return f"⛔ Invalid Deck: You cannot have **{player_name}** twice in the same deck!"
+                player_ids_in_deck.add(player_id)
+        return None
 
-        # Check for Duplicate Player IDs (e.g. 2 different cards of the same player)
-        cursor.execute('SELECT player_id, name FROM cards WHERE card_id = ?', (card_id,))
-        card_data = cursor.fetchone()
-        if card_data:
-            player_id, player_name = card_data
-            if player_id in player_ids_in_deck:
-                 await ctx.send(f"⛔ Invalid Deck: You cannot have **{player_name}** twice in the same deck!")
-                 return
-            player_ids_in_deck.add(player_id)
+    error = await run_db(validate_deck)
+    if error:
+        await ctx.send(error)
+        return
 
     # 4. Save Changes
     try:
         cards_str = ','.join(map(str, card_ids))
-        cursor.execute('UPDATE decks SET cards = ? WHERE user_id = ? AND deck_name = ?', (cards_str, ctx.author.id, deck_name))
-        conn.commit()
+        await execute('UPDATE decks SET cards = ? WHERE user_id = ? AND deck_name = ?', (cards_str, ctx.author.id, deck_name))
         await ctx.send(f"✅ Deck '**{deck_name}**' updated successfully!")
     except Exception as e:
         await ctx.send(f"❌ Error updating deck: {e}")
@@ -4801,79 +4256,16 @@ async def edit_deck(ctx, deck_name: str, card1: int, card2: int, card3: int, car
 
 #---------------------DECK VIEWER------------------------
 
-def generate_lineup_image(deck_cards):
-    # 1. Load Background
-    try:
-        bg = Image.open("pitch.png").convert("RGBA")
-    except FileNotFoundError:
-        bg = Image.new('RGBA', (1080, 1350), (0, 128, 0, 255))
-
-    # --- FORCE RESIZE: Make the background HD (1080x1350) ---
-    # This ensures the output is always big, even if pitch.png is small
-    bg = bg.resize((1080, 1350), Image.Resampling.LANCZOS)
-    bg_width, bg_height = bg.size
-
-    # ---------------- SORTING LOGIC ----------------
-    pool = deck_cards[:]
-    
-    # Sort for 2-1-2 Formation
-    pool.sort(key=lambda x: x.attack, reverse=True)
-    attackers = pool[:2]
-    for card in attackers: pool.remove(card)
-
-    pool.sort(key=lambda x: x.defense, reverse=True)
-    defenders = pool[:2]
-    for card in defenders: pool.remove(card)
-
-    midfielder = pool[0]
-    sorted_lineup = [attackers[0], attackers[1], midfielder, defenders[0], defenders[1]]
-
-    # ---------------- POSITIONING (2-1-2) ----------------
-    positions = [
-        (0.28, 0.20), # Attacker Left 
-        (0.72, 0.20), # Attacker Right 
-        (0.50, 0.50), # Midfielder 
-        (0.28, 0.80), # Defender Left 
-        (0.72, 0.80)  # Defender Right 
-    ]
-
-    # ---------------- DRAWING ----------------
-    for i, card in enumerate(sorted_lineup):
-        try:
-            card_img = Image.open(card.image_path).convert("RGBA")
-            
-            # Card size relative to the NEW huge background (35% width)
-            target_width = int(bg_width * 0.35) 
-            aspect_ratio = card_img.height / card_img.width
-            target_height = int(target_width * aspect_ratio)
-            
-            card_img = card_img.resize((target_width, target_height), Image.Resampling.LANCZOS)
-
-            pos_x_percent, pos_y_percent = positions[i]
-            x = int((bg_width * pos_x_percent) - (target_width / 2))
-            y = int((bg_height * pos_y_percent) - (target_height / 2))
-
-            bg.paste(card_img, (x, y), card_img)
-
-        except Exception as e:
-            print(f"Error loading image for card {card.name}: {e}")
-            continue
-
-    buffer = io.BytesIO()
-    bg.save(buffer, format="PNG")
-    buffer.seek(0)
-    return buffer
-
 @bot.hybrid_command(name='view_deck', description="Visualize a specific deck (Optional: @user to view theirs)")
 async def view_deck(ctx, deck_name: str, user: discord.User = None):
     # 1. Determine who we are looking at
     target_user = user or ctx.author
 
     # 2. Ensure they exist in DB (just in case)
-    ensure_player_exists(target_user.id, target_user.name)
+    await ensure_player_exists(target_user.id, target_user.name)
     
     # 3. Get the deck using TARGET's ID
-    deck_cards = get_deck(target_user.id, deck_name)
+    deck_cards = await get_deck(target_user.id, deck_name)
     
     if deck_cards is None:
         await ctx.send(f"❌ Deck '**{deck_name}**' not found for **{target_user.name}**.")
@@ -4885,8 +4277,15 @@ async def view_deck(ctx, deck_name: str, user: discord.User = None):
 
     # 4. Generate Image
     # Note: The generation logic is the same, it just processes the cards we found
-    image_buffer = await bot.loop.run_in_executor(None, generate_lineup_image, deck_cards)
-    file = discord.File(fp=image_buffer, filename=f"{deck_name}.png")
+    try:
+        image_buffer = await render_lineup(deck_cards)
+    except RenderBusy as e:
+        await ctx.send(f"⏳ {e}")
+        return
+    if not image_buffer:
+        await ctx.send("❌ Error generating lineup image.")
+        return
+    file = discord.File(fp=image_buffer, filename=render_filename(deck_name))
 
     # 5. Generate Text
     description_text = ""
@@ -5064,7 +4463,7 @@ class BuilderSaveButton(discord.ui.Button):
             
             # Note: add_deck helper might raise errors if deck name exists
             # We should probably check if deck exists first or handle the error
-            add_deck(interaction.user.id, view.deck_name, view.selected_ids)
+            await add_deck(interaction.user.id, view.deck_name, view.selected_ids)
             
             embed = discord.Embed(title="✅ Deck Saved!", description=f"Deck **{view.deck_name}** has been created successfully.", color=discord.Color.green())
             await interaction.response.edit_message(embed=embed, view=None)
@@ -5089,19 +4488,14 @@ class BuilderCancelButton(discord.ui.Button):
 
 @bot.hybrid_command(name='build_deck', description="Interactively build a deck")
 async def build_deck(ctx, deck_name: str):
-    ensure_player_exists(ctx.author.id, ctx.author.name)
+    await ensure_player_exists(ctx.author.id, ctx.author.name)
     
     # 1. Check if deck name already exists to save time
-    conn = sqlite3.connect('cards_game.db')
-    cursor = conn.cursor()
-    cursor.execute('SELECT 1 FROM decks WHERE user_id = ? AND deck_name = ?', (ctx.author.id, deck_name))
-    if cursor.fetchone():
-        conn.close()
+    if await fetchone('SELECT 1 FROM decks WHERE user_id = ? AND deck_name = ?', (ctx.author.id, deck_name)):
         return await ctx.send(f"❌ You already have a deck named **{deck_name}**. Please choose a different name.")
-    conn.close()
 
     # 2. Get Inventory
-    inventory, editions = get_player_inventory(ctx.author.id)
+    inventory, editions = await get_player_inventory(ctx.author.id)
     if not inventory:
         return await ctx.send("You have no cards to build a deck with!")
 
@@ -5134,22 +4528,13 @@ async def coins(ctx, user: discord.User = None):
     if user is None:
         user = ctx.author
 
-    ensure_player_exists(user.id, user.name)
-    cursor.execute('SELECT coins FROM players WHERE user_id = ?', (user.id,))
-    coins = cursor.fetchone()[0]
+    await ensure_player_exists(user.id, user.name)
+    coins = (await fetchone('SELECT coins FROM players WHERE user_id = ?', (user.id,)))[0]
 
     embed = discord.Embed(title=f"{user.name}'s Coins", description=f'''{user.mention} has {coins} coins.
     Earn more coins by selling cards or battling other players''', color=discord.Color.gold())
     await ctx.send(embed=embed)
 
-def add_winner_coins(user_id):
-    cursor.execute('UPDATE players SET coins = coins + 200 WHERE user_id = ?', (user_id,))
-    conn.commit()
-
-def add_loser_coins(user_id):
-    cursor.execute('UPDATE players SET coins = coins + 100 WHERE user_id = ?', (user_id,))
-    conn.commit()
-
 
 #-----------------------------------CATALOG VIEWER----------------------------------
 
@@ -5328,22 +4713,16 @@ class WishlistView(discord.ui.View):
 @bot.hybrid_command(name='wishlists', description="View a player's wishlist")
 async def wishlists(ctx, user: discord.User = None):
     target_user = user or ctx.author
-    ensure_player_exists(target_user.id, target_user.name)
+    await ensure_player_exists(target_user.id, target_user.name)
 
-    conn = sqlite3.connect('cards_game.db')
-    cursor = conn.cursor()
-    
     # --- FIX: Changed c.card_rarity to c.card_type ---
-    cursor.execute('''
+    rows = await fetchall('''
         SELECT c.name, c.card_id, c.overall, c.card_type 
         FROM wishlists w
         JOIN cards c ON w.card_id = c.card_id
         WHERE w.user_id = ?
         ORDER BY c.overall DESC
     ''', (target_user.id,))
-    
-    rows = cursor.fetchall()
-    conn.close()
 
     if not rows:
         msg = "You have no cards in your wishlist." if target_user == ctx.author else f"**{target_user.name}** has no cards in their wishlist."
@@ -5357,16 +4736,13 @@ async def wishlists(ctx, user: discord.User = None):
 
 @bot.hybrid_command(name='wishlist', aliases=['wl'], description="Add or remove a card from your wishlist")
 async def wishlist(ctx, card_id: int):
-    ensure_player_exists(ctx.author.id, ctx.author.name)
+    await ensure_player_exists(ctx.author.id, ctx.author.name)
     
     card = get_card_by_id(card_id)
     if not card:
         return await ctx.send(f"❌ Card ID `{card_id}` not found.")
 
-    conn = sqlite3.connect('cards_game.db')
-    cursor = conn.cursor()
-
-    try:
+    def toggle_wishlist(cursor):
         # Check if already wishlisted
         cursor.execute('SELECT 1 FROM wishlists WHERE user_id = ? AND card_id = ?', (ctx.author.id, card_id))
         exists = cursor.fetchone()
@@ -5375,22 +4751,25 @@ async def wishlist(ctx, card_id: int):
             # REMOVE
             cursor.execute('DELETE FROM wishlists WHERE user_id = ? AND card_id = ?', (ctx.author.id, card_id))
             cursor.execute('UPDATE cards SET wishlist_count = MAX(0, wishlist_count - 1) WHERE card_id = ?', (card_id,))
-            action_text = "removed from"
-            emoji = "💔"
-            color = discord.Color.red()
         else:
             # ADD
             cursor.execute('INSERT INTO wishlists (user_id, card_id) VALUES (?, ?)', (ctx.author.id, card_id))
             cursor.execute('UPDATE cards SET wishlist_count = wishlist_count + 1 WHERE card_id = ?', (card_id,))
-            action_text = "added to"
-            emoji = "❤️"
-            color = discord.Color.magenta()
 
-        conn.commit()
-        
         # Get updated count
         cursor.execute('SELECT wishlist_count FROM cards WHERE card_id = ?', (card_id,))
-        new_count = cursor.fetchone()[0]
+        return exists is None, cursor.fetchone()[0]
+
+    try:
+        added, new_count = await run_write(toggle_wishlist)
+        if added:
+            action_text = "added to"
+            emoji = "❤️"
+            color = discord.Color.magenta()
+        else:
+            action_text = "removed from"
+            emoji = "💔"
+            color = discord.Color.red()
 
         embed = discord.Embed(
             description=f"{emoji} **{card.name}** has been {action_text} your wishlist.\nGlobal Wishlists: **{new_count}**",
@@ -5398,16 +4777,12 @@ async def wishlist(ctx, card_id: int):
         )
         
         # --- FIX: Changed set_thumbnail to set_image ---
-        # This moves the image from the top-right corner to the bottom (Full Width)
-        embed.set_image(url=f"attachment://{card.image_path.split('/')[-1]}")
-        
-        await ctx.send(embed=embed, file=discord.File(card.image_path))
+        # send_card_image shows the card as the embed image (Full Width), not a top-right thumbnail
+        await send_card_image(ctx.send, card.image_path, embed)
 
     except Exception as e:
         logger.error(f"Wishlist Error: {e}")
         await ctx.send("An error occurred updating your wishlist.")
-    finally:
-        conn.close()
 
 
 #-----------------------------------ADMIN COMMANDS----------------------------------
@@ -5423,14 +4798,13 @@ async def give_coins(ctx, user_id: int, amount: int):
         await ctx.send("Amount must be positive.")
         return
 
-    cursor.execute('SELECT name FROM players WHERE user_id = ?', (user_id,))
-    user_name = cursor.fetchone()
-    if not user_name:
+    def credit_coins(cursor):
+        cursor.execute('UPDATE players SET coins = coins + ? WHERE user_id = ?', (amount, user_id))
+        return cursor.rowcount > 0
+
+    if not await run_write(credit_coins):
         await ctx.send("User not found.")
         return
-
-    cursor.execute('UPDATE players SET coins = coins + ? WHERE user_id = ?', (amount, user_id))
-    conn.commit()
     
     await ctx.send(f"Gave {amount} coins to user ID {user_id}.")
     logger.info(f"Admin {ctx.author.name} gave {amount} coins to user ID {user_id}.")
@@ -5438,6 +4812,23 @@ async def give_coins(ctx, user_id: int, amount: int):
 
 
 
+@bot.command(name='build_atlas')
+async def build_atlas(ctx):
+    if ctx.author.id not in ADMIN_IDS:
+        return await ctx.send("You do not have permission to use this command.")
+
+    # Packs every card's lineup thumbnail into the memory-mapped atlas the render workers blit from
+    await ctx.send("🛠️ Building the lineup atlas...")
+    rows = await run_db(fetch_atlas_cards)
+    try:
+        packed, skipped = await asyncio.get_running_loop().run_in_executor(None, build_lineup_atlas, rows)
+    except ValueError as e:
+        return await ctx.send(f"❌ {e}")
+    await ctx.send(f"✅ Lineup atlas built: {packed} cards ({skipped} skipped).")
+    logger.info(f"Admin {ctx.author.name} rebuilt the lineup atlas ({packed} cards).")
+
+
+
 @bot.command(name='give_card')
 async def give_player(ctx, user_id: int, card_id: int):
     if ctx.author.id not in ADMIN_IDS:
@@ -5448,17 +4839,25 @@ async def give_player(ctx, user_id: int, card_id: int):
         await ctx.send("Card not found.")
         return
 
-    cursor.execute('SELECT name FROM players WHERE user_id = ?', (user_id,))
-    user_name = cursor.fetchone()
-    if not user_name:
-        await ctx.send("User not found.")
+    def grant_card(cursor):
+        cursor.execute('SELECT 1 FROM players WHERE user_id = ?', (user_id,))
+        if not cursor.fetchone():
+            return "User not found."
+        cursor.execute('SELECT 1 FROM inventories WHERE user_id = ? AND card_id = ?', (user_id, card_id))
+        if cursor.fetchone():
+            return f"User ID {user_id} already owns this card."
+
+        cursor.execute('UPDATE cards SET copies = copies + 1 WHERE card_id = ?', (card_id,))
+        cursor.execute('SELECT copies FROM cards WHERE card_id = ?', (card_id,))
+        edition = cursor.fetchone()[0]
+        cursor.execute('INSERT INTO inventories (user_id, card_id, edition) VALUES (?, ?, ?)', (user_id, card_id, edition))
+        return None
+
+    error = await run_write(grant_card)
+    if error:
+        await ctx.send(error)
         return
     
-    cursor.execute('UPDATE cards SET copies = copies + 1 WHERE card_id = ?', (card_id,))
-    add_card_to_inventory(user_id, card_id)
-   
-    conn.commit()
-    
     await ctx.send(f"Gave {card.name} to user ID {user_id}.")
     logger.info(f"Admin {ctx.author.name} gave card {card_id} to user ID {user_id}.")
 
@@ -5470,12 +4869,11 @@ async def remove_player(ctx, user_id: int, card_id: int):
         await ctx.send("You do not have permission to use this command.")
         return
 
-    if not check_card_ownership(user_id, card_id):
+    if not await check_card_ownership(user_id, card_id):
         await ctx.send(f"User ID {user_id} does not own this card.")
         return
     
-    remove_card_from_inventory(user_id, card_id)
-    conn.commit()
+    await remove_card_from_inventory(user_id, card_id)
     
     await ctx.send(f"Removed card {card_id} from user ID {user_id}.")
     logger.info(f"Admin {ctx.author.name} removed card {card_id} from user ID {user_id}.")
@@ -5519,11 +4917,17 @@ def _json_err(msg, status=400):
     )
 
 
-def _db_connect():
-    """Open a short-lived SQLite connection (same file the bot uses)."""
-    c = sqlite3.connect('cards_game.db')
-    c.row_factory = sqlite3.Row
-    return c
+def _fetch_dicts(cursor, query, params=()):
+    """Run a query on a pooled reader and return its rows as dicts."""
+    cursor.execute(query, params)
+    columns = [desc[0] for desc in cursor.description]
+    return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+
+async def _refresh_catalog(*card_ids):
+    """Reload edited cards into the in-memory catalog."""
+    card_ids = [int(card_id) for card_id in card_ids]
+    card_catalog.update(card_ids, await run_db(fetch_card_rows, card_ids))
 
 
 # ── /api/ping ────────────────────────────────────────────────────────────────
@@ -5537,10 +4941,9 @@ async def api_ping(request):
 async def api_tables(request):
     if not _api_auth(request):
         return _json_err('Unauthorized', 401)
-    with _db_connect() as c:
-        rows = c.execute(
-            "SELECT name FROM sqlite_master WHERE type='table' ORDER BY name"
-        ).fetchall()
+    rows = await run_db(
+        _fetch_dicts, "SELECT name FROM sqlite_master WHERE type='table' ORDER BY name"
+    )
     return _json_ok({'tables': [r['name'] for r in rows]})
 
 
@@ -5553,9 +4956,8 @@ async def api_table_rows(request):
     if not table.replace('_', '').isalnum():
         return _json_err('Invalid table name')
     try:
-        with _db_connect() as c:
-            rows = c.execute(f'SELECT rowid, * FROM "{table}"').fetchall()
-        return _json_ok({'rows': [dict(r) for r in rows]})
+        rows = await run_db(_fetch_dicts, f'SELECT rowid, * FROM "{table}"')
+        return _json_ok({'rows': rows})
     except Exception as e:
         return _json_err(str(e))
 
@@ -5573,13 +4975,18 @@ async def api_table_insert(request):
         placeholders = ', '.join('?' for _ in cols)
         col_names = ', '.join(f'"{c}"' for c in cols)
         values = [data[c] for c in cols]
-        with _db_connect() as c:
-            cur = c.execute(
+
+        def insert_row(cursor):
+            cursor.execute(
                 f'INSERT INTO "{table}" ({col_names}) VALUES ({placeholders})',
                 values,
             )
-            c.commit()
-            return _json_ok({'inserted_id': cur.lastrowid})
+            return cursor.lastrowid
+
+        inserted_id = await run_write(insert_row)
+        if table == 'cards':
+            await _refresh_catalog(inserted_id)
+        return _json_ok({'inserted_id': inserted_id})
     except Exception as e:
         return _json_err(str(e))
 
@@ -5598,12 +5005,12 @@ async def api_table_update(request):
         data = await request.json()
         set_clause = ', '.join(f'"{k}" = ?' for k in data)
         values = list(data.values()) + [int(rowid)]
-        with _db_connect() as c:
-            c.execute(
-                f'UPDATE "{table}" SET {set_clause} WHERE rowid = ?',
-                values,
-            )
-            c.commit()
+        await execute(
+            f'UPDATE "{table}" SET {set_clause} WHERE rowid = ?',
+            values,
+        )
+        if table == 'cards':
+            await _refresh_catalog(rowid)
         return _json_ok({'updated': True})
     except Exception as e:
         return _json_err(str(e))
@@ -5620,9 +5027,9 @@ async def api_table_delete(request):
     if not rowid.isdigit():
         return _json_err('Invalid rowid')
     try:
-        with _db_connect() as c:
-            c.execute(f'DELETE FROM "{table}" WHERE rowid = ?', (int(rowid),))
-            c.commit()
+        await execute(f'DELETE FROM "{table}" WHERE rowid = ?', (int(rowid),))
+        if table == 'cards':
+            await _refresh_catalog(rowid)
         return _json_ok({'deleted': True})
     except Exception as e:
         return _json_err(str(e))
@@ -5653,4 +5060,8 @@ async def _start_dashboard_api():
 
 #---------------------RUN BOT------------------------
 
-bot.run(TOKEN)
+try:
+    bot.run(TOKEN)
+finally:
+    render_pool.close()
+    close_pool()
@@ -8,6 +8,9 @@ import os
 import logging
 from dotenv import load_dotenv
 
+from utils.database import close_pool
+from utils.render_pool import render_pool
+
 # Load environment variables
 load_dotenv()
 
@@ -81,6 +84,10 @@ async def on_command_error(ctx, error):
 # Run the bot
 if __name__ == '__main__':
     if TOKEN:
-        bot.run(TOKEN)
+        try:
+            bot.run(TOKEN)
+        finally:
+            render_pool.close()
+            close_pool()
     else:
         logger.error("No DISCORD_TOKEN found in environment variables!")
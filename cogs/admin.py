@@ -4,14 +4,18 @@ Admin-only commands for managing users, cards, and bot operations
 """
 import discord
 from discord.ext import commands
+import asyncio
 import logging
 from datetime import datetime, timedelta
 
 from utils.database import (
-    get_connection, ADMIN_IDS, 
+    run_db, fetchone, execute, ADMIN_IDS,
     add_card_to_inventory, remove_card_from_inventory, check_card_ownership
 )
 from utils.models import get_card_by_id
+from utils.catalog import reload_catalog as reload_card_catalog
+from utils.render_pool import render_pool
+from utils.atlas import build_lineup_atlas, fetch_atlas_cards
 
 logger = logging.getLogger(__name__)
 
@@ -38,19 +42,12 @@ class Admin(commands.Cog):
             await ctx.send("Amount must be positive.")
             return
 
-        conn = get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('SELECT name FROM players WHERE user_id = ?', (user_id,))
-        user_name = cursor.fetchone()
+        user_name = await fetchone('SELECT name FROM players WHERE user_id = ?', (user_id,))
         if not user_name:
-            conn.close()
             await ctx.send("User not found.")
             return
 
-        cursor.execute('UPDATE players SET coins = coins + ? WHERE user_id = ?', (amount, user_id))
-        conn.commit()
-        conn.close()
+        await execute('UPDATE players SET coins = coins + ? WHERE user_id = ?', (amount, user_id))
         
         await ctx.send(f"Gave {amount} coins to user ID {user_id}.")
         logger.info(f"Admin {ctx.author.name} gave {amount} coins to user ID {user_id}.")
@@ -63,27 +60,20 @@ class Admin(commands.Cog):
         if ctx.author.id not in ADMIN_IDS:
             return await ctx.send("You do not have permission to use this command.")
 
-        card = get_card_by_id(card_id)
+        card = await get_card_by_id(card_id)
         if not card:
             await ctx.send("Card not found.")
             return
 
-        conn = get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('SELECT name FROM players WHERE user_id = ?', (user_id,))
-        user_name = cursor.fetchone()
+        user_name = await fetchone('SELECT name FROM players WHERE user_id = ?', (user_id,))
         if not user_name:
-            conn.close()
             await ctx.send("User not found.")
             return
         
-        cursor.execute('UPDATE cards SET copies = copies + 1 WHERE card_id = ?', (card_id,))
-        conn.commit()
-        conn.close()
+        await execute('UPDATE cards SET copies = copies + 1 WHERE card_id = ?', (card_id,))
         
         try:
-            add_card_to_inventory(user_id, card_id)
+            await add_card_to_inventory(user_id, card_id)
         except ValueError:
             await ctx.send("User already owns this card.")
             return
@@ -100,11 +90,11 @@ class Admin(commands.Cog):
             await ctx.send("You do not have permission to use this command.")
             return
 
-        if not check_card_ownership(user_id, card_id):
+        if not await check_card_ownership(user_id, card_id):
             await ctx.send(f"User ID {user_id} does not own this card.")
             return
         
-        remove_card_from_inventory(user_id, card_id)
+        await remove_card_from_inventory(user_id, card_id)
         
         await ctx.send(f"Removed card {card_id} from user ID {user_id}.")
         logger.info(f"Admin {ctx.author.name} removed card {card_id} from user ID {user_id}.")
@@ -124,6 +114,55 @@ class Admin(commands.Cog):
         except Exception as e:
             await ctx.send(f"❌ Sync failed: {e}")
 
+    #---------------------------------------------------------RELOAD CATALOG-------------------------------------------------------------------------------------
+
+    @commands.command(name='reload_catalog')
+    async def reload_catalog(self, ctx):
+        """Reload the in-memory card catalog from the database (Admin only)"""
+        if ctx.author.id not in ADMIN_IDS:
+            return await ctx.send("You do not have permission to use this command.")
+
+        catalog = await reload_card_catalog()
+        await ctx.send(f"Reloaded the card catalog ({len(catalog)} cards).")
+        logger.info(f"Admin {ctx.author.name} reloaded the card catalog.")
+
+    #---------------------------------------------------------RENDER STATS-------------------------------------------------------------------------------------
+
+    @commands.command(name='render_stats')
+    async def render_stats(self, ctx):
+        """Show render pool and render cache metrics (Admin only)"""
+        if ctx.author.id not in ADMIN_IDS:
+            return await ctx.send("You do not have permission to use this command.")
+
+        stats = render_pool.stats()
+        embed = discord.Embed(title="🖼️ Render Pool", color=discord.Color.blue())
+        embed.add_field(name="Workers", value=f"{render_pool.workers} (timeout {render_pool.timeout:g}s)", inline=True)
+        embed.add_field(name="Queue", value=f"{stats['pending']} pending / {render_pool.max_pending} max (peak {stats['max_pending']})", inline=True)
+        embed.add_field(name="Jobs", value=(
+            f"Submitted: {stats['submitted']}\n"
+            f"Cache hits: {stats['cache_hits']} ({stats['cache_hit_rate']:.0%})\n"
+            f"Rendered: {stats['completed']} (avg {stats['avg_render_ms']:.0f} ms)\n"
+            f"Failed: {stats['failed']} | Timed out: {stats['timeouts']} | Rejected: {stats['rejected']}"
+        ), inline=False)
+        await ctx.send(embed=embed)
+
+    #---------------------------------------------------------BUILD ATLAS-------------------------------------------------------------------------------------
+
+    @commands.command(name='build_atlas')
+    async def build_atlas(self, ctx):
+        """Rebuild the lineup sprite atlas from every card image (Admin only)"""
+        if ctx.author.id not in ADMIN_IDS:
+            return await ctx.send("You do not have permission to use this command.")
+
+        await ctx.send("🛠️ Building the lineup atlas...")
+        rows = await run_db(fetch_atlas_cards)
+        try:
+            packed, skipped = await asyncio.get_running_loop().run_in_executor(None, build_lineup_atlas, rows)
+        except ValueError as e:
+            return await ctx.send(f"❌ {e}")
+        await ctx.send(f"✅ Lineup atlas built: {packed} cards ({skipped} skipped).")
+        logger.info(f"Admin {ctx.author.name} rebuilt the lineup atlas ({packed} cards).")
+
     #---------------------------------------------------------TEST STREAK-------------------------------------------------------------------------------------
 
     @commands.hybrid_command(name='teststreak', description="[ADMIN] Set your daily streak for testing")
@@ -137,18 +176,13 @@ class Admin(commands.Cog):
             await ctx.send("❌ Streak must be 0 or higher.", ephemeral=True)
             return
         
-        conn = get_connection()
-        cursor = conn.cursor()
-        
         # Set streak and set last_daily_claim to YESTERDAY so claiming today will continue the streak
         yesterday = (datetime.now() - timedelta(days=1)).isoformat()
-        cursor.execute('''
+        await execute('''
             UPDATE players 
             SET daily_streak = ?, last_daily_claim = ? 
             WHERE user_id = ?
         ''', (streak, yesterday, ctx.author.id))
-        conn.commit()
-        conn.close()
         
         # Preview what they'll get next claim
         next_streak = streak + 1
@@ -4,17 +4,19 @@ Battle system, deck management, and deck builder
 """
 import discord
 from discord.ext import commands
-import sqlite3
 import logging
-import io
 
-try:
-    from PIL import Image
-except ImportError:
-    Image = None
-
-from utils.database import get_connection, ensure_player_exists, get_player_inventory
-from utils.models import Card, get_card_by_id
+from utils.database import run_db, run_write, fetchone, fetchall, execute, ensure_player_exists, get_player_inventory
+from utils.models import Card
+from utils.battle_stats import BattleLedger, recover_interrupted_battles, WIN_COINS, LOSS_COINS, DRAW_COINS
+from utils.battle_engine import match_over, resolve_round, seat_tactics
+from utils.battle_ai import BattleAI, practice_deck
+from utils.battle_store import save_battle, forget_battle, restore_battles, in_live_battle
+from utils.matchmaking import QueueEntry, QUEUE_TIMEOUT_MINUTES, match_channel, matchmaking
+from utils.catalog import get_catalog
+from utils.pack_definitions import NON_DROPPABLE_TYPES
+from utils.render_pool import RenderBusy, render_pool, render_lineup
+from utils.rendering import render_filename
 
 logger = logging.getLogger(__name__)
 
@@ -22,107 +24,58 @@ logger = logging.getLogger(__name__)
 #---------------------------------------------------------HELPER FUNCTIONS-------------------------------------------------------------------------------------
 
 
-def add_deck(user_id, deck_name, card_ids):
+async def add_deck(user_id, deck_name, card_ids):
     """Add a deck to the database"""
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute('SELECT deck_name FROM decks WHERE user_id = ? AND deck_name = ?', (user_id, deck_name))
-    if cursor.fetchone():
-        conn.close()
-        raise ValueError(f"Deck '{deck_name}' already exists.")
-    
-    cards_str = ','.join(map(str, card_ids))
-    cursor.execute('INSERT INTO decks (user_id, deck_name, cards) VALUES (?, ?, ?)', (user_id, deck_name, cards_str))
-    conn.commit()
-    conn.close()
+    def _add_deck(cursor):
+        cursor.execute('SELECT deck_name FROM decks WHERE user_id = ? AND deck_name = ?', (user_id, deck_name))
+        if cursor.fetchone():
+            raise ValueError(f"Deck '{deck_name}' already exists.")
+        
+        cards_str = ','.join(map(str, card_ids))
+        cursor.execute('INSERT INTO decks (user_id, deck_name, cards) VALUES (?, ?, ?)', (user_id, deck_name, cards_str))
+    await run_write(_add_deck)
 
 
-def get_deck(user_id, deck_name):
+async def get_deck(user_id, deck_name):
     """Get deck cards by name"""
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute('SELECT cards FROM decks WHERE user_id = ? AND deck_name = ?', (user_id, deck_name))
-    result = cursor.fetchone()
-    
-    if result is None:
-        conn.close()
-        return None
-    
-    card_ids = list(map(int, result[0].split(',')))
-    cards = []
-    for card_id in card_ids:
-        cursor.execute('SELECT * FROM cards WHERE card_id = ?', (card_id,))
-        card_data = cursor.fetchone()
-        if card_data:
-            cards.append(Card(*card_data[:14]))
-    
-    conn.close()
-    return cards
+    def _get_deck(cursor):
+        cursor.execute('SELECT cards FROM decks WHERE user_id = ? AND deck_name = ?', (user_id, deck_name))
+        result = cursor.fetchone()
+        
+        if result is None:
+            return None
+        
+        card_ids = list(map(int, result[0].split(',')))
+        cards = []
+        for card_id in card_ids:
+            cursor.execute('SELECT * FROM cards WHERE card_id = ?', (card_id,))
+            card_data = cursor.fetchone()
+            if card_data:
+                cards.append(Card(*card_data[:14]))
+        return cards
+    return await run_db(_get_deck)
 
 
-def generate_lineup_image(deck_cards):
-    """Generate a visual lineup image for a deck"""
-    if Image is None:
-        return None
-    
-    try:
-        bg = Image.open("pitch.png").convert("RGBA")
-    except FileNotFoundError:
-        bg = Image.new('RGBA', (1080, 1350), (0, 128, 0, 255))
-
-    bg = bg.resize((1080, 1350), Image.Resampling.LANCZOS)
-    bg_width, bg_height = bg.size
-
-    # Sort for 2-1-2 Formation
-    pool = deck_cards[:]
-    pool.sort(key=lambda x: x.attack, reverse=True)
-    attackers = pool[:2]
-    for card in attackers: pool.remove(card)
-
-    pool.sort(key=lambda x: x.defense, reverse=True)
-    defenders = pool[:2]
-    for card in defenders: pool.remove(card)
-
-    midfielder = pool[0] if pool else None
-    if midfielder:
-        sorted_lineup = [attackers[0], attackers[1], midfielder, defenders[0], defenders[1]]
-    else:
-        sorted_lineup = deck_cards[:5]
-
-    positions = [
-        (0.28, 0.20), (0.72, 0.20),  # Attackers
-        (0.50, 0.50),                 # Midfielder
-        (0.28, 0.80), (0.72, 0.80)   # Defenders
-    ]
-
-    for i, card in enumerate(sorted_lineup):
-        try:
-            card_img = Image.open(card.image_path).convert("RGBA")
-            target_width = int(bg_width * 0.35)
-            aspect_ratio = card_img.height / card_img.width
-            target_height = int(target_width * aspect_ratio)
-            card_img = card_img.resize((target_width, target_height), Image.Resampling.LANCZOS)
-
-            pos_x_percent, pos_y_percent = positions[i]
-            x = int((bg_width * pos_x_percent) - (target_width / 2))
-            y = int((bg_height * pos_y_percent) - (target_height / 2))
-            bg.paste(card_img, (x, y), card_img)
-        except Exception as e:
-            logger.error(f"Error loading image for card {card.name}: {e}")
-            continue
+def find_unowned_card(cursor, user_id, card_ids):
+    """Return the first card id the user doesn't own, or None (runs inside a DB transaction)"""
+    for card_id in card_ids:
+        cursor.execute('SELECT 1 FROM inventories WHERE user_id = ? AND card_id = ?', (user_id, card_id))
+        if cursor.fetchone() is None:
+            return card_id
+    return None
+
 
-    buffer = io.BytesIO()
-    bg.save(buffer, format="PNG")
-    buffer.seek(0)
-    return buffer
+async def get_deck_names(user_id):
+    """Get the names of a user's decks"""
+    rows = await fetchall('SELECT deck_name FROM decks WHERE user_id = ?', (user_id,))
+    return [row[0] for row in rows]
 
 
 #---------------------------------------------------------BATTLE CLASS-------------------------------------------------------------------------------------
 
 
 class Battle:
-    def __init__(self, ctx, player1, player2):
+    def __init__(self, ctx, player1, player2, practice=False):
         self.ctx = ctx
         self.message = None
         self.player1 = player1
@@ -149,15 +102,59 @@ class Battle:
         self.p2_card = None
         
         self.draw_offers = set()
+        self.ready_players = set()
         self.phase = "SETUP"
+        self.deck_choices = [[], []]
+
+        # Stat changes are buffered here and written once when the battle ends
+        self.ledger = BattleLedger()
+        # View of the current phase; the session is saved each time it changes
+        self.view = None
+
+        # Practice: the bot plays player2 and nothing is written to the DB
+        self.practice = practice
+        self.ai = None
 
     async def start(self):
+        # Decks picked beforehand (matchmaking): straight to round 1
+        if self.player1_deck and self.player2_deck:
+            self.message = await self.ctx.send(f"⚔️ {self.player1.mention} vs {self.player2.mention}")
+            self.phase = "ACTION"
+            await self.update_game_state()
+            return
+
         embed = discord.Embed(title="⚔️ Battle Arena ⚔️", description="Both players must select their decks to begin.")
         embed.add_field(name=self.player1.name, value="❌ Deck Not Selected", inline=True)
         embed.add_field(name=self.player2.name, value="❌ Deck Not Selected", inline=True)
         
-        view = SetupView(self)
-        self.message = await self.ctx.send(embed=embed, view=view)
+        self.deck_choices = [await get_deck_names(self.player1.id), [] if self.practice else await get_deck_names(self.player2.id)]
+        self.view = self.build_view()
+        self.message = await self.ctx.send(embed=embed, view=self.view)
+        await save_battle(self)
+
+    def build_view(self):
+        """The view of the current phase (also re-attached to the message of a resumed battle)"""
+        if self.phase == "SETUP":
+            return SetupView(self, *self.deck_choices)
+        if self.phase == "ACTION":
+            return ActionView(self, self.turn_player)
+        if self.phase == "CARD_SELECT":
+            return CardSelectView(self)
+        if self.phase == "RESULT":
+            return NextRoundView(self)
+        return None
+
+    async def show(self, embed, interaction=None):
+        """Put the current phase on the battle message and save the session"""
+        if self.view is not None:
+            # Stop the old view first: the new one reuses its custom_ids on the same message
+            self.view.stop()
+        self.view = self.build_view()
+        if interaction and not interaction.response.is_done():
+            await interaction.response.edit_message(embed=embed, view=self.view)
+        else:
+            await self.message.edit(embed=embed, view=self.view)
+        await save_battle(self)
 
     async def request_surrender(self, interaction):
         if interaction.user.id not in [self.player1.id, self.player2.id]:
@@ -167,23 +164,21 @@ class Battle:
 
     async def confirm_surrender(self, interaction, loser):
         winner = self.player1 if loser == self.player2 else self.player2
-        
-        conn = get_connection()
-        cursor = conn.cursor()
-        try:
-            cursor.execute('UPDATE players SET battles_played = battles_played + 1, battles_won = battles_won + 1 WHERE user_id = ?', (winner.id,))
-            cursor.execute('UPDATE players SET battles_played = battles_played + 1, battles_lost = battles_lost + 1 WHERE user_id = ?', (loser.id,))
-            cursor.execute('UPDATE players SET coins = coins + 200 WHERE user_id = ?', (winner.id,))
-            cursor.execute('UPDATE players SET coins = coins + 100 WHERE user_id = ?', (loser.id,))
-            conn.commit()
-        except Exception as e:
-            logger.error(f"Surrender DB Error: {e}")
-        finally:
-            conn.close()
+
+        if not self.practice:
+            self.ledger.record_surrender(winner.id, loser.id)
+            try:
+                await self.ledger.flush()
+            except Exception as e:
+                logger.error(f"Surrender DB Error: {e}")
+        await forget_battle(self)
         
         embed = discord.Embed(title="🏳️ Battle Surrendered", color=discord.Color.red())
         embed.add_field(name="Result", value=f"**{winner.name}** wins! {loser.name} has surrendered.", inline=False)
-        embed.add_field(name="Rewards", value=f"{winner.name}: +200 Coins\n{loser.name}: +100 Coins", inline=False)
+        if self.practice:
+            embed.add_field(name="Rewards", value="Practice match: no coins or stats.", inline=False)
+        else:
+            embed.add_field(name="Rewards", value=f"{winner.name}: +{WIN_COINS} Coins\n{loser.name}: +{LOSS_COINS} Coins", inline=False)
         await self.message.edit(embed=embed, view=None)
         
         try:
@@ -210,21 +205,15 @@ class Battle:
         await self.update_game_state()
 
     async def confirm_draw(self, interaction):
-        conn = get_connection()
-        cursor = conn.cursor()
+        self.ledger.record_agreed_draw(self.player1.id, self.player2.id)
         try:
-            cursor.execute('UPDATE players SET battles_played = battles_played + 1, battles_drawn = battles_drawn + 1 WHERE user_id = ?', (self.player1.id,))
-            cursor.execute('UPDATE players SET battles_played = battles_played + 1, battles_drawn = battles_drawn + 1 WHERE user_id = ?', (self.player2.id,))
-            cursor.execute('UPDATE players SET coins = coins + 100 WHERE user_id = ?', (self.player1.id,))
-            cursor.execute('UPDATE players SET coins = coins + 100 WHERE user_id = ?', (self.player2.id,))
-            conn.commit()
+            await self.ledger.flush()
         except Exception as e:
             logger.error(f"Draw DB Error: {e}")
-        finally:
-            conn.close()
+        await forget_battle(self)
 
         embed = discord.Embed(title="🤝 Battle Drawn", description="Both players agreed to a draw.", color=discord.Color.greyple())
-        embed.add_field(name="Rewards", value="Both players received +100 Coins", inline=False)
+        embed.add_field(name="Rewards", value=f"Both players received +{DRAW_COINS} Coins", inline=False)
         await self.message.edit(embed=embed, view=None)
         
         try:
@@ -244,6 +233,12 @@ class Battle:
         used_ids = {card.card_id for card in used_cards}
         return [card for card in full_deck if card.card_id not in used_ids]
 
+    async def choose_bot_deck(self):
+        """Practice: give the bot a deck about as strong as the player's"""
+        catalog = await get_catalog()
+        self.player2_deck = practice_deck(catalog, self.player1_deck, NON_DROPPABLE_TYPES)
+        self.ai = BattleAI(self.player1_deck, self.player2_deck)
+
     async def update_game_state(self, interaction=None):
         if self.phase == "SETUP":
             if self.player1_deck and self.player2_deck:
@@ -251,17 +246,19 @@ class Battle:
                 await self.update_game_state(interaction)
             return
 
+        # The bot picks its tactic on its turn and its card before seeing the player's
+        if self.practice and self.phase == "ACTION" and self.turn_player.id == self.player2.id:
+            self.p1_action, self.p2_action = seat_tactics(False, self.ai.choose_tactic(self))
+            self.phase = "CARD_SELECT"
+        if self.practice and self.phase == "CARD_SELECT" and self.p2_card is None:
+            self.p2_card = self.ai.choose_card(self)
+
         if self.phase == "ACTION":
             embed = discord.Embed(title=f"⚔️ Round {self.round} | Action Phase", color=discord.Color.blue())
             embed.add_field(name="Score", value=f"{self.player1.name}: {self.player1_wins} | {self.player2.name}: {self.player2_wins} | Draws: {self.draws}", inline=False)
             embed.add_field(name="Current Turn", value=f"It is **{self.turn_player.name}'s** turn to choose the tactic.", inline=False)
             
-            view = ActionView(self, self.turn_player)
-            
-            if interaction and not interaction.response.is_done():
-                await interaction.response.edit_message(embed=embed, view=view)
-            else:
-                await self.message.edit(embed=embed, view=view)
+            await self.show(embed, interaction)
 
         elif self.phase == "CARD_SELECT":
             p1_status = "✅ Selected" if self.p1_card else "⏳ Waiting..."
@@ -271,17 +268,12 @@ class Battle:
             embed.add_field(name="Tactics", value=f"{self.player1.name}: **{self.p1_action.upper()}**\n{self.player2.name}: **{self.p2_action.upper()}**", inline=False)
             embed.add_field(name="Card Selection", value=f"**{self.player1.name}:** {p1_status}\n**{self.player2.name}:** {p2_status}", inline=False)
             
-            view = CardSelectView(self)
-            
-            if interaction and not interaction.response.is_done():
-                await interaction.response.edit_message(embed=embed, view=view)
-            else:
-                await self.message.edit(embed=embed, view=view)
+            await self.show(embed, interaction)
 
         elif self.phase == "RESULT":
             if not self.round_resolved:
                 result_text, winner = self.calculate_winner()
-                self.update_round_db_stats(winner)
+                await self.update_round_db_stats(winner)
                 self.player1_used_cards.append(self.p1_card)
                 self.player2_used_cards.append(self.p2_card)
                 self.last_result_text = result_text
@@ -295,71 +287,37 @@ class Battle:
             embed.add_field(name=f"{self.player1.name} ({self.p1_action})", value=f"**{self.p1_card.name}**\n⭐ {self.p1_card.overall}\n⚔️ {self.p1_card.attack} | 🛡️ {self.p1_card.defense} | ⚡ {self.p1_card.speed}", inline=True)
             embed.add_field(name=f"{self.player2.name} ({self.p2_action})", value=f"**{self.p2_card.name}**\n⭐ {self.p2_card.overall}\n⚔️ {self.p2_card.attack} | 🛡️ {self.p2_card.defense} | ⚡ {self.p2_card.speed}", inline=True)
             
-            if self.player1_wins >= 3 or self.player2_wins >= 3 or self.round == 5:
+            if match_over(self.player1_wins, self.player2_wins, self.round):
                 self.phase = "GAME_OVER"
                 await self.end_game(interaction, embed)
             else:
-                view = NextRoundView(self)
-                if interaction and not interaction.response.is_done():
-                    await interaction.response.edit_message(embed=embed, view=view)
-                else:
-                    await self.message.edit(embed=embed, view=view)
+                await self.show(embed, interaction)
 
     def calculate_winner(self):
-        p1_val, p2_val, stat_name = 0, 0, "Stat"
-        if self.p1_action == 'attack' and self.p2_action == 'defense':
-            p1_val, p2_val, stat_name = self.p1_card.attack, self.p2_card.defense, "Attack vs Defense"
-        elif self.p1_action == 'defense' and self.p2_action == 'attack':
-            p1_val, p2_val, stat_name = self.p1_card.defense, self.p2_card.attack, "Defense vs Attack"
-        else:
-            p1_val, p2_val, stat_name = self.p1_card.speed, self.p2_card.speed, "Speed vs Speed"
+        winner, stat_name, on_overall = resolve_round(self.p1_card, self.p2_card, self.p1_action, self.p2_action)
 
-        if p1_val > p2_val:
+        if winner == 1:
             self.player1_wins += 1
+            if on_overall:
+                return f"⚠️ Stats Draw! **{self.player1.name}** wins on Overall!", self.player1
             return f"🏆 **{self.player1.name}** Wins with {stat_name}!", self.player1
-        elif p2_val > p1_val:
+        elif winner == 2:
             self.player2_wins += 1
+            if on_overall:
+                return f"⚠️ Stats Draw! **{self.player2.name}** wins on Overall!", self.player2
             return f"🏆 **{self.player2.name}** Wins with {stat_name}!", self.player2
         else:
-            if self.p1_card.overall > self.p2_card.overall:
-                self.player1_wins += 1
-                return f"⚠️ Stats Draw! **{self.player1.name}** wins on Overall!", self.player1
-            elif self.p2_card.overall > self.p1_card.overall:
-                self.player2_wins += 1
-                return f"⚠️ Stats Draw! **{self.player2.name}** wins on Overall!", self.player2
-            else:
-                self.draws += 1
-                return f"🤝 **It's a Draw!**", None
-
-    def update_round_db_stats(self, winner):
-        conn = get_connection()
-        cursor = conn.cursor()
-        try:
-            cursor.execute('UPDATE players SET rounds_played = rounds_played + 1 WHERE user_id = ?', (self.player1.id,))
-            cursor.execute('UPDATE players SET rounds_played = rounds_played + 1 WHERE user_id = ?', (self.player2.id,))
-            
-            if winner:
-                loser = self.player2 if winner == self.player1 else self.player1
-                cursor.execute('UPDATE players SET rounds_won = rounds_won + 1 WHERE user_id = ?', (winner.id,))
-                cursor.execute('UPDATE players SET rounds_lost = rounds_lost + 1 WHERE user_id = ?', (loser.id,))
-            else:
-                cursor.execute('UPDATE players SET rounds_drawn = rounds_drawn + 1 WHERE user_id = ?', (self.player1.id,))
-                cursor.execute('UPDATE players SET rounds_drawn = rounds_drawn + 1 WHERE user_id = ?', (self.player2.id,))
-
-            for card, user in [(self.p1_card, self.player1), (self.p2_card, self.player2)]:
-                cursor.execute('UPDATE inventories SET rounds_played = rounds_played + 1 WHERE card_id = ? AND user_id = ?', (card.card_id, user.id))
-                cursor.execute('UPDATE cards SET total_rounds_played = total_rounds_played + 1 WHERE card_id = ?', (card.card_id,))
+            self.draws += 1
+            return f"🤝 **It's a Draw!**", None
 
-            if winner:
-                winning_card = self.p1_card if winner == self.player1 else self.p2_card
-                cursor.execute('UPDATE inventories SET rounds_won = rounds_won + 1 WHERE card_id = ? AND user_id = ?', (winning_card.card_id, winner.id))
-                cursor.execute('UPDATE cards SET total_rounds_won = total_rounds_won + 1 WHERE card_id = ?', (winning_card.card_id,))
-
-            conn.commit()
-        except Exception as e:
-            logger.error(f"Round Update DB Error: {e}")
-        finally:
-            conn.close()
+    async def update_round_db_stats(self, winner):
+        """Buffer the round's stats; the next save_battle stores them together with the new phase"""
+        if self.practice:
+            return
+        self.ledger.record_round(
+            self.player1.id, self.p1_card.card_id, self.player2.id, self.p2_card.card_id,
+            winner.id if winner else None
+        )
 
     async def end_game(self, interaction, last_round_embed):
         try:
@@ -376,46 +334,32 @@ class Battle:
         else:
             is_draw = True
 
-        conn = get_connection()
-        cursor = conn.cursor()
-        try:
-            cursor.execute('UPDATE players SET battles_played = battles_played + 1 WHERE user_id = ?', (self.player1.id,))
-            cursor.execute('UPDATE players SET battles_played = battles_played + 1 WHERE user_id = ?', (self.player2.id,))
-
-            def update_deck_stats(deck, user, won_battle):
-                for card in deck:
-                    cursor.execute('UPDATE inventories SET battles_played = battles_played + 1 WHERE card_id = ? AND user_id = ?', (card.card_id, user.id))
-                    cursor.execute('UPDATE cards SET total_battles_played = total_battles_played + 1 WHERE card_id = ?', (card.card_id,))
-                    if won_battle:
-                        cursor.execute('UPDATE inventories SET battles_won = battles_won + 1 WHERE card_id = ? AND user_id = ?', (card.card_id, user.id))
-                        cursor.execute('UPDATE cards SET total_battles_won = total_battles_won + 1 WHERE card_id = ?', (card.card_id,))
-
-            if is_draw:
-                cursor.execute('UPDATE players SET battles_drawn = battles_drawn + 1 WHERE user_id = ?', (self.player1.id,))
-                cursor.execute('UPDATE players SET battles_drawn = battles_drawn + 1 WHERE user_id = ?', (self.player2.id,))
-                cursor.execute('UPDATE players SET coins = coins + 100 WHERE user_id = ?', (self.player1.id,))
-                cursor.execute('UPDATE players SET coins = coins + 100 WHERE user_id = ?', (self.player2.id,))
-                update_deck_stats(self.player1_deck, self.player1, False)
-                update_deck_stats(self.player2_deck, self.player2, False)
-                embed = discord.Embed(title="🤝 Battle Drawn 🤝", color=discord.Color.greyple())
-                embed.add_field(name="Result", value="The battle ended in a draw!", inline=False)
-                embed.add_field(name="Rewards", value="Both players received +100 Coins", inline=False)
-            else:
-                cursor.execute('UPDATE players SET battles_won = battles_won + 1 WHERE user_id = ?', (winner.id,))
-                cursor.execute('UPDATE players SET battles_lost = battles_lost + 1 WHERE user_id = ?', (loser.id,))
-                cursor.execute('UPDATE players SET coins = coins + 200 WHERE user_id = ?', (winner.id,))
-                cursor.execute('UPDATE players SET coins = coins + 100 WHERE user_id = ?', (loser.id,))
-                update_deck_stats(self.player1_deck, self.player1, (winner == self.player1))
-                update_deck_stats(self.player2_deck, self.player2, (winner == self.player2))
-                embed = discord.Embed(title="🏆 Battle Finished 🏆", color=discord.Color.gold())
-                embed.add_field(name="Winner", value=f"**{winner.name}**", inline=False)
-                embed.add_field(name="Rewards", value=f"{winner.name}: +200 Coins\n{loser.name}: +100 Coins", inline=False)
-            
-            conn.commit()
-        except Exception as e:
-            logger.error(f"End Game DB Error: {e}")
-        finally:
-            conn.close()
+        # Rounds, result, coins, every deck card's stats and the stored session's removal in one transaction
+        if not self.practice:
+            self.ledger.record_result(
+                self.player1.id, [card.card_id for card in self.player1_deck],
+                self.player2.id, [card.card_id for card in self.player2_deck],
+                winner.id if winner else None
+            )
+            try:
+                await self.ledger.flush()
+            except Exception as e:
+                logger.error(f"End Game DB Error: {e}")
+        await forget_battle(self)
+
+        if is_draw:
+            embed = discord.Embed(title="🤝 Battle Drawn 🤝", color=discord.Color.greyple())
+            embed.add_field(name="Result", value="The battle ended in a draw!", inline=False)
+        else:
+            embed = discord.Embed(title="🏆 Battle Finished 🏆", color=discord.Color.gold())
+            embed.add_field(name="Winner", value=f"**{winner.name}**", inline=False)
+
+        if self.practice:
+            embed.add_field(name="Rewards", value="Practice match: no coins or stats.", inline=False)
+        elif is_draw:
+            embed.add_field(name="Rewards", value=f"Both players received +{DRAW_COINS} Coins", inline=False)
+        else:
+            embed.add_field(name="Rewards", value=f"{winner.name}: +{WIN_COINS} Coins\n{loser.name}: +{LOSS_COINS} Coins", inline=False)
 
         embed.add_field(name="Final Score", value=f"{self.player1.name}: {self.player1_wins} | {self.player2.name}: {self.player2_wins} | Draws: {self.draws}", inline=False)
         await self.message.edit(embed=embed, view=None)
@@ -426,6 +370,8 @@ class Battle:
 
 def configure_battle_buttons(view, battle):
     view.add_item(SurrenderButton(battle))
+    if battle.practice:
+        return
     label = "Accept Draw 🤝" if len(battle.draw_offers) > 0 else "Offer Draw"
     style = discord.ButtonStyle.success if len(battle.draw_offers) > 0 else discord.ButtonStyle.secondary
     view.add_item(DrawButton(battle, label=label, style=style))
@@ -433,7 +379,7 @@ def configure_battle_buttons(view, battle):
 
 class SurrenderButton(discord.ui.Button):
     def __init__(self, battle):
-        super().__init__(style=discord.ButtonStyle.danger, label="Surrender", emoji="🏳️", row=2)
+        super().__init__(style=discord.ButtonStyle.danger, label="Surrender", emoji="🏳️", row=2, custom_id="battle:surrender")
         self.battle = battle
 
     async def callback(self, interaction):
@@ -442,7 +388,7 @@ class SurrenderButton(discord.ui.Button):
 
 class DrawButton(discord.ui.Button):
     def __init__(self, battle, label="Offer Draw", style=discord.ButtonStyle.secondary):
-        super().__init__(style=style, label=label, emoji="🤝", row=2)
+        super().__init__(style=style, label=label, emoji="🤝", row=2, custom_id="battle:draw")
         self.battle = battle
 
     async def callback(self, interaction):
@@ -466,33 +412,33 @@ class SurrenderConfirmView(discord.ui.View):
         await interaction.response.edit_message(content="Surrender cancelled.", view=None)
 
 
+# Phase views never time out and use fixed custom_ids, so a resumed battle can re-attach them
+# (bot.add_view with the message id); abandoned battles are expired by utils.battle_store instead.
+
 class SetupView(discord.ui.View):
-    def __init__(self, battle):
-        super().__init__(timeout=120)
+    def __init__(self, battle, player1_decks, player2_decks):
+        super().__init__(timeout=None)
         self.battle = battle
-        self.add_item(DeckSelectMenu(battle, battle.player1))
-        self.add_item(DeckSelectMenu(battle, battle.player2))
+        self.add_item(DeckSelectMenu(battle, battle.player1, player1_decks))
+        if not battle.practice:
+            self.add_item(DeckSelectMenu(battle, battle.player2, player2_decks))
 
-    @discord.ui.button(label="Cancel Setup", style=discord.ButtonStyle.red, row=2)
+    @discord.ui.button(label="Cancel Setup", style=discord.ButtonStyle.red, row=2, custom_id="battle:setup:cancel")
     async def cancel(self, interaction, button):
         if interaction.user.id not in [self.battle.player1.id, self.battle.player2.id]:
             return await interaction.response.send_message("Not your battle.", ephemeral=True)
         await interaction.response.edit_message(content="Battle setup cancelled.", embed=None, view=None)
+        await forget_battle(self.battle)
 
 
 class DeckSelectMenu(discord.ui.Select):
-    def __init__(self, battle, player):
+    def __init__(self, battle, player, decks):
         self.battle = battle
         self.player = player
         
-        conn = get_connection()
-        cursor = conn.cursor()
-        cursor.execute('SELECT deck_name FROM decks WHERE user_id = ?', (player.id,))
-        decks = cursor.fetchall()
-        conn.close()
-        
-        options = [discord.SelectOption(label=d[0]) for d in decks] if decks else [discord.SelectOption(label="No Decks", value="none")]
-        super().__init__(placeholder=f"{player.name}, choose...", options=options, min_values=1, max_values=1)
+        options = [discord.SelectOption(label=d) for d in decks] if decks else [discord.SelectOption(label="No Decks", value="none")]
+        seat = "p1" if player.id == battle.player1.id else "p2"
+        super().__init__(placeholder=f"{player.name}, choose...", options=options, min_values=1, max_values=1, custom_id=f"battle:setup:{seat}")
 
     async def callback(self, interaction):
         if interaction.user.id != self.player.id:
@@ -502,11 +448,13 @@ class DeckSelectMenu(discord.ui.Select):
         if deck_name == "none":
             return await interaction.response.send_message("Create a deck first!", ephemeral=True)
 
-        deck_cards = get_deck(self.player.id, deck_name)
+        deck_cards = await get_deck(self.player.id, deck_name)
         if self.player.id == self.battle.player1.id:
             self.battle.player1_deck = deck_cards
         else:
             self.battle.player2_deck = deck_cards
+        if self.battle.practice and deck_cards:
+            await self.battle.choose_bot_deck()
 
         if self.battle.player1_deck and self.battle.player2_deck:
             await self.battle.update_game_state(interaction)
@@ -515,24 +463,25 @@ class DeckSelectMenu(discord.ui.Select):
             index = 0 if self.player.id == self.battle.player1.id else 1
             embed.set_field_at(index, name=self.player.name, value=f"✅ Ready ({deck_name})", inline=True)
             await interaction.response.edit_message(embed=embed, view=self.view)
+            await save_battle(self.battle)
 
 
 class ActionView(discord.ui.View):
     def __init__(self, battle, turn_player):
-        super().__init__(timeout=60)
+        super().__init__(timeout=None)
         self.battle = battle
         self.turn_player = turn_player
         configure_battle_buttons(self, battle)
 
-    @discord.ui.button(label="Attack", style=discord.ButtonStyle.danger)
+    @discord.ui.button(label="Attack", style=discord.ButtonStyle.danger, custom_id="battle:attack")
     async def attack(self, interaction, button):
         await self.process_action(interaction, "attack")
 
-    @discord.ui.button(label="Defense", style=discord.ButtonStyle.primary)
+    @discord.ui.button(label="Defense", style=discord.ButtonStyle.primary, custom_id="battle:defense")
     async def defense(self, interaction, button):
         await self.process_action(interaction, "defense")
 
-    @discord.ui.button(label="Speed", style=discord.ButtonStyle.success)
+    @discord.ui.button(label="Speed", style=discord.ButtonStyle.success, custom_id="battle:speed")
     async def speed(self, interaction, button):
         await self.process_action(interaction, "speed")
 
@@ -540,16 +489,7 @@ class ActionView(discord.ui.View):
         if interaction.user.id != self.turn_player.id:
             return await interaction.response.send_message("Not your turn!", ephemeral=True)
         
-        if self.turn_player.id == self.battle.player1.id:
-            self.battle.p1_action = action
-            if action == "attack": self.battle.p2_action = "defense"
-            elif action == "defense": self.battle.p2_action = "attack"
-            else: self.battle.p2_action = "speed"
-        else:
-            self.battle.p2_action = action
-            if action == "attack": self.battle.p1_action = "defense"
-            elif action == "defense": self.battle.p1_action = "attack"
-            else: self.battle.p1_action = "speed"
+        self.battle.p1_action, self.battle.p2_action = seat_tactics(self.turn_player.id == self.battle.player1.id, action)
             
         self.battle.phase = "CARD_SELECT"
         await self.battle.update_game_state(interaction)
@@ -557,10 +497,11 @@ class ActionView(discord.ui.View):
 
 class CardSelectView(discord.ui.View):
     def __init__(self, battle):
-        super().__init__(timeout=60)
+        super().__init__(timeout=None)
         self.battle = battle
         self.add_item(CardDropdown(battle, battle.player1))
-        self.add_item(CardDropdown(battle, battle.player2))
+        if not battle.practice:
+            self.add_item(CardDropdown(battle, battle.player2))
         configure_battle_buttons(self, battle)
 
 
@@ -572,7 +513,8 @@ class CardDropdown(discord.ui.Select):
         options = [discord.SelectOption(label=c.name[:100], description=f"OVR: {c.overall}", value=str(c.card_id)) for c in cards]
         if not options:
             options = [discord.SelectOption(label="No cards left", value="none")]
-        super().__init__(placeholder=f"{player.name}'s Card", options=options, min_values=1, max_values=1)
+        seat = "p1" if player.id == battle.player1.id else "p2"
+        super().__init__(placeholder=f"{player.name}'s Card", options=options, min_values=1, max_values=1, custom_id=f"battle:card:{seat}")
     
     async def callback(self, interaction):
         if interaction.user.id != self.player.id:
@@ -597,22 +539,24 @@ class CardDropdown(discord.ui.Select):
 
 class NextRoundView(discord.ui.View):
     def __init__(self, battle):
-        super().__init__(timeout=60)
+        super().__init__(timeout=None)
         self.battle = battle
-        self.ready_players = set()
         configure_battle_buttons(self, battle)
 
-    @discord.ui.button(label="Ready for Next Round", style=discord.ButtonStyle.primary, row=0)
+    @discord.ui.button(label="Ready for Next Round", style=discord.ButtonStyle.primary, row=0, custom_id="battle:next")
     async def next_round(self, interaction, button):
         if interaction.user.id not in [self.battle.player1.id, self.battle.player2.id]:
             return await interaction.response.send_message("Not your battle.", ephemeral=True)
         
-        if interaction.user.id in self.ready_players:
+        if interaction.user.id in self.battle.ready_players:
             return await interaction.response.send_message("Waiting for opponent...", ephemeral=True)
 
-        self.ready_players.add(interaction.user.id)
+        self.battle.ready_players.add(interaction.user.id)
+        if self.battle.practice:
+            self.battle.ready_players.add(self.battle.player2.id)
         
-        if len(self.ready_players) == 2:
+        if len(self.battle.ready_players) == 2:
+            self.battle.ready_players.clear()
             self.battle.p1_action = None
             self.battle.p2_action = None
             self.battle.p1_card = None
@@ -629,6 +573,7 @@ class NextRoundView(discord.ui.View):
             await self.battle.update_game_state(interaction)
         else:
             await interaction.response.send_message(f"{interaction.user.name} is ready! Waiting for opponent...", ephemeral=False)
+            await save_battle(self.battle)
 
 
 class BattleInviteView(discord.ui.View):
@@ -769,7 +714,7 @@ class BuilderSaveButton(discord.ui.Button):
             return await interaction.response.send_message("You need exactly 5 cards!", ephemeral=True)
 
         try:
-            add_deck(interaction.user.id, view.deck_name, view.selected_ids)
+            await add_deck(interaction.user.id, view.deck_name, view.selected_ids)
             embed = discord.Embed(title="✅ Deck Saved!", description=f"Deck **{view.deck_name}** has been created successfully.", color=discord.Color.green())
             await interaction.response.edit_message(embed=embed, view=None)
             view.stop()
@@ -797,49 +742,128 @@ class Battles(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
 
-    @commands.hybrid_command(name='battle', description="Challenge a player to a battle")
+    async def cog_load(self):
+        """Recover stats of battles cut off by a restart, resume stored battles, then start matchmaking and the render workers"""
+        await recover_interrupted_battles()
+        catalog = await get_catalog()
+        await restore_battles(self.bot, lambda player1, player2: Battle(None, player1, player2), catalog.get)
+        matchmaking.start(self.start_matched_battle, self.matchmaking_timed_out,
+                          lambda a, b: match_channel(self.bot, a, b) is not None)
+        await render_pool.warm()
+
+    @commands.hybrid_group(name='battle', description="Challenge a player to a battle", fallback='challenge', invoke_without_command=True)
     async def battle(self, ctx, user: discord.User):
         """Challenge another player to a card battle"""
         if user.id == ctx.author.id:
             return await ctx.send("You cannot battle yourself.")
         
-        ensure_player_exists(ctx.author.id, ctx.author.name)
-        ensure_player_exists(user.id, user.name)
+        await ensure_player_exists(ctx.author.id, ctx.author.name)
+        await ensure_player_exists(user.id, user.name)
         
         embed = discord.Embed(title="⚔️ Battle Request", description=f"{ctx.author.name} has challenged {user.name} to a battle!")
         view = BattleInviteView(ctx, ctx.author, user)
         await ctx.send(embed=embed, view=view)
         logger.info(f'{ctx.author.name} challenged {user.name} to battle')
 
+    @battle.command(name='bot', description="Practice battle against the bot (no coins or stats)")
+    async def battle_bot(self, ctx):
+        """Play a practice battle against the bot"""
+        battle_instance = Battle(ctx, ctx.author, self.bot.user, practice=True)
+        await battle_instance.start()
+
+    @battle.command(name='queue', description="Find an opponent of similar deck strength")
+    async def battle_queue(self, ctx, deck_name: str):
+        """Join the matchmaking queue with one of your decks"""
+        if ctx.guild is None:
+            return await ctx.send("Matchmaking is only available in servers.", ephemeral=True)
+        if in_live_battle(ctx.author.id):
+            return await ctx.send("Finish your current battle before joining the queue.", ephemeral=True)
+        deck = await get_deck(ctx.author.id, deck_name)
+        if not deck:
+            return await ctx.send(f"You don't have a deck named '{deck_name}'.", ephemeral=True)
+        await ensure_player_exists(ctx.author.id, ctx.author.name)
+
+        entry = QueueEntry(ctx.author, deck_name, deck, ctx.channel.id, pool=ctx.guild.id)
+        opponent = matchmaking.join(entry)
+        if opponent is None:
+            await ctx.send(f"🔎 {ctx.author.name} joined the matchmaking queue with **{deck_name}** (strength {entry.strength}). Use `/battle leave` to stop searching.")
+        else:
+            await ctx.send(f"✅ Opponent found: **{opponent.user.name}**! Loading arena...")
+        logger.info(f'{ctx.author.name} queued for a battle with {deck_name}')
+
+    @battle.command(name='leave', description="Leave the matchmaking queue")
+    async def battle_leave(self, ctx):
+        """Leave the matchmaking queue"""
+        if matchmaking.leave(ctx.author.id) is None:
+            return await ctx.send("You are not in the matchmaking queue.", ephemeral=True)
+        await ctx.send("You left the matchmaking queue.", ephemeral=True)
+
+    async def start_matched_battle(self, first, second):
+        """Open a battle for two queued players; the one who waited longest is player 1"""
+        channel = match_channel(self.bot, first, second)
+        if channel is None:
+            logger.error(f"No channel for matched battle {first.user.id} vs {second.user.id}")
+            return
+        # Decks are reloaded: cards may have been sold or traded while the players were queued
+        dropped = []
+        for entry in (first, second):
+            deck = await get_deck(entry.user.id, entry.deck_name)
+            if not deck:
+                dropped.append((entry, f"your deck **{entry.deck_name}** no longer exists"))
+            elif await run_db(find_unowned_card, entry.user.id, [card.card_id for card in deck]) is not None:
+                dropped.append((entry, f"your deck **{entry.deck_name}** has cards you no longer own"))
+            elif in_live_battle(entry.user.id):
+                dropped.append((entry, "you are already in a battle"))
+            else:
+                entry.set_deck(deck)
+        if dropped:
+            for entry, reason in dropped:
+                queue_channel = self.bot.get_channel(entry.channel_id)
+                if queue_channel:
+                    await queue_channel.send(f"⚠️ {entry.user.mention}, {reason}, so you have left the matchmaking queue.")
+            for entry in (first, second):
+                if entry not in [dropped_entry for dropped_entry, _ in dropped]:
+                    matchmaking.requeue(entry)
+            return
+
+        battle_instance = Battle(channel, first.user, second.user)
+        battle_instance.player1_deck, battle_instance.player2_deck = first.deck, second.deck
+        await battle_instance.start()
+
+    async def matchmaking_timed_out(self, entry):
+        """Tell a player their queue entry expired"""
+        channel = self.bot.get_channel(entry.channel_id)
+        if channel:
+            await channel.send(f"⌛ {entry.user.mention}, no opponent was found within {QUEUE_TIMEOUT_MINUTES} minutes. You have left the matchmaking queue.")
+
     @commands.hybrid_command(name='decks', description="View list of your decks")
     async def view_decks(self, ctx, user: discord.User = None):
         """View your or another user's decks"""
         if user is None:
             user = ctx.author
 
-        ensure_player_exists(user.id, user.name)
+        await ensure_player_exists(user.id, user.name)
         
-        conn = get_connection()
-        cursor = conn.cursor()
-        cursor.execute('SELECT deck_name, cards FROM decks WHERE user_id = ?', (user.id,))
-        decks = cursor.fetchall()
-        conn.close()
+        def load_decks(cursor):
+            cursor.execute('SELECT deck_name, cards FROM decks WHERE user_id = ?', (user.id,))
+            decks = []
+            for deck_name, cards in cursor.fetchall():
+                card_details = []
+                for card_id in cards.split(','):
+                    cursor.execute('SELECT name FROM cards WHERE card_id = ?', (card_id,))
+                    card_data = cursor.fetchone()
+                    if card_data:
+                        card_details.append(card_data[0])
+                decks.append((deck_name, card_details))
+            return decks
+
+        decks = await run_db(load_decks)
 
         if not decks:
             return await ctx.send(f"{user.name} has no decks.")
 
         embed = discord.Embed(title=f"📋 {user.name}'s Decks")
-        for deck_name, cards in decks:
-            card_ids = cards.split(',')
-            card_details = []
-            conn = get_connection()
-            cursor = conn.cursor()
-            for card_id in card_ids:
-                cursor.execute('SELECT name FROM cards WHERE card_id = ?', (card_id,))
-                card_data = cursor.fetchone()
-                if card_data:
-                    card_details.append(card_data[0])
-            conn.close()
+        for deck_name, card_details in decks:
             embed.add_field(name=deck_name, value=', '.join(card_details) or "No cards", inline=False)
 
         await ctx.send(embed=embed)
@@ -849,19 +873,14 @@ class Battles(commands.Cog):
         """Create a new battle deck with 5 cards"""
         card_ids = [card1, card2, card3, card4, card5]
 
-        ensure_player_exists(ctx.author.id, ctx.author.name)
+        await ensure_player_exists(ctx.author.id, ctx.author.name)
 
-        conn = get_connection()
-        cursor = conn.cursor()
-        for card_id in card_ids:
-            cursor.execute('SELECT 1 FROM inventories WHERE user_id = ? AND card_id = ?', (ctx.author.id, card_id))
-            if cursor.fetchone() is None:
-                conn.close()
-                return await ctx.send(f"⛔ You do not own the card with ID **{card_id}**.")
-        conn.close()
+        missing_id = await run_db(find_unowned_card, ctx.author.id, card_ids)
+        if missing_id is not None:
+            return await ctx.send(f"⛔ You do not own the card with ID **{missing_id}**.")
 
         try:
-            add_deck(ctx.author.id, deck_name, card_ids)
+            await add_deck(ctx.author.id, deck_name, card_ids)
             await ctx.send(f"✅ Deck '**{deck_name}**' created successfully!")
         except ValueError as e:
             await ctx.send(f"❌ Error: {str(e)}")
@@ -871,52 +890,37 @@ class Battles(commands.Cog):
         """Edit an existing battle deck"""
         card_ids = [card1, card2, card3, card4, card5]
 
-        ensure_player_exists(ctx.author.id, ctx.author.name)
+        await ensure_player_exists(ctx.author.id, ctx.author.name)
 
-        conn = get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('SELECT deck_name FROM decks WHERE user_id = ? AND deck_name = ?', (ctx.author.id, deck_name))
-        if cursor.fetchone() is None:
-            conn.close()
+        if await fetchone('SELECT deck_name FROM decks WHERE user_id = ? AND deck_name = ?', (ctx.author.id, deck_name)) is None:
             return await ctx.send(f"❌ No deck found with the name '**{deck_name}**'.")
 
-        for card_id in card_ids:
-            cursor.execute('SELECT 1 FROM inventories WHERE user_id = ? AND card_id = ?', (ctx.author.id, card_id))
-            if cursor.fetchone() is None:
-                conn.close()
-                return await ctx.send(f"⛔ You do not own ID **{card_id}**.")
+        missing_id = await run_db(find_unowned_card, ctx.author.id, card_ids)
+        if missing_id is not None:
+            return await ctx.send(f"⛔ You do not own ID **{missing_id}**.")
 
         try:
             cards_str = ','.join(map(str, card_ids))
-            cursor.execute('UPDATE decks SET cards = ? WHERE user_id = ? AND deck_name = ?', (cards_str, ctx.author.id, deck_name))
-            conn.commit()
-            conn.close()
+            await execute('UPDATE decks SET cards = ? WHERE user_id = ? AND deck_name = ?', (cards_str, ctx.author.id, deck_name))
             await ctx.send(f"✅ Deck '**{deck_name}**' updated successfully!")
         except Exception as e:
-            conn.close()
             await ctx.send(f"❌ Error updating deck: {e}")
 
     @commands.hybrid_command(name='delete_deck', description="Delete a deck")
     async def delete_deck(self, ctx, deck_name: str):
         """Delete one of your battle decks"""
-        conn = get_connection()
-        cursor = conn.cursor()
-        cursor.execute('DELETE FROM decks WHERE user_id = ? AND deck_name = ?', (ctx.author.id, deck_name))
-        if cursor.rowcount == 0:
-            conn.close()
+        deleted = await execute('DELETE FROM decks WHERE user_id = ? AND deck_name = ?', (ctx.author.id, deck_name))
+        if deleted == 0:
             return await ctx.send(f"❌ No deck found with the name '**{deck_name}**'.")
-        conn.commit()
-        conn.close()
         await ctx.send(f"✅ Deck '**{deck_name}**' deleted.")
 
     @commands.hybrid_command(name='view_deck', description="Visualize a specific deck")
     async def view_deck(self, ctx, deck_name: str, user: discord.User = None):
         """View a deck with visual lineup"""
         target_user = user or ctx.author
-        ensure_player_exists(target_user.id, target_user.name)
+        await ensure_player_exists(target_user.id, target_user.name)
         
-        deck_cards = get_deck(target_user.id, deck_name)
+        deck_cards = await get_deck(target_user.id, deck_name)
         
         if deck_cards is None:
             return await ctx.send(f"❌ Deck '**{deck_name}**' not found for **{target_user.name}**.")
@@ -931,30 +935,28 @@ class Battles(commands.Cog):
         embed = discord.Embed(title=f"📋 Deck Details: {deck_name}", description=description_text, color=discord.Color.green())
         embed.set_footer(text=f"Owner: {target_user.name}", icon_url=target_user.display_avatar.url)
 
-        if Image:
-            image_buffer = await self.bot.loop.run_in_executor(None, generate_lineup_image, deck_cards)
-            if image_buffer:
-                file = discord.File(fp=image_buffer, filename=f"{deck_name}.png")
-                embed.set_image(url=f"attachment://{deck_name}.png")
-                await ctx.send(file=file, embed=embed)
-                return
+        try:
+            image_buffer = await render_lineup(deck_cards)
+        except RenderBusy:
+            image_buffer = None
+        if image_buffer:
+            filename = render_filename(deck_name)
+            file = discord.File(fp=image_buffer, filename=filename)
+            embed.set_image(url=f"attachment://{filename}")
+            await ctx.send(file=file, embed=embed)
+            return
 
         await ctx.send(embed=embed)
 
     @commands.hybrid_command(name='build_deck', description="Interactively build a deck")
     async def build_deck(self, ctx, deck_name: str):
         """Visual deck builder interface"""
-        ensure_player_exists(ctx.author.id, ctx.author.name)
+        await ensure_player_exists(ctx.author.id, ctx.author.name)
         
-        conn = get_connection()
-        cursor = conn.cursor()
-        cursor.execute('SELECT 1 FROM decks WHERE user_id = ? AND deck_name = ?', (ctx.author.id, deck_name))
-        if cursor.fetchone():
-            conn.close()
+        if await fetchone('SELECT 1 FROM decks WHERE user_id = ? AND deck_name = ?', (ctx.author.id, deck_name)):
             return await ctx.send(f"❌ You already have a deck named **{deck_name}**.")
-        conn.close()
 
-        inventory, _ = get_player_inventory(ctx.author.id)
+        inventory, _ = await get_player_inventory(ctx.author.id)
         if not inventory:
             return await ctx.send("You have no cards to build a deck with!")
 
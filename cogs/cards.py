@@ -8,8 +8,11 @@ from discord import app_commands
 import logging
 from typing import List
 
-from utils.database import get_connection, ensure_player_exists
+from utils.database import run_db, run_write, fetchone, fetchall, ensure_player_exists
 from utils.models import get_card_by_id, fetch_all_cards
+from utils.uploads import send_card_image
+from utils.catalog import get_catalog
+from utils.search import card_search_index
 
 logger = logging.getLogger(__name__)
 
@@ -17,20 +20,14 @@ logger = logging.getLogger(__name__)
 #---------------------------------------------------------HELPER FUNCTIONS-------------------------------------------------------------------------------------
 
 
-def get_card_by_name_or_id(identifier):
+async def get_card_by_name_or_id(identifier):
     """Get cards matching a name or ID."""
-    conn = get_connection()
-    cursor = conn.cursor()
-    
     # Try exact ID match first
     if identifier.isdigit():
-        cursor.execute("SELECT * FROM cards WHERE card_id = ?", (int(identifier),))
+        rows = await fetchall("SELECT * FROM cards WHERE card_id = ?", (int(identifier),))
     else:
         # Search by name (fuzzy match)
-        cursor.execute("SELECT * FROM cards WHERE LOWER(name) LIKE ?", (f"%{identifier.lower()}%",))
-    
-    rows = cursor.fetchall()
-    conn.close()
+        rows = await fetchall("SELECT * FROM cards WHERE LOWER(name) LIKE ?", (f"%{identifier.lower()}%",))
     
     cards = []
     for row in rows:
@@ -39,6 +36,26 @@ def get_card_by_name_or_id(identifier):
     return cards
 
 
+async def get_card_details(user_id, card_id):
+    """Get (inventory entry, global stats row, is wishlisted) for a card as seen by a user."""
+    def _get_card_details(cursor):
+        cursor.execute('SELECT trade_count FROM inventories WHERE user_id = ? AND card_id = ?', (user_id, card_id))
+        inventory_entry = cursor.fetchone()
+        
+        cursor.execute('''
+            SELECT wishlist_count, 
+                   total_battles_played, total_battles_won, 
+                   total_rounds_played, total_rounds_won 
+            FROM cards WHERE card_id = ?
+        ''', (card_id,))
+        row = cursor.fetchone()
+        
+        cursor.execute('SELECT 1 FROM wishlists WHERE user_id = ? AND card_id = ?', (user_id, card_id))
+        is_wishlisted = cursor.fetchone() is not None
+        return inventory_entry, row, is_wishlisted
+    return await run_db(_get_card_details)
+
+
 #---------------------------------------------------------UI COMPONENTS-------------------------------------------------------------------------------------
 
 
@@ -57,31 +74,13 @@ class ViewCardSelect(discord.ui.Select):
         if not card:
             return await interaction.response.send_message("Card not found.", ephemeral=True)
         
-        conn = get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('SELECT trade_count FROM inventories WHERE user_id = ? AND card_id = ?', (self.ctx.author.id, card.card_id))
-        inventory_entry = cursor.fetchone()
-        
-        cursor.execute('''
-            SELECT wishlist_count, 
-                   total_battles_played, total_battles_won, 
-                   total_rounds_played, total_rounds_won 
-            FROM cards WHERE card_id = ?
-        ''', (card.card_id,))
-        
-        row = cursor.fetchone()
+        inventory_entry, row, is_wishlisted = await get_card_details(self.ctx.author.id, card.card_id)
         wl_count = row[0] if row else 0
         g_b_played = row[1] if row else 0
         g_b_won = row[2] if row else 0
         g_r_played = row[3] if row else 0
         g_r_won = row[4] if row else 0
         
-        cursor.execute('SELECT 1 FROM wishlists WHERE user_id = ? AND card_id = ?', (self.ctx.author.id, card.card_id))
-        is_wishlisted = cursor.fetchone() is not None
-        
-        conn.close()
-        
         owned_by_user = "Yes" if inventory_entry else "No"
         win_rate = f"{(g_b_won / g_b_played * 100):.1f}%" if g_b_played > 0 else "0%"
 
@@ -124,13 +123,19 @@ class ToggleWishlistButton(discord.ui.Button):
         self.is_wishlisted = is_wishlisted
 
     async def callback(self, interaction: discord.Interaction):
-        conn = get_connection()
-        cursor = conn.cursor()
+        user_id = interaction.user.id
+
+        def remove_from_wishlist(cursor):
+            cursor.execute('DELETE FROM wishlists WHERE user_id = ? AND card_id = ?', (user_id, self.card_id))
+            cursor.execute('UPDATE cards SET wishlist_count = wishlist_count - 1 WHERE card_id = ?', (self.card_id,))
+
+        def add_to_wishlist(cursor):
+            cursor.execute('INSERT INTO wishlists (user_id, card_id) VALUES (?, ?)', (user_id, self.card_id))
+            cursor.execute('UPDATE cards SET wishlist_count = wishlist_count + 1 WHERE card_id = ?', (self.card_id,))
         
         if self.is_wishlisted:
             # Remove from wishlist
-            cursor.execute('DELETE FROM wishlists WHERE user_id = ? AND card_id = ?', (interaction.user.id, self.card_id))
-            cursor.execute('UPDATE cards SET wishlist_count = wishlist_count - 1 WHERE card_id = ?', (self.card_id,))
+            await run_write(remove_from_wishlist)
             self.is_wishlisted = False
             self.label = "Add to Wishlist"
             self.emoji = "❤️"
@@ -139,21 +144,16 @@ class ToggleWishlistButton(discord.ui.Button):
         else:
             # Add to wishlist
             try:
-                cursor.execute('INSERT INTO wishlists (user_id, card_id) VALUES (?, ?)', (interaction.user.id, self.card_id))
-                cursor.execute('UPDATE cards SET wishlist_count = wishlist_count + 1 WHERE card_id = ?', (self.card_id,))
+                await run_write(add_to_wishlist)
                 self.is_wishlisted = True
                 self.label = "Remove from Wishlist"
                 self.emoji = "💔"
                 self.style = discord.ButtonStyle.danger
                 msg = "Card added to wishlist!"
             except Exception:
-                conn.close()
                 await interaction.response.send_message("Card is already in your wishlist.", ephemeral=True)
                 return
         
-        conn.commit()
-        conn.close()
-        
         await interaction.response.edit_message(view=self.view)
         await interaction.followup.send(msg, ephemeral=True)
 
@@ -179,22 +179,16 @@ class Cards(commands.Cog):
     
     def __init__(self, bot):
         self.bot = bot
-        self.all_cards = fetch_all_cards()
+
+    async def cog_load(self):
+        await fetch_all_cards()  # warm the shared card catalog
 
     async def card_search_autocomplete(self, interaction: discord.Interaction, current: str) -> List[app_commands.Choice[str]]:
         """Autocomplete for card search"""
         if not current:
             return []
 
-        matches = []
-        count = 0
-        
-        for card in self.all_cards:
-            if current.lower() in card.name.lower():
-                matches.append(card)
-                count += 1
-                if count == 25:
-                    break
+        matches = card_search_index(await get_catalog()).search(current)
 
         return [
             app_commands.Choice(
@@ -209,13 +203,13 @@ class Cards(commands.Cog):
     @app_commands.autocomplete(player_name=card_search_autocomplete)
     async def view(self, ctx, *, player_name: str):
         """View detailed information about a card"""
-        ensure_player_exists(ctx.author.id, ctx.author.name)
+        await ensure_player_exists(ctx.author.id, ctx.author.name)
         
         if player_name.isdigit():
-            card = get_card_by_id(int(player_name))
+            card = await get_card_by_id(int(player_name))
             cards = [card] if card else []
         else:
-            cards = get_card_by_name_or_id(player_name)
+            cards = await get_card_by_name_or_id(player_name)
         
         if not cards:
             return await ctx.send(f"No card found matching '{player_name}'.")
@@ -223,31 +217,13 @@ class Cards(commands.Cog):
         if len(cards) == 1:
             card = cards[0]
             
-            conn = get_connection()
-            cursor = conn.cursor()
-            
-            cursor.execute('SELECT trade_count FROM inventories WHERE user_id = ? AND card_id = ?', (ctx.author.id, card.card_id))
-            inventory_entry = cursor.fetchone()
-            
-            cursor.execute('''
-                SELECT wishlist_count, 
-                       total_battles_played, total_battles_won, 
-                       total_rounds_played, total_rounds_won 
-                FROM cards WHERE card_id = ?
-            ''', (card.card_id,))
-            
-            row = cursor.fetchone()
+            inventory_entry, row, is_wishlisted = await get_card_details(ctx.author.id, card.card_id)
             wl_count = row[0] if row else 0
             g_b_played = row[1] if row else 0
             g_b_won = row[2] if row else 0
             g_r_played = row[3] if row else 0
             g_r_won = row[4] if row else 0
             
-            cursor.execute('SELECT 1 FROM wishlists WHERE user_id = ? AND card_id = ?', (ctx.author.id, card.card_id))
-            is_wishlisted = cursor.fetchone() is not None
-            
-            conn.close()
-            
             owned_by_user = "Yes" if inventory_entry else "No"
             win_rate = f"{(g_b_won / g_b_played * 100):.1f}%" if g_b_played > 0 else "0%"
 
@@ -270,7 +246,7 @@ class Cards(commands.Cog):
             embed.set_footer(text=f"Requested by {ctx.author.name}", icon_url=ctx.author.display_avatar.url)
 
             view = CardDetailsView(ctx, card.card_id, is_wishlisted)
-            await ctx.send(embed=embed, file=discord.File(card.image_path), view=view)
+            await send_card_image(ctx.send, card.image_path, embed, view=view)
             
             logger.info(f'{ctx.author.name} viewed card {card.name}')
         else:
@@ -287,19 +263,15 @@ class Cards(commands.Cog):
     async def wishlist(self, ctx, user: discord.User = None):
         """View your or another user's card wishlist"""
         target_user = user or ctx.author
-        ensure_player_exists(target_user.id, target_user.name)
+        await ensure_player_exists(target_user.id, target_user.name)
         
-        conn = get_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
+        wishlist = await fetchall('''
             SELECT cards.card_id, cards.name, cards.overall, cards.card_type 
             FROM wishlists 
             JOIN cards ON wishlists.card_id = cards.card_id 
             WHERE wishlists.user_id = ?
             ORDER BY cards.overall DESC
         ''', (target_user.id,))
-        wishlist = cursor.fetchall()
-        conn.close()
         
         if not wishlist:
             return await ctx.send(f"{target_user.name} has no cards in their wishlist.")
@@ -330,7 +302,7 @@ class Cards(commands.Cog):
         """Check the drop weight of a specific card"""
         from utils.models import get_card_weight_by_name
         
-        weight_val, actual_card_name = get_card_weight_by_name(card_name)
+        weight_val, actual_card_name = await get_card_weight_by_name(card_name)
         if weight_val:
             embed = discord.Embed(title=f"Card Weight: {actual_card_name}", color=0x00ff00)
             embed.add_field(name="Pack Weight", value=f"{weight_val:.6f}", inline=False)
@@ -348,21 +320,18 @@ class Cards(commands.Cog):
         await ctx.defer()
         
         target_user = user or ctx.author
-        ensure_player_exists(target_user.id, target_user.name)
+        await ensure_player_exists(target_user.id, target_user.name)
 
         # Resolve Card ID
         if card.isdigit():
             card_id_int = int(card)
         else:
-            cards = get_card_by_name_or_id(card)
+            cards = await get_card_by_name_or_id(card)
             if not cards:
                 return await ctx.send(f"❌ Could not find card: {card}")
             card_id_int = cards[0].card_id
 
-        conn = get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('''
+        result = await fetchone('''
             SELECT c.name, c.overall, c.attack, c.defense, c.speed, 
                    c.card_rarity, c.card_type, c.image_path, c.copies, i.edition,
                    i.battles_played, i.battles_won, i.rounds_played, i.rounds_won
@@ -370,9 +339,6 @@ class Cards(commands.Cog):
             JOIN cards c ON i.card_id = c.card_id
             WHERE i.user_id = ? AND i.card_id = ?
         ''', (target_user.id, card_id_int))
-        
-        result = cursor.fetchone()
-        conn.close()
 
         if not result:
             return await ctx.send(f"❌ **{target_user.name}** does not own Card ID `{card_id_int}`.")
@@ -397,7 +363,7 @@ class Cards(commands.Cog):
 
         # Try to send with image
         try:
-            await ctx.send(file=discord.File(image_path), embed=embed)
+            await send_card_image(ctx.send, image_path, embed)
         except:
             await ctx.send(embed=embed)
         
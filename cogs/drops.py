@@ -11,16 +11,32 @@ import logging
 from datetime import datetime, timedelta
 
 from utils.database import (
-    get_connection, ensure_player_exists, add_card_to_inventory,
+    run_write, ensure_player_exists, add_card_to_inventory,
     increment_cards_dropped, DROP_CHANNEL_IDS
 )
 from utils.models import (
-    Card, get_cards_with_weights, weighted_choice, add_card, fetch_all_cards
+    Card, get_drop_sampler, add_card, fetch_all_cards
 )
+from utils.assets import asset_file
+from utils.uploads import edit_image_url, remember_upload, send_card_image
 
 logger = logging.getLogger(__name__)
 
 
+#---------------------------------------------------------HELPER FUNCTIONS-------------------------------------------------------------------------------------
+
+
+def daily_bonus(streak):
+    """Get the (coins, tier name) daily reward for a streak length."""
+    if streak >= 14:
+        return 300, "🔥 Legendary"
+    elif streak >= 7:
+        return 200, "💎 Diamond"
+    elif streak >= 4:
+        return 150, "🥈 Silver"
+    return 100, "🥉 Bronze"
+
+
 #---------------------------------------------------------UI COMPONENTS-------------------------------------------------------------------------------------
 
 
@@ -49,7 +65,7 @@ class CollectCardButton(discord.ui.Button):
             return
 
         try:
-            add_card_to_inventory(self.user_id, self.card.card_id)
+            await add_card_to_inventory(self.user_id, self.card.card_id)
             await interaction.response.send_message(f'{interaction.user.name} collected {self.card.name}!', ephemeral=True)
 
             # Update embed to success state
@@ -57,7 +73,7 @@ class CollectCardButton(discord.ui.Button):
             embed.title = "✅ Daily Reward Collected!"
             embed.description = f"{interaction.user.mention} has collected **{self.card.name}**!"
             embed.color = discord.Color.green()
-            embed.set_image(url=f"attachment://{self.card.image_path.split('/')[-1]}")
+            embed.set_image(url=edit_image_url(interaction.message, self.card.image_path))
             
             embed.clear_fields()
             embed.add_field(
@@ -96,9 +112,9 @@ class TimedCollectButton(discord.ui.Button):
             return
 
         # Add to Inventory
-        ensure_player_exists(interaction.user.id, interaction.user.name)
+        await ensure_player_exists(interaction.user.id, interaction.user.name)
         try:
-            add_card_to_inventory(interaction.user.id, self.card.card_id)
+            await add_card_to_inventory(interaction.user.id, self.card.card_id)
         except ValueError:
             return await interaction.response.send_message("You already have this card!", ephemeral=True)
 
@@ -108,7 +124,7 @@ class TimedCollectButton(discord.ui.Button):
             description=f"**{self.card.name}** has been collected by {interaction.user.mention}!",
             color=discord.Color.gold()
         )
-        embed.set_image(url=f"attachment://{self.card.image_path.split('/')[-1]}")
+        embed.set_image(url=edit_image_url(interaction.message, self.card.image_path))
         
         embed.add_field(name="Stats", value=f"⭐ {self.card.overall} | ⚔️ {self.card.attack} | 🛡️ {self.card.defense} | ⚡ {self.card.speed}", inline=False)
         embed.add_field(name="Card Details", value=f"ID: {self.card.card_id} | Rarity: {self.card.card_rarity} | Total Copies: {self.card.copies + 1}", inline=False)
@@ -129,31 +145,22 @@ class Drops(commands.Cog):
     
     def __init__(self, bot):
         self.bot = bot
-        self.cards_with_weights = get_cards_with_weights()
-        self.all_cards = fetch_all_cards()
 
-    def cog_load(self):
+    async def cog_load(self):
+        await get_drop_sampler()  # warm the shared card catalog
         self.card_drop.start()
 
     def cog_unload(self):
         self.card_drop.cancel()
 
-    def increment_card_copies(self, card_id):
-        """Increment the copies count for a card."""
-        conn = get_connection()
-        cursor = conn.cursor()
-        cursor.execute('UPDATE cards SET copies = copies + 1 WHERE card_id = ?', (card_id,))
-        conn.commit()
-        conn.close()
-
     # --- Auto Drop Task ---
     @tasks.loop(minutes=30)
     async def card_drop(self):
         """Automatic card drop every 30 minutes"""
         await self.bot.wait_until_ready()
         
-        card = weighted_choice(self.cards_with_weights)
-        add_card(card)
+        card = (await get_drop_sampler()).choice()
+        await add_card(card)
 
         for channel_id in DROP_CHANNEL_IDS:
             channel = self.bot.get_channel(channel_id)
@@ -170,13 +177,12 @@ class Drops(commands.Cog):
                 description="Be the first to click **Collect** to claim this card!",
                 color=discord.Color.blue()
             )
-            embed.set_image(url=f"attachment://{card.image_path.split('/')[-1]}")
             embed.set_footer(text="Hurry! This drop expires in 2 minutes.")
 
             view = DropView(timeout=120)
             view.add_item(TimedCollectButton(card, None))
 
-            msg = await channel.send(embed=embed, view=view, file=discord.File(card.image_path))
+            msg = await send_card_image(channel.send, card.image_path, embed, view=view)
             
             await view.wait()
             
@@ -186,7 +192,7 @@ class Drops(commands.Cog):
                     description=f"No one collected **{card.name}** in time.", 
                     color=discord.Color.red()
                 )
-                expired_embed.set_image(url=f"attachment://{card.image_path.split('/')[-1]}")
+                expired_embed.set_image(url=edit_image_url(msg, card.image_path))
                 await msg.edit(embed=expired_embed, view=None)
                 
         except Exception as e:
@@ -198,111 +204,97 @@ class Drops(commands.Cog):
     async def daily(self, ctx):
         """Claim your daily reward with streak bonus (once per calendar day)"""
         logger.info(f"User {ctx.author.name} (ID: {ctx.author.id}) invoked the daily command.")
-        ensure_player_exists(ctx.author.id, ctx.author.name)
-        
-        conn = get_connection()
-        cursor = conn.cursor()
+        await ensure_player_exists(ctx.author.id, ctx.author.name)
         
-        # Get current streak info
-        cursor.execute('SELECT daily_streak, last_daily_claim FROM players WHERE user_id = ?', (ctx.author.id,))
-        result = cursor.fetchone()
-        current_streak = result[0] if result[0] else 0
-        last_claim = result[1]
-        
-        today = datetime.now().date()
-        
-        # Check if already claimed today
-        if last_claim:
-            last_claim_date = datetime.fromisoformat(last_claim).date()
+        def claim_daily(cursor):
+            # Read and update the streak in one transaction so double invocations can't both claim
+            cursor.execute('SELECT daily_streak, last_daily_claim FROM players WHERE user_id = ?', (ctx.author.id,))
+            result = cursor.fetchone()
+            current_streak = result[0] if result[0] else 0
+            last_claim = result[1]
             
-            if last_claim_date == today:
-                # Already claimed today - show cooldown message
-                tomorrow = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
-                time_until = tomorrow - datetime.now()
-                hours = int(time_until.total_seconds() // 3600)
-                minutes = int((time_until.total_seconds() % 3600) // 60)
+            today = datetime.now().date()
+            
+            if last_claim:
+                last_claim_date = datetime.fromisoformat(last_claim).date()
                 
-                embed = discord.Embed(
-                    title="⏳ Daily Cooldown",
-                    description=f"You've already claimed today!\n\n**Come back in:** {hours}h {minutes}m",
-                    color=discord.Color.orange()
-                )
-                embed.add_field(name="🔥 Current Streak", value=f"**{current_streak}** days", inline=True)
+                if last_claim_date == today:
+                    return False, current_streak
                 
-                if current_streak < 7:
-                    embed.add_field(name="📍 Next Milestone", value=f"{7 - current_streak} days → Free Pack!", inline=True)
-                elif current_streak < 14:
-                    embed.add_field(name="📍 Next Milestone", value=f"{14 - current_streak} days → Rare Pack!", inline=True)
-                else:
-                    embed.add_field(name="🏆 Status", value="Max tier reached!", inline=True)
+                # Calculate days since last claim
+                days_since_claim = (today - last_claim_date).days
                 
-                await ctx.send(embed=embed)
-                conn.close()
-                logger.info(f"User {ctx.author.name} tried to claim daily reward but already claimed today")
-                return
+                if days_since_claim == 1:
+                    # Claimed yesterday - streak continues!
+                    current_streak += 1
+                elif days_since_claim > 1:
+                    # Missed a day - streak resets
+                    current_streak = 1
+            else:
+                # First ever claim
+                current_streak = 1
             
-            # Calculate days since last claim
-            days_since_claim = (today - last_claim_date).days
+            # Update streak in database
+            cursor.execute('''
+                UPDATE players 
+                SET daily_streak = ?, last_daily_claim = ? 
+                WHERE user_id = ?
+            ''', (current_streak, datetime.now().isoformat(), ctx.author.id))
             
-            if days_since_claim == 1:
-                # Claimed yesterday - streak continues!
-                current_streak += 1
-            elif days_since_claim > 1:
-                # Missed a day - streak resets
-                current_streak = 1
-        else:
-            # First ever claim
-            current_streak = 1
-        
-        # Update streak in database
-        cursor.execute('''
-            UPDATE players 
-            SET daily_streak = ?, last_daily_claim = ? 
-            WHERE user_id = ?
-        ''', (current_streak, datetime.now().isoformat(), ctx.author.id))
+            cursor.execute('UPDATE players SET coins = coins + ? WHERE user_id = ?', (daily_bonus(current_streak)[0], ctx.author.id))
+            
+            # Milestone bonuses
+            if current_streak in (7, 14):
+                cursor.execute('SELECT * FROM packs WHERE user_id = ?', (ctx.author.id,))
+                if cursor.fetchone():
+                    cursor.execute('UPDATE packs SET rare_player_pack = rare_player_pack + 1 WHERE user_id = ?', (ctx.author.id,))
+                else:
+                    cursor.execute('INSERT INTO packs (user_id, rare_player_pack, icon_pack, hero_pack, tester_pack) VALUES (?, 1, 0, 0, 0)', (ctx.author.id,))
+            return True, current_streak
+
+        claimed, current_streak = await run_write(claim_daily)
         
-        # Calculate rewards
-        if current_streak >= 14:
-            bonus_coins = 300
-            tier_name = "🔥 Legendary"
-        elif current_streak >= 7:
-            bonus_coins = 200
-            tier_name = "💎 Diamond"
-        elif current_streak >= 4:
-            bonus_coins = 150
-            tier_name = "🥈 Silver"
-        else:
-            bonus_coins = 100
-            tier_name = "🥉 Bronze"
+        # Check if already claimed today
+        if not claimed:
+            # Already claimed today - show cooldown message
+            tomorrow = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
+            time_until = tomorrow - datetime.now()
+            hours = int(time_until.total_seconds() // 3600)
+            minutes = int((time_until.total_seconds() % 3600) // 60)
+            
+            embed = discord.Embed(
+                title="⏳ Daily Cooldown",
+                description=f"You've already claimed today!\n\n**Come back in:** {hours}h {minutes}m",
+                color=discord.Color.orange()
+            )
+            embed.add_field(name="🔥 Current Streak", value=f"**{current_streak}** days", inline=True)
+            
+            if current_streak < 7:
+                embed.add_field(name="📍 Next Milestone", value=f"{7 - current_streak} days → Free Pack!", inline=True)
+            elif current_streak < 14:
+                embed.add_field(name="📍 Next Milestone", value=f"{14 - current_streak} days → Rare Pack!", inline=True)
+            else:
+                embed.add_field(name="🏆 Status", value="Max tier reached!", inline=True)
+            
+            await ctx.send(embed=embed)
+            logger.info(f"User {ctx.author.name} tried to claim daily reward but already claimed today")
+            return
         
-        cursor.execute('UPDATE players SET coins = coins + ? WHERE user_id = ?', (bonus_coins, ctx.author.id))
+        bonus_coins, tier_name = daily_bonus(current_streak)
         
         # Check for milestone bonuses
         milestone_text = ""
         if current_streak == 7:
-            cursor.execute('SELECT * FROM packs WHERE user_id = ?', (ctx.author.id,))
-            if cursor.fetchone():
-                cursor.execute('UPDATE packs SET rare_player_pack = rare_player_pack + 1 WHERE user_id = ?', (ctx.author.id,))
-            else:
-                cursor.execute('INSERT INTO packs (user_id, rare_player_pack, icon_pack, hero_pack, tester_pack) VALUES (?, 1, 0, 0, 0)', (ctx.author.id,))
             milestone_text = "\n\n🎁 **MILESTONE BONUS!** You got a FREE **Rare Player Pack**!"
         elif current_streak == 14:
-            cursor.execute('SELECT * FROM packs WHERE user_id = ?', (ctx.author.id,))
-            if cursor.fetchone():
-                cursor.execute('UPDATE packs SET rare_player_pack = rare_player_pack + 1 WHERE user_id = ?', (ctx.author.id,))
-            else:
-                cursor.execute('INSERT INTO packs (user_id, rare_player_pack, icon_pack, hero_pack, tester_pack) VALUES (?, 1, 0, 0, 0)', (ctx.author.id,))
             milestone_text = "\n\n🎁 **2-WEEK MILESTONE!** You got a FREE **Rare Player Pack**!"
         
-        conn.commit()
-        conn.close()
-        
         # Generate cards
-        cards = [weighted_choice(self.cards_with_weights) for _ in range(2)]
+        cards = (await get_drop_sampler()).sample(2)
         for card in cards:
             card.copies += 1
 
-        increment_cards_dropped(ctx.author.id)
+        await increment_cards_dropped(ctx.author.id)
 
         # Build embed
         streak_display = f"🔥 **{current_streak} Day Streak!** ({tier_name})"
@@ -339,10 +331,11 @@ class Drops(commands.Cog):
         else:
             embed.set_footer(text=f"🏆 You've reached max streak tier! Keep it going!")
         
-        files = [discord.File(card.image_path) for card in cards]
+        files = [asset_file(card.image_path) for card in cards]
         
         try:
             msg = await ctx.send(content=content, embed=embed, view=view, files=files)
+            remember_upload(msg, *(card.image_path for card in cards))
             await view.wait()
             
             if not view.collected:
@@ -362,12 +355,12 @@ class Drops(commands.Cog):
     async def drop_card(self, ctx):
         """Drop a random card for others to collect"""
         logger.info(f"User {ctx.author.name} (ID: {ctx.author.id}) invoked the drop command.")
-        ensure_player_exists(ctx.author.id, ctx.author.name)
+        await ensure_player_exists(ctx.author.id, ctx.author.name)
         
-        card = weighted_choice(self.cards_with_weights)
+        card = (await get_drop_sampler()).choice()
         card.copies += 1
-        add_card(card)
-        increment_cards_dropped(ctx.author.id)
+        await add_card(card)
+        await increment_cards_dropped(ctx.author.id)
 
         current_time = int(time.time())
         unlock_time = current_time + 10
@@ -387,13 +380,12 @@ class Drops(commands.Cog):
         embed.add_field(name="ID", value=card.card_id, inline=True)
         embed.add_field(name="Total Copies", value=card.copies, inline=True)
 
-        embed.set_image(url=f"attachment://{card.image_path.split('/')[-1]}")
 
         view = DropView(timeout=120)
         view.add_item(TimedCollectButton(card, ctx.author.id))
 
         try:
-            msg = await ctx.send(content=content, embed=embed, view=view, file=discord.File(card.image_path))
+            msg = await send_card_image(ctx.send, card.image_path, embed, content=content, view=view)
             
             await asyncio.sleep(10)
             
@@ -426,32 +418,34 @@ class Drops(commands.Cog):
     @commands.hybrid_command(name='get_starter_pack', description="Claim your free starter cards")
     async def get_starter_pack(self, ctx):
         """Claim free starter cards for new players"""
-        ensure_player_exists(ctx.author.id, ctx.author.name)
-        
-        conn = get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('SELECT has_claimed_starter_pack FROM players WHERE user_id = ?', (ctx.author.id,))
-        has_claimed_starter_pack = cursor.fetchone()[0]
-        if has_claimed_starter_pack:
-            conn.close()
-            await ctx.send("You have already claimed your starter pack!")
-            return
+        await ensure_player_exists(ctx.author.id, ctx.author.name)
 
-        all_cards_list = self.all_cards
+        all_cards_list = await fetch_all_cards()
         common_pack = random.sample([card for card in all_cards_list if 70 <= card.overall <= 79], 6)
         uncommon_pack = random.sample([card for card in all_cards_list if 80 <= card.overall <= 85], 3)
         rare_pack = random.sample([card for card in all_cards_list if card.overall > 85 and card.card_type == 'Standard'], 1)
 
         all_cards_received = common_pack + uncommon_pack + rare_pack
 
-        for card in all_cards_received:
-            self.increment_card_copies(card.card_id)
-            add_card_to_inventory(ctx.author.id, card.card_id)
+        def claim_starter_pack(cursor):
+            cursor.execute('SELECT has_claimed_starter_pack FROM players WHERE user_id = ?', (ctx.author.id,))
+            if cursor.fetchone()[0]:
+                return False
+
+            for card in all_cards_received:
+                cursor.execute('UPDATE cards SET copies = copies + 1 WHERE card_id = ?', (card.card_id,))
+                cursor.execute('SELECT 1 FROM inventories WHERE user_id = ? AND card_id = ?', (ctx.author.id, card.card_id))
+                if cursor.fetchone() is None:
+                    cursor.execute('SELECT copies FROM cards WHERE card_id = ?', (card.card_id,))
+                    edition = cursor.fetchone()[0]
+                    cursor.execute('INSERT INTO inventories (user_id, card_id, edition) VALUES (?, ?, ?)', (ctx.author.id, card.card_id, edition))
+
+            cursor.execute('UPDATE players SET has_claimed_starter_pack = 1 WHERE user_id = ?', (ctx.author.id,))
+            return True
 
-        cursor.execute('UPDATE players SET has_claimed_starter_pack = 1 WHERE user_id = ?', (ctx.author.id,))
-        conn.commit()
-        conn.close()
+        if not await run_write(claim_starter_pack):
+            await ctx.send("You have already claimed your starter pack!")
+            return
 
         card_names = "\n".join([f"{card.name} (ID: {card.card_id})" for card in all_cards_received])
         await ctx.send(f"**{ctx.author.name} has claimed their starter pack!**\nYou received:\n{card_names}")
@@ -4,48 +4,19 @@ Shop, buy, sell, packs, coins, and open commands
 """
 import discord
 from discord.ext import commands
-import random
 import logging
 
 from utils.database import (
-    get_connection, ensure_player_exists, add_card_to_inventory,
-    get_player_inventory
+    run_db, run_write, fetchone, ensure_player_exists, get_player_inventory
 )
+from utils.packs import PACKS, MAX_PACKS_PER_OPEN, open_pack_batch
+from utils.render_pool import RenderBusy, render_card_grid
+from utils.rendering import render_filename
+from utils.uploads import send_card_image
 
 logger = logging.getLogger(__name__)
 
 
-#---------------------------------------------------------PACK DEFINITIONS-------------------------------------------------------------------------------------
-
-
-PACKS = {
-    1: {
-        "name": "rare_player_pack",
-        "display_name": "Rare Player Pack",
-        "buyable": True,
-        "cost": 1000
-    },
-    2: {
-        "name": "icon_pack",
-        "display_name": "Icon Pack",
-        "buyable": True,
-        "cost": 2500
-    },
-    3: {
-        "name": "hero_pack",
-        "display_name": "Hero Pack",
-        "buyable": True,
-        "cost": 1750
-    },
-    4: {
-        "name": "tester_pack",
-        "display_name": "Tester Pack",
-        "buyable": False,
-        "cost": 0
-    }
-}
-
-
 #---------------------------------------------------------HELPER FUNCTIONS-------------------------------------------------------------------------------------
 
 
@@ -64,67 +35,15 @@ def calculate_card_value(card):
         return 25
 
 
-def get_user_packs(user_id):
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM packs WHERE user_id = ?", (user_id,))
-    row = cursor.fetchone()
-    conn.close()
-    if row:
-        columns = [desc[0] for desc in cursor.description]
-        return dict(zip(columns, row))
-    return {}
-
-
-def add_pack_to_user(user_id, pack_name):
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute('SELECT * FROM packs WHERE user_id = ?', (user_id,))
-    user_packs = cursor.fetchone()
-    
-    if user_packs:
-        cursor.execute(f'UPDATE packs SET {pack_name} = {pack_name} + 1 WHERE user_id = ?', (user_id,))
-    else:
-        cursor.execute('INSERT INTO packs (user_id, rare_player_pack, icon_pack, hero_pack, tester_pack) VALUES (?, 0, 0, 0, 0)', (user_id,))
-        cursor.execute(f'UPDATE packs SET {pack_name} = {pack_name} + 1 WHERE user_id = ?', (user_id,))
-    
-    conn.commit()
-    conn.close()
-
-
-def remove_pack_from_user(user_id, pack_name):
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute(f"UPDATE packs SET {pack_name} = {pack_name} - 1 WHERE user_id = ? AND {pack_name} > 0", (user_id,))
-    conn.commit()
-    conn.close()
-
-
-def has_sufficient_coins(user_id, cost):
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT coins FROM players WHERE user_id = ?", (user_id,))
-    coins = cursor.fetchone()[0]
-    conn.close()
-    return coins >= cost
-
-
-def deduct_coins(user_id, amount):
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("UPDATE players SET coins = coins - ? WHERE user_id = ?", (amount, user_id))
-    conn.commit()
-    conn.close()
-
-
-def is_duplicate_card(user_id, card_id):
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute('SELECT COUNT(*) FROM inventories WHERE user_id = ? AND card_id = ?', (user_id, card_id))
-    result = cursor.fetchone()[0]
-    conn.close()
-    return result > 0
+async def get_user_packs(user_id):
+    def _get_user_packs(cursor):
+        cursor.execute("SELECT * FROM packs WHERE user_id = ?", (user_id,))
+        row = cursor.fetchone()
+        if row:
+            columns = [desc[0] for desc in cursor.description]
+            return dict(zip(columns, row))
+        return {}
+    return await run_db(_get_user_packs)
 
 
 #---------------------------------------------------------SELL UI COMPONENTS-------------------------------------------------------------------------------------
@@ -197,13 +116,9 @@ class MultiSellConfirmButton(discord.ui.Button):
         view = self.view
         user_id = interaction.user.id
         
-        total_coins = 0
-        count = 0
-        
-        conn = get_connection()
-        cursor = conn.cursor()
-        
-        try:
+        def sell_cards(cursor):
+            total_coins = 0
+            count = 0
             for cid in view.selected_ids:
                 cursor.execute('SELECT 1 FROM inventories WHERE user_id = ? AND card_id = ?', (user_id, cid))
                 if not cursor.fetchone(): 
@@ -221,7 +136,10 @@ class MultiSellConfirmButton(discord.ui.Button):
                 cursor.execute('UPDATE players SET cards_sold = cards_sold + 1 WHERE user_id = ?', (user_id,))
             
             cursor.execute('UPDATE players SET coins = coins + ? WHERE user_id = ?', (total_coins, user_id))
-            conn.commit()
+            return total_coins, count
+        
+        try:
+            total_coins, count = await run_write(sell_cards)
             
             embed = discord.Embed(title="✅ Sale Complete!", color=discord.Color.green())
             embed.description = f"You sold **{count}** cards for **{total_coins:,}** coins."
@@ -233,8 +151,6 @@ class MultiSellConfirmButton(discord.ui.Button):
         except Exception as e:
             logger.error(f"Sell Error: {e}")
             await interaction.response.send_message("❌ Database error.", ephemeral=True)
-        finally:
-            conn.close()
 
 
 class MultiSellView(discord.ui.View):
@@ -328,13 +244,9 @@ class Economy(commands.Cog):
         if user is None:
             user = ctx.author
 
-        ensure_player_exists(user.id, user.name)
+        await ensure_player_exists(user.id, user.name)
         
-        conn = get_connection()
-        cursor = conn.cursor()
-        cursor.execute('SELECT coins FROM players WHERE user_id = ?', (user.id,))
-        coins = cursor.fetchone()[0]
-        conn.close()
+        coins = (await fetchone('SELECT coins FROM players WHERE user_id = ?', (user.id,)))[0]
 
         embed = discord.Embed(
             title=f"{user.name}'s Coins", 
@@ -372,13 +284,23 @@ class Economy(commands.Cog):
             return
 
         cost = pack["cost"]
-
-        if not has_sufficient_coins(user_id, cost):
+        pack_name = pack["name"]
+
+        def buy_pack(cursor):
+            # Charge and grant in one transaction; the coins >= cost guard makes concurrent buys safe
+            cursor.execute('UPDATE players SET coins = coins - ? WHERE user_id = ? AND coins >= ?', (cost, user_id, cost))
+            if cursor.rowcount == 0:
+                return False
+            cursor.execute('SELECT 1 FROM packs WHERE user_id = ?', (user_id,))
+            if not cursor.fetchone():
+                cursor.execute('INSERT INTO packs (user_id, rare_player_pack, icon_pack, hero_pack, tester_pack) VALUES (?, 0, 0, 0, 0)', (user_id,))
+            cursor.execute(f'UPDATE packs SET {pack_name} = {pack_name} + 1 WHERE user_id = ?', (user_id,))
+            return True
+
+        if not await run_write(buy_pack):
             await ctx.send(f"❌ You need **{cost:,}** coins to buy this pack.")
             return
         
-        deduct_coins(user_id, cost)
-        add_pack_to_user(user_id, pack['name'])
         await ctx.send(f"✅ You bought a **{pack['display_name']}** for {cost:,} coins!")
         logger.info(f"User {ctx.author.name} bought a {pack['display_name']} pack.")
 
@@ -386,7 +308,7 @@ class Economy(commands.Cog):
     async def packs(self, ctx):
         """View your pack inventory"""
         user_id = ctx.author.id
-        user_packs = get_user_packs(user_id)
+        user_packs = await get_user_packs(user_id)
         
         if not user_packs:
             await ctx.send("You don't have any packs.")
@@ -408,189 +330,119 @@ class Economy(commands.Cog):
         if not has_packs:
             await ctx.send("You don't have any packs.")
         else:
-            embed.set_footer(text="Use /open <pack_id> to open a pack!")
+            embed.set_footer(text="Use /open <pack_id> [count] or /open_all to open your packs!")
             await ctx.send(embed=embed)
 
-    @commands.hybrid_command(name='open', description="Open a pack")
-    async def open_pack(self, ctx, pack_id: int):
-        """Open a pack from your inventory"""
+    @commands.hybrid_command(name='open', description="Open one or more packs")
+    async def open_pack(self, ctx, pack_id: int, count: int = 1):
+        """Open packs from your inventory"""
         user_id = ctx.author.id
 
         if pack_id not in PACKS:
             await ctx.send("❌ Invalid pack ID.")
             return
+        if count < 1:
+            await ctx.send("❌ You must open at least one pack.")
+            return
 
         pack_name = PACKS[pack_id]["name"]
 
-        user_packs = get_user_packs(user_id)
-        if not user_packs or user_packs.get(pack_name, 0) <= 0:
+        user_packs = await get_user_packs(user_id)
+        owned = user_packs.get(pack_name, 0) if user_packs else 0
+        if owned <= 0:
             await ctx.send("❌ You don't own this pack.")
             return
 
-        # Open the pack based on its type
-        if pack_id == 1:
-            card_obtained = await self.open_rare_player_pack(ctx, user_id)
-        elif pack_id == 2:
-            card_obtained = await self.open_icon_pack(ctx, user_id)
-        elif pack_id == 3:
-            card_obtained = await self.open_hero_pack(ctx, user_id)
-        elif pack_id == 4:
-            card_obtained = await self.open_tester_pack(ctx, user_id)
-
-        remove_pack_from_user(user_id, pack_name)
-        await ctx.send(f"🎉 You opened a **{PACKS[pack_id]['display_name']}** and got **{card_obtained}**!")
-
-    async def open_rare_player_pack(self, ctx, user_id):
-        """Open a rare player pack"""
-        conn = get_connection()
-        cursor = conn.cursor()
-
-        card = None
-        attempts = 0
-        while attempts < 100:
-            card_types = ['Standard', 'Other']
-            probabilities = [0.8, 0.2]
-            chosen_type = random.choices(card_types, probabilities)[0]
-
-            if chosen_type == 'Standard':
-                cursor.execute("SELECT card_id, name, card_rarity, card_type, attack, defense, speed, overall, league, nation, image_path FROM cards WHERE card_type = 'Standard' AND overall > 85 ORDER BY RANDOM() LIMIT 1")
-            else:
-                cursor.execute("SELECT card_id, name, card_rarity, card_type, attack, defense, speed, overall, league, nation, image_path FROM cards WHERE card_type != 'Standard' AND overall > 85 ORDER BY RANDOM() LIMIT 1")
-
-            card = cursor.fetchone()
-            if card and not is_duplicate_card(user_id, card[0]):
-                break
-            attempts += 1
-
-        if not card:
-            conn.close()
-            return "No available cards"
-
-        card_id, name, rarity, card_type, attack, defense, speed, overall, league, nation, image_path = card
-
-        cursor.execute('UPDATE cards SET copies = copies + 1 WHERE card_id = ?', (card_id,))
-        conn.commit()
-        add_card_to_inventory(user_id, card_id)
-        conn.close()
-
-        embed = discord.Embed(title="🎁 Pack Opened!", description=f"**{name}**", color=discord.Color.gold())
-        embed.set_image(url=f"attachment://{image_path.split('/')[-1]}")
-        embed.add_field(name="Rarity", value=rarity, inline=True)
-        embed.add_field(name="Type", value=card_type, inline=True)
-        embed.add_field(name="Overall", value=overall, inline=True)
+        count = min(count, owned, MAX_PACKS_PER_OPEN)
+        await self.open_and_report(ctx, {pack_id: count})
+
+    @commands.hybrid_command(name='open_all', description="Open all of your packs at once")
+    async def open_all(self, ctx):
+        """Open every pack in your inventory"""
+        user_packs = await get_user_packs(ctx.author.id)
+        counts = {
+            pack_id: min(user_packs.get(pack['name'], 0), MAX_PACKS_PER_OPEN)
+            for pack_id, pack in PACKS.items()
+        } if user_packs else {}
+        counts = {pack_id: count for pack_id, count in counts.items() if count > 0}
+
+        if not counts:
+            await ctx.send("You don't have any packs.")
+            return
+        await self.open_and_report(ctx, counts)
+
+    async def open_and_report(self, ctx, counts):
+        """Open ``{pack_id: count}`` packs in one transaction and reply once"""
+        # The packs are consumed in the same transaction that grants their cards
+        try:
+            opened = await open_pack_batch(ctx.author.id, counts)
+        except ValueError as e:
+            await ctx.send(f"❌ {e}")
+            return
+
+        if list(counts.values()) == [1]:
+            pack_id, packs = next(iter(opened.items()))
+            cards = packs[0]
+            if len(cards) == 1:
+                await self.send_card_embed(ctx, PACKS[pack_id]['title'], cards[0])
+            card_obtained = ", ".join(card.name for card in cards)
+            await ctx.send(f"🎉 You opened a **{PACKS[pack_id]['display_name']}** and got **{card_obtained}**!")
+            return
+
+        await self.send_bulk_open_embed(ctx, counts, opened)
+
+    async def send_bulk_open_embed(self, ctx, counts, opened):
+        """Summarise several opened packs in one embed with a combined card grid"""
+        cards = sorted(
+            (card for packs in opened.values() for pack in packs for card in pack),
+            key=lambda card: card.overall, reverse=True
+        )
+        total_packs = sum(len(packs) for packs in opened.values())
+
+        embed = discord.Embed(
+            title=f"📦 Opened {total_packs} Packs!",
+            description=f"You got **{len(cards)}** new cards.",
+            color=discord.Color.gold()
+        )
+        for pack_id, count in counts.items():
+            opened_count = len(opened.get(pack_id, ()))
+            value = f"Opened: **{opened_count}**"
+            if opened_count < count:
+                value += f" ({count - opened_count} kept, you own every card they can contain)"
+            embed.add_field(name=PACKS[pack_id]['display_name'], value=value, inline=False)
+
+        lines = [f"**{card.name}** ({card.overall})" for card in cards[:15]]
+        if len(cards) > 15:
+            lines.append(f"...and {len(cards) - 15} more")
+        embed.add_field(name="Best Pulls", value="\n".join(lines), inline=False)
+        embed.set_footer(text=f"Requested by {ctx.author.name}", icon_url=ctx.author.display_avatar.url)
+
+        try:
+            image_buffer = await render_card_grid(cards)
+        except RenderBusy:
+            image_buffer = None
+        if image_buffer is None:
+            await ctx.send(embed=embed)
+            return
+        filename = render_filename("packs")
+        embed.set_image(url=f"attachment://{filename}")
+        await ctx.send(embed=embed, file=discord.File(image_buffer, filename=filename))
+
+    async def send_card_embed(self, ctx, title, card):
+        """Show a pulled card with its image"""
+        embed = discord.Embed(title=title, description=f"**{card.name}**", color=discord.Color.gold())
+        embed.add_field(name="Rarity", value=card.card_rarity, inline=True)
+        embed.add_field(name="Type", value=card.card_type, inline=True)
+        embed.add_field(name="Overall", value=card.overall, inline=True)
         embed.set_footer(text=f"Requested by {ctx.author.name}", icon_url=ctx.author.display_avatar.url)
-        file = discord.File(image_path, filename=image_path.split('/')[-1])
-        await ctx.send(embed=embed, file=file)
-        return name
-
-    async def open_icon_pack(self, ctx, user_id):
-        """Open an icon pack"""
-        conn = get_connection()
-        cursor = conn.cursor()
-
-        card = None
-        attempts = 0
-        while attempts < 100:
-            cursor.execute("SELECT card_id, name, card_rarity, card_type, attack, defense, speed, overall, league, nation, image_path FROM cards WHERE card_type = 'Icon' ORDER BY RANDOM() LIMIT 1")
-            card = cursor.fetchone()
-            if card and not is_duplicate_card(user_id, card[0]):
-                break
-            attempts += 1
-
-        if not card:
-            conn.close()
-            return "No available icons"
-
-        card_id, name, rarity, card_type, attack, defense, speed, overall, league, nation, image_path = card
-
-        cursor.execute('UPDATE cards SET copies = copies + 1 WHERE card_id = ?', (card_id,))
-        conn.commit()
-        add_card_to_inventory(user_id, card_id)
-        conn.close()
-
-        embed = discord.Embed(title="⭐ Icon Pack Opened!", description=f"**{name}**", color=discord.Color.gold())
-        embed.set_image(url=f"attachment://{image_path.split('/')[-1]}")
-        embed.add_field(name="Overall", value=overall, inline=True)
-        file = discord.File(image_path, filename=image_path.split('/')[-1])
-        await ctx.send(embed=embed, file=file)
-        return name
-
-    async def open_hero_pack(self, ctx, user_id):
-        """Open a hero pack"""
-        conn = get_connection()
-        cursor = conn.cursor()
-
-        card = None
-        attempts = 0
-        while attempts < 100:
-            cursor.execute("SELECT card_id, name, card_rarity, card_type, attack, defense, speed, overall, league, nation, image_path FROM cards WHERE card_type = 'Hero' ORDER BY RANDOM() LIMIT 1")
-            card = cursor.fetchone()
-            if card and not is_duplicate_card(user_id, card[0]):
-                break
-            attempts += 1
-
-        if not card:
-            conn.close()
-            return "No available heroes"
-
-        card_id, name, rarity, card_type, attack, defense, speed, overall, league, nation, image_path = card
-
-        cursor.execute('UPDATE cards SET copies = copies + 1 WHERE card_id = ?', (card_id,))
-        conn.commit()
-        add_card_to_inventory(user_id, card_id)
-        conn.close()
-
-        embed = discord.Embed(title="🦸 Hero Pack Opened!", description=f"**{name}**", color=discord.Color.gold())
-        embed.set_image(url=f"attachment://{image_path.split('/')[-1]}")
-        embed.add_field(name="Overall", value=overall, inline=True)
-        file = discord.File(image_path, filename=image_path.split('/')[-1])
-        await ctx.send(embed=embed, file=file)
-        return name
-
-    async def open_tester_pack(self, ctx, user_id):
-        """Open a tester pack (1 Icon + 4 high OVR cards)"""
-        conn = get_connection()
-        cursor = conn.cursor()
-
-        # Get 1 icon
-        icon_card = None
-        attempts = 0
-        while attempts < 100:
-            cursor.execute("SELECT card_id, name FROM cards WHERE card_type = 'Icon' ORDER BY RANDOM() LIMIT 1")
-            icon_card = cursor.fetchone()
-            if icon_card and not is_duplicate_card(user_id, icon_card[0]):
-                break
-            attempts += 1
-
-        if icon_card:
-            cursor.execute('UPDATE cards SET copies = copies + 1 WHERE card_id = ?', (icon_card[0],))
-            add_card_to_inventory(user_id, icon_card[0])
-
-        # Get 4 high overall cards
-        high_cards = []
-        attempts = 0
-        while len(high_cards) < 4 and attempts < 100:
-            cursor.execute("SELECT card_id, name FROM cards WHERE overall > 85 ORDER BY RANDOM() LIMIT 1")
-            card = cursor.fetchone()
-            if card and not is_duplicate_card(user_id, card[0]):
-                cursor.execute('UPDATE cards SET copies = copies + 1 WHERE card_id = ?', (card[0],))
-                add_card_to_inventory(user_id, card[0])
-                high_cards.append(card[1])
-            attempts += 1
-
-        conn.commit()
-        conn.close()
-
-        cards_obtained = [icon_card[1]] if icon_card else []
-        cards_obtained.extend(high_cards)
-        return ", ".join(cards_obtained) if cards_obtained else "No cards available"
+        await send_card_image(ctx.send, card.image_path, embed)
 
     @commands.hybrid_command(name='sell', description="Sell cards for coins")
     async def sell(self, ctx, *, items: str = None):
         """Open the transfer market to sell cards"""
-        ensure_player_exists(ctx.author.id, ctx.author.name)
+        await ensure_player_exists(ctx.author.id, ctx.author.name)
         
-        inventory, _ = get_player_inventory(ctx.author.id)
+        inventory, _ = await get_player_inventory(ctx.author.id)
         if not inventory:
             return await ctx.send("You have no cards to sell!")
 
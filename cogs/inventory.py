@@ -6,8 +6,9 @@ import discord
 from discord.ext import commands
 import logging
 
-from utils.database import get_connection, ensure_player_exists, get_player_inventory
+from utils.database import ensure_player_exists, get_player_inventory
 from utils.models import fetch_all_cards
+from utils.catalog import get_catalog
 
 logger = logging.getLogger(__name__)
 
@@ -339,15 +340,17 @@ class Inventory(commands.Cog):
     
     def __init__(self, bot):
         self.bot = bot
-        self.all_cards = fetch_all_cards()
+
+    async def cog_load(self):
+        await fetch_all_cards()  # warm the shared card catalog
 
     @commands.hybrid_command(name='inventory', aliases=['inv'], description="View your card collection")
     async def view_inventory(self, ctx, user: discord.User = None, search: str = None):
         """View your or another user's card inventory"""
         target_user = user or ctx.author
-        ensure_player_exists(target_user.id, target_user.name)
+        await ensure_player_exists(target_user.id, target_user.name)
         
-        inventory, editions = get_player_inventory(target_user.id)
+        inventory, editions = await get_player_inventory(target_user.id)
         
         if not inventory:
             return await ctx.send(f"{target_user.name} has no cards in their inventory.")
@@ -370,7 +373,7 @@ class Inventory(commands.Cog):
     @commands.hybrid_command(name='catalog', description="View all available cards")
     async def catalog(self, ctx, search: str = None):
         """View the complete card catalog"""
-        cards = self.all_cards
+        cards = (await get_catalog()).sorted_by('overall')
         
         if not cards:
             return await ctx.send("No cards available in the catalog.")
@@ -6,7 +6,8 @@ import discord
 from discord.ext import commands
 import logging
 
-from utils.database import get_connection, ensure_player_exists, get_player_inventory
+from utils.database import run_write, fetchone, fetchall, ensure_player_exists, get_player_inventory
+from utils.leaderboard import get_leaderboard
 
 logger = logging.getLogger(__name__)
 
@@ -17,55 +18,15 @@ logger = logging.getLogger(__name__)
 async def build_leaderboard_embed(guild, author_id, stat_column, stat_name, scope):
     """Helper to generate the leaderboard Embed."""
     scope = scope.title()  # "Server" or "Global"
-    
-    conn = get_connection()
-    cursor = conn.cursor()
-
-    # Fetch ALL players sorted by the stat
-    cursor.execute(f'SELECT user_id, name, {stat_column} FROM players ORDER BY {stat_column} DESC')
-    all_rows = cursor.fetchall()
-    conn.close()
-
-    leaderboard_data = []
-    user_rank_info = None
-    rank_counter = 1
 
-    # Filter Logic
-    if scope == 'Server':
-        if not guild:
-            return discord.Embed(title="Error", description="Server leaderboard cannot be used in DMs.", color=discord.Color.red())
+    if scope == 'Server' and not guild:
+        return discord.Embed(title="Error", description="Server leaderboard cannot be used in DMs.", color=discord.Color.red())
 
-        guild_member_ids = {member.id for member in guild.members}
-        
-        for row in all_rows:
-            u_id, u_name, u_stat = row
-            
-            if u_id in guild_member_ids:
-                if len(leaderboard_data) < 10:
-                    leaderboard_data.append((rank_counter, u_name, u_stat))
-                
-                if u_id == author_id:
-                    user_rank_info = (rank_counter, u_name, u_stat)
-                
-                rank_counter += 1
-                
-            if len(leaderboard_data) == 10 and user_rank_info:
-                break
-                
-    else:  # Global
-        for row in all_rows:
-            u_id, u_name, u_stat = row
-            
-            if len(leaderboard_data) < 10:
-                leaderboard_data.append((rank_counter, u_name, u_stat))
-            
-            if u_id == author_id:
-                user_rank_info = (rank_counter, u_name, u_stat)
-            
-            rank_counter += 1
-            
-            if len(leaderboard_data) == 10 and user_rank_info:
-                break
+    # Ranks come from the in-memory leaderboards, not a players scan
+    leaderboard = await get_leaderboard()
+    leaderboard_data, user_rank_info = leaderboard.standings(
+        stat_column, author_id, guild if scope == 'Server' else None
+    )
 
     # Build Embed
     icon = "🌍" if scope == "Global" else "🏰"
@@ -183,14 +144,14 @@ class TitleDropdown(discord.ui.Select):
     async def callback(self, interaction: discord.Interaction):
         achievement_id = int(self.values[0])
         
-        conn = get_connection()
-        cursor = conn.cursor()
-        cursor.execute('SELECT title FROM achievements WHERE achievement_id = ?', (achievement_id,))
-        title = cursor.fetchone()[0]
-        
-        cursor.execute('UPDATE players SET display_title = ? WHERE user_id = ?', (title, self.user_id))
-        conn.commit()
-        conn.close()
+        def equip_title(cursor):
+            cursor.execute('SELECT title FROM achievements WHERE achievement_id = ?', (achievement_id,))
+            title = cursor.fetchone()[0]
+            
+            cursor.execute('UPDATE players SET display_title = ? WHERE user_id = ?', (title, self.user_id))
+            return title
+
+        title = await run_write(equip_title)
 
         await interaction.response.send_message(f"Your title has been set to: {title}", ephemeral=True)
         logger.info(f'{interaction.user.name} set their title to {title}')
@@ -211,6 +172,22 @@ class Leaderboards(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
 
+    async def cog_load(self):
+        """Load the leaderboards before the first command needs them"""
+        await get_leaderboard()
+
+    @commands.Cog.listener()
+    async def on_member_join(self, member):
+        (await get_leaderboard()).add_member(member.guild.id, member.id)
+
+    @commands.Cog.listener()
+    async def on_member_remove(self, member):
+        (await get_leaderboard()).remove_member(member.guild.id, member.id)
+
+    @commands.Cog.listener()
+    async def on_guild_remove(self, guild):
+        (await get_leaderboard()).forget_guild(guild.id)
+
     @commands.hybrid_command(name='leaderboard', aliases=['lb'], description="View game rankings")
     async def leaderboard(self, ctx):
         """View the leaderboard with various rankings"""
@@ -230,13 +207,9 @@ class Leaderboards(commands.Cog):
         """View stats for yourself or another player"""
         if member is None:
             member = ctx.author
-        ensure_player_exists(member.id, member.name)
+        await ensure_player_exists(member.id, member.name)
         
-        conn = get_connection()
-        cursor = conn.cursor()
-        cursor.execute('SELECT * FROM players WHERE user_id = ?', (member.id,))
-        player = cursor.fetchone()
-        conn.close()
+        player = await fetchone('SELECT * FROM players WHERE user_id = ?', (member.id,))
         
         if player:
             embed = discord.Embed(title=f"**{player[1]}'s Stats**")
@@ -251,7 +224,7 @@ class Leaderboards(commands.Cog):
             embed.add_field(name="**Rounds Won**", value=player[7])
             embed.add_field(name="**Rounds Lost**", value=player[8])
 
-            cards, editions = get_player_inventory(player[0])
+            cards, editions = await get_player_inventory(player[0])
             total_cards = len(cards)
             common_cards = sum(1 for card in cards if card.card_rarity == 'Common')
             uncommon_cards = sum(1 for card in cards if card.card_rarity == 'Uncommon')
@@ -270,18 +243,14 @@ class Leaderboards(commands.Cog):
     @commands.hybrid_command(name='set_title', description="Equip a title you have unlocked")
     async def set_title(self, ctx):
         """Set your display title from earned achievements"""
-        ensure_player_exists(ctx.author.id, ctx.author.name)
+        await ensure_player_exists(ctx.author.id, ctx.author.name)
         
-        conn = get_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
+        titles = await fetchall('''
         SELECT achievements.title, achievements.achievement_id
         FROM achievements
         JOIN user_achievements ON achievements.achievement_id = user_achievements.achievement_id
         WHERE user_achievements.user_id = ?
         ''', (ctx.author.id,))
-        titles = cursor.fetchall()
-        conn.close()
 
         if titles:
             view = TitleDropdownView(titles, ctx.author.id)
@@ -292,22 +261,17 @@ class Leaderboards(commands.Cog):
     @commands.hybrid_command(name='titles', description="View achievements")
     async def titles(self, ctx, member: discord.Member = None):
         """View all achievements or a user's unlocked achievements"""
-        conn = get_connection()
-        cursor = conn.cursor()
-        
         if member is None:
-            cursor.execute('SELECT title, description FROM achievements')
-            achievements = cursor.fetchall()
+            achievements = await fetchall('SELECT title, description FROM achievements')
             embed = discord.Embed(title="All Achievements", description="List of all possible achievements.")
             for title, description in achievements:
                 embed.add_field(name=title, value=description, inline=False)
         else:
-            cursor.execute('''
+            user_achievements = await fetchall('''
             SELECT a.title, a.description FROM achievements a
             JOIN user_achievements ua ON a.achievement_id = ua.achievement_id
             WHERE ua.user_id = ?
             ''', (member.id,))
-            user_achievements = cursor.fetchall()
 
             if not user_achievements:
                 embed = discord.Embed(title=f"{member.name}'s Achievements", description="This user doesn't have any achievements.")
@@ -316,7 +280,6 @@ class Leaderboards(commands.Cog):
                 for title, description in user_achievements:
                     embed.add_field(name=title, value=description, inline=False)
         
-        conn.close()
         await ctx.send(embed=embed)
         logger.info(f'{ctx.author.name} viewed titles')
 
@@ -89,7 +89,7 @@ class HelpSelect(discord.ui.Select):
         
         elif value == "battle":
             embed = discord.Embed(title="⚔️ Battle Arena", color=discord.Color.red())
-            embed.add_field(name="Matchmaking", value="`/battle @user` - Challenge a player to a 5-round match.", inline=False)
+            embed.add_field(name="Matchmaking", value="`/battle challenge @user` - Challenge a player to a 5-round match.\n`/battle bot` - Practice against the bot (no coins or stats).\n`/battle queue [deck]` - Get matched with a player of similar deck strength.", inline=False)
             embed.add_field(name="Deck Management", value="`/build_deck [name]` - **NEW!** Visual interactive deck builder.\n`/create_deck` - Manual creation (Requires IDs).\n`/edit_deck` - Modify an existing deck.\n`/decks` - View your list of decks.\n`/view_deck` - Visualize your lineup.", inline=False)
             embed.add_field(name="Info", value="`/battle_logic` - Learn the rules of combat.", inline=False)
 
@@ -97,7 +97,7 @@ class HelpSelect(discord.ui.Select):
             embed = discord.Embed(title="🎒 Collection & Items", color=discord.Color.blue())
             embed.add_field(name="Viewing", value="`/inventory` - View your cards (Sort/Filter available).\n`/catalog` - Browse ALL cards in the game database.\n`/view [name]` - See card stats and global popularity.", inline=False)
             embed.add_field(name="Inspection", value="`/lookup [id]` - Generate a custom 'Minted' slab for a card you own.", inline=False)
-            embed.add_field(name="Packs", value="`/packs` - See your unopened card packs.\n`/open [id]` - Open a pack.\n`/weight` - Check drop chances.", inline=False)
+            embed.add_field(name="Packs", value="`/packs` - See your unopened card packs.\n`/open [id] [count]` - Open one or more packs.\n`/open_all` - Open all of your packs.\n`/weight` - Check drop chances.", inline=False)
             embed.add_field(name="Wishlist", value="`/wishlist [id]` - Add/Remove a card from your wishlist.\n`/wishlists [@user]` - View your (or a friend's) wishlist.", inline=False)
 
         elif value == "economy":
@@ -7,8 +7,9 @@ from discord.ext import commands
 import random
 import logging
 
-from utils.database import get_connection, ensure_player_exists, add_card_to_inventory
+from utils.database import run_db, execute, ensure_player_exists, add_card_to_inventory
 from utils.models import get_card_by_id, add_card
+from utils.uploads import send_card_image
 
 logger = logging.getLogger(__name__)
 
@@ -43,45 +44,44 @@ async def process_secret_command(ctx, card_ids, db_column, command_name):
         db_column: Database column to check/update (e.g., 'itscominghome')
         command_name: Name of the command for logging
     """
-    ensure_player_exists(ctx.author.id, ctx.author.name)
+    await ensure_player_exists(ctx.author.id, ctx.author.name)
     
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    # Check if already used
-    cursor.execute(f'SELECT {db_column} FROM players WHERE user_id = ?', (ctx.author.id,))
-    used_command = cursor.fetchone()[0]
+    def pick_card(cursor):
+        # Check if already used
+        cursor.execute(f'SELECT {db_column} FROM players WHERE user_id = ?', (ctx.author.id,))
+        if cursor.fetchone()[0]:
+            return True, None
+        
+        # Find a card the user doesn't own
+        card_id = None
+        attempts = 0
+        max_attempts = len(card_ids) * 2
+        
+        while attempts < max_attempts:
+            attempts += 1
+            card_id = random.choice(card_ids)
+            cursor.execute('SELECT 1 FROM inventories WHERE user_id = ? AND card_id = ?', (ctx.author.id, card_id))
+            if cursor.fetchone() is None:
+                break
+        return False, card_id
+
+    used_command, card_id = await run_db(pick_card)
 
     if used_command:
         await ctx.author.send("You have already used this command.")
-        conn.close()
         return
-    
-    # Find a card the user doesn't own
-    card_id = None
-    attempts = 0
-    max_attempts = len(card_ids) * 2
-    
-    while attempts < max_attempts:
-        attempts += 1
-        card_id = random.choice(card_ids)
-        cursor.execute('SELECT 1 FROM inventories WHERE user_id = ? AND card_id = ?', (ctx.author.id, card_id))
-        if cursor.fetchone() is None:
-            break
 
     if card_id is None:
         await ctx.author.send("No available cards to add to your inventory.")
-        conn.close()
         return
 
-    card = get_card_by_id(card_id)
+    card = await get_card_by_id(card_id)
     if card:
         card.copies += 1
-        add_card(card)
-        add_card_to_inventory(ctx.author.id, card.card_id)
+        await add_card(card)
+        await add_card_to_inventory(ctx.author.id, card.card_id)
 
-        cursor.execute(f'UPDATE players SET {db_column} = 1 WHERE user_id = ?', (ctx.author.id,))
-        conn.commit()
+        await execute(f'UPDATE players SET {db_column} = 1 WHERE user_id = ?', (ctx.author.id,))
         
         embed = discord.Embed(
             title="🎁 Special Drop",
@@ -99,15 +99,12 @@ async def process_secret_command(ctx, card_ids, db_column, command_name):
         embed.add_field(name="League", value=card.league, inline=True)
         embed.add_field(name="Nation", value=card.nation, inline=True)
         embed.add_field(name="Copies", value=card.copies, inline=True)
-        embed.set_image(url=f"attachment://{card.image_path.split('/')[-1]}")
         embed.set_footer(text=f"Requested by {ctx.author.name}", icon_url=ctx.author.display_avatar.url)
 
-        await ctx.author.send(embed=embed, file=discord.File(card.image_path))
+        await send_card_image(ctx.author.send, card.image_path, embed)
         logger.info(f'{ctx.author.name} received a special card {card.name} (ID: {card.card_id}) using !{command_name}')
     else:
         await ctx.author.send("An error occurred while processing your request.")
-    
-    conn.close()
 
 
 #---------------------------------------------------------CARD ID POOLS-------------------------------------------------------------------------------------
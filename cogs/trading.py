@@ -7,7 +7,7 @@ from discord.ext import commands
 import logging
 
 from utils.database import (
-    get_connection, ensure_player_exists, get_player_inventory
+    run_write, fetchone, ensure_player_exists, get_player_inventory
 )
 from utils.models import get_card_by_id
 
@@ -17,13 +17,9 @@ logger = logging.getLogger(__name__)
 #---------------------------------------------------------HELPER FUNCTIONS-------------------------------------------------------------------------------------
 
 
-def check_card_ownership(user_id, card_id):
+async def check_card_ownership(user_id, card_id):
     """Check if a user owns a specific card."""
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute('SELECT 1 FROM inventories WHERE user_id = ? AND card_id = ?', (user_id, card_id))
-    result = cursor.fetchone()
-    conn.close()
+    result = await fetchone('SELECT 1 FROM inventories WHERE user_id = ? AND card_id = ?', (user_id, card_id))
     return result is not None
 
 
@@ -50,24 +46,16 @@ class TradeView(discord.ui.View):
         if interaction.user.id != self.other_user.id:
             return await interaction.response.send_message("This trade offer is not for you!", ephemeral=True)
 
-        conn = get_connection()
-        cursor = conn.cursor()
-        
-        # Verify ownership one last time
-        cursor.execute('SELECT 1 FROM inventories WHERE user_id = ? AND card_id = ?', (self.ctx.author.id, self.your_card.card_id))
-        sender_has = cursor.fetchone()
-        cursor.execute('SELECT 1 FROM inventories WHERE user_id = ? AND card_id = ?', (self.other_user.id, self.their_card.card_id))
-        receiver_has = cursor.fetchone()
-
-        if not sender_has or not receiver_has:
-            conn.close()
-            embed = interaction.message.embeds[0]
-            embed.color = discord.Color.red()
-            embed.title = "❌ Trade Failed"
-            embed.description = "One of the players no longer owns the required card."
-            return await interaction.response.edit_message(embed=embed, view=None)
+        def swap_cards(cursor):
+            # Verify ownership one last time
+            cursor.execute('SELECT 1 FROM inventories WHERE user_id = ? AND card_id = ?', (self.ctx.author.id, self.your_card.card_id))
+            sender_has = cursor.fetchone()
+            cursor.execute('SELECT 1 FROM inventories WHERE user_id = ? AND card_id = ?', (self.other_user.id, self.their_card.card_id))
+            receiver_has = cursor.fetchone()
+
+            if not sender_has or not receiver_has:
+                return False
 
-        try:
             # Move Author's card to Other User
             cursor.execute('''
                 UPDATE inventories 
@@ -81,14 +69,20 @@ class TradeView(discord.ui.View):
                 SET user_id = ?, trade_count = trade_count + 1 
                 WHERE user_id = ? AND card_id = ?
             ''', (self.ctx.author.id, self.other_user.id, self.their_card.card_id))
-            
-            conn.commit()
+            return True
+
+        try:
+            swapped = await run_write(swap_cards)
         except Exception as e:
-            conn.close()
             logger.error(f"Trade Error: {e}")
             return await interaction.response.send_message("Database error occurred.", ephemeral=True)
-        
-        conn.close()
+
+        if not swapped:
+            embed = interaction.message.embeds[0]
+            embed.color = discord.Color.red()
+            embed.title = "❌ Trade Failed"
+            embed.description = "One of the players no longer owns the required card."
+            return await interaction.response.edit_message(embed=embed, view=None)
 
         embed = interaction.message.embeds[0]
         embed.title = "✅ Trade Successful"
@@ -162,14 +156,14 @@ class ExchangeCardSearchSelect(discord.ui.Select):
         card_id = int(self.values[0])
         user = interaction.user
         
-        if not check_card_ownership(user.id, card_id):
+        if not await check_card_ownership(user.id, card_id):
             return await interaction.response.send_message("❌ You no longer own this card.", ephemeral=True)
 
         opponent = self.exchange_view.session.p2 if self.side == 'p1' else self.exchange_view.session.p1
-        if check_card_ownership(opponent.id, card_id):
+        if await check_card_ownership(opponent.id, card_id):
             return await interaction.response.send_message(f"⛔ **{opponent.name}** already owns this card!", ephemeral=True)
 
-        card = get_card_by_id(card_id)
+        card = await get_card_by_id(card_id)
         current_offer = self.exchange_view.session.p1_offer['cards'] if self.side == 'p1' else self.exchange_view.session.p2_offer['cards']
         
         if any(c.card_id == card.card_id for c in current_offer):
@@ -199,7 +193,7 @@ class ExchangeSearchModal(discord.ui.Modal, title="Search your Inventory"):
         search_term = self.query.value.lower()
         user_id = interaction.user.id
         
-        inventory, _ = get_player_inventory(user_id)
+        inventory, _ = await get_player_inventory(user_id)
         matches = [c for c in inventory if search_term in c.name.lower()]
         
         if not matches:
@@ -245,11 +239,7 @@ class ExAddCoinsModal(discord.ui.Modal, title="Add Coins"):
         
         amount = int(self.amount.value)
         
-        conn = get_connection()
-        cursor = conn.cursor()
-        cursor.execute('SELECT coins FROM players WHERE user_id = ?', (interaction.user.id,))
-        user_coins = cursor.fetchone()[0]
-        conn.close()
+        user_coins = (await fetchone('SELECT coins FROM players WHERE user_id = ?', (interaction.user.id,)))[0]
         
         if amount > user_coins:
             return await interaction.response.send_message(f"You only have {user_coins} coins!", ephemeral=True)
@@ -405,10 +395,7 @@ class ExchangeView(discord.ui.View):
             await interaction.response.edit_message(embed=embed, view=self)
 
     async def execute_exchange(self, interaction):
-        conn = get_connection()
-        cursor = conn.cursor()
-        
-        try:
+        def transfer_items(cursor):
             # Transfer cards from P1 to P2
             for card in self.session.p1_offer['cards']:
                 cursor.execute('UPDATE inventories SET user_id = ?, trade_count = trade_count + 1 WHERE user_id = ? AND card_id = ?',
@@ -427,8 +414,9 @@ class ExchangeView(discord.ui.View):
                           (p1_coins, p2_coins, self.session.p1.id))
             cursor.execute('UPDATE players SET coins = coins - ? + ? WHERE user_id = ?',
                           (p2_coins, p1_coins, self.session.p2.id))
-            
-            conn.commit()
+
+        try:
+            await run_write(transfer_items)
             
             embed = discord.Embed(title="✅ Exchange Complete!", color=discord.Color.green())
             embed.description = f"Items have been swapped between **{self.session.p1.name}** and **{self.session.p2.name}**!"
@@ -436,11 +424,8 @@ class ExchangeView(discord.ui.View):
             self.stop()
             
         except Exception as e:
-            conn.rollback()
             logger.error(f"Exchange Error: {e}")
             await interaction.response.send_message("❌ Exchange failed due to database error.", ephemeral=True)
-        finally:
-            conn.close()
 
 
 #---------------------------------------------------------COG CLASS-------------------------------------------------------------------------------------
@@ -458,27 +443,27 @@ class Trading(commands.Cog):
         if ctx.author.id == other_user.id:
             return await ctx.send("You cannot trade with yourself.")
 
-        ensure_player_exists(ctx.author.id, ctx.author.name)
-        ensure_player_exists(other_user.id, other_user.name)
+        await ensure_player_exists(ctx.author.id, ctx.author.name)
+        await ensure_player_exists(other_user.id, other_user.name)
 
-        your_card = get_card_by_id(your_card_id)
-        their_card = get_card_by_id(their_card_id)
+        your_card = await get_card_by_id(your_card_id)
+        their_card = await get_card_by_id(their_card_id)
 
         if not your_card:
             return await ctx.send(f"Card ID **{your_card_id}** not found.")
         if not their_card:
             return await ctx.send(f"Card ID **{their_card_id}** not found.")
 
-        if not check_card_ownership(ctx.author.id, your_card_id):
+        if not await check_card_ownership(ctx.author.id, your_card_id):
             return await ctx.send(f"You do not own the card **{your_card.name}** (ID: {your_card_id}).")
         
-        if not check_card_ownership(other_user.id, their_card_id):
+        if not await check_card_ownership(other_user.id, their_card_id):
             return await ctx.send(f"{other_user.name} does not own the card **{their_card.name}** (ID: {their_card_id}).")
 
-        if check_card_ownership(ctx.author.id, their_card_id):
+        if await check_card_ownership(ctx.author.id, their_card_id):
             return await ctx.send(f"You already own **{their_card.name}**. Cannot trade for duplicates.")
         
-        if check_card_ownership(other_user.id, your_card_id):
+        if await check_card_ownership(other_user.id, your_card_id):
             return await ctx.send(f"{other_user.name} already owns **{your_card.name}**. Cannot trade duplicates.")
 
         view = TradeView(ctx, your_card, other_user, their_card)
@@ -498,8 +483,8 @@ class Trading(commands.Cog):
         if ctx.author.id == other_user.id:
             return await ctx.send("You cannot exchange with yourself.")
 
-        ensure_player_exists(ctx.author.id, ctx.author.name)
-        ensure_player_exists(other_user.id, other_user.name)
+        await ensure_player_exists(ctx.author.id, ctx.author.name)
+        await ensure_player_exists(other_user.id, other_user.name)
 
         view = ExchangeView(ctx, ctx.author, other_user)
         
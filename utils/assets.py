@@ -0,0 +1,175 @@
+"""
+Asset store for FutBot
+Decodes card art, the pitch background and fonts once per process and serves them from memory.
+"""
+import io
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+try:
+    from PIL import Image, ImageFont
+except ImportError:
+    Image = None
+    ImageFont = None
+
+logger = logging.getLogger(__name__)
+
+PITCH_PATH = "pitch.png"
+PITCH_SIZE = (1080, 1350)
+
+# Bold fonts tried in order; the first one that loads is used for every size
+FONT_CANDIDATES = (
+    "arialbd.ttf",
+    "Arial Bold.ttf",
+    "DejaVuSans-Bold.ttf",
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf",
+    "/Library/Fonts/Arial Bold.ttf",
+)
+
+ASSET_CACHE_BYTES = int(os.getenv('ASSET_CACHE_MB', '128')) * 1024 * 1024
+
+
+def file_stamp(path):
+    """(mtime, size) of a file, used to notice replaced assets; None if it doesn't exist."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+class AssetStore:
+    """Per-process cache of decoded images, pre-scaled thumbnails, raw file bytes and fonts.
+
+    Images and bytes share one LRU bounded by ``max_bytes`` (decoded images count as w*h*4).
+    Cached images are shared: callers must ``copy()`` before drawing on them.
+    """
+    def __init__(self, max_bytes=ASSET_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (stamp, value, size)
+        self._bytes = 0
+        self._fonts = {}
+        self._font_path = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    # --- LRU ---
+
+    def _cached(self, key, path, build, size_of):
+        """Return the cached value for ``key`` if ``path`` is unchanged, otherwise ``build()`` and store it."""
+        stamp = file_stamp(path)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == stamp:
+                self._entries.move_to_end(key)
+                return entry[1]
+
+        value = build()
+        size = size_of(value)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[2]
+            if size <= self.max_bytes:
+                self._entries[key] = (stamp, value, size)
+                self._bytes += size
+                while self._bytes > self.max_bytes:
+                    _, (_, _, evicted) = self._entries.popitem(last=False)
+                    self._bytes -= evicted
+        return value
+
+    def clear(self):
+        """Forget every cached asset."""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self._fonts.clear()
+
+    # --- Files ---
+
+    def file_bytes(self, path):
+        """Raw contents of a file (e.g. card art sent as an attachment)."""
+        def build():
+            with open(path, 'rb') as f:
+                return f.read()
+        return self._cached(('bytes', path), path, build, len)
+
+    def open_file(self, path):
+        """A fresh file-like object over the cached bytes of ``path``."""
+        return io.BytesIO(self.file_bytes(path))
+
+    # --- Images ---
+
+    def image(self, path, width=None):
+        """Decoded RGBA image, optionally resized (LANCZOS) to ``width`` keeping its aspect ratio."""
+        def build():
+            if width is None:
+                img = Image.open(path)
+                img.load()
+                return img.convert("RGBA")
+            full = self.image(path)
+            height = int(width * full.height / full.width)
+            return full.resize((width, height), Image.Resampling.LANCZOS)
+        return self._cached(('image', path, width), path, build, lambda img: img.width * img.height * 4)
+
+    def pitch(self, size=PITCH_SIZE):
+        """The pitch background scaled to ``size`` (a plain green pitch if pitch.png is missing)."""
+        def build():
+            try:
+                img = Image.open(PITCH_PATH).convert("RGBA")
+            except FileNotFoundError:
+                return Image.new('RGBA', size, (0, 128, 0, 255))
+            return img.resize(size, Image.Resampling.LANCZOS)
+        return self._cached(('pitch', size), PITCH_PATH, build, lambda img: img.width * img.height * 4)
+
+    # --- Fonts ---
+
+    def font(self, size):
+        """Bold TrueType font at ``size``, falling back to PIL's default font if none is installed."""
+        font = self._fonts.get(size)
+        if font is not None:
+            return font
+
+        if self._font_path is None:
+            self._font_path = ''
+            for candidate in FONT_CANDIDATES:
+                try:
+                    ImageFont.truetype(candidate, size)
+                    self._font_path = candidate
+                    break
+                except OSError:
+                    continue
+            if not self._font_path:
+                logger.warning("No TrueType font found, using PIL's default font for card text")
+
+        font = ImageFont.truetype(self._font_path, size) if self._font_path else ImageFont.load_default()
+        self._fonts[size] = font
+        return font
+
+    # --- Warm-up ---
+
+    def preload(self, image_paths=(), thumb_widths=()):
+        """Decode the pitch and the given card images (and thumbnails) ahead of the first render."""
+        if Image is None:
+            return
+        self.pitch()
+        for path in image_paths:
+            try:
+                self.image(path)
+                for width in thumb_widths:
+                    self.image(path, width)
+            except Exception as e:
+                logger.error(f"Could not preload {path}: {e}")
+
+
+assets = AssetStore()
+
+
+def asset_file(path, filename=None):
+    """discord.File for ``path`` served from the asset store instead of being re-read from disk."""
+    import discord
+    return discord.File(assets.open_file(path), filename=filename or os.path.basename(path))
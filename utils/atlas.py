@@ -0,0 +1,231 @@
+"""
+Lineup sprite atlas for FutBot
+Packs every card's lineup-sized thumbnail into one raw RGBA file that render workers memory-map,
+so a deck lineup is five rectangle blits instead of five decodes and resizes.
+
+Build it offline with ``python -m utils.atlas`` or the ``!build_atlas`` admin command.
+"""
+import json
+import logging
+import mmap
+import os
+import threading
+import time
+
+from utils.assets import PITCH_SIZE, assets, file_stamp
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+ATLAS_DIR = os.getenv('LINEUP_ATLAS_DIR', 'atlas')
+ATLAS_INDEX = os.path.join(ATLAS_DIR, 'lineup_atlas.json')
+
+# Cards are drawn at 35% of the pitch width in the lineup
+LINEUP_CARD_WIDTH = int(PITCH_SIZE[0] * 0.35)
+# Sprites per atlas row-band; every sprite has the same width, so columns are fixed
+ATLAS_COLUMNS = 16
+
+
+# --- Building ---
+
+def load_sprite(image_path, width):
+    """Decode and scale one card like AssetStore.image does, without filling the shared asset cache."""
+    with Image.open(image_path) as img:
+        full = img.convert('RGBA')
+    return full.resize((width, sprite_height(full.size, width)), Image.Resampling.LANCZOS)
+
+
+def sprite_height(size, width):
+    """Height of a ``width``-wide thumbnail of an image of ``size``."""
+    return int(width * size[1] / size[0])
+
+
+def build_lineup_atlas(cards, width=LINEUP_CARD_WIDTH, columns=ATLAS_COLUMNS, directory=ATLAS_DIR):
+    """Pack the lineup thumbnail of every (card_id, image_path) into the atlas files. Returns (packed, skipped).
+
+    The layout is computed from the image headers alone: each sprite goes into the shortest of
+    ``columns`` fixed-width columns. The raw RGBA pixel file is then sized up front, mapped, and
+    every sprite is decoded and written straight into its rows, so only one sprite is held in
+    memory at a time. The index (card_id -> rect plus the source file stamp) is written as JSON
+    next to it and replaced atomically last, so running workers never see a half-written atlas.
+    """
+    if Image is None:
+        raise ValueError("Pillow is required to build the lineup atlas.")
+
+    # 1. Layout from image sizes (headers only, no pixel decode)
+    heights = [0] * columns
+    rects = {}
+    skipped = 0
+    for card_id, image_path in cards:
+        try:
+            stamp = file_stamp(image_path)
+            with Image.open(image_path) as img:
+                height = sprite_height(img.size, width)
+        except Exception as e:
+            logger.error(f"Atlas: could not load image for card {card_id}: {e}")
+            skipped += 1
+            continue
+        column = heights.index(min(heights))
+        rects[str(card_id)] = [column * width, heights[column], width, height, image_path, list(stamp)]
+        heights[column] += height
+    if not rects:
+        raise ValueError("No card images could be loaded for the atlas.")
+
+    atlas_width, atlas_height = width * columns, max(heights)
+    row_bytes = atlas_width * 4
+
+    os.makedirs(directory, exist_ok=True)
+    index_path = os.path.join(directory, os.path.basename(ATLAS_INDEX))
+    # A fresh pixel file per build, so workers still mapping the previous atlas keep valid pages
+    pixels_name = f"lineup_atlas.{time.time_ns()}.rgba"
+    pixels_path = os.path.join(directory, pixels_name)
+
+    # 2. Decode each sprite and copy its rows into the mapped file (unwritten areas stay transparent zeros)
+    with open(pixels_path, 'w+b') as f:
+        f.truncate(row_bytes * atlas_height)
+        with mmap.mmap(f.fileno(), 0) as pixels:
+            for card_id, (x, y, w, h, image_path, stamp) in list(rects.items()):
+                try:
+                    sprite = load_sprite(image_path, width)
+                    if sprite.size != (w, h):
+                        raise ValueError(f"size changed during the build ({sprite.size} != {(w, h)})")
+                    data = sprite.tobytes('raw', 'RGBA')
+                except Exception as e:
+                    logger.error(f"Atlas: could not load image for card {card_id}: {e}")
+                    del rects[card_id]
+                    skipped += 1
+                    continue
+                sprite_row = w * 4
+                for row in range(h):
+                    offset = (y + row) * row_bytes + x * 4
+                    pixels[offset:offset + sprite_row] = data[row * sprite_row:(row + 1) * sprite_row]
+            pixels.flush()
+    if not rects:
+        os.remove(pixels_path)
+        raise ValueError("No card images could be loaded for the atlas.")
+
+    index = {
+        'width': atlas_width, 'height': atlas_height, 'sprite_width': width,
+        'pixels': pixels_name, 'cards': rects,
+    }
+    tmp = f"{index_path}.tmp"
+    with open(tmp, 'w') as f:
+        json.dump(index, f)
+    os.replace(tmp, index_path)
+
+    # Old pixel files are only unlinked; processes that still map one keep it until they reload
+    for name in os.listdir(directory):
+        if name.startswith('lineup_atlas.') and name.endswith('.rgba') and name != pixels_name:
+            try:
+                os.remove(os.path.join(directory, name))
+            except OSError:
+                pass
+    logger.info(f"Built lineup atlas: {len(rects)} cards, {atlas_width}x{atlas_height} ({pixels_path})")
+    return len(rects), skipped
+
+
+def fetch_atlas_cards(cursor):
+    """(card_id, image_path) of every card with an image."""
+    cursor.execute("SELECT card_id, image_path FROM cards WHERE image_path IS NOT NULL AND image_path != ''")
+    return cursor.fetchall()
+
+
+# --- Lookup ---
+
+class LineupAtlas:
+    """Read side of the atlas: maps the pixel file once per process and serves sprites by card id.
+
+    The index file is re-checked on every lookup (one stat), so a rebuild is picked up without a restart.
+    Sprites whose source image changed since the build are reported as missing.
+    """
+    def __init__(self, index_path=ATLAS_INDEX):
+        self.index_path = index_path
+        self._stamp = None
+        self._rects = {}
+        self._image = None
+        self._map = None
+        self.sprite_width = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._rects)
+
+    def refresh(self):
+        """Load (or reload) the atlas if its index file changed."""
+        stamp = file_stamp(self.index_path)
+        if stamp == self._stamp:
+            return
+        with self._lock:
+            if stamp == self._stamp:
+                return
+            self._close()
+            self._stamp = stamp
+            if stamp is None or Image is None:
+                return
+            try:
+                with open(self.index_path) as f:
+                    index = json.load(f)
+                pixels_path = os.path.join(os.path.dirname(self.index_path), index['pixels'])
+                with open(pixels_path, 'rb') as f:
+                    self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                # Zero-copy view over the mapping: pages are only read in when a sprite is blitted
+                self._image = Image.frombuffer(
+                    'RGBA', (index['width'], index['height']), self._map, 'raw', 'RGBA', 0, 1
+                )
+                self._rects = index['cards']
+                self.sprite_width = index['sprite_width']
+            except Exception as e:
+                logger.error(f"Could not load lineup atlas: {e}")
+                self._close()
+
+    def _close(self):
+        self._image = None
+        self._rects = {}
+        self.sprite_width = None
+        if self._map is not None:
+            try:
+                self._map.close()
+            except BufferError:
+                pass  # still exported by a live image; released when it's collected
+            self._map = None
+
+    def sprite(self, card_id, image_path, width):
+        """The card's ``width``-wide thumbnail cut from the atlas, or None if the atlas can't serve it."""
+        self.refresh()
+        if self._image is None or width != self.sprite_width:
+            return None
+        rect = self._rects.get(str(card_id))
+        if rect is None:
+            return None
+        x, y, w, h, path, stamp = rect
+        if path != image_path or file_stamp(path) != tuple(stamp):
+            return None
+        return self._image.crop((x, y, x + w, y + h))
+
+
+lineup_atlas = LineupAtlas()
+
+
+def lineup_sprite(card, width):
+    """Lineup thumbnail of a card: from the atlas when it's current, otherwise decoded via the asset store."""
+    sprite = lineup_atlas.sprite(card.card_id, card.image_path, width)
+    if sprite is None:
+        sprite = assets.image(card.image_path, width)
+    return sprite
+
+
+if __name__ == '__main__':
+    from utils.database import connect
+
+    logging.basicConfig(level=logging.INFO)
+    conn = connect()
+    try:
+        rows = fetch_atlas_cards(conn.cursor())
+    finally:
+        conn.close()
+    packed, skipped = build_lineup_atlas(rows)
+    print(f"Packed {packed} cards into the lineup atlas in {ATLAS_DIR}/ ({skipped} skipped)")
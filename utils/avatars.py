@@ -0,0 +1,101 @@
+"""
+Avatar cache for FutBot
+Fetches user avatars once per avatar hash at the size minted cards draw them, and keeps their circular crops.
+"""
+import hashlib
+import io
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+try:
+    from PIL import Image, ImageDraw, ImageOps
+except ImportError:
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+# Size requested from the CDN; minted cards draw the avatar at ~9% of the card width (90px on a 1000px card)
+AVATAR_FETCH_SIZE = int(os.getenv('AVATAR_FETCH_SIZE', '128'))
+# Avatars (fetched bytes) and circular crops kept, each
+AVATAR_CACHE_SIZE = int(os.getenv('AVATAR_CACHE_SIZE', '512'))
+
+
+class LRU:
+    """Small thread-safe LRU bounded by entry count."""
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+# --- Fetching (bot process) ---
+
+avatar_cache = LRU(AVATAR_CACHE_SIZE)  # avatar key (hash) -> image bytes
+
+
+async def fetch_avatar(user, size=AVATAR_FETCH_SIZE):
+    """Avatar bytes of ``user`` at ``size`` px, fetched once per avatar hash; None if it can't be downloaded.
+
+    discord.py's asset ``key`` is the avatar hash, so a new avatar is a new key and stale entries just age out.
+    """
+    asset = user.display_avatar
+    key = (asset.key, size)
+    data = avatar_cache.get(key)
+    if data is not None:
+        return data
+    try:
+        data = await asset.with_size(size).read()
+    except Exception as e:
+        logger.error(f"Could not fetch avatar of {user}: {e}")
+        return None
+    avatar_cache.put(key, data)
+    return data
+
+
+# --- Circular Crops (render workers) ---
+
+crop_cache = LRU(AVATAR_CACHE_SIZE)  # (avatar digest, size) -> masked RGBA image
+
+
+def circular_avatar(avatar_bytes, size):
+    """The avatar fitted to ``size`` x ``size`` and masked to a circle. Cached images are shared: don't draw on them."""
+    key = (hashlib.sha1(avatar_bytes).digest(), size)
+    crop = crop_cache.get(key)
+    if crop is not None:
+        return crop
+
+    avatar_img = Image.open(io.BytesIO(avatar_bytes)).convert("RGBA")
+    mask = Image.new("L", (size, size), 0)
+    ImageDraw.Draw(mask).ellipse((0, 0, size, size), fill=255)
+    crop = ImageOps.fit(avatar_img, mask.size, method=Image.Resampling.LANCZOS, centering=(0.5, 0.5))
+    crop.putalpha(mask)
+    crop_cache.put(key, crop)
+    return crop
@@ -0,0 +1,131 @@
+"""
+Practice opponent for FutBot
+Plays the second seat of a practice battle with a memoised search over the remaining cards.
+
+The turn player's tactic is chosen by minimax; cards are picked at the same time by both seats, so
+the bot scores each of its cards against every card the opponent may still play (averaged). With
+at most five cards a side the whole game tree fits in a few thousand states, so a decision takes
+milliseconds and later rounds are table lookups.
+"""
+import random
+
+from utils.battle_engine import ROUNDS, TACTICS, match_over, resolve_round, seat_tactics
+
+PRACTICE_DECK_SIZE = 5
+# The bot's deck is drawn from cards within this many overall points of the player's deck average
+PRACTICE_OVERALL_SPREAD = 3
+
+
+def practice_deck(catalog, player_deck, exclude_types=(), size=PRACTICE_DECK_SIZE):
+    """A random bot deck about as strong as ``player_deck`` (read from the catalog only)."""
+    average = round(sum(card.overall for card in player_deck) / len(player_deck)) if player_deck else 75
+    exclude_ids = {card.card_id for card in player_deck}
+    spread = PRACTICE_OVERALL_SPREAD
+    while True:
+        pool = [
+            card for card in catalog.in_range(average - spread, average + spread, exclude_types=exclude_types)
+            if card.card_id not in exclude_ids
+        ]
+        if len(pool) >= size or spread > 100:
+            return random.sample(pool, min(size, len(pool)))
+        spread *= 2
+
+
+class BattleAI:
+    """Decision maker for player 2 of one battle.
+
+    Hands are bitmasks over the two starting decks; values are player 2's expected result
+    (1 win, 0 draw, -1 loss) and are cached per (hands, score, round).
+    """
+    def __init__(self, p1_deck, p2_deck):
+        self.p1_deck = list(p1_deck)
+        self.p2_deck = list(p2_deck)
+        # outcomes[(p1_action, p2_action)][i][j]: 1/2/0 when p1_deck[i] meets p2_deck[j]
+        self.outcomes = {}
+        for tactic in TACTICS:
+            for turn_is_p1 in (True, False):
+                actions = seat_tactics(turn_is_p1, tactic)
+                self.outcomes[actions] = [
+                    [resolve_round(p1_card, p2_card, *actions)[0] for p2_card in self.p2_deck]
+                    for p1_card in self.p1_deck
+                ]
+        self._value_cache = {}
+        self._card_value_cache = {}
+
+    @staticmethod
+    def _mask(deck, cards):
+        ids = {card.card_id for card in cards}
+        mask = 0
+        for i, card in enumerate(deck):
+            if card.card_id in ids:
+                mask |= 1 << i
+        return mask
+
+    def _state(self, battle):
+        return (
+            self._mask(self.p1_deck, battle.get_valid_deck(battle.player1)),
+            self._mask(self.p2_deck, battle.get_valid_deck(battle.player2)),
+            battle.player1_wins, battle.player2_wins, battle.round,
+        )
+
+    # --- Search ---
+
+    def _value(self, p1_hand, p2_hand, p1_wins, p2_wins, round_number):
+        """Value of the position before ``round_number`` is played."""
+        key = (p1_hand, p2_hand, p1_wins, p2_wins, round_number)
+        value = self._value_cache.get(key)
+        if value is None:
+            if not p1_hand or not p2_hand or round_number > ROUNDS:
+                value = (p2_wins > p1_wins) - (p1_wins > p2_wins)
+            else:
+                options = [
+                    max(self._card_values(p1_hand, p2_hand, p1_wins, p2_wins, round_number, actions).values())
+                    for actions in self._actions(round_number)
+                ]
+                # Player 1 picks the tactic in odd rounds
+                value = min(options) if round_number % 2 == 1 else max(options)
+            self._value_cache[key] = value
+        return value
+
+    def _card_values(self, p1_hand, p2_hand, p1_wins, p2_wins, round_number, actions):
+        """{p2 card index: expected value} with player 1's card unknown (every remaining card equally likely)."""
+        key = (p1_hand, p2_hand, p1_wins, p2_wins, round_number, actions)
+        values = self._card_value_cache.get(key)
+        if values is None:
+            outcomes = self.outcomes[actions]
+            p1_cards = [i for i in range(len(self.p1_deck)) if p1_hand >> i & 1]
+            values = {}
+            for j in range(len(self.p2_deck)):
+                if not p2_hand >> j & 1:
+                    continue
+                total = 0
+                for i in p1_cards:
+                    winner = outcomes[i][j]
+                    w1, w2 = p1_wins + (winner == 1), p2_wins + (winner == 2)
+                    if match_over(w1, w2, round_number):
+                        total += (w2 > w1) - (w1 > w2)
+                    else:
+                        total += self._value(p1_hand & ~(1 << i), p2_hand & ~(1 << j), w1, w2, round_number + 1)
+                values[j] = total / len(p1_cards)
+            self._card_value_cache[key] = values
+        return values
+
+    @staticmethod
+    def _actions(round_number):
+        return [seat_tactics(round_number % 2 == 1, tactic) for tactic in TACTICS]
+
+    # --- Decisions ---
+
+    def choose_tactic(self, battle):
+        """The tactic player 2 picks on its turn."""
+        state = self._state(battle)
+        return max(
+            TACTICS,
+            key=lambda tactic: max(self._card_values(*state, seat_tactics(False, tactic)).values(), default=0)
+        )
+
+    def choose_card(self, battle):
+        """Player 2's card for the current round (player 1's pick is not looked at)."""
+        state = self._state(battle)
+        values = self._card_values(*state, (battle.p1_action, battle.p2_action))
+        return self.p2_deck[max(values, key=values.get)] if values else None
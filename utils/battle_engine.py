@@ -0,0 +1,52 @@
+"""
+Battle rules for FutBot
+Round resolution and match flow without Discord, shared by the Battle classes and offline tools.
+"""
+
+TACTICS = ('attack', 'defense', 'speed')
+
+# The turn player picks a tactic; the opponent is forced into its counter
+COUNTER_TACTIC = {'attack': 'defense', 'defense': 'attack', 'speed': 'speed'}
+
+ROUNDS = 5
+WINS_NEEDED = 3
+
+
+def counter_tactic(tactic):
+    """The tactic the other seat plays when the turn player picks ``tactic``."""
+    return COUNTER_TACTIC[tactic]
+
+
+def seat_tactics(turn_is_p1, tactic):
+    """(p1_action, p2_action) after the turn player picked ``tactic``."""
+    if turn_is_p1:
+        return tactic, COUNTER_TACTIC[tactic]
+    return COUNTER_TACTIC[tactic], tactic
+
+
+def duel(p1_action, p2_action):
+    """(p1 stat, p2 stat, label) compared in a round."""
+    if p1_action == 'attack' and p2_action == 'defense':
+        return 'attack', 'defense', "Attack vs Defense"
+    if p1_action == 'defense' and p2_action == 'attack':
+        return 'defense', 'attack', "Defense vs Attack"
+    return 'speed', 'speed', "Speed vs Speed"
+
+
+def resolve_round(p1_card, p2_card, p1_action, p2_action):
+    """(winner, label, on_overall) of one round; winner is 1, 2 or 0 for a draw.
+
+    The duel stat decides; equal stats fall back to overall, equal overalls are a draw.
+    """
+    p1_stat, p2_stat, label = duel(p1_action, p2_action)
+    p1_val, p2_val = getattr(p1_card, p1_stat), getattr(p2_card, p2_stat)
+    if p1_val != p2_val:
+        return (1 if p1_val > p2_val else 2), label, False
+    if p1_card.overall != p2_card.overall:
+        return (1 if p1_card.overall > p2_card.overall else 2), label, True
+    return 0, label, True
+
+
+def match_over(p1_wins, p2_wins, round_number):
+    """Whether the match ends after ``round_number`` was resolved."""
+    return p1_wins >= WINS_NEEDED or p2_wins >= WINS_NEEDED or round_number >= ROUNDS
@@ -0,0 +1,128 @@
+"""
+Battle simulation for FutBot
+The rules of utils.battle_engine over NumPy arrays, for evaluating card balance offline.
+
+Stat arrays have STAT_COLUMNS as their last axis; tactics are indexes into battle_engine.TACTICS.
+Needs numpy (not a bot dependency).
+"""
+import numpy as np
+
+from utils.battle_engine import COUNTER_TACTIC, ROUNDS, TACTICS, WINS_NEEDED
+
+STAT_COLUMNS = ('overall', 'attack', 'defense', 'speed')
+
+# Column of the stat each tactic duels with, and the forced counter of each tactic
+TACTIC_STAT = np.array([STAT_COLUMNS.index(tactic) for tactic in TACTICS])
+COUNTER = np.array([TACTICS.index(COUNTER_TACTIC[tactic]) for tactic in TACTICS])
+
+# Player 1 picks the tactic in rounds 1, 3 and 5
+P1_TURN = np.arange(ROUNDS) % 2 == 0
+
+
+def card_stats(cards):
+    """(len(cards), 4) int16 array of STAT_COLUMNS."""
+    return np.array([[getattr(card, stat) or 0 for stat in STAT_COLUMNS] for card in cards], dtype=np.int16)
+
+
+def p1_tactics(turn_tactics):
+    """Player 1's tactic in each round, from the turn player's picks (shape (..., ROUNDS))."""
+    return np.where(P1_TURN, turn_tactics, COUNTER[turn_tactics])
+
+
+def resolve_rounds(p1, p2, p1_tactic):
+    """Round results: 1 (player 1 wins), -1 (player 2 wins) or 0 (draw).
+
+    ``p1``/``p2`` are stat arrays of shape (..., 4) and ``p1_tactic`` has the leading shape.
+    """
+    p1_stat = np.take_along_axis(p1, TACTIC_STAT[p1_tactic][..., None], axis=-1)[..., 0]
+    p2_stat = np.take_along_axis(p2, TACTIC_STAT[COUNTER[p1_tactic]][..., None], axis=-1)[..., 0]
+    diff = p1_stat.astype(np.int32) - p2_stat
+    tie_break = p1[..., 0].astype(np.int32) - p2[..., 0]
+    return np.sign(np.where(diff != 0, diff, tie_break)).astype(np.int8)
+
+
+def play_matches(p1_decks, p2_decks, turn_tactics):
+    """Play whole matches at once.
+
+    ``p1_decks``/``p2_decks`` are (N, ROUNDS, 4) stats in play order and ``turn_tactics`` is (N, ROUNDS).
+    Returns (rounds, played, result): per-round results, which rounds were reached before someone
+    had WINS_NEEDED wins, and the match result (1, -1 or 0).
+    """
+    rounds = resolve_rounds(p1_decks, p2_decks, p1_tactics(turn_tactics))
+    p1_wins = np.cumsum(rounds == 1, axis=1)
+    p2_wins = np.cumsum(rounds == -1, axis=1)
+    decided = (p1_wins >= WINS_NEEDED) | (p2_wins >= WINS_NEEDED)
+    # A round is played if nobody had won before it
+    played = np.ones_like(decided)
+    played[:, 1:] = ~decided[:, :-1]
+    rounds = np.where(played, rounds, 0).astype(np.int8)
+    result = np.sign((rounds == 1).sum(axis=1) - (rounds == -1).sum(axis=1)).astype(np.int8)
+    return rounds, played, result
+
+
+def sample_decks(rng, pool_size, matches, deck_size=ROUNDS):
+    """(matches, 2, deck_size) card indexes; no card twice in one deck."""
+    decks = rng.integers(0, pool_size, size=(matches, 2, deck_size), dtype=np.int32)
+    while True:
+        # Pairwise compares are cheaper than sorting rows this short
+        clash = np.zeros(decks.shape[:2], dtype=bool)
+        for i in range(deck_size):
+            for j in range(i + 1, deck_size):
+                clash |= decks[..., i] == decks[..., j]
+        if not clash.any():
+            return decks
+        decks[clash] = rng.integers(0, pool_size, size=(int(clash.sum()), deck_size), dtype=np.int32)
+
+
+class BalanceReport:
+    """Per-card and per-tactic tallies accumulated over simulated batches."""
+    def __init__(self, pool_size):
+        self.matches = 0
+        self.p1_results = np.zeros(3, dtype=np.int64)  # player 1 losses, draws, wins
+        self.card_rounds = np.zeros(pool_size, dtype=np.int64)
+        self.card_round_wins = np.zeros(pool_size, dtype=np.int64)
+        self.card_matches = np.zeros(pool_size, dtype=np.int64)
+        self.card_match_wins = np.zeros(pool_size, dtype=np.int64)
+        self.tactic_rounds = np.zeros(len(TACTICS), dtype=np.int64)
+        self.tactic_wins = np.zeros(len(TACTICS), dtype=np.int64)
+        self.tactic_draws = np.zeros(len(TACTICS), dtype=np.int64)
+
+    def add(self, decks, turn_tactics, rounds, played, result):
+        """Tally one batch from sample_decks and play_matches."""
+        pool_size = len(self.card_rounds)
+        self.matches += len(result)
+        self.p1_results += np.bincount(result + 1, minlength=3)
+
+        for seat, sign in ((0, 1), (1, -1)):
+            cards = decks[:, seat]
+            self.card_rounds += np.bincount(cards[played], minlength=pool_size)
+            self.card_round_wins += np.bincount(cards[rounds == sign], minlength=pool_size)
+            self.card_matches += np.bincount(cards.ravel(), minlength=pool_size)
+            self.card_match_wins += np.bincount(cards[result == sign].ravel(), minlength=pool_size)
+
+        # Results from the turn player's side
+        turn_result = np.where(P1_TURN, rounds, -rounds)
+        chosen = turn_tactics[played]
+        self.tactic_rounds += np.bincount(chosen, minlength=len(TACTICS))
+        self.tactic_wins += np.bincount(chosen[turn_result[played] == 1], minlength=len(TACTICS))
+        self.tactic_draws += np.bincount(chosen[turn_result[played] == 0], minlength=len(TACTICS))
+
+    def card_rates(self):
+        """(round win rate, match win rate) per card; NaN for cards never drawn."""
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return self.card_round_wins / self.card_rounds, self.card_match_wins / self.card_matches
+
+
+def simulate(stats, matches, batch=100_000, seed=None, report=None):
+    """Random 5-card decks and random tactics over a (pool, 4) stat array. Returns a BalanceReport."""
+    rng = np.random.default_rng(seed)
+    report = report or BalanceReport(len(stats))
+    remaining = matches
+    while remaining > 0:
+        n = min(batch, remaining)
+        decks = sample_decks(rng, len(stats), n)
+        turn_tactics = rng.integers(0, len(TACTICS), size=(n, ROUNDS))
+        rounds, played, result = play_matches(stats[decks[:, 0]], stats[decks[:, 1]], turn_tactics)
+        report.add(decks, turn_tactics, rounds, played, result)
+        remaining -= n
+    return report
@@ -0,0 +1,177 @@
+"""
+Battle stats for FutBot
+Buffers a battle's stat changes in memory and writes them once, aggregated, when the battle ends.
+"""
+import json
+import logging
+import uuid
+
+from utils.database import run_write
+
+logger = logging.getLogger(__name__)
+
+WIN_COINS = 200
+LOSS_COINS = 100
+DRAW_COINS = 100
+
+# Key columns of each table a ledger updates
+TABLE_KEYS = {
+    'players': ('user_id',),
+    'inventories': ('user_id', 'card_id'),
+    'cards': ('card_id',),
+}
+
+
+# --- Journal ---
+#
+# The ledger so far is stored in the battle's session row (utils.battle_store) in the same write as the
+# phase state, so a resumed battle's state and ledger always agree. The final flush applies the stats and
+# deletes that row in one transaction: no played round is lost or counted twice, and a credited battle can
+# never be resumed. battle_journal only holds rows written by older versions; they are applied on startup.
+
+def apply_statements(cursor, battle_id, statements):
+    """Apply a ledger's aggregated UPDATEs and drop its journal and session rows (one transaction)."""
+    for sql, rows in statements:
+        cursor.executemany(sql, rows)
+    cursor.execute('DELETE FROM battle_journal WHERE battle_id = ?', (battle_id,))
+    cursor.execute('DELETE FROM battles WHERE battle_id = ?', (battle_id,))
+
+
+def recover_battle_journals(cursor):
+    """Apply the stats of battles interrupted by a restart. Returns how many were recovered.
+
+    Journals of battles with a stored session (utils.battle_store) are left alone; those battles resume.
+    """
+    cursor.execute('''
+        SELECT battle_id, ledger FROM battle_journal
+        WHERE battle_id NOT IN (SELECT battle_id FROM battles)
+    ''')
+    rows = cursor.fetchall()
+    for battle_id, payload in rows:
+        try:
+            ledger = BattleLedger.from_json(payload, battle_id)
+        except (ValueError, TypeError) as e:
+            logger.error(f"Dropping unreadable battle journal {battle_id}: {e}")
+            cursor.execute('DELETE FROM battle_journal WHERE battle_id = ?', (battle_id,))
+            continue
+        apply_statements(cursor, battle_id, ledger.statements())
+    return len(rows)
+
+
+_recovered = False
+
+async def recover_interrupted_battles():
+    """Apply the previous run's leftover journals, once per process (before any battle starts)."""
+    global _recovered
+    if _recovered:
+        return 0
+    _recovered = True
+    recovered = await run_write(recover_battle_journals)
+    if recovered:
+        logger.info(f"Recovered the stats of {recovered} interrupted battle(s)")
+    return recovered
+
+
+# --- Ledger ---
+
+class BattleLedger:
+    """Per-row stat increments of one battle, e.g. players[user_id] = {'rounds_won': 2, ...}."""
+    def __init__(self, battle_id=None):
+        self.battle_id = battle_id or uuid.uuid4().hex
+        self.tables = {table: {} for table in TABLE_KEYS}
+        self.flushed = False
+
+    def __bool__(self):
+        return any(self.tables.values())
+
+    def add(self, table, key, **deltas):
+        row = self.tables[table].setdefault(key, {})
+        for column, delta in deltas.items():
+            row[column] = row.get(column, 0) + delta
+
+    def _card(self, user_id, card_id, **deltas):
+        self.add('inventories', (user_id, card_id), **deltas)
+        self.add('cards', (card_id,), **{f'total_{column}': delta for column, delta in deltas.items()})
+
+    # --- Events ---
+
+    def record_round(self, p1_id, p1_card_id, p2_id, p2_card_id, winner_id):
+        """One resolved round; ``winner_id`` is None for a drawn round."""
+        for user_id, card_id in ((p1_id, p1_card_id), (p2_id, p2_card_id)):
+            self.add('players', (user_id,), rounds_played=1)
+            self._card(user_id, card_id, rounds_played=1)
+
+        if winner_id is None:
+            self.add('players', (p1_id,), rounds_drawn=1)
+            self.add('players', (p2_id,), rounds_drawn=1)
+            return
+        loser_id = p2_id if winner_id == p1_id else p1_id
+        winning_card_id = p1_card_id if winner_id == p1_id else p2_card_id
+        self.add('players', (winner_id,), rounds_won=1)
+        self.add('players', (loser_id,), rounds_lost=1)
+        self._card(winner_id, winning_card_id, rounds_won=1)
+
+    def record_result(self, p1_id, p1_card_ids, p2_id, p2_card_ids, winner_id):
+        """A battle played to the end: results, coins and the battle stats of every deck card."""
+        for user_id, card_ids in ((p1_id, p1_card_ids), (p2_id, p2_card_ids)):
+            won = user_id == winner_id
+            if winner_id is None:
+                self.add('players', (user_id,), battles_played=1, battles_drawn=1, coins=DRAW_COINS)
+            elif won:
+                self.add('players', (user_id,), battles_played=1, battles_won=1, coins=WIN_COINS)
+            else:
+                self.add('players', (user_id,), battles_played=1, battles_lost=1, coins=LOSS_COINS)
+            for card_id in card_ids:
+                if won:
+                    self._card(user_id, card_id, battles_played=1, battles_won=1)
+                else:
+                    self._card(user_id, card_id, battles_played=1)
+
+    def record_surrender(self, winner_id, loser_id):
+        self.add('players', (winner_id,), battles_played=1, battles_won=1, coins=WIN_COINS)
+        self.add('players', (loser_id,), battles_played=1, battles_lost=1, coins=LOSS_COINS)
+
+    def record_agreed_draw(self, p1_id, p2_id):
+        for user_id in (p1_id, p2_id):
+            self.add('players', (user_id,), battles_played=1, battles_drawn=1, coins=DRAW_COINS)
+
+    # --- Writing ---
+
+    def statements(self):
+        """[(sql, rows)] with one UPDATE per affected row, grouped by column set for executemany."""
+        grouped = {}
+        for table, rows in self.tables.items():
+            for key, deltas in rows.items():
+                columns = tuple(sorted(column for column, delta in deltas.items() if delta))
+                if columns:
+                    grouped.setdefault((table, columns), []).append(
+                        tuple(deltas[column] for column in columns) + tuple(key)
+                    )
+
+        statements = []
+        for (table, columns), rows in grouped.items():
+            assignments = ', '.join(f'{column} = {column} + ?' for column in columns)
+            where = ' AND '.join(f'{column} = ?' for column in TABLE_KEYS[table])
+            statements.append((f'UPDATE {table} SET {assignments} WHERE {where}', rows))
+        return statements
+
+    def to_json(self):
+        return json.dumps({
+            table: [list(key) + [deltas] for key, deltas in rows.items()]
+            for table, rows in self.tables.items()
+        })
+
+    @classmethod
+    def from_json(cls, payload, battle_id=None):
+        ledger = cls(battle_id)
+        for table, rows in json.loads(payload).items():
+            for *key, deltas in rows:
+                ledger.add(table, tuple(key), **deltas)
+        return ledger
+
+    async def flush(self):
+        """Write every buffered change and end the battle's stored session in one transaction, then clear the ledger."""
+        statements = self.statements()
+        await run_write(apply_statements, self.battle_id, statements)
+        self.tables = {table: {} for table in TABLE_KEYS}
+        self.flushed = True
@@ -0,0 +1,236 @@
+"""
+Battle sessions for FutBot
+Persists every in-flight battle's state so matches survive restarts, and expires abandoned ones.
+
+A Battle (bot.py or cogs/battles.py) calls ``save_battle`` whenever it shows a new phase and
+``forget_battle`` when it ends. On startup ``restore_battles`` rebuilds each stored battle, re-attaches
+its phase view to the original message (stable custom_ids, no timeout) and the match continues.
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+
+from utils.battle_stats import BattleLedger
+from utils.database import run_db, run_write
+
+logger = logging.getLogger(__name__)
+
+# Battles with no interaction for this long are closed (the views themselves never time out)
+BATTLE_IDLE_MINUTES = int(os.getenv('BATTLE_IDLE_MINUTES', '30'))
+SWEEP_INTERVAL = 60
+
+
+# --- Storage ---
+
+def save_battle_row(cursor, battle_id, channel_id, message_id, state, ledger, updated_at):
+    cursor.execute(
+        'INSERT OR REPLACE INTO battles (battle_id, channel_id, message_id, state, ledger, updated_at) VALUES (?, ?, ?, ?, ?, ?)',
+        (battle_id, channel_id, message_id, state, ledger, updated_at)
+    )
+
+
+def delete_battle_row(cursor, battle_id):
+    cursor.execute('DELETE FROM battles WHERE battle_id = ?', (battle_id,))
+
+
+def fetch_battle_rows(cursor):
+    """(battle_id, channel_id, message_id, state, updated_at, ledger or None) of every stored battle."""
+    cursor.execute('''
+        SELECT b.battle_id, b.channel_id, b.message_id, b.state, b.updated_at, COALESCE(b.ledger, j.ledger)
+        FROM battles b LEFT JOIN battle_journal j ON j.battle_id = b.battle_id
+    ''')
+    return cursor.fetchall()
+
+
+# --- State ---
+
+def _card_id(card):
+    return card.card_id if card is not None else None
+
+
+def battle_state(battle):
+    """Everything needed to rebuild a Battle, as a JSON string."""
+    return json.dumps({
+        'players': [battle.player1.id, battle.player2.id],
+        'decks': [[card.card_id for card in battle.player1_deck], [card.card_id for card in battle.player2_deck]],
+        'used': [[card.card_id for card in battle.player1_used_cards], [card.card_id for card in battle.player2_used_cards]],
+        'wins': [battle.player1_wins, battle.player2_wins],
+        'draws': battle.draws,
+        'round': battle.round,
+        'round_resolved': battle.round_resolved,
+        'last_result_text': battle.last_result_text,
+        'last_winner': battle.last_winner.id if battle.last_winner else None,
+        'turn_player': battle.turn_player.id,
+        'actions': [battle.p1_action, battle.p2_action],
+        'cards': [_card_id(battle.p1_card), _card_id(battle.p2_card)],
+        'draw_offers': sorted(battle.draw_offers),
+        'ready_players': sorted(battle.ready_players),
+        'phase': battle.phase,
+        'deck_choices': getattr(battle, 'deck_choices', None),
+    })
+
+
+def apply_battle_state(battle, state, get_card):
+    """Load a saved state into a freshly built Battle whose player1/player2 are already set."""
+    players = {battle.player1.id: battle.player1, battle.player2.id: battle.player2}
+
+    def cards(card_ids):
+        return [card for card in map(get_card, card_ids) if card is not None]
+
+    battle.player1_deck, battle.player2_deck = (cards(ids) for ids in state['decks'])
+    battle.player1_used_cards, battle.player2_used_cards = (cards(ids) for ids in state['used'])
+    battle.player1_wins, battle.player2_wins = state['wins']
+    battle.draws = state['draws']
+    battle.round = state['round']
+    battle.round_resolved = state['round_resolved']
+    battle.last_result_text = state['last_result_text']
+    battle.last_winner = players.get(state['last_winner'])
+    battle.turn_player = players[state['turn_player']]
+    battle.p1_action, battle.p2_action = state['actions']
+    battle.p1_card, battle.p2_card = (get_card(card_id) if card_id is not None else None for card_id in state['cards'])
+    battle.draw_offers = set(state['draw_offers'])
+    battle.ready_players = set(state['ready_players'])
+    battle.phase = state['phase']
+    if state.get('deck_choices') is not None:
+        battle.deck_choices = state['deck_choices']
+
+
+# --- Live Sessions ---
+
+active_battles = {}  # battle_id -> Battle
+_sweeper = None
+
+
+def in_live_battle(user_id):
+    """Whether the user is a player in a battle that hasn't ended."""
+    return any(user_id in (battle.player1.id, battle.player2.id) for battle in active_battles.values())
+
+
+async def save_battle(battle):
+    """Persist a battle and its ledger (one write) after it moved to a new phase, and mark it active.
+
+    Practice battles are only tracked for the idle sweep; they are never written to the database.
+    """
+    if battle.ledger.flushed:
+        return  # already ended; don't bring its row back
+    battle.updated_at = time.time()
+    active_battles[battle.ledger.battle_id] = battle
+    _start_sweeper()
+    if battle.practice:
+        return
+    try:
+        await run_write(
+            save_battle_row, battle.ledger.battle_id, battle.message.channel.id, battle.message.id,
+            battle_state(battle), battle.ledger.to_json(), battle.updated_at
+        )
+    except Exception as e:
+        logger.error(f"Could not save battle {battle.ledger.battle_id}: {e}")
+
+
+async def forget_battle(battle):
+    """Drop a finished battle's session and stop its view.
+
+    A battle whose ledger was flushed already lost its row in that transaction; the others
+    (cancelled setups, failed flushes) are deleted here.
+    """
+    active_battles.pop(battle.ledger.battle_id, None)
+    if getattr(battle, 'view', None) is not None:
+        battle.view.stop()
+        battle.view = None
+    if battle.practice or battle.ledger.flushed:
+        return
+    try:
+        await run_write(delete_battle_row, battle.ledger.battle_id)
+    except Exception as e:
+        logger.error(f"Could not delete battle {battle.ledger.battle_id}: {e}")
+
+
+async def expire_battle(battle):
+    """Close an abandoned battle: its played rounds still count, nobody gets a result."""
+    battle.phase = "EXPIRED"
+    if not battle.practice:
+        try:
+            await battle.ledger.flush()
+        except Exception as e:
+            logger.error(f"Expired battle stats DB Error: {e}")
+    await forget_battle(battle)
+    try:
+        await battle.message.edit(content="⌛ This battle expired after inactivity.", view=None)
+    except Exception as e:
+        logger.error(f"Could not close expired battle message: {e}")
+
+
+def _start_sweeper():
+    global _sweeper
+    if _sweeper is None or _sweeper.done():
+        _sweeper = asyncio.get_running_loop().create_task(_sweep_loop())
+
+
+async def _sweep_loop():
+    while True:
+        await asyncio.sleep(SWEEP_INTERVAL)
+        cutoff = time.time() - BATTLE_IDLE_MINUTES * 60
+        for battle in [b for b in active_battles.values() if b.updated_at < cutoff]:
+            try:
+                await expire_battle(battle)
+            except Exception as e:
+                logger.error(f"Battle sweep failed: {e}")
+
+
+# --- Restoring ---
+
+_restored = False
+
+
+async def restore_battles(bot, build_battle, get_card):
+    """Resume every stored battle once per process. Returns how many were resumed.
+
+    ``build_battle(player1, player2)`` returns an empty Battle with a ``build_view()`` for its current
+    phase; ``get_card(card_id)`` looks up the saved deck cards.
+    """
+    global _restored
+    if _restored:
+        return 0
+    _restored = True
+
+    resumed = 0
+    cutoff = time.time() - BATTLE_IDLE_MINUTES * 60
+    for battle_id, channel_id, message_id, state, updated_at, ledger in await run_db(fetch_battle_rows):
+        battle = None
+        try:
+            state = json.loads(state)
+            player1, player2 = [bot.get_user(user_id) or await bot.fetch_user(user_id) for user_id in state['players']]
+            channel = bot.get_channel(channel_id) or await bot.fetch_channel(channel_id)
+
+            battle = build_battle(player1, player2)
+            battle.ledger = BattleLedger.from_json(ledger, battle_id) if ledger else BattleLedger(battle_id)
+            battle.message = channel.get_partial_message(message_id)
+            apply_battle_state(battle, state, get_card)
+            battle.updated_at = updated_at
+
+            if updated_at < cutoff:
+                await expire_battle(battle)
+                continue
+
+            battle.view = battle.build_view()
+            bot.add_view(battle.view, message_id=message_id)
+            active_battles[battle_id] = battle
+            resumed += 1
+        except Exception as e:
+            logger.error(f"Could not resume battle {battle_id}: {e}")
+            if battle is not None:
+                await expire_battle(battle)
+            else:
+                # Players or channel are gone; keep the played rounds and drop the session (one transaction)
+                if ledger:
+                    await BattleLedger.from_json(ledger, battle_id).flush()
+                else:
+                    await run_write(delete_battle_row, battle_id)
+
+    if active_battles:
+        _start_sweeper()
+    if resumed:
+        logger.info(f"Resumed {resumed} battle(s)")
+    return resumed
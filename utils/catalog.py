@@ -0,0 +1,329 @@
+"""
+Card catalog for FutBot
+Keeps the whole cards table in memory with O(1) id lookups and refreshes it in place.
+"""
+import asyncio
+import logging
+from array import array
+
+from utils.database import connect, run_db
+
+logger = logging.getLogger(__name__)
+
+# Explicit column order matching the Card constructor (SELECT * would put the stat columns into copies)
+CARD_COLUMNS = (
+    'card_id', 'player_id', 'name', 'attack', 'defense', 'speed', 'height', 'club', 'position',
+    'overall', 'image_path', 'card_rarity', 'card_type', 'league', 'nation', 'copies', 'wishlist_count'
+)
+CARD_SELECT = f"SELECT {', '.join(CARD_COLUMNS)} FROM cards"
+
+# Numeric stats kept as packed columns, aligned with CardCatalog.all()
+STAT_COLUMNS = ('overall', 'attack', 'defense', 'speed')
+
+# Counters bumped on drops and wishlists; no index or derived structure depends on them
+COUNTER_COLUMNS = ('copies', 'wishlist_count')
+
+# How often card edits made outside this process (the dashboard) are pulled into the catalog
+SYNC_INTERVAL = 5
+
+
+def fetch_card_rows(cursor, card_ids=None):
+    """Fetch card rows in CARD_COLUMNS order, optionally limited to some ids."""
+    if card_ids is None:
+        cursor.execute(CARD_SELECT)
+    else:
+        if not card_ids:
+            return []
+        placeholders = ','.join('?' * len(card_ids))
+        cursor.execute(f"{CARD_SELECT} WHERE card_id IN ({placeholders})", card_ids)
+    return cursor.fetchall()
+
+
+def fetch_catalog_snapshot(cursor):
+    """Return (last card_changes seq, every card row); changes after that seq are picked up by sync()."""
+    cursor.execute('SELECT COALESCE(MAX(seq), 0) FROM card_changes')
+    seq = cursor.fetchone()[0]
+    return seq, fetch_card_rows(cursor)
+
+
+def fetch_card_changes(cursor, after):
+    """Return (last seq, changed card ids, their fresh rows) for card_changes entries past ``after``."""
+    cursor.execute('SELECT seq, card_id FROM card_changes WHERE seq > ? ORDER BY seq', (after,))
+    changes = cursor.fetchall()
+    if not changes:
+        return after, [], []
+    card_ids = list(dict.fromkeys(card_id for _, card_id in changes))
+    return changes[-1][0], card_ids, fetch_card_rows(cursor, card_ids)
+
+
+class CardCatalog:
+    """In-memory copy of the cards table, indexed by id, player id, type and overall."""
+    def __init__(self, card_class=None):
+        if card_class is None:
+            from utils.models import Card
+            card_class = Card
+        self.card_class = card_class
+        self.version = 0
+        self.change_seq = 0
+        self.by_id = {}
+        self.by_player_id = {}
+        self.by_type = {}
+        self.by_overall = {}
+        self._cards = []
+        self._columns = {stat: array('h') for stat in STAT_COLUMNS}
+        self._positions = {}
+        self._derived = {}
+        self._listeners = []
+        self._sync_task = None
+
+    def __len__(self):
+        return len(self.by_id)
+
+    def __contains__(self, card_id):
+        return card_id in self.by_id
+
+    # --- Loading ---
+
+    def load(self, cursor):
+        """Replace the catalog with every row of the cards table."""
+        self.change_seq, rows = fetch_catalog_snapshot(cursor)
+        self.replace(rows)
+
+    def refresh(self, cursor, card_ids):
+        """Reload only the given card ids; ids no longer in the table are dropped."""
+        card_ids = [int(card_id) for card_id in card_ids]
+        self.update(card_ids, fetch_card_rows(cursor, card_ids))
+
+    def replace(self, rows):
+        """Swap in a full set of card rows."""
+        self.by_id = {row[0]: self.card_class(*row) for row in rows}
+        self._rebuild()
+
+    def update(self, card_ids, rows):
+        """Apply freshly fetched rows for ``card_ids``; ids without a row are removed.
+
+        Only the changed cards are patched in the indexes and stat columns. Existing cards are updated in
+        place, so when nothing but their counters changed, derived structures stay valid and listeners aren't called.
+        """
+        if not card_ids:
+            return
+        rows = {row[0]: row for row in rows}
+        reshaped = False
+        for card_id in card_ids:
+            card = self.by_id.get(card_id)
+            if card_id not in rows:
+                if card is not None:
+                    self._remove(card)
+                    reshaped = True
+            elif card is None:
+                self._add(self.card_class(*rows[card_id]))
+                reshaped = True
+            elif self._patch(card, self.card_class(*rows[card_id])):
+                reshaped = True
+
+        self.version += 1
+        if reshaped:
+            self._changed()
+
+    def _rebuild(self):
+        """Rebuild the secondary indexes and notify subscribers."""
+        self._cards = list(self.by_id.values())
+        self._positions = {card.card_id: i for i, card in enumerate(self._cards)}
+        self._columns = {
+            stat: array('h', [getattr(card, stat) or 0 for card in self._cards])
+            for stat in STAT_COLUMNS
+        }
+        self.by_player_id = {}
+        self.by_type = {}
+        self.by_overall = {}
+        for card in self._cards:
+            self._index(card)
+
+        self.version += 1
+        self._changed()
+
+    def _changed(self):
+        """Drop derived structures and notify subscribers after the card set or indexed fields changed."""
+        self._derived = {}
+        for callback in self._listeners:
+            try:
+                callback(self)
+            except Exception as e:
+                logger.error(f"Catalog listener failed: {e}")
+
+    def _index(self, card):
+        self.by_player_id.setdefault(card.player_id, []).append(card)
+        self.by_type.setdefault(card.card_type, []).append(card)
+        self.by_overall.setdefault(card.overall, []).append(card)
+
+    def _unindex(self, card):
+        for index, key in ((self.by_player_id, card.player_id), (self.by_type, card.card_type), (self.by_overall, card.overall)):
+            bucket = index.get(key, [])
+            for i, other in enumerate(bucket):
+                if other is card:
+                    del bucket[i]
+                    break
+            if not bucket:
+                index.pop(key, None)
+
+    def _add(self, card):
+        self.by_id[card.card_id] = card
+        self._positions[card.card_id] = len(self._cards)
+        self._cards.append(card)
+        for stat, values in self._columns.items():
+            values.append(getattr(card, stat) or 0)
+        self._index(card)
+
+    def _remove(self, card):
+        del self.by_id[card.card_id]
+        position = self._positions.pop(card.card_id)
+        del self._cards[position]
+        for values in self._columns.values():
+            del values[position]
+        for i in range(position, len(self._cards)):
+            self._positions[self._cards[i].card_id] = i
+        self._unindex(card)
+
+    def _patch(self, card, fresh):
+        """Copy ``fresh`` onto the cached card; return whether anything but its counters changed."""
+        reshaped = any(
+            getattr(card, column) != getattr(fresh, column)
+            for column in CARD_COLUMNS if column not in COUNTER_COLUMNS
+        )
+        if reshaped:
+            self._unindex(card)
+        for column in CARD_COLUMNS:
+            setattr(card, column, getattr(fresh, column))
+        if reshaped:
+            self._index(card)
+            position = self._positions[card.card_id]
+            for stat, values in self._columns.items():
+                values[position] = getattr(card, stat) or 0
+        return reshaped
+
+    def subscribe(self, callback):
+        """Call ``callback(catalog)`` after every load, and after refreshes that add, remove or reshape cards."""
+        self._listeners.append(callback)
+
+    # --- External Changes ---
+    #
+    # Triggers (utils.database.ensure_card_change_log) log every card inserted, deleted or edited outside its
+    # counters in card_changes, whichever process wrote it. Each catalog reads the entries past its own seq.
+
+    async def sync(self):
+        """Apply card changes logged since the last load or sync."""
+        seq, card_ids, rows = await run_db(fetch_card_changes, self.change_seq)
+        if card_ids:
+            self.update(card_ids, rows)
+        self.change_seq = seq
+
+    def start(self):
+        """Start the background task that keeps the catalog in step with card_changes."""
+        if self._sync_task is None or self._sync_task.done():
+            self._sync_task = asyncio.get_running_loop().create_task(self._sync_loop())
+
+    async def _sync_loop(self):
+        while True:
+            await asyncio.sleep(SYNC_INTERVAL)
+            try:
+                await self.sync()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Catalog sync failed: {e}")
+
+    # --- Lookups ---
+
+    def get(self, card_id):
+        """Get a card by its ID, or None."""
+        return self.by_id.get(card_id)
+
+    def all(self):
+        """All cards, in table order. Treat the list as read-only."""
+        return self._cards
+
+    def of_type(self, card_type):
+        """All cards of one card_type."""
+        return self.by_type.get(card_type, [])
+
+    def in_range(self, min_overall=None, max_overall=None, card_type=None, exclude_types=()):
+        """Cards whose overall falls in [min_overall, max_overall], optionally filtered by type."""
+        lo = min_overall if min_overall is not None else float('-inf')
+        hi = max_overall if max_overall is not None else float('inf')
+        source = self.of_type(card_type) if card_type is not None else None
+
+        if source is not None:
+            return [card for card in source if lo <= card.overall <= hi and card.card_type not in exclude_types]
+        return [
+            card
+            for overall, cards in self.by_overall.items() if lo <= overall <= hi
+            for card in cards if card.card_type not in exclude_types
+        ]
+
+    def column(self, stat):
+        """Packed values of one stat column, index-aligned with all()."""
+        return self._columns[stat]
+
+    def sorted_by(self, stat, reverse=True):
+        """All cards sorted by a stat column (highest first by default)."""
+        values = self._columns[stat]
+        order = sorted(range(len(values)), key=values.__getitem__, reverse=reverse)
+        cards = self._cards
+        return [cards[i] for i in order]
+
+    def where(self, stat, lo=None, hi=None):
+        """Cards whose stat lies in [lo, hi], scanned over the packed column."""
+        lo = lo if lo is not None else -32768
+        hi = hi if hi is not None else 32767
+        cards = self._cards
+        return [cards[i] for i, value in enumerate(self._columns[stat]) if lo <= value <= hi]
+
+    def memo(self, key, builder):
+        """Return ``builder(catalog)``, cached until cards are added, removed or reshaped."""
+        if key not in self._derived:
+            self._derived[key] = builder(self)
+        return self._derived[key]
+
+
+# --- Shared Catalog ---
+
+_catalog = None
+_catalog_lock = asyncio.Lock()
+
+async def get_catalog():
+    """Get the shared catalog, loading it and starting its sync task on first use."""
+    global _catalog
+    if _catalog is None:
+        async with _catalog_lock:
+            if _catalog is None:
+                catalog = CardCatalog()
+                catalog.change_seq, rows = await run_db(fetch_catalog_snapshot)
+                catalog.replace(rows)
+                catalog.start()
+                _catalog = catalog
+                logger.info(f"Card catalog loaded ({len(catalog)} cards)")
+    return _catalog
+
+async def reload_catalog():
+    """Reload the shared catalog from the database."""
+    catalog = await get_catalog()
+    catalog.change_seq, rows = await run_db(fetch_catalog_snapshot)
+    catalog.replace(rows)
+    return catalog
+
+async def refresh_cards(*card_ids):
+    """Reload specific cards in the shared catalog after they were inserted, edited or deleted."""
+    catalog = await get_catalog()
+    card_ids = [int(card_id) for card_id in card_ids]
+    catalog.update(card_ids, await run_db(fetch_card_rows, card_ids))
+    return catalog
+
+def load_catalog(card_class=None):
+    """Build and load a standalone catalog synchronously (startup / offline use)."""
+    catalog = CardCatalog(card_class)
+    conn = connect()
+    try:
+        catalog.load(conn.cursor())
+    finally:
+        conn.close()
+    return catalog
@@ -2,11 +2,18 @@
 Database utilities for FutBot
 Handles database connection, table creation, migrations, and common DB operations.
 """
+import asyncio
 import sqlite3
 import logging
 import os
+import queue
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from dotenv import load_dotenv
 
+from utils.pack_definitions import PACKS
+
 load_dotenv()
 
 logger = logging.getLogger(__name__)
@@ -25,10 +32,212 @@ SUGGESTION_CHANNEL_ID = int(os.getenv('SUGGESTION_CHANNEL_ID', '0'))
 
 # Database path
 DB_PATH = 'cards_game.db'
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '4'))
+
+# Connection tuning
+DB_BUSY_TIMEOUT_MS = int(os.getenv('DB_BUSY_TIMEOUT_MS', '5000'))
+DB_MMAP_SIZE = int(os.getenv('DB_MMAP_SIZE', str(256 * 1024 * 1024)))
+DB_CACHE_SIZE_KB = int(os.getenv('DB_CACHE_SIZE_KB', '32768'))
+DB_WRITE_BATCH = int(os.getenv('DB_WRITE_BATCH', '64'))
+
+def configure_connection(conn):
+    """Apply the per-connection PRAGMAs every FutBot connection should run with."""
+    conn.execute(f'PRAGMA busy_timeout = {DB_BUSY_TIMEOUT_MS}')
+    conn.execute('PRAGMA synchronous = NORMAL')
+    conn.execute(f'PRAGMA mmap_size = {DB_MMAP_SIZE}')
+    conn.execute(f'PRAGMA cache_size = -{DB_CACHE_SIZE_KB}')
+    conn.execute('PRAGMA temp_store = MEMORY')
+    return conn
+
+def connect(**kwargs):
+    """Open a tuned connection to the bot database."""
+    return configure_connection(sqlite3.connect(DB_PATH, timeout=DB_BUSY_TIMEOUT_MS / 1000, **kwargs))
 
 def get_connection():
-    """Get a new database connection."""
-    return sqlite3.connect(DB_PATH)
+    """Get a new standalone connection (startup migrations and offline scripts only)."""
+    return connect()
+
+def bootstrap_db():
+    """Switch the database to WAL journaling. The mode is stored in the file, so this sticks."""
+    conn = get_connection()
+    mode = conn.execute('PRAGMA journal_mode = WAL').fetchone()[0]
+    conn.close()
+    if mode.lower() != 'wal':
+        logger.warning(f"Could not enable WAL journaling (journal_mode={mode})")
+
+# --- Connection Pool (readers) ---
+
+class ConnectionPool:
+    """A bounded set of long-lived read-only connections served by a dedicated thread pool."""
+    def __init__(self, path, size):
+        self.path = path
+        self.size = size
+        self._idle = queue.LifoQueue()
+        for _ in range(size):
+            conn = connect(check_same_thread=False, isolation_level=None)
+            # Writes must go through the writer queue; make a stray one fail loudly
+            conn.execute('PRAGMA query_only = ON')
+            self._idle.put(conn)
+        # One worker per connection, so a job never waits on a connection it can't get
+        self._executor = ThreadPoolExecutor(max_workers=size, thread_name_prefix='futbot-db')
+
+    @contextmanager
+    def connection(self):
+        """Check a connection out of the pool for the duration of the block."""
+        conn = self._idle.get()
+        try:
+            yield conn
+        finally:
+            self._idle.put(conn)
+
+    def _run(self, func, args):
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            # One read transaction, so multi-query jobs see a single WAL snapshot
+            cursor.execute('BEGIN')
+            try:
+                return func(cursor, *args)
+            finally:
+                cursor.execute('COMMIT')
+                cursor.close()
+
+    async def run(self, func, *args):
+        """Run ``func(cursor, *args)`` in one read transaction on a pooled connection."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._run, func, args)
+
+    def close(self):
+        """Stop the worker threads and close every pooled connection."""
+        self._executor.shutdown(wait=True)
+        while not self._idle.empty():
+            self._idle.get_nowait().close()
+
+# --- Write Queue ---
+
+class DatabaseWriter:
+    """Serializes every write through one connection and commits queued jobs in ordered batches."""
+    def __init__(self, path, max_batch=DB_WRITE_BATCH):
+        self.path = path
+        self.max_batch = max_batch
+        self._conn = connect(check_same_thread=False, isolation_level=None)
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='futbot-db-writer')
+        self._queue = None
+        self._task = None
+
+    async def submit(self, func, *args):
+        """Queue ``func(cursor, *args)`` and wait for the batch holding it to commit."""
+        if self._task is None or self._task.done():
+            self._queue = asyncio.Queue()
+            self._task = asyncio.get_running_loop().create_task(self._drain())
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((func, args, future))
+        return await future
+
+    async def _drain(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            while len(batch) < self.max_batch and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+
+            results = await loop.run_in_executor(self._executor, self._commit_batch, batch)
+
+            for (_, _, future), (ok, value) in zip(batch, results):
+                if future.done():
+                    continue
+                if ok:
+                    future.set_result(value)
+                else:
+                    future.set_exception(value)
+
+    def _commit_batch(self, batch):
+        """Run a batch in one transaction; each job gets a savepoint so one failure can't sink the rest."""
+        cursor = self._conn.cursor()
+        results = []
+        try:
+            cursor.execute('BEGIN IMMEDIATE')
+            for func, args, _ in batch:
+                cursor.execute('SAVEPOINT job')
+                try:
+                    results.append((True, func(cursor, *args)))
+                    cursor.execute('RELEASE job')
+                except Exception as e:
+                    cursor.execute('ROLLBACK TO job')
+                    cursor.execute('RELEASE job')
+                    results.append((False, e))
+            cursor.execute('COMMIT')
+        except Exception as e:
+            if self._conn.in_transaction:
+                cursor.execute('ROLLBACK')
+            logger.error(f"Write batch of {len(batch)} failed: {e}")
+            results = [(False, e)] * len(batch)
+        finally:
+            cursor.close()
+        return results
+
+    def close(self):
+        """Stop the writer and close its connection. Queued jobs that haven't run are cancelled."""
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            self._task = None
+        self._executor.shutdown(wait=True)
+        self._conn.close()
+
+_pool = None
+_writer = None
+
+def get_pool():
+    """Get the shared reader pool, creating it on first use."""
+    global _pool
+    if _pool is None:
+        _pool = ConnectionPool(DB_PATH, DB_POOL_SIZE)
+    return _pool
+
+def get_writer():
+    """Get the shared writer, creating it on first use."""
+    global _writer
+    if _writer is None:
+        _writer = DatabaseWriter(DB_PATH)
+    return _writer
+
+def close_pool():
+    """Close the shared reader pool and writer (call on bot shutdown)."""
+    global _pool, _writer
+    if _pool is not None:
+        _pool.close()
+        _pool = None
+    if _writer is not None:
+        _writer.close()
+        _writer = None
+
+async def run_db(func, *args):
+    """Run read-only ``func(cursor, *args)`` on a pooled connection off the event loop."""
+    return await get_pool().run(func, *args)
+
+async def run_write(func, *args):
+    """Queue ``func(cursor, *args)`` on the single writer. Its changes roll back if it raises."""
+    return await get_writer().submit(func, *args)
+
+async def fetchone(query, params=()):
+    """Run a query and return its first row."""
+    def _fetchone(cursor):
+        cursor.execute(query, params)
+        return cursor.fetchone()
+    return await run_db(_fetchone)
+
+async def fetchall(query, params=()):
+    """Run a query and return all rows."""
+    def _fetchall(cursor):
+        cursor.execute(query, params)
+        return cursor.fetchall()
+    return await run_db(_fetchall)
+
+async def execute(query, params=()):
+    """Run a single write statement through the writer and return the affected row count."""
+    def _execute(cursor):
+        cursor.execute(query, params)
+        return cursor.rowcount
+    return await run_write(_execute)
 
 def init_tables():
     """Create all required tables if they don't exist."""
@@ -132,6 +341,133 @@ def init_tables():
     conn.commit()
     conn.close()
 
+# --- Indexes ---
+
+# (name, table, columns, unique) - unique indexes fall back to plain ones if old data has duplicates
+INDEXES = [
+    ('idx_inventories_user_card', 'inventories', 'user_id, card_id', True),
+    ('idx_inventories_card', 'inventories', 'card_id', False),
+    ('idx_decks_user_name', 'decks', 'user_id, deck_name', True),
+    ('idx_players_name', 'players', 'name', False),
+]
+
+# Ranked players columns; (stat DESC, name) plus the rowid covers the leaderboard query
+LEADERBOARD_COLUMNS = ['battles_won', 'battles_played', 'rounds_won', 'rounds_played', 'coins', 'cards_dropped']
+INDEXES += [(f'idx_players_{col}', 'players', f'{col} DESC, name', False) for col in LEADERBOARD_COLUMNS]
+
+def db_size(cursor):
+    """Return the database file size in bytes (page_count * page_size)."""
+    page_count = cursor.execute('PRAGMA page_count').fetchone()[0]
+    page_size = cursor.execute('PRAGMA page_size').fetchone()[0]
+    return page_count * page_size
+
+def migrate_indexes(cursor):
+    """Create any missing secondary indexes and report their size and build time."""
+    cursor.execute("SELECT name FROM sqlite_master WHERE type = 'index'")
+    existing = {row[0] for row in cursor.fetchall()}
+    missing = [index for index in INDEXES if index[0] not in existing]
+    if not missing:
+        return
+
+    size_before = db_size(cursor)
+    started = time.perf_counter()
+    for name, table, columns, unique in missing:
+        index_started = time.perf_counter()
+        try:
+            cursor.execute(f"CREATE {'UNIQUE ' if unique else ''}INDEX IF NOT EXISTS {name} ON {table} ({columns})")
+        except sqlite3.IntegrityError:
+            logger.warning(f"Duplicate rows in {table} ({columns}); creating {name} as a non-unique index.")
+            cursor.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})")
+        print(f"Migrating DB: Created index {name} on {table} ({columns}) in {(time.perf_counter() - index_started) * 1000:.1f} ms")
+    cursor.execute('ANALYZE')
+
+    added_kb = (db_size(cursor) - size_before) / 1024
+    print(f"Migrating DB: {len(missing)} indexes built in {(time.perf_counter() - started) * 1000:.1f} ms (+{added_kb:.0f} KB)")
+
+# --- Feature Tables ---
+#
+# DDL for tables the feature modules own. It lives here (not in utils.packs, utils.leaderboard, utils.catalog,
+# utils.battle_stats, utils.battle_store) because those import this module, and migrate_db runs on import.
+
+def ensure_pack_columns(cursor):
+    """Add a ``packs`` column for every pack definition that doesn't have one yet."""
+    cursor.execute("PRAGMA table_info(packs)")
+    columns = {info[1] for info in cursor.fetchall()}
+    for pack in PACKS.values():
+        if pack['name'] not in columns:
+            print(f"Migrating DB: Adding {pack['name']} to packs...")
+            cursor.execute(f"ALTER TABLE packs ADD COLUMN {pack['name']} INTEGER DEFAULT 0")
+
+def ensure_leaderboard_triggers(cursor):
+    """Create the leaderboard_dirty table and the players triggers that fill it (drained by utils.leaderboard)."""
+    cursor.execute('CREATE TABLE IF NOT EXISTS leaderboard_dirty (user_id INTEGER PRIMARY KEY)')
+    columns = ', '.join(['name'] + LEADERBOARD_COLUMNS)
+    triggers = {
+        'trg_players_lb_insert': 'AFTER INSERT ON players',
+        'trg_players_lb_update': f'AFTER UPDATE OF {columns} ON players',
+    }
+    for name, event in triggers.items():
+        cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS {name} {event}
+        BEGIN
+            INSERT OR IGNORE INTO leaderboard_dirty (user_id) VALUES (NEW.user_id);
+        END''')
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS trg_players_lb_delete AFTER DELETE ON players
+    BEGIN
+        INSERT OR IGNORE INTO leaderboard_dirty (user_id) VALUES (OLD.user_id);
+    END''')
+
+def ensure_card_change_log(cursor):
+    """Create the card_changes log and the cards triggers that fill it (read by utils.catalog)."""
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS card_changes (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        card_id INTEGER NOT NULL,
+        changed_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    )''')
+    # copies and wishlist_count are left out: they change on every drop and the catalog doesn't index them
+    columns = ('player_id, name, attack, defense, speed, height, club, position, overall, image_path, '
+               'card_rarity, card_type, league, nation')
+    triggers = {
+        'trg_cards_change_insert': ('AFTER INSERT ON cards', 'NEW'),
+        'trg_cards_change_update': (f'AFTER UPDATE OF {columns} ON cards', 'NEW'),
+        'trg_cards_change_delete': ('AFTER DELETE ON cards', 'OLD'),
+    }
+    for name, (event, row) in triggers.items():
+        cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS {name} {event}
+        BEGIN
+            INSERT INTO card_changes (card_id) VALUES ({row}.card_id);
+        END''')
+    # Every catalog has caught up long before a day passes
+    cursor.execute("DELETE FROM card_changes WHERE changed_at < datetime('now', '-1 day')")
+
+def ensure_battle_journal(cursor):
+    """Create the battle_journal table (only read now: ledgers of battles saved by older versions)."""
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS battle_journal (
+        battle_id TEXT PRIMARY KEY,
+        ledger TEXT NOT NULL,
+        updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    )''')
+
+def ensure_battle_store(cursor):
+    """Create the battles table of in-flight sessions (see utils.battle_store)."""
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS battles (
+        battle_id TEXT PRIMARY KEY,
+        channel_id INTEGER NOT NULL,
+        message_id INTEGER NOT NULL,
+        state TEXT NOT NULL,
+        ledger TEXT,
+        updated_at REAL NOT NULL
+    )''')
+    cursor.execute("PRAGMA table_info(battles)")
+    if 'ledger' not in {info[1] for info in cursor.fetchall()}:
+        print("Migrating DB: Adding ledger to battles...")
+        cursor.execute("ALTER TABLE battles ADD COLUMN ledger TEXT")
+
 def migrate_db():
     """Run database migrations to add new columns."""
     try:
@@ -168,6 +504,7 @@ def migrate_db():
             'cards_sold': 'INTEGER DEFAULT 0',
             'display_title': 'TEXT DEFAULT NULL',
             'battles_drawn': 'INTEGER DEFAULT 0',
+            'rounds_drawn': 'INTEGER DEFAULT 0',
             'daily_streak': 'INTEGER DEFAULT 0',
             'last_daily_claim': 'TEXT DEFAULT NULL'
         }
@@ -182,6 +519,24 @@ def migrate_db():
             if col not in player_columns:
                 cursor.execute(f"ALTER TABLE players ADD COLUMN {col} INTEGER DEFAULT 0")
 
+        # One packs column per declared pack
+        ensure_pack_columns(cursor)
+
+        # Change log feeding the in-memory leaderboards
+        ensure_leaderboard_triggers(cursor)
+
+        # Change log keeping the in-memory card catalogs in step with edits from other processes
+        ensure_card_change_log(cursor)
+
+        # Crash journal for battle stats buffered in memory
+        ensure_battle_journal(cursor)
+
+        # In-flight battle sessions, resumed after a restart
+        ensure_battle_store(cursor)
+
+        # Secondary indexes for the hot lookups
+        migrate_indexes(cursor)
+
         conn.commit()
         conn.close()
         print("Database migration complete.")
@@ -190,116 +545,75 @@ def migrate_db():
 
 # --- Common Helper Functions ---
 
-def ensure_player_exists(user_id, user_name):
+async def ensure_player_exists(user_id, user_name):
     """Create player record if it doesn't exist."""
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute('SELECT * FROM players WHERE user_id = ?', (user_id,))
-    if cursor.fetchone() is None:
-        cursor.execute('INSERT INTO players (user_id, name) VALUES (?, ?)', (user_id, user_name))
-        conn.commit()
-    conn.close()
+    await execute('INSERT OR IGNORE INTO players (user_id, name) VALUES (?, ?)', (user_id, user_name))
 
-def add_card_to_inventory(user_id, card_id):
+async def add_card_to_inventory(user_id, card_id):
     """Add a card to user's inventory. Raises ValueError if duplicate."""
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute('SELECT * FROM inventories WHERE user_id = ? AND card_id = ?', (user_id, card_id))
-    if cursor.fetchone() is not None:
-        conn.close()
-        raise ValueError("Card already in inventory")
+    def _add(cursor):
+        cursor.execute('SELECT 1 FROM inventories WHERE user_id = ? AND card_id = ?', (user_id, card_id))
+        if cursor.fetchone() is not None:
+            raise ValueError("Card already in inventory")
 
-    cursor.execute('SELECT copies FROM cards WHERE card_id = ?', (card_id,))
-    result = cursor.fetchone()
-    edition = result[0] if result else 1
+        cursor.execute('SELECT copies FROM cards WHERE card_id = ?', (card_id,))
+        result = cursor.fetchone()
+        edition = result[0] if result else 1
 
-    cursor.execute('INSERT INTO inventories (user_id, card_id, edition) VALUES (?, ?, ?)', (user_id, card_id, edition))
-    conn.commit()
-    conn.close()
+        cursor.execute('INSERT INTO inventories (user_id, card_id, edition) VALUES (?, ?, ?)', (user_id, card_id, edition))
+    await run_write(_add)
 
-def remove_card_from_inventory(user_id, card_id):
+async def remove_card_from_inventory(user_id, card_id):
     """Remove a card from user's inventory."""
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute('DELETE FROM inventories WHERE user_id = ? AND card_id = ?', (user_id, card_id))
-    conn.commit()
-    conn.close()
+    await execute('DELETE FROM inventories WHERE user_id = ? AND card_id = ?', (user_id, card_id))
 
-def get_player_inventory(user_id):
+async def get_player_inventory(user_id):
     """Get all cards in a user's inventory."""
     from utils.models import Card
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute('''
+    rows = await fetchall('''
     SELECT cards.*, inventories.edition FROM cards
     JOIN inventories ON cards.card_id = inventories.card_id
     WHERE inventories.user_id = ?
     ORDER BY cards.overall DESC
     ''', (user_id,))
-    rows = cursor.fetchall()
-    conn.close()
     return [Card(*row[:-1]) for row in rows], [row[-1] for row in rows]
 
-def add_coins(user_id, coins):
+async def add_coins(user_id, coins):
     """Add coins to a user's balance."""
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute('UPDATE players SET coins = coins + ? WHERE user_id = ?', (coins, user_id))
-    conn.commit()
-    conn.close()
+    await execute('UPDATE players SET coins = coins + ? WHERE user_id = ?', (coins, user_id))
 
-def deduct_coins(user_id, amount):
+async def deduct_coins(user_id, amount):
     """Deduct coins from a user's balance."""
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute('UPDATE players SET coins = coins - ? WHERE user_id = ?', (amount, user_id))
-    conn.commit()
-    conn.close()
+    await execute('UPDATE players SET coins = coins - ? WHERE user_id = ?', (amount, user_id))
 
-def get_user_coins(user_id):
+async def get_user_coins(user_id):
     """Get a user's coin balance."""
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute('SELECT coins FROM players WHERE user_id = ?', (user_id,))
-    result = cursor.fetchone()
-    conn.close()
+    result = await fetchone('SELECT coins FROM players WHERE user_id = ?', (user_id,))
     return result[0] if result else 0
 
-def has_sufficient_coins(user_id, cost):
+async def has_sufficient_coins(user_id, cost):
     """Check if user has enough coins."""
-    return get_user_coins(user_id) >= cost
+    return await get_user_coins(user_id) >= cost
 
-def check_card_ownership(user_id, card_id):
+async def check_card_ownership(user_id, card_id):
     """Check if user owns a specific card."""
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute('SELECT * FROM inventories WHERE user_id = ? AND card_id = ?', (user_id, card_id))
-    result = cursor.fetchone()
-    conn.close()
+    result = await fetchone('SELECT 1 FROM inventories WHERE user_id = ? AND card_id = ?', (user_id, card_id))
     return result is not None
 
-def increment_cards_dropped(user_id):
+async def increment_cards_dropped(user_id):
     """Increment the cards_dropped counter for a user."""
     try:
-        conn = get_connection()
-        cursor = conn.cursor()
-        cursor.execute("UPDATE players SET cards_dropped = cards_dropped + 1 WHERE user_id = ?", (user_id,))
-        conn.commit()
-        conn.close()
+        await execute("UPDATE players SET cards_dropped = cards_dropped + 1 WHERE user_id = ?", (user_id,))
         return True
     except Exception as e:
         logger.error(f"Error incrementing cards_dropped: {e}")
         return False
 
-def increment_cards_sold(user_id):
+async def increment_cards_sold(user_id):
     """Increment the cards_sold counter for a user."""
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("UPDATE players SET cards_sold = cards_sold + 1 WHERE user_id = ?", (user_id,))
-    conn.commit()
-    conn.close()
+    await execute("UPDATE players SET cards_sold = cards_sold + 1 WHERE user_id = ?", (user_id,))
 
 # Initialize on import
+bootstrap_db()
 init_tables()
 migrate_db()
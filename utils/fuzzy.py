@@ -0,0 +1,54 @@
+"""
+Fuzzy card name matching for FutBot
+One rapidfuzz matcher per catalog version, with the processed name list built once.
+"""
+import os
+
+from rapidfuzz import fuzz, process
+from rapidfuzz.utils import default_process
+
+from utils.search import fold
+
+# Matches scoring below this (0-100, WRatio) count as "not found"
+FUZZY_SCORE_CUTOFF = float(os.getenv('FUZZY_SCORE_CUTOFF', '60'))
+
+
+def normalize(name):
+    """Accent-fold, lower-case and strip punctuation, so queries and names are processed the same way."""
+    return default_process(fold(name))
+
+
+class CardNameMatcher:
+    """Best-match lookup of typed card names against the catalog.
+
+    Choice strings are normalized once at build time and matched with ``processor=None``; list
+    positions map straight back to cards. Exact (normalized) names skip the fuzzy scan entirely.
+    """
+    def __init__(self, cards, score_cutoff=FUZZY_SCORE_CUTOFF):
+        self.cards = list(cards)
+        self.choices = [normalize(card.name) for card in self.cards]
+        self.score_cutoff = score_cutoff
+        self.exact = {}
+        for position, choice in enumerate(self.choices):
+            self.exact.setdefault(choice, position)
+
+    def __len__(self):
+        return len(self.cards)
+
+    def best(self, query):
+        """The closest card to ``query``, or None if nothing scores at least ``score_cutoff``."""
+        query = normalize(query)
+        if not query:
+            return None
+        position = self.exact.get(query)
+        if position is not None:
+            return self.cards[position]
+        match = process.extractOne(
+            query, self.choices, scorer=fuzz.WRatio, processor=None, score_cutoff=self.score_cutoff
+        )
+        return self.cards[match[2]] if match else None
+
+
+def card_name_matcher(catalog):
+    """The name matcher of a CardCatalog, rebuilt after the catalog changes."""
+    return catalog.memo('matcher', lambda c: CardNameMatcher(c.all()))
@@ -0,0 +1,268 @@
+"""
+Leaderboards for FutBot
+Keeps every ranked stat as an in-memory sorted index so top-10 and "your rank" never scan the players table.
+"""
+import asyncio
+import logging
+from bisect import bisect_left, insort
+
+from utils.database import LEADERBOARD_COLUMNS, run_db, run_write
+
+logger = logging.getLogger(__name__)
+
+# How often changed players are pulled back into the in-memory rankings
+SYNC_INTERVAL = 5
+
+
+# --- Change Tracking ---
+#
+# Triggers (utils.database.ensure_leaderboard_triggers) record every player whose name or ranked stats
+# change in leaderboard_dirty, whichever code path wrote them (cogs, bot.py, the dashboard). The service
+# drains that table in the background.
+
+def fetch_player_rows(cursor, user_ids=None):
+    """Fetch (user_id, name, *LEADERBOARD_COLUMNS) rows, optionally limited to some ids."""
+    query = f"SELECT user_id, name, {', '.join(LEADERBOARD_COLUMNS)} FROM players"
+    if user_ids is None:
+        cursor.execute(query)
+    else:
+        if not user_ids:
+            return []
+        placeholders = ','.join('?' * len(user_ids))
+        cursor.execute(f"{query} WHERE user_id IN ({placeholders})", user_ids)
+    return cursor.fetchall()
+
+
+def drain_changes(cursor):
+    """Take the dirty player ids and return (ids, fresh rows) in one transaction."""
+    cursor.execute('SELECT user_id FROM leaderboard_dirty')
+    user_ids = [row[0] for row in cursor.fetchall()]
+    if not user_ids:
+        return [], []
+    rows = fetch_player_rows(cursor, user_ids)
+    cursor.execute('DELETE FROM leaderboard_dirty')
+    return user_ids, rows
+
+
+# --- Rankings ---
+
+class Ranking:
+    """Players sorted by one stat (highest first, ties by name) with O(log n) rank lookups."""
+    def __init__(self, keys=()):
+        self.keys = sorted(keys)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def add(self, key):
+        insort(self.keys, key)
+
+    def remove(self, key):
+        i = bisect_left(self.keys, key)
+        if i < len(self.keys) and self.keys[i] == key:
+            del self.keys[i]
+
+    def rank(self, key):
+        """1-based position of ``key``, or None if it isn't ranked."""
+        i = bisect_left(self.keys, key)
+        if i < len(self.keys) and self.keys[i] == key:
+            return i + 1
+        return None
+
+    def top(self, n=10):
+        return self.keys[:n]
+
+
+class LeaderboardService:
+    """In-memory rankings for every LEADERBOARD_COLUMNS stat, globally and per guild."""
+    def __init__(self):
+        self.names = {}
+        self.stats = {}       # user_id -> tuple of values in LEADERBOARD_COLUMNS order
+        self.global_rankings = {stat: Ranking() for stat in LEADERBOARD_COLUMNS}
+        self.guild_members = {}   # guild_id -> set of member ids
+        self.guild_rankings = {}  # guild_id -> {stat: Ranking}, built on first use
+        self.user_guilds = {}     # user_id -> set of guild ids with a built ranking
+        self._sync_task = None
+
+    def __len__(self):
+        return len(self.stats)
+
+    def key(self, stat, user_id):
+        """Sort key of a player for one stat; mirrors ORDER BY stat DESC, name."""
+        value = self.stats[user_id][LEADERBOARD_COLUMNS.index(stat)]
+        return (-value, self.names[user_id] or '', user_id)
+
+    # --- Loading ---
+
+    def load(self, cursor):
+        """Replace every ranking with the current players table."""
+        self.replace(fetch_player_rows(cursor))
+
+    def replace(self, rows):
+        """Swap in a full set of player rows (drops per-guild rankings)."""
+        self.names = {}
+        self.stats = {}
+        for user_id, name, *values in rows:
+            self.names[user_id] = name
+            self.stats[user_id] = tuple(value or 0 for value in values)
+        self.global_rankings = {
+            stat: Ranking(self.key(stat, user_id) for user_id in self.stats)
+            for stat in LEADERBOARD_COLUMNS
+        }
+        self.guild_rankings = {}
+        self.user_guilds = {}
+
+    def update(self, user_ids, rows):
+        """Apply fresh rows for ``user_ids``; ids without a row are removed."""
+        rows = {row[0]: row for row in rows}
+        for user_id in user_ids:
+            self._unrank(user_id)
+            if user_id in rows:
+                _, name, *values = rows[user_id]
+                self.names[user_id] = name
+                self.stats[user_id] = tuple(value or 0 for value in values)
+                self._rank(user_id)
+            else:
+                self.names.pop(user_id, None)
+                self.stats.pop(user_id, None)
+
+    def _rankings_of(self, user_id):
+        """Every ranking a player belongs to, as {stat: [Ranking, ...]}."""
+        rankings = {stat: [ranking] for stat, ranking in self.global_rankings.items()}
+        for guild_id in self.user_guilds.get(user_id, ()):
+            for stat, ranking in self.guild_rankings[guild_id].items():
+                rankings[stat].append(ranking)
+        return rankings
+
+    def _unrank(self, user_id):
+        if user_id not in self.stats:
+            return
+        for stat, rankings in self._rankings_of(user_id).items():
+            key = self.key(stat, user_id)
+            for ranking in rankings:
+                ranking.remove(key)
+
+    def _rank(self, user_id):
+        for guild_id, members in self.guild_members.items():
+            if user_id in members and guild_id in self.guild_rankings:
+                self.user_guilds.setdefault(user_id, set()).add(guild_id)
+        for stat, rankings in self._rankings_of(user_id).items():
+            key = self.key(stat, user_id)
+            for ranking in rankings:
+                ranking.add(key)
+
+    # --- Guild Membership ---
+
+    def _guild_rankings(self, guild):
+        """Per-guild rankings, built from the guild's member list the first time they're needed."""
+        if guild.id not in self.guild_rankings:
+            members = {member.id for member in guild.members}
+            ranked = [user_id for user_id in members if user_id in self.stats]
+            self.guild_members[guild.id] = members
+            self.guild_rankings[guild.id] = {
+                stat: Ranking(self.key(stat, user_id) for user_id in ranked)
+                for stat in LEADERBOARD_COLUMNS
+            }
+            for user_id in ranked:
+                self.user_guilds.setdefault(user_id, set()).add(guild.id)
+        return self.guild_rankings[guild.id]
+
+    def add_member(self, guild_id, user_id):
+        """A member joined a guild whose rankings are tracked."""
+        members = self.guild_members.get(guild_id)
+        if members is None or user_id in members:
+            return
+        members.add(user_id)
+        if user_id in self.stats:
+            self.user_guilds.setdefault(user_id, set()).add(guild_id)
+            for stat, ranking in self.guild_rankings[guild_id].items():
+                ranking.add(self.key(stat, user_id))
+
+    def remove_member(self, guild_id, user_id):
+        """A member left a guild whose rankings are tracked."""
+        members = self.guild_members.get(guild_id)
+        if members is None or user_id not in members:
+            return
+        members.discard(user_id)
+        if user_id in self.stats:
+            self.user_guilds.get(user_id, set()).discard(guild_id)
+            for stat, ranking in self.guild_rankings[guild_id].items():
+                ranking.remove(self.key(stat, user_id))
+
+    def forget_guild(self, guild_id):
+        """Drop a guild's rankings (the bot left it)."""
+        self.guild_members.pop(guild_id, None)
+        self.guild_rankings.pop(guild_id, None)
+        for guilds in self.user_guilds.values():
+            guilds.discard(guild_id)
+
+    # --- Queries ---
+
+    def standings(self, stat, user_id, guild=None, limit=10):
+        """Return (top, user_rank) where top is [(rank, name, value)] and user_rank is one such tuple or None."""
+        ranking = self._guild_rankings(guild)[stat] if guild is not None else self.global_rankings[stat]
+        top = [(rank, name, -value) for rank, (value, name, _) in enumerate(ranking.top(limit), start=1)]
+
+        user_rank = None
+        if user_id in self.stats:
+            key = self.key(stat, user_id)
+            rank = ranking.rank(key)
+            if rank is not None:
+                user_rank = (rank, key[1], -key[0])
+        return top, user_rank
+
+    def rank(self, stat, user_id):
+        """Global (rank, name, value) of a player, or None."""
+        return self.standings(stat, user_id, limit=0)[1]
+
+    # --- Syncing ---
+
+    async def sync(self):
+        """Pull players changed since the last sync into the rankings."""
+        user_ids, rows = await run_write(drain_changes)
+        if user_ids:
+            self.update(user_ids, rows)
+        return len(user_ids)
+
+    def start(self):
+        """Start the background sync task (idempotent)."""
+        if self._sync_task is None or self._sync_task.done():
+            self._sync_task = asyncio.get_running_loop().create_task(self._sync_loop())
+
+    async def _sync_loop(self):
+        while True:
+            await asyncio.sleep(SYNC_INTERVAL)
+            try:
+                if await run_db(has_changes):
+                    await self.sync()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Leaderboard sync failed: {e}")
+
+
+def has_changes(cursor):
+    """Whether any player changed since the last sync (cheap check before taking the write lock)."""
+    cursor.execute('SELECT 1 FROM leaderboard_dirty LIMIT 1')
+    return cursor.fetchone() is not None
+
+
+# --- Shared Service ---
+
+_leaderboard = None
+_leaderboard_lock = asyncio.Lock()
+
+async def get_leaderboard():
+    """Get the shared leaderboard service, loading it and starting its sync task on first use."""
+    global _leaderboard
+    if _leaderboard is None:
+        async with _leaderboard_lock:
+            if _leaderboard is None:
+                service = LeaderboardService()
+                # Clear the change log first so nothing written during the load is lost
+                await run_write(drain_changes)
+                service.replace(await run_db(fetch_player_rows))
+                service.start()
+                _leaderboard = service
+                logger.info(f"Leaderboards loaded ({len(service)} players)")
+    return _leaderboard
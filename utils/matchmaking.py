@@ -0,0 +1,231 @@
+"""
+Matchmaking for FutBot
+Queues players with a chosen deck and pairs them by deck strength (summed overall of the deck).
+
+Queued players sit in strength buckets per guild, so a join only looks at the few buckets around its
+own strength. Each player's allowed strength gap widens the longer they wait; a periodic sweep retries
+waiting players with their wider gap and drops entries past their timeout (an expiry heap with lazy
+deletion, so leaving the queue is O(1)).
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+import time
+
+from utils.database import ALLOWED_CHANNELS
+
+logger = logging.getLogger(__name__)
+
+QUEUE_TIMEOUT_MINUTES = int(os.getenv('QUEUE_TIMEOUT_MINUTES', '10'))
+MATCH_BUCKET_SIZE = 10        # Strength points per bucket
+MATCH_BASE_GAP = 15           # Strength difference accepted straight away
+MATCH_GAP_PER_MINUTE = 15     # Extra difference accepted per minute waited
+MATCH_MAX_GAP = 100
+MATCH_SWEEP_SECONDS = 5
+
+
+def deck_strength(cards):
+    """Summed overall of a deck."""
+    return sum(card.overall for card in cards)
+
+
+class QueueEntry:
+    """One queued player and the deck they will battle with."""
+    __slots__ = ('user', 'deck_name', 'deck', 'strength', 'pool', 'channel_id', 'joined_at', 'expires_at')
+
+    def __init__(self, user, deck_name, deck, channel_id, pool=None, timeout=QUEUE_TIMEOUT_MINUTES * 60):
+        self.user = user
+        self.deck_name = deck_name
+        self.deck = deck
+        self.strength = deck_strength(deck)
+        # Players are only paired within a pool (the guild they queued in)
+        self.pool = pool
+        self.channel_id = channel_id
+        self.joined_at = time.monotonic()
+        self.expires_at = self.joined_at + timeout
+
+    def set_deck(self, deck):
+        """Swap in a freshly loaded copy of the deck (cards may have been sold or traded while queued)."""
+        self.deck = deck
+        self.strength = deck_strength(deck)
+
+
+class MatchmakingQueue:
+    """Strength-bucketed matchmaking queue.
+
+    ``on_match(player1_entry, player2_entry)`` and ``on_expire(entry)`` are coroutines run as tasks;
+    ``compatible(a, b)`` can veto a pairing (e.g. a player has left the guild).
+    """
+    def __init__(self, bucket_size=MATCH_BUCKET_SIZE, base_gap=MATCH_BASE_GAP,
+                 gap_per_minute=MATCH_GAP_PER_MINUTE, max_gap=MATCH_MAX_GAP, sweep_seconds=MATCH_SWEEP_SECONDS):
+        self.bucket_size = bucket_size
+        self.base_gap = base_gap
+        self.gap_per_minute = gap_per_minute
+        self.max_gap = max_gap
+        self.sweep_seconds = sweep_seconds
+
+        self.entries = {}   # user_id -> QueueEntry, in join order
+        self.buckets = {}   # (pool, bucket) -> {user_id: QueueEntry}, in join order
+        self._expiry = []   # (expires_at, seq, entry); stale items are skipped when popped
+        self._seq = itertools.count()
+
+        self.on_match = None
+        self.on_expire = None
+        self.compatible = None
+        self._task = None
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, user_id):
+        return user_id in self.entries
+
+    def start(self, on_match, on_expire=None, compatible=None):
+        """Set the callbacks and start the sweep task (once)."""
+        self.on_match = on_match
+        self.on_expire = on_expire
+        self.compatible = compatible
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    # --- Queue ---
+
+    def _bucket(self, entry):
+        return entry.pool, int(entry.strength // self.bucket_size)
+
+    def _gap(self, entry, now):
+        waited = (now - entry.joined_at) / 60
+        return min(self.base_gap + self.gap_per_minute * waited, self.max_gap)
+
+    def _insert(self, entry):
+        self.entries[entry.user.id] = entry
+        self.buckets.setdefault(self._bucket(entry), {})[entry.user.id] = entry
+        heapq.heappush(self._expiry, (entry.expires_at, next(self._seq), entry))
+
+    def _remove(self, entry):
+        del self.entries[entry.user.id]
+        bucket = self._bucket(entry)
+        members = self.buckets[bucket]
+        del members[entry.user.id]
+        if not members:
+            del self.buckets[bucket]
+
+    def join(self, entry):
+        """Queue a player (replacing an earlier entry). Returns the opponent if paired right away."""
+        previous = self.entries.get(entry.user.id)
+        if previous is not None:
+            self._remove(previous)
+        opponent = self._find_opponent(entry, time.monotonic())
+        if opponent is not None:
+            self._remove(opponent)
+            self._dispatch(self.on_match, opponent, entry)
+            return opponent
+        self._insert(entry)
+        return None
+
+    def requeue(self, entry):
+        """Put back a matched entry whose battle could not start, keeping its place and expiry.
+
+        Skipped if the player has queued again in the meantime. Returns the opponent if paired right away.
+        """
+        if entry.user.id in self.entries or entry.expires_at <= time.monotonic():
+            return None
+        return self.join(entry)
+
+    def leave(self, user_id):
+        """Take a player out of the queue. Returns their entry, or None if they weren't queued."""
+        entry = self.entries.get(user_id)
+        if entry is not None:
+            self._remove(entry)
+        return entry
+
+    def _find_opponent(self, entry, now):
+        """Closest-strength queued player both sides accept; the longest waiting wins ties."""
+        gap = self._gap(entry, now)
+        pool, home = self._bucket(entry)
+        reach = int(gap // self.bucket_size) + 1
+        best, best_diff = None, None
+        for offset in range(reach + 1):
+            for bucket in {home - offset, home + offset}:
+                for other in self.buckets.get((pool, bucket), {}).values():
+                    if other.user.id == entry.user.id:
+                        continue
+                    diff = abs(other.strength - entry.strength)
+                    if diff > max(gap, self._gap(other, now)):
+                        continue
+                    if self.compatible is not None and not self.compatible(entry, other):
+                        continue
+                    # Buckets iterate in join order; across buckets the earlier joiner wins a tie
+                    if best is None or (diff, other.joined_at) < (best_diff, best.joined_at):
+                        best, best_diff = other, diff
+            # Nothing in a further ring can be as close as a match already found here
+            if best is not None and best_diff < offset * self.bucket_size:
+                break
+        return best
+
+    # --- Sweep ---
+
+    def sweep(self, now=None):
+        """Drop expired entries, then retry everyone still waiting with their widened gap."""
+        now = time.monotonic() if now is None else now
+        while self._expiry and self._expiry[0][0] <= now:
+            _, _, entry = heapq.heappop(self._expiry)
+            if self.entries.get(entry.user.id) is entry:
+                self._remove(entry)
+                self._dispatch(self.on_expire, entry)
+
+        paired = 0
+        for entry in list(self.entries.values()):
+            if self.entries.get(entry.user.id) is not entry:
+                continue
+            opponent = self._find_opponent(entry, now)
+            if opponent is not None:
+                self._remove(entry)
+                self._remove(opponent)
+                first, second = (entry, opponent) if entry.joined_at <= opponent.joined_at else (opponent, entry)
+                self._dispatch(self.on_match, first, second)
+                paired += 1
+        return paired
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.sweep_seconds)
+            try:
+                self.sweep()
+            except Exception as e:
+                logger.error(f"Matchmaking sweep failed: {e}")
+
+    @staticmethod
+    def _dispatch(callback, *entries):
+        if callback is None:
+            return
+
+        async def run():
+            try:
+                await callback(*entries)
+            except Exception as e:
+                logger.error(f"Matchmaking callback failed: {e}")
+
+        try:
+            asyncio.get_running_loop().create_task(run())
+        except RuntimeError:
+            # No event loop (offline use / benchmarks): callbacks are skipped
+            pass
+
+
+def match_channel(bot, a, b):
+    """The queue channel of ``a`` or else ``b`` if it is allowed and both players are in its guild, or None."""
+    for entry in (a, b):
+        if ALLOWED_CHANNELS and entry.channel_id not in ALLOWED_CHANNELS:
+            continue
+        channel = bot.get_channel(entry.channel_id)
+        guild = getattr(channel, 'guild', None)
+        if guild is not None and guild.get_member(a.user.id) and guild.get_member(b.user.id):
+            return channel
+    return None
+
+
+# Shared queue (bot.py or cogs/battles.py starts it with their Battle class)
+matchmaking = MatchmakingQueue()
@@ -3,7 +3,8 @@ Data models for FutBot
 Card and Player classes, plus card loading and weight utilities.
 """
 import random
-from utils.database import get_connection
+import sys
+from utils.database import fetchone, execute
 
 def determine_card_rarity(overall):
     """Determine rarity based on overall rating."""
@@ -17,8 +18,18 @@ def determine_card_rarity(overall):
         return 'Common'
 
 
+def _intern(value):
+    """Intern repeated category strings (club, league, nation, type) so cards share one copy."""
+    return sys.intern(value) if isinstance(value, str) else value
+
+
 class Card:
     """Represents a player card with stats and attributes."""
+    __slots__ = (
+        'card_id', 'player_id', 'name', 'attack', 'defense', 'speed', 'height', 'club', 'position',
+        'overall', 'image_path', 'card_rarity', 'card_type', 'league', 'nation', 'copies', 'wishlist_count'
+    )
+
     def __init__(self, card_id, player_id, name, attack, defense, speed, height, club, position, overall, image_path, card_rarity=None, card_type='standard', league=None, nation=None, copies=0, wishlist_count=0, *args):
         self.card_id = card_id
         self.player_id = player_id
@@ -27,14 +38,14 @@ class Card:
         self.defense = defense
         self.speed = speed
         self.height = height
-        self.club = club
-        self.position = position
+        self.club = _intern(club)
+        self.position = _intern(position)
         self.overall = overall if overall is not None else 0
         self.image_path = image_path
-        self.card_rarity = card_rarity if card_rarity else determine_card_rarity(overall)
-        self.card_type = card_type
-        self.league = league
-        self.nation = nation
+        self.card_rarity = _intern(card_rarity if card_rarity else determine_card_rarity(overall))
+        self.card_type = _intern(card_type)
+        self.league = _intern(league)
+        self.nation = _intern(nation)
         self.copies = copies
         self.wishlist_count = wishlist_count
 
@@ -54,47 +65,33 @@ class Player:
 
 # --- Card Loading and Utilities ---
 
-def fetch_all_cards():
-    """Fetch all cards from the database."""
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute('SELECT * FROM cards')
-    rows = cursor.fetchall()
-    conn.close()
-    return [Card(*row) for row in rows]
+async def fetch_all_cards():
+    """Fetch all cards (served from the shared card catalog)."""
+    from utils.catalog import get_catalog
+    return (await get_catalog()).all()
 
-def get_card_by_id(card_id):
+async def get_card_by_id(card_id):
     """Get a card by its ID."""
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute('SELECT * FROM cards WHERE card_id = ?', (card_id,))
-    row = cursor.fetchone()
-    conn.close()
-    return Card(*row) if row else None
-
-def get_card_by_name(card_name):
-    """Get a card by fuzzy name matching."""
-    from rapidfuzz import process as rapidfuzz_process
-    cards = fetch_all_cards()
-    card_names = [card.name.lower() for card in cards]
-    best_match = rapidfuzz_process.extractOne(card_name.lower(), card_names)
-    if best_match:
-        best_match_index = card_names.index(best_match[0])
-        return cards[best_match_index]
-    return None
-
-def add_card(card):
+    from utils.catalog import get_catalog
+    return (await get_catalog()).get(card_id)
+
+async def get_card_by_name(card_name):
+    """Get a card by fuzzy name matching (None if nothing is close enough)."""
+    from utils.catalog import get_catalog
+    from utils.fuzzy import card_name_matcher
+    return card_name_matcher(await get_catalog()).best(card_name)
+
+async def add_card(card):
     """Add or update a card in the database."""
-    conn = get_connection()
-    cursor = conn.cursor()
     card_rarity = determine_card_rarity(card.overall)
-    cursor.execute('''
+    await execute('''
     INSERT INTO cards (card_id, player_id, name, attack, defense, speed, height, club, position, overall, image_path, card_rarity, card_type, league, nation, copies)
     VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
     ON CONFLICT(card_id) DO UPDATE SET copies = copies + 1
     ''', (card.card_id, card.player_id, card.name, card.attack, card.defense, card.speed, card.height, card.club, card.position, card.overall, card.image_path, card_rarity, card.card_type, card.league, card.nation, card.copies))
-    conn.commit()
-    conn.close()
+    from utils.catalog import get_catalog, refresh_cards
+    if card.card_id not in await get_catalog():
+        await refresh_cards(card.card_id)
 
 
 # --- Card Weights for Pack Drops ---
@@ -109,10 +106,8 @@ WEIGHT_ICON_80 = 2
 WEIGHT_ICON_90 = 1
 WEIGHT_TOTT = 1
 
-def get_cards_with_weights():
-    """Get all cards with their drop weights for pack opening."""
-    all_cards = fetch_all_cards()
-    
+def build_cards_with_weights(all_cards):
+    """Pair every droppable card with its pack weight."""
     cards_with_weights = []
     
     for card in all_cards:
@@ -137,6 +132,19 @@ def get_cards_with_weights():
     
     return cards_with_weights
 
+async def get_cards_with_weights():
+    """Get all cards with their drop weights for pack opening (cached per catalog version)."""
+    from utils.catalog import get_catalog
+    catalog = await get_catalog()
+    return catalog.memo('weights', lambda c: build_cards_with_weights(c.all()))
+
+async def get_drop_sampler():
+    """Get the alias sampler over the drop weights (rebuilt whenever the catalog changes)."""
+    from utils.catalog import get_catalog
+    from utils.sampler import WeightedSampler
+    catalog = await get_catalog()
+    return catalog.memo('sampler', lambda c: WeightedSampler(build_cards_with_weights(c.all())))
+
 def weighted_choice(cards_with_weights):
     """Select a random card based on weights."""
     total = sum(weight for card, weight in cards_with_weights)
@@ -149,19 +157,14 @@ def weighted_choice(cards_with_weights):
     return cards_with_weights[0][0] if cards_with_weights else None
 
 
-def get_card_weight_by_name(card_name):
+async def get_card_weight_by_name(card_name):
     """Get the pack weight for a specific card by name."""
-    card = get_card_by_name(card_name)
+    card = await get_card_by_name(card_name)
     if not card:
         return None, None
 
-    conn = get_connection()
-    cursor = conn.cursor()
-
     if card.card_type == 'Standard':
-        cursor.execute('SELECT COUNT(*) FROM cards WHERE card_type = "Standard"')
-        total_standard_cards = cursor.fetchone()[0]
-        conn.close()
+        total_standard_cards = (await fetchone('SELECT COUNT(*) FROM cards WHERE card_type = "Standard"'))[0]
 
         if 70 <= card.overall <= 79:
             return WEIGHT_70_79 / total_standard_cards, card.name
@@ -173,11 +176,7 @@ def get_card_weight_by_name(card_name):
             return WEIGHT_90_PLUS / total_standard_cards, card.name
         
     else:
-        cursor.execute('SELECT COUNT(*) FROM cards WHERE card_type != "Standard"')
-        total_non_standard_cards = cursor.fetchone()[0]
-        conn.close()
+        total_non_standard_cards = (await fetchone('SELECT COUNT(*) FROM cards WHERE card_type != "Standard"'))[0]
         return 3 / total_non_standard_cards, card.name
     
-    conn.close()
     return None, None
-
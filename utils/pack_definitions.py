@@ -0,0 +1,69 @@
+"""
+Pack definitions for FutBot
+Plain data with no imports, so utils.database can add the matching ``packs`` columns during its
+migrations without importing the pack engine.
+"""
+
+# Card types excluded from all pack drops and random card drops
+NON_DROPPABLE_TYPES = ('Unique',)
+
+# Card types left out when a slot draws a special (non-Standard) card
+NON_SPECIAL_TYPES = ('Standard',) + NON_DROPPABLE_TYPES
+
+
+# --- Pack Definitions ---
+#
+# Each slot draws ``count`` cards. For every card one option is picked by ``weight``; an option
+# filters the catalog by ``card_type`` (str or tuple), ``exclude_types``, ``min_overall`` and
+# ``max_overall``. Every pack also needs a matching INTEGER column in the ``packs`` table, which
+# utils.database.migrate_db() adds automatically.
+
+PACKS = {
+    1: {
+        "name": "rare_player_pack",
+        "display_name": "Rare Player Pack",
+        "title": "🎁 Pack Opened!",
+        "buyable": True,
+        "cost": 1000,
+        "slots": [
+            {"count": 1, "options": [
+                {"weight": 0.8, "card_type": "Standard", "min_overall": 86},
+                {"weight": 0.2, "exclude_types": NON_SPECIAL_TYPES, "min_overall": 86},
+            ]},
+        ],
+    },
+    2: {
+        "name": "icon_pack",
+        "display_name": "Icon Pack",
+        "title": "⭐ Icon Pack Opened!",
+        "buyable": True,
+        "cost": 2500,
+        "slots": [
+            {"count": 1, "options": [{"card_type": "Icon"}]},
+        ],
+    },
+    3: {
+        "name": "hero_pack",
+        "display_name": "Hero Pack",
+        "title": "🦸 Hero Pack Opened!",
+        "buyable": True,
+        "cost": 1750,
+        "slots": [
+            {"count": 1, "options": [{"card_type": "Hero"}]},
+        ],
+    },
+    4: {
+        "name": "tester_pack",
+        "display_name": "Tester Pack",
+        "title": "🧪 Tester Pack Opened!",
+        "buyable": False,
+        "cost": 0,  # Not buyable, so cost is 0
+        "slots": [
+            {"count": 1, "options": [{"card_type": "Icon"}]},
+            {"count": 4, "options": [
+                {"weight": 0.9, "card_type": "Standard", "min_overall": 86},
+                {"weight": 0.1, "exclude_types": NON_SPECIAL_TYPES, "min_overall": 86},
+            ]},
+        ],
+    },
+}
@@ -0,0 +1,165 @@
+"""
+Pack opening engine for FutBot
+Packs are declared as data (slots of filtered, weighted card pools). The engine compiles each
+definition against the card catalog once, draws every card in memory and grants them in one transaction.
+"""
+import random
+
+from utils.database import run_write
+from utils.pack_definitions import PACKS
+from utils.sampler import WeightedSampler
+
+# Upper bound on packs of one type opened by a single command
+MAX_PACKS_PER_OPEN = 100
+
+
+# --- Compilation ---
+
+def option_key(option):
+    """Hashable key for an option's filters (weight excluded), so identical pools are shared."""
+    return tuple(sorted((k, v) for k, v in option.items() if k != 'weight'))
+
+
+def build_candidates(catalog, option):
+    """Cards matching one slot option, narrowed through the catalog's type buckets / overall column."""
+    card_type = option.get('card_type')
+    min_overall = option.get('min_overall')
+    max_overall = option.get('max_overall')
+    exclude_types = option.get('exclude_types', ())
+
+    if isinstance(card_type, str):
+        cards = [card for card in catalog.of_type(card_type)
+                 if (min_overall is None or card.overall >= min_overall) and (max_overall is None or card.overall <= max_overall)]
+    elif min_overall is not None or max_overall is not None:
+        cards = catalog.where('overall', min_overall, max_overall)
+    else:
+        cards = catalog.all()
+
+    if isinstance(card_type, tuple):
+        cards = [card for card in cards if card.card_type in card_type]
+    if exclude_types:
+        cards = [card for card in cards if card.card_type not in exclude_types]
+    return cards
+
+
+def compile_packs(catalog):
+    """Compile every pack into ``{pack_id: [(samplers, weights, count), ...]}`` sharing identical pools."""
+    pools = {}
+    compiled = {}
+    for pack_id, pack in PACKS.items():
+        slots = []
+        for slot in pack['slots']:
+            samplers = []
+            for option in slot['options']:
+                key = option_key(option)
+                if key not in pools:
+                    pools[key] = WeightedSampler([(card, 1) for card in build_candidates(catalog, option)])
+                samplers.append(pools[key])
+            weights = [option.get('weight', 1) for option in slot['options']]
+            slots.append((samplers, weights, slot.get('count', 1)))
+        compiled[pack_id] = slots
+    return compiled
+
+
+def get_compiled_packs(catalog):
+    """Compiled pack definitions for a catalog (rebuilt whenever the catalog changes)."""
+    return catalog.memo('packs', compile_packs)
+
+
+# --- Drawing ---
+
+def draw_card(samplers, weights, owned):
+    """Draw one card the user doesn't own, picking a pool by weight.
+
+    Exhausted pools are dropped from the pick, so this always terminates and returns
+    None once every pool is fully owned. The drawn card id is added to ``owned``.
+    """
+    samplers = list(samplers)
+    weights = list(weights)
+    while samplers:
+        i = random.choices(range(len(samplers)), weights)[0]
+        card = samplers[i].choice_excluding(owned)
+        if card is not None:
+            owned.add(card.card_id)
+            return card
+        del samplers[i]
+        del weights[i]
+    return None
+
+
+def draw_pack(slots, owned):
+    """Draw every card of one pack, or None (leaving ``owned`` untouched) if a slot can't be filled."""
+    cards = []
+    for samplers, weights, count in slots:
+        for _ in range(count):
+            card = draw_card(samplers, weights, owned)
+            if card is None:
+                owned.difference_update(c.card_id for c in cards)
+                return None
+            cards.append(card)
+    return cards
+
+
+# --- Transaction Steps (run inside run_write jobs) ---
+
+def load_owned_ids(cursor, user_id):
+    """Set of card ids the user already owns."""
+    cursor.execute('SELECT card_id FROM inventories WHERE user_id = ?', (user_id,))
+    return {row[0] for row in cursor.fetchall()}
+
+
+def take_pack(cursor, user_id, pack_name, count=1):
+    """Remove ``count`` packs from the user, or raise ValueError if they don't have that many."""
+    cursor.execute(f'UPDATE packs SET {pack_name} = {pack_name} - ? WHERE user_id = ? AND {pack_name} >= ?', (count, user_id, count))
+    if cursor.rowcount == 0:
+        raise ValueError("You don't own this pack.")
+
+
+def grant_cards(cursor, user_id, card_ids):
+    """Add a new copy of each (distinct) card to the user's inventory; editions follow the copies counter."""
+    if not card_ids:
+        return
+    cursor.executemany('UPDATE cards SET copies = copies + 1 WHERE card_id = ?', [(card_id,) for card_id in card_ids])
+    placeholders = ','.join('?' * len(card_ids))
+    cursor.execute(f'SELECT card_id, copies FROM cards WHERE card_id IN ({placeholders})', card_ids)
+    editions = dict(cursor.fetchall())
+    cursor.executemany(
+        'INSERT INTO inventories (user_id, card_id, edition) VALUES (?, ?, ?)',
+        [(user_id, card_id, editions[card_id]) for card_id in card_ids]
+    )
+
+
+# --- Opening ---
+
+async def open_pack_batch(user_id, counts, catalog=None):
+    """Open several pack types at once (``{pack_id: count}``) in a single transaction.
+
+    Returns ``{pack_id: [cards of each opened pack]}``. Each type is drawn until its count is
+    reached or a slot runs out of unowned cards, and only the packs actually opened are consumed.
+    Raises ValueError if the user lacks the packs or nothing could be opened.
+    """
+    if catalog is None:
+        from utils.catalog import get_catalog
+        catalog = await get_catalog()
+    compiled = get_compiled_packs(catalog)
+
+    def open_all(cursor):
+        owned = load_owned_ids(cursor, user_id)
+        opened = {}
+        for pack_id, count in counts.items():
+            packs = []
+            for _ in range(count):
+                cards = draw_pack(compiled[pack_id], owned)
+                if cards is None:
+                    break
+                packs.append(cards)
+            if packs:
+                opened[pack_id] = packs
+        if not opened:
+            raise ValueError("You already own every card this pack can contain.")
+
+        for pack_id, packs in opened.items():
+            take_pack(cursor, user_id, PACKS[pack_id]['name'], len(packs))
+        grant_cards(cursor, user_id, [card.card_id for packs in opened.values() for cards in packs for card in cards])
+        return opened
+    return await run_write(open_all)
@@ -0,0 +1,243 @@
+"""
+Render worker pool for FutBot
+Runs PIL renders in dedicated warm worker processes, away from the event loop and the default executor.
+"""
+import asyncio
+import concurrent.futures
+import contextlib
+import io
+import logging
+import multiprocessing
+import os
+import sys
+from collections import namedtuple
+from concurrent.futures.process import BrokenProcessPool
+
+from utils import render_worker
+from utils.rendering import (
+    render_cache, generate_card_grid, generate_lineup_image, generate_minted_card, lineup_key, minted_card_key
+)
+
+logger = logging.getLogger(__name__)
+
+# Number of render processes; 0 uses a dedicated thread pool instead
+RENDER_WORKERS = int(os.getenv('RENDER_WORKERS', str(min(2, os.cpu_count() or 1))))
+# Renders allowed to wait or run at once before new ones are turned away
+RENDER_MAX_PENDING = int(os.getenv('RENDER_MAX_PENDING', '16'))
+# Seconds a single render may take before the caller gives up on it
+RENDER_TIMEOUT = float(os.getenv('RENDER_TIMEOUT', '20'))
+# Threads reading and writing the render cache, kept apart from the loop's default executor
+RENDER_CACHE_THREADS = 2
+
+# Lightweight, picklable stand-in for a Card (bot.py's Card class can't be imported by a worker)
+CardArt = namedtuple('CardArt', ['card_id', 'name', 'image_path', 'attack', 'defense', 'overall'])
+
+
+def card_art(card):
+    """The fields of a card the renderers use."""
+    return CardArt(card.card_id, card.name, card.image_path, card.attack, card.defense, card.overall)
+
+
+class RenderBusy(Exception):
+    """Raised when the render queue is full."""
+
+
+# --- Worker Start ---
+
+def _worker_context():
+    """forkserver where available, else spawn: workers never fork the bot's threads and open DB connections."""
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context('forkserver')
+        # The server imports PIL and the renderers once; each worker forks from it already warm
+        context.set_forkserver_preload(['utils.rendering'])
+        return context
+    return multiprocessing.get_context('spawn')
+
+
+@contextlib.contextmanager
+def _worker_entry():
+    """Start any worker launched in this block from utils.render_worker rather than re-running the bot's entry script."""
+    main = sys.modules['__main__']
+    sys.modules['__main__'] = render_worker
+    try:
+        yield
+    finally:
+        sys.modules['__main__'] = main
+
+
+# --- Pool ---
+
+class RenderPool:
+    """Bounded pool of render workers with per-job timeouts, a render cache in front and metrics."""
+    def __init__(self, workers=RENDER_WORKERS, max_pending=RENDER_MAX_PENDING, timeout=RENDER_TIMEOUT):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self._executor = None
+        self._cache_io = None
+        self._slots = None
+        self.metrics = {
+            'submitted': 0, 'cache_hits': 0, 'completed': 0, 'failed': 0,
+            'timeouts': 0, 'rejected': 0, 'render_ms': 0.0, 'max_pending': 0,
+        }
+        self._pending = 0
+
+    def _start(self):
+        if self._cache_io is None:
+            self._cache_io = concurrent.futures.ThreadPoolExecutor(
+                max_workers=RENDER_CACHE_THREADS, thread_name_prefix='render-cache'
+            )
+        if self._executor is not None:
+            return
+        use_processes = self.workers > 0
+        if use_processes:
+            self._executor = concurrent.futures.ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=_worker_context(),
+                initializer=render_worker.warm_worker,
+            )
+        else:
+            self._executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix='render', initializer=render_worker.warm_worker
+            )
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(max(1, self.workers))
+        logger.info(f"Render pool started ({self.workers} {'processes' if use_processes else 'threads'})")
+
+    def _submit(self, func, args):
+        """Hand a job to the workers, rebuilding the executor if a worker died and broke it."""
+        self._start()
+        try:
+            with _worker_entry():
+                return self._executor.submit(render_worker.render_bytes, func, args)
+        except BrokenProcessPool:
+            self._discard_executor()
+            self._start()
+            with _worker_entry():
+                return self._executor.submit(render_worker.render_bytes, func, args)
+
+    def _discard_executor(self, executor=None):
+        """Drop a broken executor so the next job starts a fresh one."""
+        if executor is not None and executor is not self._executor:
+            return
+        logger.error("Render workers died; restarting the render pool")
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._executor = None
+
+    async def warm(self):
+        """Start the workers now (and let them preload assets) instead of on the first render."""
+        await asyncio.gather(*(
+            asyncio.wrap_future(self._submit(render_worker.noop, ()))
+            for _ in range(max(1, self.workers))
+        ))
+
+    async def render(self, key_func, func, *args):
+        """Render ``func(*args)`` as an encoded BytesIO, served from the render cache when ``key_func`` is given.
+
+        Raises RenderBusy if ``max_pending`` renders are already queued; returns None if the
+        renderer failed or took longer than ``timeout`` seconds.
+        """
+        self._start()
+        loop = asyncio.get_running_loop()
+        self.metrics['submitted'] += 1
+
+        # Cache lookups read small files, so keep them off the loop but out of the render workers
+        key = None
+        if key_func is not None:
+            key, data = await loop.run_in_executor(self._cache_io, _lookup, key_func, args)
+            if data is not None:
+                self.metrics['cache_hits'] += 1
+                return io.BytesIO(data)
+
+        if self._pending >= self.max_pending:
+            self.metrics['rejected'] += 1
+            raise RenderBusy("The image renderer is busy, please try again in a moment.")
+
+        self._pending += 1
+        self.metrics['max_pending'] = max(self.metrics['max_pending'], self._pending)
+        try:
+            # Only as many jobs as workers are handed to the executor; the rest wait here.
+            # A slot is freed when its job actually finishes, not when the caller stops waiting,
+            # so a timed-out render still occupying a worker keeps its slot.
+            await self._slots.acquire()
+            try:
+                future = self._submit(func, args)
+            except Exception:
+                self._slots.release()
+                raise
+            executor = self._executor
+            future.add_done_callback(lambda _: _release_slot(loop, self._slots))
+            try:
+                data, render_ms = await asyncio.wait_for(asyncio.wrap_future(future), self.timeout)
+            except asyncio.TimeoutError:
+                self.metrics['timeouts'] += 1
+                logger.error(f"Render {func.__name__} timed out after {self.timeout}s")
+                return None
+            except BrokenProcessPool:
+                self.metrics['failed'] += 1
+                self._discard_executor(executor)
+                return None
+            except Exception as e:
+                self.metrics['failed'] += 1
+                logger.error(f"Render {func.__name__} failed: {e}")
+                return None
+        finally:
+            self._pending -= 1
+
+        self.metrics['render_ms'] += render_ms
+        if data is None:
+            self.metrics['failed'] += 1
+            return None
+        self.metrics['completed'] += 1
+        if key is not None:
+            await loop.run_in_executor(self._cache_io, render_cache.put, key, data)
+        return io.BytesIO(data)
+
+    def stats(self):
+        """Metrics snapshot for monitoring."""
+        stats = dict(self.metrics)
+        stats['pending'] = self._pending
+        stats['avg_render_ms'] = stats['render_ms'] / stats['completed'] if stats['completed'] else 0.0
+        stats['cache_hit_rate'] = stats['cache_hits'] / stats['submitted'] if stats['submitted'] else 0.0
+        return stats
+
+    def close(self):
+        """Shut the workers down."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        if self._cache_io is not None:
+            self._cache_io.shutdown(wait=False)
+            self._cache_io = None
+
+
+def _release_slot(loop, slots):
+    """Done-callback (worker management thread): free the job's slot on the event loop."""
+    if not loop.is_closed():
+        loop.call_soon_threadsafe(slots.release)
+
+
+def _lookup(key_func, args):
+    """Compute a render's cache key and fetch its cached bytes (runs on the cache I/O threads)."""
+    key = key_func(*args)
+    return key, render_cache.get(key)
+
+
+render_pool = RenderPool()
+
+
+# --- Render Helpers ---
+
+async def render_lineup(deck_cards):
+    """Deck lineup image (BytesIO) or None."""
+    return await render_pool.render(lineup_key, generate_lineup_image, [card_art(card) for card in deck_cards])
+
+
+async def render_minted_card(card_path, avatar_bytes, owner_name, edition_text):
+    """Minted card image (BytesIO) or None."""
+    return await render_pool.render(minted_card_key, generate_minted_card, card_path, avatar_bytes, owner_name, edition_text)
+
+
+async def render_card_grid(cards):
+    """Pack grid image (BytesIO) or None. Not cached: the same pulls rarely repeat."""
+    return await render_pool.render(None, generate_card_grid, [card_art(card) for card in cards])
@@ -0,0 +1,25 @@
+"""
+Render worker entry module for FutBot
+Everything a render process runs. Workers start from this module instead of the bot's entry
+script, so keep its imports limited to the rendering code.
+"""
+import time
+
+
+def warm_worker():
+    """Worker initializer: decode the shared assets and map the lineup atlas once so the first job doesn't pay for it."""
+    from utils.assets import assets
+    from utils.atlas import lineup_atlas
+    assets.preload()
+    lineup_atlas.refresh()
+
+
+def render_bytes(func, args):
+    """Run a renderer in the worker and return encoded bytes (or None) with the render time in ms."""
+    start = time.perf_counter()
+    buffer = func(*args)
+    return (buffer.getvalue() if buffer is not None else None), (time.perf_counter() - start) * 1000
+
+
+def noop():
+    return None
@@ -0,0 +1,456 @@
+"""
+Image rendering for FutBot
+Every PIL render (pack grids, deck lineups, minted cards) plus a cache for finished renders.
+Renderers are plain module-level functions so they can run in the render worker processes.
+"""
+import hashlib
+import io
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+try:
+    from PIL import Image, ImageDraw
+except ImportError:
+    Image = None
+
+from utils.assets import assets
+from utils.atlas import LINEUP_CARD_WIDTH, lineup_sprite
+from utils.avatars import circular_avatar
+
+logger = logging.getLogger(__name__)
+
+
+# --- Output Encoding ---
+#
+# Every render is encoded through encode_image(): RENDER_FORMAT (WEBP, JPEG or PNG) at RENDER_QUALITY,
+# stepping the quality down and then the resolution until the payload fits RENDER_MAX_BYTES.
+
+RENDER_FORMAT = os.getenv('RENDER_FORMAT', 'WEBP').upper()
+RENDER_QUALITY = int(os.getenv('RENDER_QUALITY', '85'))
+RENDER_MIN_QUALITY = int(os.getenv('RENDER_MIN_QUALITY', '55'))
+RENDER_OPTIMIZE = os.getenv('RENDER_OPTIMIZE', '1') != '0'
+RENDER_MAX_BYTES = int(float(os.getenv('RENDER_MAX_MB', '2')) * 1024 * 1024)
+
+FORMAT_EXTENSIONS = {'PNG': 'png', 'WEBP': 'webp', 'JPEG': 'jpg'}
+JPEG_BACKGROUND = (20, 20, 20)
+
+
+def render_filename(stem, fmt=None):
+    """Attachment filename for a render encoded in ``fmt`` (default RENDER_FORMAT)."""
+    return f"{stem}.{FORMAT_EXTENSIONS[(fmt or RENDER_FORMAT).upper()]}"
+
+
+def _encode(img, fmt, quality, optimize):
+    buffer = io.BytesIO()
+    if fmt == 'PNG':
+        img.save(buffer, format='PNG', optimize=optimize)
+    elif fmt == 'WEBP':
+        img.save(buffer, format='WEBP', quality=quality, method=4 if optimize else 0)
+    elif fmt == 'JPEG':
+        if img.mode != 'RGB':
+            flat = Image.new('RGB', img.size, JPEG_BACKGROUND)
+            flat.paste(img, mask=img.getchannel('A') if 'A' in img.getbands() else None)
+            img = flat
+        img.save(buffer, format='JPEG', quality=quality, optimize=optimize, progressive=optimize)
+    else:
+        raise ValueError(f"Unsupported render format: {fmt}")
+    return buffer
+
+
+def encode_image(img, fmt=None, quality=None, optimize=None, max_bytes=None):
+    """Encode a PIL image to a BytesIO, lowering quality and then size until it fits ``max_bytes``."""
+    fmt = (fmt or RENDER_FORMAT).upper()
+    quality = quality or RENDER_QUALITY
+    optimize = RENDER_OPTIMIZE if optimize is None else optimize
+    max_bytes = RENDER_MAX_BYTES if max_bytes is None else max_bytes
+
+    buffer = _encode(img, fmt, quality, optimize)
+    lossy = fmt != 'PNG'
+    while max_bytes and buffer.getbuffer().nbytes > max_bytes:
+        if lossy and quality > RENDER_MIN_QUALITY:
+            quality = max(RENDER_MIN_QUALITY, quality - 10)
+        elif min(img.size) > 64:
+            img = img.resize((int(img.width * 0.85), int(img.height * 0.85)), Image.Resampling.LANCZOS)
+        else:
+            break
+        buffer = _encode(img, fmt, quality, optimize)
+
+    buffer.seek(0)
+    return buffer
+
+
+# --- Pack Grid ---
+
+GRID_COLUMNS = 5
+GRID_THUMB_WIDTH = 200
+GRID_PADDING = 10
+GRID_MAX_CARDS = 50  # Keeps the attachment well under Discord's upload limit
+
+
+def generate_card_grid(cards, columns=GRID_COLUMNS, thumb_width=GRID_THUMB_WIDTH, padding=GRID_PADDING):
+    """Composite card images into one grid image (BytesIO), or None if PIL is unavailable.
+
+    Only the first GRID_MAX_CARDS cards are drawn; cards whose image can't be loaded leave an empty cell.
+    """
+    if Image is None or not cards:
+        return None
+
+    cards = cards[:GRID_MAX_CARDS]
+    thumbs = []
+    for card in cards:
+        try:
+            thumbs.append(assets.image(card.image_path, thumb_width))
+        except Exception as e:
+            logger.error(f"Error loading image for card {card.name}: {e}")
+            thumbs.append(None)
+
+    loaded = [thumb for thumb in thumbs if thumb is not None]
+    if not loaded:
+        return None
+
+    cell_height = max(thumb.height for thumb in loaded)
+    columns = min(columns, len(thumbs))
+    rows = -(-len(thumbs) // columns)
+    grid = Image.new(
+        'RGBA',
+        (columns * (thumb_width + padding) + padding, rows * (cell_height + padding) + padding),
+        (0, 0, 0, 0)
+    )
+
+    for i, thumb in enumerate(thumbs):
+        if thumb is None:
+            continue
+        row, col = divmod(i, columns)
+        x = padding + col * (thumb_width + padding)
+        y = padding + row * (cell_height + padding) + (cell_height - thumb.height) // 2
+        grid.paste(thumb, (x, y), thumb)
+
+    return encode_image(grid)
+
+
+# --- Deck Lineup ---
+
+def generate_lineup_image(deck_cards):
+    """Generate a visual lineup image for a deck"""
+    if Image is None:
+        return None
+
+    # The asset store scales pitch.png to HD (1080x1350) once; copy it so the cached one stays clean
+    bg = assets.pitch((1080, 1350)).copy()
+    bg_width, bg_height = bg.size
+
+    # Sort for 2-1-2 Formation
+    pool = deck_cards[:]
+    pool.sort(key=lambda x: x.attack, reverse=True)
+    attackers = pool[:2]
+    for card in attackers: pool.remove(card)
+
+    pool.sort(key=lambda x: x.defense, reverse=True)
+    defenders = pool[:2]
+    for card in defenders: pool.remove(card)
+
+    midfielder = pool[0] if pool else None
+    if midfielder:
+        sorted_lineup = [attackers[0], attackers[1], midfielder, defenders[0], defenders[1]]
+    else:
+        sorted_lineup = deck_cards[:5]
+
+    positions = [
+        (0.28, 0.20), (0.72, 0.20),  # Attackers
+        (0.50, 0.50),                 # Midfielder
+        (0.28, 0.80), (0.72, 0.80)   # Defenders
+    ]
+
+    for i, card in enumerate(sorted_lineup):
+        try:
+            # Card size relative to the background (35% width), cut from the lineup atlas when it's built
+            target_width = LINEUP_CARD_WIDTH
+            card_img = lineup_sprite(card, target_width)
+            target_height = card_img.height
+
+            pos_x_percent, pos_y_percent = positions[i]
+            x = int((bg_width * pos_x_percent) - (target_width / 2))
+            y = int((bg_height * pos_y_percent) - (target_height / 2))
+            bg.paste(card_img, (x, y), card_img)
+        except Exception as e:
+            logger.error(f"Error loading image for card {card.name}: {e}")
+            continue
+
+    return encode_image(bg)
+
+
+# --- Minted Card ---
+
+def generate_minted_card(card_path, avatar_bytes, owner_name, edition_text):
+    """Stamp the owner (avatar + name) and edition onto a card image and return it encoded (BytesIO)"""
+    if Image is None:
+        return None
+
+    try:
+        # 1. Load Base Card
+        card_img = assets.image(card_path).copy()
+        card_w, card_h = card_img.size
+        draw = ImageDraw.Draw(card_img)
+
+        # --- DYNAMIC SCALING MATH ---
+        # We base everything on the card's width to ensure readability
+        # Example: On a 1000px card, font will be 45px. On a 2000px card, it becomes 90px.
+        scale_factor = card_w / 1000 
+        
+        font_size_main = int(45 * scale_factor) # Base size 45
+        pfp_size = int(90 * scale_factor)       # Base size 90
+        padding = int(20 * scale_factor)        # Padding 20
+        edge_margin = int(30 * scale_factor)    # Margin from edge 30
+        border_width = int(3 * scale_factor)    # Border thickness
+        corner_radius = int(25 * scale_factor)  # Pill roundness
+
+        # Ensure minimum visible sizes for very small cards
+        font_size_main = max(20, font_size_main)
+        pfp_size = max(40, pfp_size)
+
+        # --- Setup Fonts (cached per size) ---
+        font_owner = assets.font(font_size_main)
+        font_edition = font_owner
+
+        # ==============================================================================
+        # LEFT BOTTOM: OWNER TAG (PFP + Name)
+        # ==============================================================================
+        
+        # Calculate text dimensions
+        owner_bbox = draw.textbbox((0, 0), owner_name, font=font_owner)
+        owner_text_w = owner_bbox[2] - owner_bbox[0]
+        owner_text_h = owner_bbox[3] - owner_bbox[1]
+        
+        # Pill Dimensions
+        owner_pill_w = pfp_size + owner_text_w + (padding * 3)
+        owner_pill_h = pfp_size + padding
+
+        # Create Pill
+        owner_pill = Image.new("RGBA", (owner_pill_w, owner_pill_h), (0, 0, 0, 0))
+        pill_draw = ImageDraw.Draw(owner_pill)
+
+        # Draw Background
+        pill_draw.rounded_rectangle(
+            [(0, 0), (owner_pill_w, owner_pill_h)],
+            radius=corner_radius,
+            fill=(20, 20, 20, 245), # Very dark background for contrast
+            outline=(255, 255, 255, 150), 
+            width=max(1, int(border_width/2))
+        )
+
+        # Paste Avatar
+        if avatar_bytes:
+            # Masked crops are cached per avatar and size, so repeat lookups skip the fit/mask work
+            avatar_img = circular_avatar(avatar_bytes, pfp_size)
+
+            # Vertically center PFP in pill
+            pfp_y = (owner_pill_h - pfp_size) // 2
+            owner_pill.paste(avatar_img, (padding, pfp_y), avatar_img)
+
+        # Draw Name
+        text_x = padding * 2 + pfp_size
+        # Vertically center text
+        text_y = (owner_pill_h - owner_text_h) // 2 - int(5 * scale_factor)
+        pill_draw.text((text_x, text_y), owner_name, font=font_owner, fill="white")
+
+        # Paste onto Card (Bottom Left)
+        card_img.paste(owner_pill, (edge_margin, card_h - owner_pill_h - edge_margin), owner_pill)
+
+
+        # ==============================================================================
+        # RIGHT BOTTOM: EDITION PLATE
+        # ==============================================================================
+        ed_bbox = draw.textbbox((0, 0), edition_text, font=font_edition)
+        ed_w = ed_bbox[2] - ed_bbox[0]
+        ed_h = ed_bbox[3] - ed_bbox[1]
+
+        plate_w = ed_w + (padding * 4)
+        plate_h = owner_pill_h # Match height of owner pill for symmetry
+
+        # Create Plate
+        plate_img = Image.new("RGBA", (plate_w, plate_h), (0, 0, 0, 0))
+        plate_draw = ImageDraw.Draw(plate_img)
+
+        gold_border = (218, 165, 32, 255)
+        gold_text = (255, 223, 0, 255)
+        dark_fill = (30, 30, 30, 245)
+
+        # Draw Background
+        plate_draw.rounded_rectangle(
+            [(0, 0), (plate_w, plate_h)],
+            radius=corner_radius,
+            fill=dark_fill,
+            outline=gold_border,
+            width=border_width
+        )
+
+        # Draw Text
+        text_pos_x = (plate_w - ed_w) // 2
+        text_pos_y = (plate_h - ed_h) // 2 - int(5 * scale_factor)
+        plate_draw.text((text_pos_x, text_pos_y), edition_text, font=font_edition, fill=gold_text)
+
+        # Paste onto Card (Bottom Right)
+        card_img.paste(plate_img, (card_w - plate_w - edge_margin, card_h - plate_h - edge_margin), plate_img)
+
+        # --- Finalize ---
+        return encode_image(card_img)
+
+    except Exception as e:
+        logger.exception(f"Error generating minted card: {e}")
+        return None
+
+
+# --- Render Cache ---
+#
+# Finished renders are stored under a digest of everything that affects their pixels (source image
+# contents, avatar bytes, text), so a hit is served as bytes without touching PIL. Entries live in a
+# size-bounded in-memory LRU backed by a size-bounded directory of encoded images (LRU by access time).
+
+RENDER_CACHE_DIR = os.getenv('RENDER_CACHE_DIR', 'render_cache')
+RENDER_CACHE_MEMORY_BYTES = int(os.getenv('RENDER_CACHE_MEMORY_MB', '64')) * 1024 * 1024
+RENDER_CACHE_DISK_BYTES = int(os.getenv('RENDER_CACHE_DISK_MB', '512')) * 1024 * 1024
+
+_file_digests = {}
+
+
+def file_digest(path):
+    """Content hash of a file, memoized on (path, mtime, size) so unchanged files are only read once."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    stamp = (stat.st_mtime_ns, stat.st_size)
+    cached = _file_digests.get(path)
+    if cached and cached[0] == stamp:
+        return cached[1]
+    with open(path, 'rb') as f:
+        digest = hashlib.sha1(f.read()).hexdigest()
+    _file_digests[path] = (stamp, digest)
+    return digest
+
+
+def bytes_digest(data):
+    """Content hash of raw bytes (e.g. a downloaded avatar), or None."""
+    return hashlib.sha1(data).hexdigest() if data else None
+
+
+def render_key(*parts):
+    """Cache key for a render from the values that determine its output (including the encoding settings)."""
+    encoding = (RENDER_FORMAT, RENDER_QUALITY, RENDER_MIN_QUALITY, RENDER_OPTIMIZE, RENDER_MAX_BYTES)
+    return hashlib.sha256(repr((encoding,) + parts).encode('utf-8')).hexdigest()
+
+
+class RenderCache:
+    """Two-level LRU of rendered images: bytes in memory, encoded files on disk. Thread-safe."""
+    def __init__(self, directory=RENDER_CACHE_DIR, max_memory_bytes=RENDER_CACHE_MEMORY_BYTES, max_disk_bytes=RENDER_CACHE_DISK_BYTES):
+        self.directory = directory
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self.hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+        self._memory_bytes = 0
+        self._disk = None  # key -> size, oldest first; scanned on first use
+        self._disk_bytes = 0
+        self._lock = threading.Lock()
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.img")
+
+    def _scan_disk(self):
+        """Index the cache directory by access order (oldest first)."""
+        self._disk = OrderedDict()
+        self._disk_bytes = 0
+        if self.max_disk_bytes <= 0:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and entry.name.endswith('.img'):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, entry.name[:-4], stat.st_size))
+        for _, key, size in sorted(entries):
+            self._disk[key] = size
+            self._disk_bytes += size
+
+    def _remember(self, key, data):
+        """Put bytes in the memory LRU, evicting the least recently used entries."""
+        if len(data) > self.max_memory_bytes:
+            return
+        if key in self._memory:
+            self._memory_bytes -= len(self._memory.pop(key))
+        self._memory[key] = data
+        self._memory_bytes += len(data)
+        while self._memory_bytes > self.max_memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+
+    def get(self, key):
+        """Cached bytes for ``key``, or None."""
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return data
+
+            if self._disk is None:
+                self._scan_disk()
+            if key in self._disk:
+                try:
+                    with open(self._path(key), 'rb') as f:
+                        data = f.read()
+                    os.utime(self._path(key))
+                    self._disk.move_to_end(key)
+                    self._remember(key, data)
+                    self.hits += 1
+                    return data
+                except OSError:
+                    self._disk_bytes -= self._disk.pop(key)
+
+            self.misses += 1
+            return None
+
+    def put(self, key, data):
+        """Store rendered bytes in memory and on disk, evicting old files past the disk budget."""
+        with self._lock:
+            self._remember(key, data)
+            if self.max_disk_bytes <= 0:
+                return
+            if self._disk is None:
+                self._scan_disk()
+            try:
+                tmp_path = f"{self._path(key)}.{threading.get_ident()}.tmp"
+                with open(tmp_path, 'wb') as f:
+                    f.write(data)
+                os.replace(tmp_path, self._path(key))
+            except OSError as e:
+                logger.error(f"Could not write render cache entry {key}: {e}")
+                return
+            self._disk_bytes -= self._disk.pop(key, 0)
+            self._disk[key] = len(data)
+            self._disk_bytes += len(data)
+            while self._disk_bytes > self.max_disk_bytes and len(self._disk) > 1:
+                old_key, size = self._disk.popitem(last=False)
+                self._disk_bytes -= size
+                try:
+                    os.remove(self._path(old_key))
+                except OSError:
+                    pass
+
+
+render_cache = RenderCache()
+
+
+def lineup_key(deck_cards):
+    """Render key of a deck lineup: the pitch, card ids, the stats that decide their slots, and each card's art."""
+    return render_key('lineup', file_digest("pitch.png"), tuple(
+        (card.card_id, card.attack, card.defense, file_digest(card.image_path)) for card in deck_cards
+    ))
+
+
+def minted_card_key(card_path, avatar_bytes, owner_name, edition_text):
+    """Render key of a minted (owner + edition) card."""
+    return render_key('minted', file_digest(card_path), bytes_digest(avatar_bytes), owner_name, edition_text)
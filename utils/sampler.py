@@ -0,0 +1,83 @@
+"""
+Weighted sampling for FutBot
+Walker alias sampler used for card drops and pack pulls.
+"""
+import random
+from bisect import bisect_right
+from itertools import accumulate
+
+
+class WeightedSampler:
+    """Draws items in O(1) from a fixed list of (item, weight) pairs using Walker's alias method."""
+    def __init__(self, items_with_weights, key=None, rng=None):
+        pairs = [(item, weight) for item, weight in items_with_weights if weight > 0]
+        self.items = [item for item, _ in pairs]
+        self.weights = [weight for _, weight in pairs]
+        self.total = sum(self.weights)
+        self.key = key or (lambda item: item.card_id)
+        self.rng = rng or random.Random()
+        self._build_alias()
+
+    def __len__(self):
+        return len(self.items)
+
+    def _build_alias(self):
+        """Build the probability / alias tables (Vose's variant)."""
+        n = len(self.items)
+        self._prob = [0.0] * n
+        self._alias = [0] * n
+        if n == 0:
+            return
+
+        scaled = [weight * n / self.total for weight in self.weights]
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+
+        while small and large:
+            s = small.pop()
+            l = large.pop()
+            self._prob[s] = scaled[s]
+            self._alias[s] = l
+            scaled[l] -= 1.0 - scaled[s]
+            (small if scaled[l] < 1.0 else large).append(l)
+
+        # Leftovers are 1.0 up to float error
+        for i in large + small:
+            self._prob[i] = 1.0
+
+    def choice(self):
+        """Draw one item, or None if the sampler is empty."""
+        n = len(self.items)
+        if n == 0:
+            return None
+        i = int(self.rng.random() * n)
+        if self.rng.random() >= self._prob[i]:
+            i = self._alias[i]
+        return self.items[i]
+
+    def sample(self, k):
+        """Draw ``k`` items with replacement."""
+        return [self.choice() for _ in range(k)]
+
+    def choice_excluding(self, exclude, attempts=32):
+        """Draw one item whose key is not in ``exclude``, or None if every item is excluded.
+
+        Rejection-samples first; if the excluded items carry most of the weight,
+        falls back to a cumulative table over the remaining items (O(n) build, O(log n) draw).
+        """
+        if not exclude:
+            return self.choice()
+
+        for _ in range(attempts):
+            item = self.choice()
+            if item is None:
+                return None
+            if self.key(item) not in exclude:
+                return item
+
+        remaining = [(item, weight) for item, weight in zip(self.items, self.weights) if self.key(item) not in exclude]
+        if not remaining:
+            return None
+        cumulative = list(accumulate(weight for _, weight in remaining))
+        r = self.rng.random() * cumulative[-1]
+        return remaining[min(bisect_right(cumulative, r), len(remaining) - 1)][0]
@@ -0,0 +1,83 @@
+"""
+Card name search for FutBot
+Precomputed, accent-folded trigram index over card names for autocomplete (top 25 per keystroke).
+"""
+import re
+import unicodedata
+
+# Letters NFKD doesn't decompose into a base letter + accent
+FOLD_TABLE = str.maketrans({
+    'ø': 'o', 'đ': 'd', 'ð': 'd', 'ł': 'l', 'ħ': 'h', 'ı': 'i', 'þ': 'th',
+    'æ': 'ae', 'œ': 'oe', 'ß': 'ss',
+})
+NON_WORD = re.compile(r'[^0-9a-z]+')
+
+AUTOCOMPLETE_LIMIT = 25  # Discord's cap on autocomplete choices
+
+
+def fold(text):
+    """Lower-case ``text`` and strip accents, so "Mbappé" and "mbappe" compare equal."""
+    text = unicodedata.normalize('NFKD', (text or '').casefold())
+    return ''.join(ch for ch in text if not unicodedata.combining(ch)).translate(FOLD_TABLE)
+
+
+def trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class CardSearchIndex:
+    """Substring search over folded card names, ranked by overall then popularity.
+
+    Cards are stored in rank order and every trigram maps to the (ascending) positions of the names
+    containing it, so a query walks its rarest trigram's posting list in rank order and stops once it
+    has enough hits. Names where a word starts with the query rank above other substring matches.
+    """
+    def __init__(self, cards):
+        self.cards = sorted(
+            cards, key=lambda c: (-(c.overall or 0), -(c.wishlist_count or 0), -(c.copies or 0), c.name or '')
+        )
+        self.names = [fold(card.name) for card in self.cards]
+        # Word-separated form with a leading space: ' ' + query inside it means a word starts with the query
+        self.words = [' ' + NON_WORD.sub(' ', name).strip() for name in self.names]
+        self.postings = {}
+        for position, name in enumerate(self.names):
+            for gram in trigrams(name):
+                self.postings.setdefault(gram, []).append(position)
+
+    def __len__(self):
+        return len(self.cards)
+
+    def _candidates(self, query):
+        if len(query) < 3:
+            return range(len(self.cards))
+        lists = [self.postings.get(gram) for gram in trigrams(query)]
+        if not all(lists):
+            return ()
+        return min(lists, key=len)
+
+    def search(self, query, limit=AUTOCOMPLETE_LIMIT):
+        """Up to ``limit`` cards whose name contains ``query`` (accent- and case-insensitive), best first."""
+        query = fold(query).strip()
+        if not query:
+            return []
+        word_query = ' ' + NON_WORD.sub(' ', query).strip()
+
+        prefix_hits, other_hits = [], []
+        names, words = self.names, self.words
+        for position in self._candidates(query):
+            if query not in names[position]:
+                continue
+            if word_query in words[position]:
+                prefix_hits.append(position)
+                if len(prefix_hits) == limit:
+                    break
+            elif len(other_hits) < limit:
+                other_hits.append(position)
+
+        hits = (prefix_hits + other_hits)[:limit]
+        return [self.cards[position] for position in hits]
+
+
+def card_search_index(catalog):
+    """The search index of a CardCatalog, rebuilt after the catalog changes."""
+    return catalog.memo('search', lambda c: CardSearchIndex(c.all()))
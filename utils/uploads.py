@@ -0,0 +1,133 @@
+"""
+Upload cache for FutBot
+Remembers the Discord CDN URL of each card image after its first upload so later embeds can link it instead.
+"""
+import asyncio
+import logging
+import os
+import time
+from urllib.parse import parse_qs, urlparse
+
+from utils.assets import asset_file, file_stamp
+
+logger = logging.getLogger(__name__)
+
+# Stop reusing a URL this many seconds before Discord's signed link expires
+UPLOAD_URL_MARGIN = 3600
+# Lifetime assumed for URLs without an expiry parameter
+UPLOAD_URL_TTL = 12 * 3600
+
+
+def attachment_name(path):
+    """Filename an image is attached under (Discord replaces spaces with underscores)."""
+    return os.path.basename(path).replace(' ', '_')
+
+
+def url_expiry(url):
+    """Expiry timestamp of a signed CDN URL (its hex ``ex`` parameter), or now + UPLOAD_URL_TTL."""
+    try:
+        return int(parse_qs(urlparse(url).query)['ex'][0], 16)
+    except (KeyError, IndexError, ValueError):
+        return time.time() + UPLOAD_URL_TTL
+
+
+class UploadCache:
+    """Image path -> (CDN URL, expiry, file stamp) of the last upload of that image."""
+    def __init__(self):
+        self._urls = {}
+        self.hits = 0
+        self.uploads = 0
+
+    def __len__(self):
+        return len(self._urls)
+
+    def get(self, path):
+        """A still-valid CDN URL for ``path`` (not near expiry, file unchanged since the upload), or None."""
+        entry = self._urls.get(path)
+        if entry is None:
+            return None
+        url, expires, stamp = entry
+        if expires - UPLOAD_URL_MARGIN <= time.time() or file_stamp(path) != stamp:
+            del self._urls[path]
+            return None
+        return url
+
+    def remember(self, message, *paths):
+        """Record the CDN URLs of ``paths`` uploaded as attachments of ``message``."""
+        if message is None:
+            return
+        attachments = {attachment.filename: attachment.url for attachment in getattr(message, 'attachments', ())}
+        for path in paths:
+            url = attachments.get(attachment_name(path))
+            if url:
+                self._urls[path] = (url, url_expiry(url), file_stamp(path))
+
+    def forget(self, path):
+        """Drop the URL of an image (e.g. after its file was replaced)."""
+        self._urls.pop(path, None)
+
+
+upload_cache = UploadCache()
+_in_flight = {}  # path -> future resolved once its first upload finished
+
+
+def card_attachment(path):
+    """(image url, file) to show ``path`` in an embed.
+
+    Reuses the CDN URL of an earlier upload when it's still valid (file is None); otherwise
+    returns an ``attachment://`` reference and the discord.File to upload. Pass the sent message
+    to ``remember_upload`` so the next embed can skip the upload.
+    """
+    url = upload_cache.get(path)
+    if url is not None:
+        upload_cache.hits += 1
+        return url, None
+    upload_cache.uploads += 1
+    return f"attachment://{attachment_name(path)}", asset_file(path, attachment_name(path))
+
+
+def remember_upload(message, *paths):
+    """Record the CDN URLs of images uploaded with ``message``."""
+    upload_cache.remember(message, *paths)
+
+
+def edit_image_url(message, path):
+    """Image URL for an embed that replaces ``message``'s embed, matching how the message shows ``path``.
+
+    A message that uploaded the image must keep referencing its attachment; one that linked a
+    CDN URL keeps that URL.
+    """
+    filename = attachment_name(path)
+    if any(attachment.filename == filename for attachment in getattr(message, 'attachments', ())):
+        return f"attachment://{filename}"
+    if message is not None and message.embeds and message.embeds[0].image and message.embeds[0].image.url:
+        return message.embeds[0].image.url
+    return upload_cache.get(path) or f"attachment://{filename}"
+
+
+async def send_card_image(send, path, embed, **kwargs):
+    """Send ``embed`` with the image at ``path`` as its image through ``send`` (ctx.send, channel.send, ...).
+
+    Links the cached CDN URL when there is one and uploads the file otherwise. Concurrent sends of an
+    image that isn't cached yet (e.g. a drop fanned out to every drop channel) wait for the first
+    upload and then link its URL. Returns whatever ``send`` returns.
+    """
+    pending = _in_flight.get(path)
+    if pending is not None:
+        await asyncio.shield(pending)
+
+    image_url, image_file = card_attachment(path)
+    embed.set_image(url=image_url)
+    if image_file is None:
+        return await send(embed=embed, **kwargs)
+
+    future = asyncio.get_running_loop().create_future()
+    _in_flight[path] = future
+    try:
+        message = await send(embed=embed, file=image_file, **kwargs)
+        remember_upload(message, path)
+        return message
+    finally:
+        if _in_flight.get(path) is future:
+            del _in_flight[path]
+        future.set_result(None)